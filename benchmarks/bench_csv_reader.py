@@ -0,0 +1,45 @@
+"""
+Measures how quickly MovieFileCSVReader reads a data file in this process and across a pool of processes, and checks
+that both produce the same movies.
+
+Usage:
+    python -m movie.datafilereaders.movie_file_csv_generator --rows 1000000 --output movies_1m.csv
+    python -m benchmarks.bench_csv_reader --data-path movies_1m.csv --processes 4
+"""
+
+import argparse
+import os
+from time import perf_counter
+
+from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-path', default=os.path.join('movie', 'adapters', 'data', 'Data1000Movies.csv'))
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-lines', type=int, default=None)
+    args = parser.parse_args()
+
+    results = {}
+
+    for label, processes in (('serial', 1), ('parallel', args.processes)):
+        reader = MovieFileCSVReader(args.data_path)
+
+        start = perf_counter()
+        # Always parsed, even if the file has been compiled
+        movies = list(reader.iter_csv_movies(args.max_lines, processes))
+        elapsed = perf_counter() - start
+
+        results[label] = movies
+        print(f'{label:>8}: {len(movies)} movies in {elapsed:.2f}s ({len(movies) / max(elapsed, 1e-9):,.0f} movies/s)')
+
+    serial, parallel = results['serial'], results['parallel']
+    identical = serial == parallel and all(
+        (a.id, a.description, a.genres, a.director, a.actors) == (b.id, b.description, b.genres, b.director, b.actors)
+        for a, b in zip(serial, parallel))
+    print(f'identical: {identical}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Measures how long it takes to build recommendations and to look them up.
+
+Usage:
+    python -m benchmarks.bench_recommendations --users 100000
+"""
+
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from movie.adapters.recommendations import Recommender
+
+
+def generate_interactions(num_users: int, num_movies: int, mean_movies_per_user: int, seed: int):
+    """
+    Generates a random user x movie matrix in coordinate form. Movie popularity follows a Zipf distribution, as a few
+    movies are watched by far more people than the rest.
+    """
+    rng = np.random.default_rng(seed)
+
+    counts = np.clip(rng.poisson(mean_movies_per_user, num_users), 1, num_movies)
+    rows = np.repeat(np.arange(num_users), counts)
+
+    popularity = 1 / np.arange(1, num_movies + 1)
+    popularity /= popularity.sum()
+    columns = rng.choice(num_movies, size=len(rows), p=popularity)
+
+    # Drop duplicate (user, movie) pairs
+    pairs = np.unique(rows * num_movies + columns)
+    rows, columns = pairs // num_movies, pairs % num_movies
+
+    # Mostly watched movies, with some watchlisted and some reviewed
+    weights = rng.choice([1.0, 2.0, 0.4, 2.8, 4.0], size=len(rows), p=[0.3, 0.4, 0.1, 0.1, 0.1])
+
+    return rows, columns, weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--movies', type=int, default=1000)
+    parser.add_argument('--movies-per-user', type=int, default=15)
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=123)
+    args = parser.parse_args()
+
+    rows, columns, weights = generate_interactions(args.users, args.movies, args.movies_per_user, args.seed)
+    print(f'{args.users} users, {args.movies} movies, {len(rows)} interactions')
+
+    recommendations = Recommender().build_from_arrays(rows, columns, weights, list(range(args.users)),
+                                                      list(range(args.movies)))
+    print(f'Build: {recommendations.build_seconds:.2f}s')
+
+    rng = np.random.default_rng(args.seed)
+    timings = np.empty(args.lookups)
+
+    for i, user_id in enumerate(rng.integers(0, args.users, args.lookups).tolist()):
+        start = perf_counter()
+        recommendations.get(user_id)
+        timings[i] = perf_counter() - start
+
+    p50, p99 = np.percentile(timings, [50, 99]) * 1e6
+    print(f'Lookup: p50 {p50:.2f}us, p99 {p99:.2f}us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Runs the same scenarios against MemoryRepository and SqlAlchemyRepository (SQLite in a file and in memory) at several
+catalog sizes, and reports each scenario's throughput and latency percentiles.
+
+Results can be written to a JSON file and compared against the results from another commit. With --baseline, the
+benchmark exits with a non-zero status if any scenario's median latency is more than --tolerance slower than it was.
+
+Usage:
+    python -m benchmarks.bench_repository --sizes 100,1000,10000 --output results.json
+    python -m benchmarks.bench_repository --sizes 100,1000,10000 --baseline results.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from movie.activitysimulations.movie_watching_simulation import MovieWatchingSimulation
+from movie.adapters.database_repository import SqlAlchemyRepository
+from movie.adapters.memory_repository import MemoryRepository
+from movie.adapters.orm import map_model_to_tables, metadata
+from movie.adapters.repository import AbstractRepository, populate
+from movie.datafilereaders.movie_file_csv_generator import CatalogModel, MovieFileCSVGenerator
+from movie.domain.actor import Actor
+from movie.domain.genre import Genre
+
+DATA_PATH = os.path.join('movie', 'adapters', 'data', 'Data1000Movies.csv')
+BACKENDS = ['memory', 'sqlite-memory', 'sqlite-file']
+
+
+class Result(NamedTuple):
+    backend: str
+    size: int
+    scenario: str
+    operations: int
+    ops_per_second: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+    @property
+    def key(self) -> Tuple[str, int, str]:
+        return self.backend, self.size, self.scenario
+
+
+def summarise(backend: str, size: int, scenario: str, timings: List[float]) -> Result:
+    timings = np.asarray(timings)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1000
+    return Result(backend, size, scenario, len(timings), len(timings) / timings.sum(), timings.mean() * 1000,
+                  p50, p95, p99)
+
+
+def catalog_path(size: int, directory: str, seed: int) -> Tuple[str, Optional[int]]:
+    """ Returns a csv file with at least size movies and the number of lines to read from it. """
+    if size <= 1000:
+        return DATA_PATH, size
+
+    path = os.path.join(directory, f'movies_{size}.csv')
+    if not os.path.exists(path):
+        MovieFileCSVGenerator(CatalogModel.fit(DATA_PATH), seed).write(path, size)
+    return path, None
+
+
+def create_repository(backend: str, directory: str) -> AbstractRepository:
+    if backend == 'memory':
+        return MemoryRepository()
+
+    if backend == 'sqlite-memory':
+        engine = create_engine('sqlite://')
+    else:
+        path = os.path.join(directory, 'bench.db')
+        if os.path.exists(path):
+            os.remove(path)
+        engine = create_engine(f'sqlite:///{path}')
+
+    clear_mappers()
+    metadata.create_all(engine)
+    map_model_to_tables()
+    return SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+
+
+def time_operations(repo: AbstractRepository, operations: List[Callable[[], object]], warmup: int = 0) -> List[float]:
+    """ Runs each operation, starting a new session first as a request would, and returns how long each took. """
+    timings = []
+
+    for i, operation in enumerate(operations):
+        if isinstance(repo, SqlAlchemyRepository):
+            repo.reset_session()
+
+        start = perf_counter()
+        operation()
+        elapsed = perf_counter() - start
+
+        if i >= warmup:
+            timings.append(elapsed)
+
+    return timings
+
+
+def run_scenarios(backend: str, size: int, users: int, operations: int, seed: int, directory: str) -> List[Result]:
+    rng = random.Random(seed)
+    repo = create_repository(backend, directory)
+    path, max_num_lines = catalog_path(size, directory, seed)
+    results = []
+
+    # Populating includes simulating some users so that there are watchlists and reviews to read
+    start = perf_counter()
+    populate(repo, path, seed, simulate_activity=False, max_num_lines=max_num_lines)
+    movies = repo.get_movies(0, page_size=size)
+    state = MovieWatchingSimulation(movies, seed).simulate(num_users=users, min_num_movies=10, max_num_movies=20)
+
+    # Simulated usernames aren't guaranteed to be unique
+    simulated_users = list({user.username: user for user in state.users}.values())
+    repo.add_users(simulated_users)
+    repo.add_reviews([review for user in simulated_users for review in user.reviews])
+    results.append(summarise(backend, size, 'populate', [perf_counter() - start]))
+
+    movie_ids = [movie.id for movie in movies]
+    reviewed_ids = sorted({review.movie.id for user in simulated_users for review in user.reviews})
+    usernames = [user.username for user in simulated_users]
+    number_of_pages = repo.get_number_of_movie_pages()
+    words = [word.lower() for movie in movies for word in movie.title.split() if len(word) > 3]
+    filters = [([Genre(movie.genres[0].genre_name)], [Actor(movie.actors[0].actor_full_name)])
+               for movie in movies if movie.genres and movie.actors]
+    warmup = min(10, operations)
+
+    def listing(page_number):
+        return lambda: (repo.get_number_of_movie_pages(), repo.get_movies(page_number))
+
+    def query(text):
+        return lambda: (repo.get_number_of_movie_pages(query=text), repo.get_movies(0, query=text))
+
+    def filtered(genres, actors):
+        return lambda: (repo.get_number_of_movie_pages(genres=genres, actors=actors),
+                        repo.get_movies(0, genres=genres, actors=actors))
+
+    def reviews_page(movie_id):
+        def operation():
+            movie = repo.get_movie_by_id(movie_id)
+            return repo.get_number_of_review_pages_for_movie(movie), repo.get_reviews_for_movie(movie, 0)
+        return operation
+
+    def watchlist_page(username):
+        def operation():
+            user = repo.get_user(username)
+            return repo.get_number_of_movie_pages_for_user(user), repo.get_movies_for_user(user, 0)
+        return operation
+
+    def delete_user(username):
+        return lambda: repo.delete_user(repo.get_user(username))
+
+    count = operations + warmup
+    scenarios: Dict[str, List[Callable[[], object]]] = {
+        'listing': [listing(rng.randrange(number_of_pages)) for _ in range(count)],
+        'query': [query(rng.choice(words)) for _ in range(count)],
+        'genre_actor_filter': [filtered(*rng.choice(filters)) for _ in range(count)],
+        'reviews_page': [reviews_page(rng.choice(reviewed_ids or movie_ids)) for _ in range(count)],
+        'watchlist_page': [watchlist_page(rng.choice(usernames)) for _ in range(count)]
+    }
+
+    for scenario, scenario_operations in scenarios.items():
+        results.append(summarise(backend, size, scenario, time_operations(repo, scenario_operations, warmup)))
+
+    # Deleting changes the repository, so it goes last and each user can only be deleted once
+    deleted = rng.sample(usernames, min(operations, len(usernames)))
+    results.append(summarise(backend, size, 'delete_user', time_operations(repo, [delete_user(u) for u in deleted])))
+
+    if isinstance(repo, SqlAlchemyRepository):
+        repo.close_session()
+        clear_mappers()
+
+    return results
+
+
+def find_regressions(results: List[Result], baseline: List[Result], tolerance: float,
+                     min_difference_ms: float = 0.0) -> List[Tuple[Result, Result]]:
+    """
+    Returns (result, baseline result) pairs for each scenario whose median latency exceeds the tolerance. Scenarios
+    that slowed down by less than min_difference_ms aren't counted, as very fast operations are noisy.
+    """
+    baseline_results = {result.key: result for result in baseline}
+    regressions = []
+
+    for result in results:
+        previous = baseline_results.get(result.key)
+        if previous is None or result.p50_ms - previous.p50_ms <= min_difference_ms:
+            continue
+
+        if result.p50_ms > previous.p50_ms * (1 + tolerance):
+            regressions.append((result, previous))
+
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_results(path: str) -> List[Result]:
+    with open(path) as file:
+        return [Result(**result) for result in json.load(file)['results']]
+
+
+def save_results(path: str, results: List[Result], args: argparse.Namespace) -> None:
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'users': args.users, 'operations': args.operations, 'seed': args.seed},
+        'results': [result._asdict() for result in results]
+    }
+
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000', help='comma separated catalog sizes')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='comma separated backends to run')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--operations', type=int, default=200, help='timed operations per scenario')
+    parser.add_argument('--seed', type=int, default=123)
+    parser.add_argument('--output', help='file to write the results to as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction a median latency can increase by before it counts as a regression')
+    parser.add_argument('--min-difference-ms', type=float, default=0.05,
+                        help='smallest increase in median latency that can count as a regression')
+    args = parser.parse_args()
+
+    backends = args.backends.split(',')
+    for backend in backends:
+        if backend not in BACKENDS:
+            parser.error(f"invalid backend '{backend}', should be one of {BACKENDS}")
+
+    results = []
+    print(f"{'backend':<14}{'size':>7}  {'scenario':<20}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in [int(size) for size in args.sizes.split(',')]:
+            for backend in backends:
+                for result in run_scenarios(backend, size, args.users, args.operations, args.seed, directory):
+                    results.append(result)
+                    print(f'{result.backend:<14}{result.size:>7}  {result.scenario:<20}{result.ops_per_second:>10.1f}'
+                          f'{result.p50_ms:>10.3f}{result.p95_ms:>10.3f}{result.p99_ms:>10.3f}')
+
+    if args.output:
+        save_results(args.output, results, args)
+
+    if args.baseline:
+        regressions = find_regressions(results, load_results(args.baseline), args.tolerance,
+                                       args.min_difference_ms)
+
+        for result, previous in regressions:
+            print(f'REGRESSION {result.backend} {result.size} {result.scenario}: '
+                  f'p50 {previous.p50_ms:.3f}ms -> {result.p50_ms:.3f}ms')
+
+        if regressions:
+            sys.exit(1)
+
+        print(f'No scenario slowed down by more than {args.tolerance:.0%}')
+
+
+if __name__ == '__main__':
+    main()
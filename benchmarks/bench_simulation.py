@@ -0,0 +1,53 @@
+"""
+Measures how quickly MovieWatchingSimulation can generate users and reviews.
+
+Usage:
+    python -m benchmarks.bench_simulation --users 100000 --max-movies 200 --processes 4
+"""
+
+import argparse
+import os
+import resource
+from time import perf_counter
+
+from movie.activitysimulations.movie_watching_simulation import MovieWatchingSimulation
+from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-path', default=os.path.join('movie', 'adapters', 'data', 'Data1000Movies.csv'))
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--min-movies', type=int, default=0)
+    parser.add_argument('--max-movies', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--domain-objects', action='store_true', help='also create Users and Reviews from each batch')
+    parser.add_argument('--seed', type=int, default=123)
+    args = parser.parse_args()
+
+    reader = MovieFileCSVReader(args.data_path)
+    reader.read_csv_file()
+    simulation = MovieWatchingSimulation(reader.dataset_of_movies, args.seed)
+
+    start = perf_counter()
+    num_users = num_reviews = 0
+
+    for batch in simulation.simulate_batches(args.users, args.min_movies, args.max_movies, args.batch_size,
+                                             args.processes):
+        num_users += batch.number_of_users
+        num_reviews += batch.number_of_reviews
+
+        if args.domain_objects:
+            simulation.to_state(batch)
+
+    elapsed = perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f'{num_users} users, {num_reviews} reviews in {elapsed:.2f}s')
+    print(f'{num_users / elapsed:.0f} users/s, {num_reviews / elapsed:.0f} reviews/s')
+    print(f'Peak RSS: {peak_rss_mb:.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
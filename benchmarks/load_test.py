@@ -0,0 +1,413 @@
+"""
+Load tests the web app with virtual users that behave like the users made by MovieWatchingSimulation: each registers,
+logs in, then browses, searches, opens movies and their reviews, adds movies to their watchlist, watches some of them,
+reviews some of those and removes others from their watchlist.
+
+Requests are made either in-process through Flask's test client or over HTTP to a running server, e.g. gunicorn. The
+latency of each endpoint is recorded and summarised, and the summary can be saved as JSON and compared with a previous
+run.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 8 --duration 30
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --concurrency 32 --duration 60 --output release.json
+    python -m benchmarks.load_test --gunicorn-workers 4 --concurrency 32 --baseline release.json
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import tempfile
+import threading
+from datetime import datetime
+from http.cookiejar import CookieJar
+from time import perf_counter, sleep
+from typing import Dict, List, NamedTuple, Optional
+from urllib import error, parse, request
+
+import numpy as np
+from random_words.random_words import RandomWords
+
+from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+DATA_PATH = os.path.join('movie', 'adapters', 'data', 'Data1000Movies.csv')
+
+# Upper bounds, in milliseconds, of the latency histogram's buckets
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf')]
+
+_CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+class Response(NamedTuple):
+    status: int
+    text: str
+
+
+class InProcessSession:
+    """ Makes requests to an app in-process. Each session has its own cookies. """
+
+    def __init__(self, app) -> None:
+        self._client = app.test_client()
+
+    def request(self, method: str, path: str, data: Dict[str, str] = None) -> Response:
+        response = self._client.open(path, method=method, data=data)
+        return Response(response.status_code, response.get_data(as_text=True))
+
+
+class _NoRedirectHandler(request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        # Redirects are timed as their own requests, as they are with the test client
+        return None
+
+
+class HttpSession:
+    """ Makes requests to a server over HTTP. Each session has its own cookies. """
+
+    def __init__(self, base_url: str, timeout: float = 30) -> None:
+        self._base_url = base_url.rstrip('/')
+        self._timeout = timeout
+        self._opener = request.build_opener(request.HTTPCookieProcessor(CookieJar()), _NoRedirectHandler())
+
+    def request(self, method: str, path: str, data: Dict[str, str] = None) -> Response:
+        body = parse.urlencode(data).encode() if data is not None else None
+        http_request = request.Request(self._base_url + path, data=body, method=method)
+
+        try:
+            with self._opener.open(http_request, timeout=self._timeout) as response:
+                return Response(response.status, response.read().decode('utf-8', errors='replace'))
+        except error.HTTPError as e:
+            return Response(e.code, e.read().decode('utf-8', errors='replace'))
+
+
+class EndpointStatistics:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.statuses: Dict[int, int] = {}
+
+    def summary(self, elapsed: float) -> dict:
+        latencies_ms = np.asarray(self.latencies) * 1000
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms) else (0, 0, 0)
+        counts = np.histogram(latencies_ms, [0] + HISTOGRAM_BUCKETS_MS)[0] if len(latencies_ms) else []
+
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'requests_per_second': len(self.latencies) / elapsed,
+            'mean_ms': float(latencies_ms.mean()) if len(latencies_ms) else 0,
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'max_ms': float(latencies_ms.max()) if len(latencies_ms) else 0,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'histogram': {f'<={bound:g}ms': int(count) for bound, count in zip(HISTOGRAM_BUCKETS_MS, counts)}
+        }
+
+
+class Recorder:
+    """ Collects the latency and outcome of every request, grouped by endpoint. Safe to use from many threads. """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, EndpointStatistics] = {}
+
+    def record(self, endpoint: str, elapsed: float, status: Optional[int]) -> None:
+        with self._lock:
+            statistics = self._endpoints.setdefault(endpoint, EndpointStatistics())
+            statistics.latencies.append(elapsed)
+            statistics.statuses[status or 0] = statistics.statuses.get(status or 0, 0) + 1
+
+            # A status of None means that the request failed without a response
+            if status is None or status >= 400:
+                statistics.errors += 1
+
+    def summary(self, elapsed: float) -> dict:
+        with self._lock:
+            endpoints = {endpoint: statistics.summary(elapsed)
+                         for endpoint, statistics in sorted(self._endpoints.items())}
+
+        total = sum(endpoint['requests'] for endpoint in endpoints.values())
+        return {
+            'elapsed_seconds': elapsed,
+            'requests': total,
+            'errors': sum(endpoint['errors'] for endpoint in endpoints.values()),
+            'requests_per_second': total / elapsed,
+            'endpoints': endpoints
+        }
+
+
+class VirtualUser:
+    """ Signs up, then repeatedly picks one of the actions a real user might take until the deadline. """
+
+    def __init__(self, session, recorder: Recorder, rng: random.Random, movie_ids: List[int], words: List[str],
+                 think_time: float) -> None:
+        self._session = session
+        self._recorder = recorder
+        self._rng = rng
+        self._movie_ids = movie_ids
+        self._words = words
+        self._think_time = think_time
+        self._watchlist: List[int] = []
+        self._watched: List[int] = []
+
+        self._actions = [
+            (self.browse, 10),
+            (self.search, 10),
+            (self.open_movie, 20),
+            (self.open_reviews, 10),
+            (self.add_to_watchlist, 10),
+            (self.watch, 6),
+            (self.review, 4),
+            (self.remove_from_watchlist, 3),
+            (self.open_watchlist, 5)
+        ]
+
+    def _request(self, endpoint: str, method: str, path: str, data: Dict[str, str] = None) -> Optional[Response]:
+        start = perf_counter()
+        try:
+            response = self._session.request(method, path, data)
+        except Exception:
+            self._recorder.record(endpoint, perf_counter() - start, None)
+            return None
+
+        self._recorder.record(endpoint, perf_counter() - start, response.status)
+        return response
+
+    def _submit_form(self, endpoint: str, path: str, data: Dict[str, str]) -> Optional[Response]:
+        """ Loads the form to get its CSRF token, if there is one, then submits it. """
+        form = self._request(f'GET {endpoint}', 'GET', path)
+        token = _CSRF_TOKEN.search(form.text) if form else None
+
+        if token:
+            data = {**data, 'csrf_token': token.group(1)}
+
+        return self._request(f'POST {endpoint}', 'POST', path, data)
+
+    def sign_up(self, index: int) -> None:
+        # Usernames and passwords must meet the registration form's requirements
+        username = f"{'-'.join(self._rng.sample(self._words, 2))}-{index}"[:32].lower()
+        password = f'{self._rng.choice(self._words).capitalize()}x{self._rng.randrange(10 ** 6)}'
+
+        self._submit_form('/register', '/register', {'username': username, 'password': password})
+        self._submit_form('/login', '/login', {'username': username, 'password': password})
+
+    def browse(self) -> None:
+        self._request('GET /', 'GET', '/')
+
+    def search(self) -> None:
+        query = parse.urlencode({'query': self._rng.choice(self._words)})
+        self._request('GET /search', 'GET', f'/search?{query}')
+
+    def open_movie(self) -> None:
+        self._request('GET /movie/<id>', 'GET', f'/movie/{self._rng.choice(self._movie_ids)}')
+
+    def open_reviews(self) -> None:
+        self._request('GET /movie/<id>/reviews', 'GET', f'/movie/{self._rng.choice(self._movie_ids)}/reviews')
+
+    def add_to_watchlist(self) -> None:
+        movie_id = self._rng.choice(self._movie_ids)
+        self._request('POST /watchlist/<id>', 'POST', f'/watchlist/{movie_id}')
+        self._watchlist.append(movie_id)
+
+    def watch(self) -> None:
+        # As in the simulation, users watch movies from their watchlist
+        if not self._watchlist:
+            return self.add_to_watchlist()
+
+        movie_id = self._watchlist.pop(self._rng.randrange(len(self._watchlist)))
+        self._request('POST /watch/<id>', 'POST', f'/watch/{movie_id}')
+        self._watched.append(movie_id)
+
+    def review(self) -> None:
+        # ...and review movies they've watched
+        if not self._watched:
+            return self.watch()
+
+        movie_id = self._watched.pop(self._rng.randrange(len(self._watched)))
+        text = ' '.join(self._rng.choice(self._words) for _ in range(self._rng.randint(8, 32)))
+        self._submit_form('/movie/<id>/reviews', f'/movie/{movie_id}/reviews',
+                          {'review': text, 'rating': str(self._rng.randint(1, 10))})
+
+    def remove_from_watchlist(self) -> None:
+        if not self._watchlist:
+            return self.add_to_watchlist()
+
+        movie_id = self._watchlist.pop(self._rng.randrange(len(self._watchlist)))
+        self._request('DELETE /watchlist/<id>', 'DELETE', f'/watchlist/{movie_id}')
+
+    def open_watchlist(self) -> None:
+        self._request('GET /watchlist', 'GET', '/watchlist')
+
+    def run(self, index: int, deadline: float) -> None:
+        actions, weights = zip(*self._actions)
+        self.sign_up(index)
+
+        while perf_counter() < deadline:
+            self._rng.choices(actions, weights)[0]()
+
+            if self._think_time:
+                sleep(self._rng.expovariate(1 / self._think_time))
+
+
+def run_load_test(session_factory, concurrency: int, duration: float, movie_ids: List[int], think_time: float = 0,
+                  seed: int = None) -> dict:
+    """ Runs concurrency virtual users, each with a session from session_factory, for duration seconds. """
+    recorder = Recorder()
+    words = sorted({word for nouns in RandomWords().nouns.values() for word in nouns if word.isalpha()})
+    seeds = random.Random(seed)
+
+    users = [VirtualUser(session_factory(), recorder, random.Random(seeds.random()), movie_ids, words, think_time)
+             for _ in range(concurrency)]
+
+    start = perf_counter()
+    threads = [threading.Thread(target=user.run, args=(i, start + duration), daemon=True)
+               for i, user in enumerate(users)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return recorder.summary(perf_counter() - start)
+
+
+def create_in_process_app(repository: str, data_path: str, directory: str):
+    from movie import create_app
+
+    return create_app({
+        'TESTING': True,
+        'REPOSITORY': repository,
+        'TEST_DATA_PATH': data_path,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'load_test.db')}",
+        'RECOMMENDATIONS_REFRESH_SECONDS': 0
+    })
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers: int, repository: str, directory: str, timeout: float = 300,
+                   preload: bool = True) -> (subprocess.Popen, str):
+    """
+    Starts the app with gunicorn, as in the Procfile, and waits until it responds. By default the app is loaded before
+    the workers are forked, as configured in gunicorn.conf.py, so that they don't all try to populate a new database
+    at once.
+    """
+    url = f'http://127.0.0.1:{_free_port()}'
+    environment = {
+        **os.environ,
+        'REPOSITORY': repository,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'load_test.db')}",
+        'GUNICORN_PRELOAD': str(preload)
+    }
+    process = subprocess.Popen(['gunicorn', '--workers', str(workers), '--bind', url[len('http://'):],
+                                'movie:create_app()'], env=environment)
+
+    deadline = perf_counter() + timeout
+    while perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+        try:
+            HttpSession(url, timeout=5).request('GET', '/')
+            return process, url
+        except OSError:
+            sleep(0.5)
+
+    process.terminate()
+    raise RuntimeError(f"gunicorn didn't start within {timeout}s")
+
+
+def print_summary(summary: dict, baseline: dict = None) -> None:
+    print(f"{summary['requests']} requests, {summary['errors']} errors in {summary['elapsed_seconds']:.1f}s "
+          f"({summary['requests_per_second']:.1f} requests/s)")
+    print(f"{'endpoint':<30}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          + (f"{'p50 vs baseline':>17}" if baseline else ''))
+
+    for endpoint, result in summary['endpoints'].items():
+        line = (f"{endpoint:<30}{result['requests']:>9}{result['errors']:>8}{result['requests_per_second']:>9.1f}"
+                f"{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}")
+
+        previous = baseline['endpoints'].get(endpoint) if baseline else None
+        if previous and previous['p50_ms']:
+            line += f"{result['p50_ms'] / previous['p50_ms'] - 1:>+17.0%}"
+
+        print(line)
+
+    print()
+    print('Latency histograms (requests per bucket):')
+    buckets = [f'{bound:g}' for bound in HISTOGRAM_BUCKETS_MS]
+    print(f"{'endpoint':<30}" + ''.join(f'{bucket:>7}' for bucket in buckets))
+    for endpoint, result in summary['endpoints'].items():
+        print(f'{endpoint:<30}' + ''.join(f'{count:>7}' for count in result['histogram'].values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='load test a running server rather than the app in-process')
+    target.add_argument('--gunicorn-workers', type=int, help='start the app with gunicorn and load test it')
+    parser.add_argument('--repository', choices=['memory', 'database'], default='memory',
+                        help='repository to use when testing in-process or with gunicorn')
+    parser.add_argument('--data-path', default=DATA_PATH, help='the movies the app was populated from')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run for')
+    parser.add_argument('--think-time', type=float, default=0, help='mean seconds each user waits between actions')
+    parser.add_argument('--seed', type=int, default=123)
+    parser.add_argument('--output', help='file to write the summary to as JSON')
+    parser.add_argument('--baseline', help='summary from a previous run to compare with')
+    args = parser.parse_args()
+
+    reader = MovieFileCSVReader(args.data_path)
+    reader.read_csv_file()
+    movie_ids = list(range(len(reader.dataset_of_movies)))
+
+    server = None
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            if args.gunicorn_workers:
+                server, url = start_gunicorn(args.gunicorn_workers, args.repository, directory)
+                target = f'gunicorn ({args.gunicorn_workers} workers)'
+                session_factory = lambda: HttpSession(url)
+            elif args.url:
+                target = args.url
+                session_factory = lambda: HttpSession(args.url)
+            else:
+                app = create_in_process_app(args.repository, args.data_path, directory)
+                target = f'in-process ({args.repository})'
+                session_factory = lambda: InProcessSession(app)
+
+            summary = run_load_test(session_factory, args.concurrency, args.duration, movie_ids, args.think_time,
+                                    args.seed)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    summary = {
+        'target': target,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'settings': {'concurrency': args.concurrency, 'duration': args.duration, 'think_time': args.think_time},
+        **summary
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    print_summary(summary, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
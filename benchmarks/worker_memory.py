@@ -0,0 +1,117 @@
+"""
+Measures how much memory each gunicorn worker uses with and without the app being preloaded in the master process.
+
+Each configuration is started with gunicorn.conf.py and sent requests for the home, search and movie pages so that the
+workers have touched the catalog, as they would under real traffic. Then the memory of the master and each worker is
+read from /proc/<pid>/smaps_rollup (so this only runs on Linux):
+
+- unique (USS): memory only that process uses, i.e. what's freed if it exits
+- proportional (PSS): unique memory plus an equal share of the memory it shares with other processes
+- resident (RSS): all the memory it uses, counting shared memory in full
+
+Usage:
+    python -m benchmarks.worker_memory --workers 4
+    python -m benchmarks.worker_memory --workers 4 --repository database --requests 400 --output memory.json
+"""
+
+import argparse
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import perf_counter, sleep
+from typing import Dict, List
+
+from benchmarks.load_test import HttpSession, start_gunicorn
+
+PATHS = ['/', '/search?query=the', '/search?genre=Action&sort=rating'] + [f'/movie/{i}' for i in range(0, 1000, 50)]
+
+
+def worker_pids(master_pid: int) -> List[int]:
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as file:
+        return [int(pid) for pid in file.read().split()]
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """ Returns the unique, proportional and resident memory of the process with the given id in kB. """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+
+    return {
+        'uss': values['Private_Clean'] + values['Private_Dirty'],
+        'pss': values['Pss'],
+        'rss': values['Rss']
+    }
+
+
+def measure(workers: int, repository: str, preload: bool, requests: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        start = perf_counter()
+        process, url = start_gunicorn(workers, repository, directory, preload=preload)
+
+        try:
+            # Requests are spread over every worker, which each populate their own repository if it isn't preloaded
+            with ThreadPoolExecutor(workers * 2) as executor:
+                list(executor.map(lambda path: HttpSession(url).request('GET', path),
+                                  (PATHS[i % len(PATHS)] for i in range(requests))))
+            ready_seconds = perf_counter() - start
+
+            # Give the workers a moment to finish any requests and garbage collection
+            sleep(1)
+            pids = worker_pids(process.pid)
+            worker_memory = [memory_kb(pid) for pid in pids]
+            master_memory = memory_kb(process.pid)
+        finally:
+            process.terminate()
+            process.wait()
+
+    def mean(key):
+        return sum(memory[key] for memory in worker_memory) / len(worker_memory)
+
+    return {
+        'preload': preload,
+        'workers': len(pids),
+        'ready_seconds': ready_seconds,
+        'master': master_memory,
+        'worker_mean': {key: mean(key) for key in ('uss', 'pss', 'rss')},
+        'total_pss': master_memory['pss'] + sum(memory['pss'] for memory in worker_memory)
+    }
+
+
+def print_results(results: List[dict]) -> None:
+    print(f"{'preload':<10}{'workers':>8}{'ready s':>9}{'worker USS MB':>15}{'worker PSS MB':>15}"
+          f"{'worker RSS MB':>15}{'master PSS MB':>15}{'total PSS MB':>14}")
+
+    for result in results:
+        worker = result['worker_mean']
+        print(f"{str(result['preload']):<10}{result['workers']:>8}{result['ready_seconds']:>9.1f}"
+              f"{worker['uss'] / 1024:>15.1f}{worker['pss'] / 1024:>15.1f}{worker['rss'] / 1024:>15.1f}"
+              f"{result['master']['pss'] / 1024:>15.1f}{result['total_pss'] / 1024:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repository', choices=['memory', 'database'], default='memory')
+    parser.add_argument('--requests', type=int, default=200, help='number of requests to send before measuring')
+    parser.add_argument('--output', help='file to write the results to as JSON')
+    args = parser.parse_args()
+
+    results = [measure(args.workers, args.repository, preload, args.requests) for preload in (False, True)]
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'settings': {'workers': args.workers, 'repository': args.repository, 'requests': args.requests},
+                'results': results
+            }, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -31,9 +31,60 @@ class Config:
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 60
 
+    # Pages that are the same for every anonymous visitor are cached for this many seconds, or not at all if it's 0.
+    # Changing the version stops any pages cached by a previous version of the app from being used.
+    PAGE_CACHE_TIMEOUT = int(environ.get('PAGE_CACHE_TIMEOUT') or 60)
+    PAGE_CACHE_VERSION = environ.get('PAGE_CACHE_VERSION') or ''
+
+    # With the memory repository, each process writes the changes users make to this file and applies the changes
+    # written by other processes before each request, so that every gunicorn worker sees the same users and reviews
+    OPERATION_LOG_PATH = environ.get('OPERATION_LOG_PATH')
+
+    # The memory repository is loaded from a snapshot saved to this file, if there is one, rather than populated. A new
+    # snapshot is saved this often, if anything has changed, and on exit. If the interval is 0 it's only saved on exit.
+    SNAPSHOT_PATH = environ.get('SNAPSHOT_PATH')
+    SNAPSHOT_INTERVAL_SECONDS = float(environ.get('SNAPSHOT_INTERVAL_SECONDS') or 300)
+
+    # The ids of a search's results, or a movie's reviews, are kept when the first page is shown so that its other pages
+    # don't shift as movies and reviews are added. Each set is kept for at most this long, and the least recently used
+    # are dropped once together they hold more ids than this.
+    RESULT_VERSION_MAX_AGE_SECONDS = float(environ.get('RESULT_VERSION_MAX_AGE_SECONDS') or 1800)
+    RESULT_VERSION_MAX_IDS = int(environ.get('RESULT_VERSION_MAX_IDS') or 1_000_000)
+
+    # With the memory repository, the data file is checked for changes this often and the movies are reloaded from it
+    # without restarting once it's been left unchanged for as long. If this is 0 the file isn't checked.
+    CATALOG_RELOAD_SECONDS = float(environ.get('CATALOG_RELOAD_SECONDS') or 0)
+
+    # With the database repository, the data file is imported into an existing database on startup, adding new movies
+    # and updating changed ones while keeping users and reviews, rather than only being loaded into an empty database
+    IMPORT_CATALOG_ON_START = _get_bool('IMPORT_CATALOG_ON_START')
+
     # Data file reader configuration
     MAX_LINES_TO_LOAD = int(environ.get('MAX_LINES_TO_LOAD') or 0) or None
 
+    # Recommendations are rebuilt in the background this often. If this is 0 they're only built once on startup.
+    RECOMMENDATIONS_REFRESH_SECONDS = int(environ.get('RECOMMENDATIONS_REFRESH_SECONDS') or 300)
+
+    # Metrics are kept in memory unless this is set, in which case each process writes its metrics to a file in this
+    # directory so that /metrics reports the total across every gunicorn worker
+    METRICS_DIRECTORY = environ.get('METRICS_DIRECTORY')
+
+    # Fraction of requests whose database statements are counted and timed, and how long a statement can take before
+    # it's logged along with its query plan
+    QUERY_SAMPLE_RATE = float(environ.get('QUERY_SAMPLE_RATE') or 1.0)
+    SLOW_QUERY_SECONDS = float(environ.get('SLOW_QUERY_SECONDS') or 0.1)
+
+    # Requests with a profile query parameter or X-Profile header matching PROFILING_TOKEN are profiled, if enabled
+    PROFILING_ENABLED = _get_bool('PROFILING_ENABLED')
+    PROFILING_TOKEN = environ.get('PROFILING_TOKEN')
+    PROFILES_DIRECTORY = environ.get('PROFILES_DIRECTORY') or 'profiles'
+    PROFILING_TOP_N = int(environ.get('PROFILING_TOP_N') or 50)
+
+    # A background thread can sample every thread's stack this often and write the counts to PROFILES_DIRECTORY
+    SAMPLING_PROFILER_ENABLED = _get_bool('SAMPLING_PROFILER_ENABLED')
+    SAMPLING_PROFILER_INTERVAL_SECONDS = float(environ.get('SAMPLING_PROFILER_INTERVAL_SECONDS') or 0.01)
+    SAMPLING_PROFILER_FLUSH_SECONDS = float(environ.get('SAMPLING_PROFILER_FLUSH_SECONDS') or 60)
+
 
 class HerokuProductionConfig(Config):
     """Set Flask configuration from Heroku environment variables."""
@@ -44,3 +95,8 @@ class HerokuProductionConfig(Config):
     # Flask-Caching configuration
     CACHE_TYPE = 'redis'
     CACHE_REDIS_URL = environ.get('REDIS_URL')
+
+    # Each release gets its own pages as every dyno shares the cache
+    PAGE_CACHE_VERSION = environ.get('PAGE_CACHE_VERSION') or environ.get('HEROKU_RELEASE_VERSION') or ''
+
+    QUERY_SAMPLE_RATE = float(environ.get('QUERY_SAMPLE_RATE') or 0.05)
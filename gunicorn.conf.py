@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration, read automatically when gunicorn is started from this directory, e.g. by the Procfile.
+
+The app is created once in the master process and the workers are forked from it, so that the repository is only
+populated once and the workers share the master's memory for as long as none of them write to it. Python writes to
+an object whenever it's referenced though, and the garbage collector also writes to every object it tracks when it
+runs, so the objects that exist when the workers are forked are moved out of the collector's reach first.
+
+Set GUNICORN_PRELOAD to False to have each worker create its own app instead, and GUNICORN_THREADS to have each worker
+handle that many requests at once on separate threads.
+"""
+import gc
+from os import environ
+
+preload_app = environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+threads = int(environ.get('GUNICORN_THREADS') or 1)
+
+
+def when_ready(server):
+    if preload_app:
+        # Anything left over from populating the repository is collected first, as frozen objects are never freed
+        gc.collect()
+        gc.freeze()
+        server.log.info('Froze %d objects before forking workers', gc.get_freeze_count())
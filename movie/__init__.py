@@ -1,23 +1,64 @@
 """Initialize Flask app."""
 
 import os
-from typing import Union
+import weakref
+from datetime import datetime
+from typing import Optional, Union
 
 from flask import Flask, render_template
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import clear_mappers, sessionmaker
 from sqlalchemy.pool import NullPool
 
 from cache import cache
 from movie.adapters import database_repository, memory_repository
+from movie.adapters.catalog_import import import_catalog
+from movie.adapters.catalog_reload import CatalogReloadJob, read_catalog_source
 from movie.adapters.orm import metadata, map_model_to_tables
+from movie.adapters.operation_log import OperationLog
+from movie.adapters.query_tracker import QueryTracker
+from movie.adapters.recommendations import RecommendationJob
 from movie.adapters.repository import AbstractRepository, populate
+from movie.adapters.result_versions import ResultVersions
+from movie.adapters.snapshot import SnapshotJob, catalog_fingerprint, load_snapshot
+from movie.caching.page_cache import PageCache
+from movie.metrics.registry import Metrics
+from movie.metrics.store import MemoryMetricsStore, MultiprocessMetricsStore
+from movie.profiling.request_profiler import RequestProfiler
+from movie.profiling.sampling_profiler import SamplingProfiler
 
 
 def page_not_found(e):
     return render_template('404.html'), 404
 
 
+def _dispose_before_fork(engine: Engine) -> None:
+    """
+    Closes the engine's pooled connections before the process forks, e.g. into gunicorn workers when the app is
+    preloaded, so that each process opens its own rather than sharing the parent's sockets. Closing them in the child
+    instead would also end them for the parent.
+    """
+    engine_ref = weakref.ref(engine)
+
+    def dispose():
+        engine = engine_ref()
+        if engine is not None:
+            engine.dispose()
+
+    os.register_at_fork(before=dispose)
+
+
+def _set_catalog_version(app: Flask, data_path: str) -> None:
+    """
+    Identifies the catalog the repository was populated from and the release serving it, so that clients can tell
+    whether the pages they've kept are still current.
+    """
+    data_stat = os.stat(data_path)
+    app.config['CATALOG_VERSION'] = f"{app.config['PAGE_CACHE_VERSION']}:{data_stat.st_size}:{data_stat.st_mtime_ns}"
+    app.config['CATALOG_MODIFIED'] = datetime.utcfromtimestamp(int(data_stat.st_mtime))
+
+
 def create_app(test_config=None):
     """ Construct the core application. """
 
@@ -40,15 +81,47 @@ def create_app(test_config=None):
         data_path = app.config['TEST_DATA_PATH']
 
     # Setup our repository
+    query_tracker = None
+    operation_log = None
     repo: Union[memory_repository.MemoryRepository, database_repository.SqlAlchemyRepository, None] = None
     repository = app.config['REPOSITORY']
 
     max_num_lines = app.config['MAX_LINES_TO_LOAD']
 
     if repository == 'memory':
-        # Create the MemoryRepository implementation for a memory-based repository.
-        repo = memory_repository.MemoryRepository()
-        populate(repo, data_path, 123, simulate_activity=is_dev, max_num_lines=max_num_lines)
+        snapshot_path = app.config['SNAPSHOT_PATH']
+        snapshot = None
+
+        if snapshot_path:
+            fingerprint = catalog_fingerprint(data_path, 123, is_dev, max_num_lines)
+            snapshot = load_snapshot(snapshot_path, fingerprint)
+
+        if snapshot is not None:
+            repo = snapshot.repo
+        else:
+            # Create the MemoryRepository implementation for a memory-based repository.
+            repo = memory_repository.MemoryRepository()
+            populate(repo, data_path, 123, simulate_activity=is_dev, max_num_lines=max_num_lines)
+
+        # Changes made since the last snapshot are kept in the log, which is also how they're shared with other
+        # processes, e.g. gunicorn workers
+        operation_log_path = app.config['OPERATION_LOG_PATH'] or (snapshot_path and f'{snapshot_path}.journal')
+
+        if operation_log_path:
+            # Reloads of the catalog in the log are only applied if they're of a different file to this one
+            repo.catalog_source = read_catalog_source(data_path, max_num_lines)
+            operation_log = OperationLog(operation_log_path)
+            operation_log.attach(repo, snapshot.log_positions if snapshot else ())
+
+        if snapshot_path:
+            snapshots = SnapshotJob(repo, operation_log, snapshot_path, fingerprint,
+                                    app.config['SNAPSHOT_INTERVAL_SECONDS'])
+
+            if snapshot is None:
+                snapshots.save(force=True)
+
+            snapshots.start()
+            app.config['SNAPSHOTS'] = snapshots
 
     elif repository == 'database':
         # Configure database.
@@ -63,13 +136,18 @@ def create_app(test_config=None):
 
         is_testing_or_init = app.config['TESTING'] is True or len(database_engine.table_names()) == 0
 
+        # Conditionally create database tables, including any added since an existing database was created.
+        metadata.create_all(database_engine)
+
         if is_testing_or_init:
             # For testing, or first-time use of the web application, reinitialise the database.
             clear_mappers()
-            metadata.create_all(database_engine)  # Conditionally create database tables.
             for table in reversed(metadata.sorted_tables):  # Remove any data from the tables.
                 database_engine.execute(table.delete())
 
+        # Count and time the statements each request runs, and log slow ones
+        query_tracker = QueryTracker(database_engine, app.config['SLOW_QUERY_SECONDS'], app.config['QUERY_SAMPLE_RATE'])
+
         # Generate mappings that map domain model classes to the database tables.
         map_model_to_tables()
 
@@ -79,17 +157,47 @@ def create_app(test_config=None):
         # Create the SQLAlchemy DatabaseRepository instance for an sqlite3-based repository.
         repo = database_repository.SqlAlchemyRepository(session_factory)
 
+        # Databases created before similar movies and review summaries were kept have movies and reviews but neither
+        repo.backfill_similar_movies()
+        repo.backfill_review_summaries()
+
         if is_testing_or_init:
             print("-----------------------------------------------------------")
             print("------------------ REPOPULATING DATABASE ------------------")
             print("-----------------------------------------------------------")
 
             populate(repo, data_path, 123, simulate_activity=is_dev, max_num_lines=max_num_lines)
+        elif app.config['IMPORT_CATALOG_ON_START']:
+            import_catalog(repo, data_path, max_num_lines)
+
+        _dispose_before_fork(database_engine)
     else:
         raise ValueError(f"Invalid repository '{repository}', should be 'memory' or 'database'")
 
     app.config['REPOSITORY'] = repo
 
+    _set_catalog_version(app, data_path)
+
+    # Requests and repository calls are measured and reported at /metrics
+    metrics_directory = app.config['METRICS_DIRECTORY']
+    metrics = Metrics(MultiprocessMetricsStore(metrics_directory) if metrics_directory else MemoryMetricsStore())
+    metrics.instrument_repository(repo)
+    app.config['METRICS'] = metrics
+
+    # Recommendations are precomputed for every user, either once now or periodically on a background thread
+    recommendations = RecommendationJob(repo, app.config['RECOMMENDATIONS_REFRESH_SECONDS'])
+
+    if app.config['RECOMMENDATIONS_REFRESH_SECONDS']:
+        recommendations.start()
+    else:
+        recommendations.refresh()
+
+    app.config['RECOMMENDATIONS'] = recommendations
+
+    # Pages of search results and reviews after the first are served from the results the first page was taken from
+    app.config['RESULT_VERSIONS'] = ResultVersions(app.config['RESULT_VERSION_MAX_AGE_SECONDS'],
+                                                   app.config['RESULT_VERSION_MAX_IDS'])
+
     # Build the application - these steps require an application context.
     with app.app_context():
         # Register blueprints.
@@ -111,9 +219,15 @@ def create_app(test_config=None):
         from .user import user
         app.register_blueprint(user.user_blueprint)
 
+        from .actors import actors
+        app.register_blueprint(actors.actors_blueprint)
+
         from .utilities import utilities
         app.register_blueprint(utilities.utilities_blueprint)
 
+        from .metrics import metrics
+        app.register_blueprint(metrics.metrics_blueprint)
+
         app.register_error_handler(404, page_not_found)
 
         if isinstance(repo, database_repository.SqlAlchemyRepository):
@@ -128,5 +242,63 @@ def create_app(test_config=None):
             def shutdown_session(exception=None):
                 repo.close_session()
 
+            query_tracker.init_app(app)
+
+        if operation_log is not None:
+            operation_log.init_app(app)
+
+        if app.config['PAGE_CACHE_TIMEOUT']:
+            # Registered last so that its hooks run after the repository's session is reset, and so that the headers
+            # added by the others after each request aren't cached
+            page_cache = PageCache(cache, app.config['PAGE_CACHE_TIMEOUT'], app.config['PAGE_CACHE_VERSION'])
+            page_cache.watch_repository(repo)
+            page_cache.init_app(app)
+            app.config['PAGE_CACHE'] = page_cache
+
+    if repository == 'memory':
+        # The movies can be reloaded from a changed data file while the app is running, either when it's noticed in the
+        # background or by calling reload
+        catalog_reload = CatalogReloadJob(repo, data_path, app.config['CATALOG_RELOAD_SECONDS'], max_num_lines)
+
+        def catalog_replaced(changes: memory_repository.CatalogChanges,
+                             source: Optional[memory_repository.CatalogSource]) -> None:
+            # Called in every process, including those applying a reload made by another from the operation log
+            reloaded_path = source.data_path if source else data_path
+            _set_catalog_version(app, reloaded_path)
+            recommendations.refresh()
+
+            if 'PAGE_CACHE' in app.config:
+                app.config['PAGE_CACHE'].invalidate()
+
+            if 'SNAPSHOTS' in app.config:
+                app.config['SNAPSHOTS'].fingerprint = catalog_fingerprint(reloaded_path, 123, is_dev, max_num_lines)
+
+        repo.add_catalog_listener(catalog_replaced)
+
+        def catalog_reloaded(reloaded_path: str, changes: memory_repository.CatalogChanges) -> None:
+            if 'SNAPSHOTS' in app.config:
+                # Starting the app with the new file loads this snapshot, rather than one with the previous catalog.
+                # Only saved by the process that reloaded it, once the reload has been written to the operation log.
+                app.config['SNAPSHOTS'].save(force=True)
+
+        catalog_reload.add_listener(catalog_reloaded)
+
+        if app.config['CATALOG_RELOAD_SECONDS']:
+            catalog_reload.start()
+
+        app.config['CATALOG_RELOAD'] = catalog_reload
+
+    if app.config['PROFILING_ENABLED']:
+        # Only wrapped when enabled so that requests don't pay anything for profiling otherwise
+        app.wsgi_app = RequestProfiler(app.wsgi_app, app.config['PROFILING_TOKEN'], app.config['PROFILES_DIRECTORY'],
+                                       app.config['PROFILING_TOP_N'])
+
+    if app.config['SAMPLING_PROFILER_ENABLED']:
+        sampling_profiler = SamplingProfiler(app.config['PROFILES_DIRECTORY'],
+                                             app.config['SAMPLING_PROFILER_INTERVAL_SECONDS'],
+                                             app.config['SAMPLING_PROFILER_FLUSH_SECONDS'])
+        sampling_profiler.start()
+        app.config['SAMPLING_PROFILER'] = sampling_profiler
+
     cache.init_app(app)
     return app
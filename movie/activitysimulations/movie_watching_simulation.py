@@ -1,7 +1,13 @@
-from datetime import datetime
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import chain
 from random import randint, sample, choice, random, seed
-from typing import Optional
+from time import time
+from typing import Optional, List, Iterator, NamedTuple, Tuple
 
+import numpy as np
 from random_words.random_words import RandomWords
 from werkzeug.security import generate_password_hash
 
@@ -17,14 +23,153 @@ def _rand_string(min_length: int = 8, max_length: int = 32, spaces: bool = False
     return (' ' if spaces else '').join(choice(words) for _ in range(randint(min_length, max_length)))
 
 
+class SimulationBatch(NamedTuple):
+    """
+    Users and reviews simulated by MovieWatchingSimulation.simulate_batches, as arrays rather than domain objects.
+
+    Each user added movie_indices[movie_offsets[i]:movie_offsets[i + 1]] to their watchlist in that order, then
+    watched the first num_watched[i] of those movies and reviewed the first num_reviewed[i]. Reviews are ordered by
+    user, i.e. review j was written by review_users[j] about review_movie_indices[j]. Movie indices refer to the
+    simulation's list of movies and timestamps are seconds since the epoch in UTC.
+    """
+    first_user: int
+    usernames: List[str]
+    passwords: List[str]
+    movie_offsets: np.ndarray
+    movie_indices: np.ndarray
+    num_watched: np.ndarray
+    num_reviewed: np.ndarray
+    review_users: np.ndarray
+    review_movie_indices: np.ndarray
+    review_texts: List[str]
+    ratings: np.ndarray
+    timestamps: np.ndarray
+
+    @property
+    def number_of_users(self) -> int:
+        return len(self.usernames)
+
+    @property
+    def number_of_reviews(self) -> int:
+        return len(self.review_texts)
+
+
+def _random_strings(rng: np.random.Generator,
+                    words: np.ndarray,
+                    count: int,
+                    min_length: int,
+                    max_length: int,
+                    separator: str = '') -> List[str]:
+    """ Vectorised equivalent of calling _rand_string count times. """
+    lengths = rng.integers(min_length, max_length + 1, count)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+    picked = words[rng.integers(0, len(words), offsets[-1])].tolist()
+    return [separator.join(picked[offsets[i]:offsets[i + 1]]) for i in range(count)]
+
+
+def _sample_distinct(rng: np.random.Generator, counts: np.ndarray, population: int) -> np.ndarray:
+    """
+    Picks counts[i] distinct values from range(population) for each i, in a random order. Returns the picked values
+    ordered by i.
+    """
+    owners = []
+    values = []
+
+    # Users picking most of the population get a random permutation of it, computed a block of users at a time
+    dense = np.flatnonzero(counts * 4 >= population)
+    block_size = max(1, (1 << 22) // max(1, population))
+
+    for start in range(0, len(dense), block_size):
+        block = dense[start:start + block_size]
+        permutations = np.argsort(rng.random((len(block), population)), axis=1)
+        keep = np.arange(population) < counts[block, None]
+        owners.append(np.repeat(block, counts[block]))
+        values.append(permutations[keep])
+
+    # Everyone else draws with replacement, discarding duplicates and redrawing until they have enough
+    sparse = np.flatnonzero(counts * 4 < population)
+    picked = np.empty(0, dtype=np.int64)
+    missing = counts[sparse]
+
+    while missing.any():
+        draws = np.repeat(np.arange(len(sparse)), missing) * population + rng.integers(0, population, missing.sum())
+        picked = np.unique(np.concatenate([picked, draws]))
+        missing = counts[sparse] - np.bincount(picked // population, minlength=len(sparse))
+
+    # np.unique sorts what was picked, so shuffle it again
+    order = np.lexsort((rng.random(len(picked)), picked // population))
+    owners.append(sparse[picked[order] // population])
+    values.append(picked[order] % population)
+
+    owners = np.concatenate(owners)
+    return np.concatenate(values)[np.argsort(owners, kind='stable')]
+
+
+def _simulate_shard(release_timestamps: np.ndarray,
+                    words: np.ndarray,
+                    entropy: int,
+                    shard: int,
+                    first_user: int,
+                    num_users: int,
+                    min_num_movies: int,
+                    max_num_movies: int,
+                    now: float) -> SimulationBatch:
+    """ Simulates a batch of users. The result only depends on the arguments, not on which process runs it. """
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(shard,)))
+
+    # Usernames are numbered so that they're unique across batches
+    usernames = [f'{name}{first_user + i}' for i, name in enumerate(_random_strings(rng, words, num_users, 1, 4))]
+    passwords = [generate_password_hash(password, method='plain')
+                 for password in _random_strings(rng, words, num_users, 1, 1)]
+
+    num_movies = rng.integers(min_num_movies, max_num_movies + 1, num_users)
+    movie_offsets = np.concatenate([[0], np.cumsum(num_movies)])
+    movie_indices = _sample_distinct(rng, num_movies, len(release_timestamps))
+
+    num_watched = rng.integers(0, num_movies + 1)
+    num_reviewed = rng.integers(0, num_watched + 1)
+
+    # Each user reviews the first num_reviewed movies they added
+    review_users = np.repeat(np.arange(num_users), num_reviewed)
+    review_positions = np.arange(len(review_users)) - np.repeat(np.cumsum(num_reviewed) - num_reviewed, num_reviewed)
+    review_movie_indices = movie_indices[movie_offsets[review_users] + review_positions]
+
+    review_texts = _random_strings(rng, words, len(review_users), 8, 32, ' ')
+    ratings = rng.integers(1, 11, len(review_users))
+
+    # Reviews are written at some point after the movie's release
+    released = release_timestamps[review_movie_indices]
+    timestamps = now - rng.random(len(review_users)) * (now - released)
+
+    return SimulationBatch(first_user, usernames, passwords, movie_offsets, movie_indices, num_watched, num_reviewed,
+                           review_users, review_movie_indices, review_texts, ratings, timestamps)
+
+
+# Set in each worker process so that they're only sent to it once
+_worker_release_timestamps: Optional[np.ndarray] = None
+_worker_words: Optional[np.ndarray] = None
+
+
+def _init_worker(release_timestamps: np.ndarray, words: np.ndarray) -> None:
+    global _worker_release_timestamps, _worker_words
+    _worker_release_timestamps = release_timestamps
+    _worker_words = words
+
+
+def _simulate_shard_in_worker(args: Tuple) -> SimulationBatch:
+    return _simulate_shard(_worker_release_timestamps, _worker_words, *args)
+
+
 class MovieWatchingSimulation(AbstractMovingWatchingSimulation):
     _DEFAULT_USER_COUNT = 10
     _DEFAULT_MIN_MOVIES_PER_USER = 0
     _DEFAULT_MAX_MOVIES_PER_USER = None
+    _DEFAULT_BATCH_SIZE = 10000
 
     def __init__(self, movies, seed_: Optional[int] = None):
         super().__init__(movies)
         seed(seed_)
+        self._seed = seed_
 
     @staticmethod
     def _validate_params(num_users: int, min_num_movies: int, max_num_movies: int):
@@ -101,3 +246,107 @@ class MovieWatchingSimulation(AbstractMovingWatchingSimulation):
             users.append(user)
 
         return self.State(users, reviews)
+
+    def simulate_batches(self,
+                         num_users: int = _DEFAULT_USER_COUNT,
+                         min_num_movies: int = _DEFAULT_MIN_MOVIES_PER_USER,
+                         max_num_movies: int = _DEFAULT_MAX_MOVIES_PER_USER,
+                         batch_size: int = _DEFAULT_BATCH_SIZE,
+                         processes: Optional[int] = None) -> Iterator[SimulationBatch]:
+        """
+        Simulates the same behaviour as simulate, but with NumPy rather than a user at a time, so that it can generate
+        millions of users and reviews.
+
+        Users are split into batches of batch_size users which are simulated across a pool of processes and yielded in
+        order, with only a few batches queued up at once so memory use doesn't grow with the number of users. Use
+        to_state to turn a batch into Users and Reviews. Each batch has its own seed derived from the seed this
+        simulation was created with, so the output is the same regardless of the number of processes or the order
+        batches finish in. If processes is 1 batches are simulated in this process, and if it's None one process is
+        used per CPU.
+        """
+        self._validate_params(num_users, min_num_movies, max_num_movies)
+
+        if not isinstance(batch_size, int):
+            raise TypeError(f"'batch_size' must be of type 'int' but was '{type(batch_size).__name__}'")
+
+        if batch_size <= 0:
+            raise ValueError("'batch_size' must be greater than zero")
+
+        if processes is not None and not isinstance(processes, int):
+            raise TypeError(f"'processes' must be of type 'int' but was '{type(processes).__name__}'")
+
+        if processes is not None and processes <= 0:
+            raise ValueError("'processes' must be greater than zero")
+
+        num_movies = len(self._movies)
+        upper_bound = min(max_num_movies or num_movies, num_movies)
+        now = time()
+
+        entropy = self._seed if self._seed is not None else np.random.SeedSequence().entropy
+        shards = [(entropy, shard, first_user, min(batch_size, num_users - first_user), min_num_movies, upper_bound,
+                   now) for shard, first_user in enumerate(range(0, num_users, batch_size))]
+
+        return self._simulate_shards(shards, processes or os.cpu_count() or 1)
+
+    def _simulate_shards(self, shards: List[Tuple], processes: int) -> Iterator[SimulationBatch]:
+        release_timestamps = np.array([datetime(movie.release_date, 1, 1, tzinfo=timezone.utc).timestamp()
+                                       for movie in self._movies])
+        words = np.array(sorted(chain.from_iterable(_rw.nouns.values())), dtype=object)
+
+        if processes == 1:
+            for args in shards:
+                yield _simulate_shard(release_timestamps, words, *args)
+            return
+
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(release_timestamps, words)) as pool:
+            # Limit the number of batches that are queued up so memory use doesn't depend on the number of users
+            pending = deque()
+
+            try:
+                for args in shards:
+                    pending.append(pool.submit(_simulate_shard_in_worker, args))
+
+                    if len(pending) >= 2 * processes:
+                        yield pending.popleft().result()
+
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def to_state(self, batch: SimulationBatch) -> 'State':
+        """ Creates the Users and Reviews described by the given batch. """
+        users = []
+        reviews = []
+
+        movie_offsets = batch.movie_offsets.tolist()
+        movies = [self._movies[idx] for idx in batch.movie_indices.tolist()]
+        num_watched = batch.num_watched.tolist()
+        num_reviewed = batch.num_reviewed.tolist()
+        ratings = batch.ratings.tolist()
+
+        # Converting every timestamp at once is much faster than one at a time with datetime.utcfromtimestamp
+        timestamps = (batch.timestamps * 1e6).astype(np.int64).astype('datetime64[us]').astype(object).tolist()
+
+        review = 0
+
+        for i in range(batch.number_of_users):
+            user = User(batch.usernames[i], batch.passwords[i])
+            user_movies = movies[movie_offsets[i]:movie_offsets[i + 1]]
+
+            for movie in user_movies:
+                user.add_to_watchlist(movie)
+
+            for movie in user_movies[:num_watched[i]]:
+                user.watch_movie(movie)
+
+            for movie in user_movies[:num_reviewed[i]]:
+                review_ = Review(movie, batch.review_texts[review], ratings[review], timestamps[review], user)
+                user.add_review(review_)
+                reviews.append(review_)
+                review += 1
+
+            users.append(user)
+
+        return self.State(users, reviews)
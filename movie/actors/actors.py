@@ -0,0 +1,36 @@
+from flask import Blueprint, render_template, request, current_app
+
+from .services import get_actor_path, create_actor_path_form
+
+actors_blueprint = Blueprint(
+    'actors_bp', __name__)
+
+UNKNOWN_ACTOR_MESSAGE = 'Unrecognized actor - please check and try again.'
+NO_PATH_MESSAGE = 'These actors are not connected by any movies.'
+
+
+@actors_blueprint.route('/actors/path', methods=['GET'])
+def path():
+    repo = current_app.config['REPOSITORY']
+    form = create_actor_path_form(repo, request.args)
+    actor_path = None
+    error_message = None
+
+    actor_name = request.args.get('from', '')
+    other_name = request.args.get('to', '')
+
+    if actor_name and other_name:
+        try:
+            actor_path = get_actor_path(repo, actor_name, other_name)
+        except ValueError:
+            error_message = UNKNOWN_ACTOR_MESSAGE
+        else:
+            if actor_path is None:
+                error_message = NO_PATH_MESSAGE
+
+    return render_template(
+        'actors/path.html',
+        form=form,
+        actor_path=actor_path,
+        error_message=error_message
+    )
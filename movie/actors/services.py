@@ -0,0 +1,42 @@
+from typing import Optional
+
+from flask_wtf import FlaskForm
+from wtforms import SelectField, SubmitField
+
+from movie.adapters.repository import AbstractRepository
+from movie.domain.actor_graph import ActorPath
+from movie.utilities.services import get_actors
+
+
+def get_actor_path(repo: AbstractRepository, actor_name: str, other_name: str) -> Optional[ActorPath]:
+    """
+    Returns the shortest chain of movies linking the actors with the given names in the given repository, or None if
+    they aren't connected.
+
+    Raises:
+        ValueError: if there is no actor with one of the given names
+    """
+    actor = repo.get_actor(actor_name)
+    other = repo.get_actor(other_name)
+    return repo.get_actor_path(actor, other)
+
+
+def create_actor_path_form(repo: AbstractRepository, request_args):
+    """ Returns an ActorPathForm populated with options from the given repository. """
+
+    actors = [(actor.actor_full_name, actor.actor_full_name) for actor in get_actors(repo)]
+
+    form = ActorPathForm(request_args, meta={'csrf': False})
+    form['from'].choices = actors + [('', 'Actor')]
+    form.to.choices = actors + [('', 'Actor')]
+
+    return form
+
+
+class ActorPathForm(FlaskForm):
+    to = SelectField('To')
+    submit = SubmitField('Connect')
+
+
+# 'from' is a keyword so this field can't be declared in the class body
+setattr(ActorPathForm, 'from', SelectField('From'))
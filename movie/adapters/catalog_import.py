@@ -0,0 +1,65 @@
+"""
+Imports a movie data file into an existing database without clearing it, adding new movies and updating changed ones
+while keeping users, their lists and reviews.
+
+Usage:
+    python -m movie.adapters.catalog_import movies.csv --database-uri sqlite:///movies.db
+"""
+
+import argparse
+import logging
+import os
+from typing import Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from movie.adapters.database_repository import CatalogImport, SqlAlchemyRepository
+from movie.adapters.orm import metadata, map_model_to_tables
+from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+logger = logging.getLogger(__name__)
+
+
+def import_catalog(repo: SqlAlchemyRepository,
+                   data_path: str,
+                   max_num_lines: Optional[int] = None,
+                   batch_size: int = SqlAlchemyRepository.IMPORT_BATCH_SIZE) -> CatalogImport:
+    """
+    Adds the movies in the data file at the given path to the database, or updates the movies with the same title and
+    release date, and returns how many were inserted, updated and unchanged.
+    """
+    reader = MovieFileCSVReader(data_path)
+    result = repo.import_movies(reader.iter_movies(max_num_lines), batch_size)
+
+    logger.info(f'Imported {data_path}: {result.inserted} new, {result.updated} updated and {result.unchanged} '
+                f'unchanged movies in {result.seconds:.2f}s ({result.movies_per_second:,.0f} movies/s)')
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_path')
+    parser.add_argument('--database-uri', default=os.environ.get('SQLALCHEMY_DATABASE_URI'))
+    parser.add_argument('--batch-size', type=int, default=SqlAlchemyRepository.IMPORT_BATCH_SIZE)
+    parser.add_argument('--max-lines', type=int, default=None)
+    args = parser.parse_args()
+
+    if not args.database_uri:
+        parser.error('--database-uri is required if SQLALCHEMY_DATABASE_URI isn\'t set')
+
+    engine = create_engine(args.database_uri)
+    metadata.create_all(engine)
+    map_model_to_tables()
+
+    repo = SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+    result = import_catalog(repo, args.data_path, args.max_lines, args.batch_size)
+
+    print(f'Inserted {result.inserted}, updated {result.updated} and left {result.unchanged} movies unchanged, '
+          f'adding {result.names_inserted} genres and people, in {result.seconds:.2f}s '
+          f'({result.movies_per_second:,.0f} movies/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import logging
+import os
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Callable, List, Optional
+
+from movie.adapters.memory_repository import CatalogChanges, CatalogSource, MemoryRepository
+from movie.adapters.repository import populate_catalog
+
+logger = logging.getLogger(__name__)
+
+ReloadListener = Callable[[str, CatalogChanges], None]
+
+
+def read_catalog_source(data_path: str, max_num_lines: Optional[int] = None) -> CatalogSource:
+    """ Returns the data file at the given path as it is now, for the given number of lines of it to be read. """
+    stat = os.stat(data_path)
+    return CatalogSource(data_path, max_num_lines, stat.st_size, stat.st_mtime_ns)
+
+
+def build_catalog(source: CatalogSource) -> MemoryRepository:
+    """
+    Returns a new repository holding only the movies in the given data file, ready to replace another's catalog.
+
+    Raises:
+        ValueError: the file isn't a valid data file or has no movies in it
+    """
+    catalog = MemoryRepository()
+    populate_catalog(catalog, source.data_path, source.max_num_lines)
+
+    # Users' lists would all be emptied, e.g. if the file was replaced by an empty one
+    if catalog.get_number_of_movies() == 0:
+        raise ValueError(f"'{source.data_path}' has no movies in it")
+
+    return catalog
+
+
+class CatalogReloadJob:
+    """
+    Reloads the movies in a MemoryRepository from its data file when the file changes, without restarting the app.
+
+    The new catalog and its indexes are built on a background thread while requests carry on using the current one,
+    and are then swapped in with replace_catalog in a single step, which moves users' watched movies, watchlists and
+    reviews over to the new movies. The file is checked every interval_seconds and only reloaded once it's been left
+    unchanged for a whole interval, so that a file that's still being written isn't loaded.
+
+    If the repository has an operation log the reload is written to it like any other change, so every process sharing
+    the log swaps in the new catalog at the same point between the same changes, and numbers the new movies alike.
+    Only the first process to notice a change reloads it, and only its listeners are told, once the reload has been
+    logged. Anything every process has to update, e.g. its caches, should listen to the repository instead.
+    """
+
+    def __init__(self,
+                 repo: MemoryRepository,
+                 data_path: str,
+                 interval_seconds: float,
+                 max_num_lines: Optional[int] = None) -> None:
+        self._repo = repo
+        self._interval_seconds = interval_seconds
+        self._max_num_lines = max_num_lines
+        self._pending_source: Optional[CatalogSource] = None
+        self._listeners: List[ReloadListener] = []
+        self._reload_lock = Lock()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        self._registered_fork_handler = False
+
+        if repo.catalog_source is None:
+            repo.catalog_source = read_catalog_source(data_path, max_num_lines)
+
+        repo.add_catalog_listener(self._replaced)
+
+    @property
+    def data_path(self) -> str:
+        return self._repo.catalog_source.data_path
+
+    def add_listener(self, listener: ReloadListener) -> None:
+        """ Calls the given function with the data file's path and what changed after each reload made by this job. """
+        self._listeners.append(listener)
+
+    @staticmethod
+    def _replaced(changes: CatalogChanges, source: Optional[CatalogSource]) -> None:
+        # Logged by every process, whichever of them reloaded the catalog
+        data_path = source.data_path if source else 'a new catalog'
+        logger.info(f'Reloaded {data_path} with {changes.added} new, {changes.removed} removed and {changes.kept} kept '
+                    f'movies')
+
+        if changes.dropped_reviews:
+            logger.warning(f'Dropped {changes.dropped_reviews} reviews of movies that are no longer in {data_path}')
+
+    def reload(self, data_path: Optional[str] = None) -> Optional[CatalogChanges]:
+        """
+        Replaces the repository's catalog with the movies in the given data file, or the current one if not given,
+        and returns what changed, or None if another process sharing the repository's operation log already has.
+
+        Raises:
+            ValueError: the file isn't a valid data file or has no movies in it
+        """
+        with self._reload_lock:
+            source = read_catalog_source(data_path or self.data_path, self._max_num_lines)
+            start = perf_counter()
+            catalog = build_catalog(source)
+
+            built = perf_counter()
+            changes = self._repo.replace_catalog(catalog, source)
+            self._pending_source = None
+
+        # Nothing was changed if another process had already logged the same reload
+        if changes is None:
+            return None
+
+        logger.info(f'Built the catalog from {source.data_path} in {built - start:.3f}s, swapped in '
+                    f'{perf_counter() - built:.3f}s')
+
+        for listener in self._listeners:
+            try:
+                listener(source.data_path, changes)
+            except Exception:
+                logger.exception('Failed to notify a listener of a catalog reload')
+
+        return changes
+
+    def check(self) -> Optional[CatalogChanges]:
+        """
+        Reloads the catalog if the data file has changed and was already changed in the same way at the last check,
+        and returns what changed, otherwise returns None.
+        """
+        try:
+            source = read_catalog_source(self.data_path, self._max_num_lines)
+        except FileNotFoundError:
+            # e.g. in the middle of being replaced
+            return None
+
+        if source == self._repo.catalog_source:
+            self._pending_source = None
+            return None
+
+        if source != self._pending_source:
+            self._pending_source = source
+            return None
+
+        return self.reload()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._interval_seconds):
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Failed to reload the catalog')
+
+    def start(self) -> None:
+        """ Starts checking for changes to the data file in the background. Does nothing if already started. """
+        if self._thread is not None:
+            return
+
+        if not self._registered_fork_handler:
+            os.register_at_fork(after_in_child=self._restart_in_child)
+            self._registered_fork_handler = True
+
+        self._start_thread()
+
+    def _start_thread(self) -> None:
+        self._thread = Thread(target=self._run, name='catalog-reload', daemon=True)
+        self._thread.start()
+
+    def _restart_in_child(self) -> None:
+        # Threads don't survive a fork, e.g. into gunicorn workers when the app is preloaded, so each worker checks
+        # for changes, and the first to notice one reloads it for them all through the operation log
+        was_running = self._thread is not None and not self._stopped.is_set()
+        self._reload_lock = Lock()
+        self._thread = None
+
+        if was_running:
+            self._start_thread()
+
+    def stop(self) -> None:
+        """ Stops checking for changes to the data file. """
+        self._stopped.set()
@@ -1,22 +1,33 @@
+import threading
+from collections import Counter, defaultdict
+from itertools import groupby, islice
 from math import ceil
-from typing import List, Dict, Union, Optional
+from operator import itemgetter
+from time import perf_counter
+from typing import Iterable, Iterator, List, Dict, NamedTuple, Set, Tuple, Union, Optional
 
 from flask import _app_ctx_stack
-from sqlalchemy import func, or_, case
-from sqlalchemy.orm import scoped_session, Session, Query
+from sqlalchemy import Column, Table, bindparam, func, or_, case, event, select
+from sqlalchemy.orm import scoped_session, Session, Query, selectinload, joinedload
 from sqlalchemy.orm.exc import NoResultFound
 from werkzeug.security import generate_password_hash
 
 from cache import cache
 from movie.activitysimulations.movie_watching_simulation import MovieWatchingSimulation
-from movie.adapters.orm import movie_genres, movie_actors, user_watched_movies, user_watchlist_movies
+from movie.adapters import orm
+from movie.adapters.orm import movie_genres, movie_actors, user_watched_movies, user_watchlist_movies, \
+    movie_similarities, movie_review_summaries
+from movie.adapters.recommendations import Interaction
 from movie.adapters.repository import AbstractRepository
+from movie.adapters.similarity import MovieSimilarityIndex
 from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
 from movie.domain.actor import Actor
+from movie.domain.actor_graph import ActorGraph, ActorPath
 from movie.domain.director import Director
 from movie.domain.genre import Genre
 from movie.domain.movie import Movie
 from movie.domain.review import Review
+from movie.domain.review_summary import ReviewSummary
 from movie.domain.user import User
 
 
@@ -53,11 +64,57 @@ class SessionContextManager:
             self.__session.close()
 
 
+class CatalogImport(NamedTuple):
+    inserted: int
+    updated: int
+    unchanged: int
+    # Genres, directors and actors that weren't in the database yet
+    names_inserted: int
+    seconds: float
+
+    @property
+    def movies_per_second(self) -> float:
+        total = self.inserted + self.updated + self.unchanged
+        return total / self.seconds if self.seconds else 0.0
+
+
+# Columns of the movies table that an imported movie is compared on, besides its title, release date, genres and actors
+_IMPORTED_COLUMNS = ('description', 'director_id', 'runtime_minutes', 'rating', 'votes', 'revenue_millions', 'metascore')
+
+
 class SqlAlchemyRepository(AbstractRepository):
+    # Number of movies to update similar movies for per statement
+    _SIMILARITY_BATCH_SIZE = 500
+
+    # Ids looked up in a single statement, which SQLite limits the number of parameters of
+    _ID_BATCH_SIZE = 500
+
+    # Rows written per statement when importing a catalog
+    IMPORT_BATCH_SIZE = 500
+
+    # Number of rows, highest movie id and total of the actor ids in movie_actors when there aren't any rows
+    _EMPTY_ACTOR_GRAPH_VERSION = (0, -1, 0)
 
     def __init__(self, session_factory):
         self._session_cm = SessionContextManager(session_factory)
 
+        # Each thread has its own session, but the actor graph and similarity index are shared by every thread and are
+        # changed as they're used, so each is only used by one thread at a time
+        self._actor_graph_lock = threading.Lock()
+        self._similarity_lock = threading.RLock()
+
+        # Graph between actor and movie ids. This is loaded on first use and then only movies added since are loaded,
+        # unless casts have changed some other way, e.g. by another process importing a catalog.
+        self._actor_graph = ActorGraph()
+        self._actor_graph_version = self._EMPTY_ACTOR_GRAPH_VERSION
+
+        # Only needed when movies are added so this is loaded the first time that happens
+        self._similarity_index: Optional[MovieSimilarityIndex] = None
+
+        # Reviews can be added and deleted directly or through cascades from their user, so review summaries are
+        # updated from whatever reviews are about to be written each time a session is flushed
+        event.listen(session_factory, 'before_flush', self._update_review_summaries)
+
     def close_session(self):
         self._session_cm.close_current_session()
 
@@ -69,11 +126,72 @@ class SqlAlchemyRepository(AbstractRepository):
             scm.session.add(movie)
             scm.commit()
 
+        self._update_similar_movies([movie])
+
     def add_movies(self, movies: List[Movie]) -> None:
         with self._session_cm as scm:
             scm.session.add_all(movies)
             scm.commit()
 
+        self._update_similar_movies(movies)
+
+    @staticmethod
+    def _load_similarity_index(session: Session, restore_neighbours: bool = True) -> MovieSimilarityIndex:
+        """
+        Returns a MovieSimilarityIndex of every movie in the database and their stored neighbours. If the neighbours
+        aren't restored every movie is pending.
+        """
+        index = MovieSimilarityIndex()
+
+        movies = session.query(Movie). \
+            options(joinedload(Movie._director), selectinload(Movie._genres), selectinload(Movie._actors)). \
+            order_by(Movie._id). \
+            all()
+
+        for movie in movies:
+            index.add_movie(movie, key=movie.id)
+
+        if not restore_neighbours:
+            return index
+
+        rows = session.query(movie_similarities). \
+            order_by(movie_similarities.c.movie_id, movie_similarities.c.rank). \
+            all()
+
+        for movie_id, group in groupby(rows, key=lambda row: row.movie_id):
+            index.set_neighbours(movie_id, [(row.similar_movie_id, row.score) for row in group])
+
+        return index
+
+    def _update_similar_movies(self, movies: List[Movie]) -> None:
+        """ Computes similar movies for the given newly added movies and stores any that have changed. """
+        with self._similarity_lock, self._session_cm as scm:
+            if self._similarity_index is None:
+                # The given movies were committed already so they're loaded along with everything else
+                self._similarity_index = self._load_similarity_index(scm.session)
+            else:
+                for movie in movies:
+                    self._similarity_index.add_movie(movie, key=movie.id)
+
+            changed = list(self._similarity_index.update())
+
+            for i in range(0, len(changed), self._SIMILARITY_BATCH_SIZE):
+                batch = changed[i:i + self._SIMILARITY_BATCH_SIZE]
+
+                scm.session.execute(movie_similarities.delete().where(movie_similarities.c.movie_id.in_(batch)))
+
+                rows = [
+                    {'movie_id': movie_id, 'rank': rank, 'similar_movie_id': similar_movie_id, 'score': score}
+                    for movie_id in batch
+                    for rank, (similar_movie_id, score) in
+                    enumerate(self._similarity_index.get_neighbour_scores(movie_id))
+                ]
+
+                if rows:
+                    scm.session.execute(movie_similarities.insert(), rows)
+
+            scm.commit()
+
     def add_genre(self, genre: Genre) -> None:
         with self._session_cm as scm:
             scm.session.add(genre)
@@ -125,6 +243,66 @@ class SqlAlchemyRepository(AbstractRepository):
             except NoResultFound:
                 raise ValueError
 
+    @staticmethod
+    def _get_actor_graph_version(rows: List[Tuple[int, int]], version: Tuple[int, int, int]) -> Tuple[int, int, int]:
+        """ Returns what the given version of a graph becomes once the given (movie id, actor id) rows are added. """
+        number_of_rows, last_movie_id, actor_id_total = version
+
+        return (number_of_rows + len(rows), max([last_movie_id] + [row[0] for row in rows]),
+                actor_id_total + sum(row[1] for row in rows))
+
+    def _refresh_actor_graph(self, session: Session) -> None:
+        """
+        Adds the casts of movies added since the actor graph was last refreshed, or loads the graph again if casts have
+        changed in any other way.
+        """
+        columns = movie_actors.c
+        version = tuple(session.query(func.count(), func.coalesce(func.max(columns.movie_id), -1),
+                                      func.coalesce(func.sum(columns.actor_id), 0)).one())
+
+        if version == self._actor_graph_version:
+            return
+
+        query = session.query(columns.movie_id, columns.actor_id).order_by(columns.movie_id)
+        rows = query.filter(columns.movie_id > self._actor_graph_version[1]).all()
+        graph, graph_version = self._actor_graph, self._get_actor_graph_version(rows, self._actor_graph_version)
+
+        # Rows were changed or removed rather than only added for new movies
+        if graph_version != version:
+            rows = query.all()
+            graph, graph_version = ActorGraph(), self._get_actor_graph_version(rows, self._EMPTY_ACTOR_GRAPH_VERSION)
+
+        for movie_id, group in groupby(rows, key=itemgetter(0)):
+            graph.add_cast(movie_id, [row[1] for row in group])
+
+        self._actor_graph, self._actor_graph_version = graph, graph_version
+
+    def get_actor_path(self, actor: Actor, other: Actor) -> Optional[ActorPath]:
+        with self._session_cm as scm:
+            names = [actor.actor_full_name, other.actor_full_name]
+            ids = dict(scm.session.query(Actor._person_full_name, Actor.id).
+                       filter(Actor._person_full_name.in_(names)).
+                       all())
+
+            # Searching the graph changes it too, as recent paths are cached
+            with self._actor_graph_lock:
+                self._refresh_actor_graph(scm.session)
+
+                try:
+                    path = self._actor_graph.get_path(ids[names[0]], ids[names[1]])
+                except KeyError:
+                    return None
+
+            if path is None:
+                return None
+
+            # Loaded in one query each and put back in the order of the path
+            actors = {actor.id: actor for actor in scm.session.query(Actor).filter(Actor.id.in_(path.actors))}
+            movies = {movie.id: movie for movie in scm.session.query(Movie).filter(Movie._id.in_(path.movies))}
+
+            return ActorPath([actors[actor_id] for actor_id in path.actors],
+                             [movies[movie_id] for movie_id in path.movies])
+
     def add_user(self, user: User) -> None:
         with self._session_cm as scm:
             scm.session.add(user)
@@ -191,6 +369,84 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_review_user(self, review: Review) -> Union[User, None]:
         return review.user
 
+    @staticmethod
+    def _update_review_summaries(session: Session, flush_context, instances) -> None:
+        """ Applies the reviews being inserted or deleted by the given session to movie_review_summaries. """
+        changes: Dict[int, Counter] = defaultdict(Counter)
+
+        # Reviews without a rating aren't counted, as in MemoryRepository
+        for review in session.new:
+            if isinstance(review, Review) and review.rating is not None:
+                changes[review.movie.id][review.rating] += 1
+
+        for review in session.deleted:
+            if isinstance(review, Review) and review.rating is not None:
+                changes[review.movie.id][review.rating] -= 1
+
+        columns = movie_review_summaries.c
+
+        for movie_id, counts in changes.items():
+            number_of_reviews = sum(counts.values())
+            rating_total = sum(rating * count for rating, count in counts.items())
+
+            # Increment the existing totals in a single statement so concurrent updates aren't lost
+            values = {
+                'number_of_reviews': columns.number_of_reviews + number_of_reviews,
+                'rating_total': columns.rating_total + rating_total
+            }
+            values.update({f'rating_{rating}': columns[f'rating_{rating}'] + count for rating, count in counts.items()})
+
+            result = session.execute(
+                movie_review_summaries.update().where(columns.movie_id == movie_id).values(values))
+
+            if result.rowcount == 0:
+                values = {
+                    'movie_id': movie_id,
+                    'number_of_reviews': number_of_reviews,
+                    'rating_total': rating_total
+                }
+                values.update({f'rating_{rating}': count for rating, count in counts.items()})
+                session.execute(movie_review_summaries.insert().values(values))
+
+    def backfill_review_summaries(self) -> int:
+        """
+        Summarises the reviews of every movie in a single statement if movie_review_summaries is empty, e.g. because
+        the database was created before review summaries were kept, and returns the number of movies summarised.
+        """
+        columns = orm.reviews.c
+
+        with self._session_cm as scm:
+            if scm.session.execute(select([func.count()]).select_from(movie_review_summaries)).scalar():
+                return 0
+
+            ratings = range(ReviewSummary.MIN_RATING, ReviewSummary.MAX_RATING + 1)
+            summaries = select([columns.movie_id, func.count(), func.sum(columns.rating)] +
+                               [func.sum(case([(columns.rating == rating, 1)], else_=0)) for rating in ratings]). \
+                where(columns.rating.isnot(None)). \
+                group_by(columns.movie_id)
+
+            result = scm.session.execute(movie_review_summaries.insert().from_select(
+                ['movie_id', 'number_of_reviews', 'rating_total'] + [f'rating_{rating}' for rating in ratings],
+                summaries))
+            scm.commit()
+
+        return result.rowcount
+
+    def get_review_summary(self, movie: Movie) -> ReviewSummary:
+        columns = movie_review_summaries.c
+        histogram_columns = [columns[f'rating_{rating}']
+                             for rating in range(ReviewSummary.MIN_RATING, ReviewSummary.MAX_RATING + 1)]
+
+        with self._session_cm as scm:
+            row = scm.session.execute(
+                movie_review_summaries.select().where(columns.movie_id == movie.id)).first()
+
+        if row is None:
+            return ReviewSummary()
+
+        return ReviewSummary(row[columns.number_of_reviews], row[columns.rating_total],
+                             [row[column] for column in histogram_columns])
+
     @staticmethod
     def _get_page(query: Query, page_number: int, page_size: int) -> List:
         offset = page_number * page_size
@@ -216,6 +472,24 @@ class SqlAlchemyRepository(AbstractRepository):
         with self._session_cm as scm:
             return self._get_page(self._get_reviews_for_movie_query(scm.session, movie), page_number, page_size)
 
+    def get_review_ids_for_movie(self, movie: Movie) -> List[int]:
+        with self._session_cm as scm:
+            query = self._get_reviews_for_movie_query(scm.session, movie).with_entities(Review._id)
+            return [review_id for review_id, in query]
+
+    def get_reviews_by_id(self, review_ids: List[int]) -> List[Review]:
+        with self._session_cm as scm:
+            return self._get_by_id(scm.session, Review, review_ids)
+
+    def _get_by_id(self, session: Session, cls, ids: List[int]) -> List:
+        """ Returns the instances of cls with the given ids in the given order, leaving out any that don't exist. """
+        found = {}
+        for i in range(0, len(ids), self._ID_BATCH_SIZE):
+            batch = ids[i:i + self._ID_BATCH_SIZE]
+            found.update((instance.id, instance) for instance in session.query(cls).filter(cls._id.in_(batch)))
+
+        return [found[id_] for id_ in ids if id_ in found]
+
     @staticmethod
     def _get_number_of_pages(number_of_elements: int, page_size: int) -> int:
         return ceil(number_of_elements / page_size)
@@ -248,8 +522,7 @@ class SqlAlchemyRepository(AbstractRepository):
             outerjoin(Genre). \
             outerjoin(movie_actors). \
             outerjoin(Actor). \
-            group_by(Movie._id). \
-            order_by(Movie._mapped_title, Movie._mapped_release_date)
+            group_by(Movie._id)
 
         _query = query.strip()
         if _query:
@@ -287,12 +560,48 @@ class SqlAlchemyRepository(AbstractRepository):
                    query: str = "",
                    genres: List[Genre] = [],
                    directors: List[Director] = [],
-                   actors: List[Actor] = []) -> List[Movie]:
-        self._check_get_movies_args(page_number, page_size, query, genres, directors, actors)
+                   actors: List[Actor] = [],
+                   sort_by: str = AbstractRepository.SORT_BY_TITLE) -> List[Movie]:
+        self._check_get_movies_args(page_number, page_size, query, genres, directors, actors, sort_by)
+
+        with self._session_cm as scm:
+            filtered = self._get_sorted_movies_query(scm.session, query, genres, directors, actors, sort_by)
+            return self._get_page(filtered, page_number, page_size)
+
+    def get_movie_ids(self,
+                      query: str = "",
+                      genres: List[Genre] = [],
+                      directors: List[Director] = [],
+                      actors: List[Actor] = [],
+                      sort_by: str = AbstractRepository.SORT_BY_TITLE) -> List[int]:
+        self._check_get_movies_args(0, AbstractRepository.DEFAULT_PAGE_SIZE, query, genres, directors, actors, sort_by)
 
         with self._session_cm as scm:
-            return self._get_page(self._get_filtered_movies_query(scm.session, query, genres, directors, actors),
-                                  page_number, page_size)
+            filtered = self._get_sorted_movies_query(scm.session, query, genres, directors, actors, sort_by)
+            return [movie_id for movie_id, in filtered.with_entities(Movie._id)]
+
+    def _get_sorted_movies_query(self,
+                                 session: Session,
+                                 query: str = "",
+                                 genres: List[Genre] = [],
+                                 directors: List[Director] = [],
+                                 actors: List[Actor] = [],
+                                 sort_by: str = AbstractRepository.SORT_BY_TITLE) -> Query:
+        filtered = self._get_filtered_movies_query(session, query, genres, directors, actors)
+
+        if sort_by == self.SORT_BY_COMMUNITY_RATING:
+            # Movies are grouped by id, and there's at most one summary per movie, so these aggregates just select
+            # each movie's summary. Unreviewed movies have no average and are sorted last.
+            columns = movie_review_summaries.c
+            average = func.max(columns.rating_total * 1.0 / func.nullif(columns.number_of_reviews, 0))
+
+            number_of_reviews = func.max(columns.number_of_reviews)
+
+            filtered = filtered. \
+                outerjoin(movie_review_summaries, columns.movie_id == Movie._id). \
+                order_by(func.coalesce(average, -1).desc(), func.coalesce(number_of_reviews, 0).desc())
+
+        return filtered.order_by(Movie._mapped_title, Movie._mapped_release_date)
 
     def _get_all_movies(self) -> List[Movie]:
         """ For testing and debugging. Returns all the movies in this repository. """
@@ -343,6 +652,42 @@ class SqlAlchemyRepository(AbstractRepository):
 
         return movie
 
+    def get_movies_by_id(self, movie_ids: List[int]) -> List[Movie]:
+        with self._session_cm as scm:
+            return self._get_by_id(scm.session, Movie, movie_ids)
+
+    def get_similar_movies(self, movie: Movie) -> List[Movie]:
+        with self._session_cm as scm:
+            return scm.session.query(Movie). \
+                join(movie_similarities, movie_similarities.c.similar_movie_id == Movie._id). \
+                filter(movie_similarities.c.movie_id == movie.id). \
+                order_by(movie_similarities.c.rank). \
+                all()
+
+    def get_user_movie_interactions(self) -> List[Interaction]:
+        interactions: Dict[tuple, Interaction] = {}
+
+        with self._session_cm as scm:
+            session = scm.session
+
+            for user_id, movie_id in session.query(user_watchlist_movies):
+                interactions[user_id, movie_id] = Interaction(user_id, movie_id, watchlisted=True)
+
+            for user_id, movie_id in session.query(user_watched_movies):
+                interaction = interactions.get((user_id, movie_id)) or Interaction(user_id, movie_id)
+                interactions[user_id, movie_id] = interaction._replace(watched=True)
+
+            # Ordered so that each user's most recent rating of a movie is the one that's kept
+            reviews = session.query(Review.user_id, Review.movie_id, Review._mapped_rating). \
+                filter(Review.user_id.isnot(None)). \
+                order_by(Review._mapped_timestamp, Review._id)
+
+            for user_id, movie_id, rating in reviews:
+                interaction = interactions.get((user_id, movie_id)) or Interaction(user_id, movie_id)
+                interactions[user_id, movie_id] = interaction._replace(rating=rating)
+
+        return list(interactions.values())
+
     # These methods are cached as otherwise things can get quite slow as they're called to populate the search form
 
     @cache.memoize(timeout=30)
@@ -381,3 +726,192 @@ class SqlAlchemyRepository(AbstractRepository):
                 all()
 
         return {row[0]: row[1] for row in rows}
+
+    def import_movies(self, movies: Iterable[Movie], batch_size: int = IMPORT_BATCH_SIZE) -> CatalogImport:
+        """
+        Adds the given movies to the database, or updates the movie with the same title and release date if it's
+        changed, along with any genres, directors and actors that aren't in the database yet. Nothing is deleted, and
+        users, their lists and reviews are left as they are, so a new version of the data file can be loaded without
+        repopulating the database.
+
+        Movies are taken from the given iterable and compared with the database batch_size at a time, so only a batch
+        of them needs to be in memory at once. Everything is written in a single transaction. If the same title and
+        release date is given more than once, the last one given is what ends up in the database.
+        """
+        if batch_size < 1:
+            raise ValueError(f"'batch_size' must be at least 1 but was {batch_size}")
+
+        start = perf_counter()
+        inserted = updated = unchanged = names_inserted = 0
+
+        with self._session_cm as scm:
+            session = scm.session
+            next_id = (session.execute(select([func.max(orm.movies.c.id)])).scalar() or 0) + 1
+
+            for batch in self._batches(movies, batch_size):
+                # Existing movies are looked up for the whole batch at once, so a movie repeated within it would
+                # otherwise be inserted twice. The last one is kept, as it would be if the repeat were in a later batch.
+                batch = list({(movie.title, movie.release_date): movie for movie in batch}.values())
+
+                genre_ids, genres_inserted = self._import_names(
+                    session, orm.genres, orm.genres.c.genre_name,
+                    {genre.genre_name for movie in batch for genre in movie.genres}, batch_size)
+                director_ids, directors_inserted = self._import_names(
+                    session, orm.directors, orm.directors.c.director_full_name,
+                    {movie.director.director_full_name for movie in batch if movie.director}, batch_size)
+                actor_ids, actors_inserted = self._import_names(
+                    session, orm.actors, orm.actors.c.actor_full_name,
+                    {actor.actor_full_name for movie in batch for actor in movie.actors}, batch_size)
+                names_inserted += genres_inserted + directors_inserted + actors_inserted
+
+                existing = {(row.title, row.release_date): row for row in session.execute(
+                    select([orm.movies.c.id, orm.movies.c.title, orm.movies.c.release_date] +
+                           [orm.movies.c[name] for name in _IMPORTED_COLUMNS]).
+                    where(orm.movies.c.title.in_({movie.title for movie in batch})))}
+                existing_ids = [row.id for row in existing.values()]
+                existing_genres = self._group_pairs(session, movie_genres.c.movie_id, movie_genres.c.genre_id,
+                                                    existing_ids)
+                existing_actors = self._group_pairs(session, movie_actors.c.movie_id, movie_actors.c.actor_id,
+                                                    existing_ids)
+
+                inserts, updates, genre_rows, actor_rows, relinked_ids = [], [], [], [], []
+
+                for movie in batch:
+                    values = {
+                        'description': movie.description,
+                        'director_id': director_ids[movie.director.director_full_name] if movie.director else None,
+                        'runtime_minutes': movie.runtime_minutes,
+                        'rating': movie.rating,
+                        'votes': movie.votes,
+                        'revenue_millions': movie.revenue_millions,
+                        'metascore': movie.metascore
+                    }
+                    movie_genre_ids = {genre_ids[genre.genre_name] for genre in movie.genres}
+                    movie_actor_ids = {actor_ids[actor.actor_full_name] for actor in movie.actors}
+                    row = existing.get((movie.title, movie.release_date))
+
+                    if row is None:
+                        # Ids are given explicitly, as the database populated the existing ones with ids from the
+                        # file without advancing any sequence it has
+                        movie_id = next_id
+                        next_id += 1
+                        inserts.append({'id': movie_id, 'title': movie.title, 'release_date': movie.release_date,
+                                        **values})
+                    else:
+                        movie_id = row.id
+                        cast_changed = movie_genre_ids != existing_genres.get(movie_id, set()) or \
+                            movie_actor_ids != existing_actors.get(movie_id, set())
+
+                        if all(row[name] == value for name, value in values.items()) and not cast_changed:
+                            unchanged += 1
+                            continue
+
+                        updates.append({'movie_id': movie_id,
+                                        **{f'new_{name}': value for name, value in values.items()}})
+
+                        if not cast_changed:
+                            continue
+
+                        relinked_ids.append(movie_id)
+
+                    genre_rows += [{'movie_id': movie_id, 'genre_id': genre_id} for genre_id in sorted(movie_genre_ids)]
+                    actor_rows += [{'movie_id': movie_id, 'actor_id': actor_id} for actor_id in sorted(movie_actor_ids)]
+
+                if inserts:
+                    session.execute(orm.movies.insert(), inserts)
+
+                if updates:
+                    session.execute(orm.movies.update().
+                                    where(orm.movies.c.id == bindparam('movie_id')).
+                                    values({name: bindparam(f'new_{name}') for name in _IMPORTED_COLUMNS}),
+                                    updates)
+
+                # Updated movies' genres and actors are replaced rather than diffed
+                if relinked_ids:
+                    session.execute(movie_genres.delete().where(movie_genres.c.movie_id.in_(relinked_ids)))
+                    session.execute(movie_actors.delete().where(movie_actors.c.movie_id.in_(relinked_ids)))
+
+                for table, rows in ((movie_genres, genre_rows), (movie_actors, actor_rows)):
+                    for rows_batch in self._batches(rows, batch_size):
+                        session.execute(table.insert(), rows_batch)
+
+                inserted += len(inserts)
+                updated += len(updates)
+
+            scm.commit()
+
+        # Updated movies can have different casts and neighbours now
+        with self._actor_graph_lock:
+            self._actor_graph = ActorGraph()
+            self._actor_graph_version = self._EMPTY_ACTOR_GRAPH_VERSION
+
+        with self._similarity_lock:
+            if updated:
+                self._rebuild_similar_movies()
+            elif inserted:
+                self._similarity_index = None
+                self._update_similar_movies([])
+
+        return CatalogImport(inserted, updated, unchanged, names_inserted, perf_counter() - start)
+
+    @staticmethod
+    def _batches(rows: Iterable, batch_size: int) -> Iterator[List]:
+        rows = iter(rows)
+
+        while batch := list(islice(rows, batch_size)):
+            yield batch
+
+    def _import_names(self, session: Session, table: Table, column: Column, names: Set[str],
+                      batch_size: int) -> Tuple[Dict[str, int], int]:
+        """
+        Adds the given names to a table of genres or people if they're not in it already, and returns the id of each
+        name along with how many were added.
+        """
+        ids: Dict[str, int] = {}
+        inserted = 0
+
+        for batch in self._batches(sorted(names), batch_size):
+            ids.update(session.execute(select([column, table.c.id]).where(column.in_(batch))).fetchall())
+            missing = [name for name in batch if name not in ids]
+
+            if missing:
+                session.execute(table.insert(), [{column.name: name} for name in missing])
+                ids.update(session.execute(select([column, table.c.id]).where(column.in_(missing))).fetchall())
+                inserted += len(missing)
+
+        return ids, inserted
+
+    def _group_pairs(self, session: Session, key: Column, value: Column, keys: List[int]) -> Dict[int, Set[int]]:
+        groups: Dict[int, Set[int]] = defaultdict(set)
+
+        for batch in self._batches(keys, self._ID_BATCH_SIZE):
+            for k, v in session.execute(select([key, value]).where(key.in_(batch))):
+                groups[k].add(v)
+
+        return groups
+
+    def backfill_similar_movies(self) -> int:
+        """
+        Computes the similar movies of every movie if movie_similarities is empty, e.g. because the database was created
+        before similar movies were kept, and returns the number of movies compared.
+        """
+        with self._session_cm as scm:
+            if scm.session.execute(select([func.count()]).select_from(movie_similarities)).scalar():
+                return 0
+
+            number_of_movies = scm.session.query(Movie).count()
+
+        # A single movie doesn't have any similar movies
+        if number_of_movies < 2:
+            return 0
+
+        self._rebuild_similar_movies()
+        return number_of_movies
+
+    def _rebuild_similar_movies(self) -> None:
+        """ Computes the similar movies of every movie again, e.g. after their details have changed. """
+        with self._similarity_lock:
+            with self._session_cm as scm:
+                self._similarity_index = self._load_similarity_index(scm.session, restore_neighbours=False)
+
+            self._update_similar_movies([])
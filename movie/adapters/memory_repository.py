@@ -1,44 +1,149 @@
-from typing import List, Dict, Optional, Union
+import logging
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Callable, List, Dict, NamedTuple, Optional, Union
 
 from werkzeug.security import generate_password_hash
 
 from movie.activitysimulations.movie_watching_simulation import MovieWatchingSimulation
+from movie.adapters.read_write_lock import ReadWriteLock
+from movie.adapters.recommendations import Interaction
 from movie.adapters.repository import AbstractRepository
+from movie.adapters.similarity import MovieSimilarityIndex
 from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
 from movie.domain.actor import Actor
+from movie.domain.actor_graph import ActorGraph, ActorPath
 from movie.domain.director import Director
 from movie.domain.movie import Movie
 from movie.domain.movie import Genre
 
-from bisect import insort
+from bisect import bisect_left, insort
 from math import ceil
 from fuzzywuzzy import fuzz
 
 from movie.domain.review import Review
+from movie.domain.review_summary import ReviewSummary
 from movie.domain.user import User
+from movie.domain.watchlist import WatchList
 
 from collections import defaultdict
 
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_microseconds(timestamp: datetime) -> int:
+    return (timestamp - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_microseconds(microseconds: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=microseconds)
+
+
+class CatalogChanges(NamedTuple):
+    added: int
+    removed: int
+    kept: int
+    dropped_reviews: int
+
+
+class CatalogSource(NamedTuple):
+    """ The data file a catalog was read from, how much of it was read and its size and modification time then. """
+    data_path: str
+    max_num_lines: Optional[int]
+    size: int
+    mtime_ns: int
+
+
+# Called with what changed and where the new catalog was read from, if known, each time a repository's catalog is
+# replaced
+CatalogListener = Callable[[CatalogChanges, Optional[CatalogSource]], None]
+
+
+def _reading(method):
+    """ Runs the decorated method while holding the repository's lock for reading. """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._lock.acquire_read()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._lock.release_read()
+    return wrapper
+
+
+def _writing(method):
+    """ Runs the decorated method while holding the repository's lock for writing. """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._lock.acquire_write()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._lock.release_write()
+    return wrapper
+
 
 class MemoryRepository(AbstractRepository):
+    """
+    Keeps everything in memory. Any number of threads can read from the repository at once, while changes are made
+    by one thread at a time with no reads in progress, so a single instance can be shared by every thread in a process.
+
+    The users, movies and reviews returned are the repository's own, so a thread that keeps using one may see changes
+    other threads make to it afterwards.
+    """
 
     def __init__(self):
+        self._lock = ReadWriteLock()
         self._movies: List[Movie] = []
         self._movie_map: Dict[int, Movie] = {}
+        self._similarity_index = MovieSimilarityIndex()
         self._genres: List[Genre] = []
         self._genre_map: Dict[str, Genre] = {}
         self._directors: List[Director] = []
         self._director_map: Dict[str, Director] = {}
         self._actors: List[Actor] = []
         self._actor_map: Dict[str, Actor] = {}
+        self._actor_graph = ActorGraph()
         self._users: List[User] = []
         self._user_id_map: Dict[str, int] = {}  # maps usernames to a user id
         self._user_map: Dict[int, User] = {}  # maps user ids to a User
         self._reviews: List[Review] = []
+        self._review_map: Dict[int, Review] = {}  # maps review ids to a Review
+        self._next_review_id = 1
         self._reviews_movie_map: Dict[Movie, List[Review]] = defaultdict(list)
         self._reviews_user_map: Dict[Review, Union[User, None]] = {}
+        self._review_summaries: Dict[Movie, ReviewSummary] = defaultdict(ReviewSummary)
+
+        # The file the movies were read from, if known, so that processes can tell whether they have the same catalog
+        self._catalog_source: Optional[CatalogSource] = None
+        self._catalog_listeners: List[CatalogListener] = []
+
+    @property
+    def catalog_source(self) -> Optional[CatalogSource]:
+        return self._catalog_source
+
+    @catalog_source.setter
+    def catalog_source(self, catalog_source: Optional[CatalogSource]) -> None:
+        self._catalog_source = catalog_source
+
+    def add_catalog_listener(self, listener: CatalogListener) -> None:
+        """
+        Calls the given function with what changed and the new catalog's source after each call to replace_catalog,
+        however it's made, e.g. by applying a reload from an operation log. It's called once the repository's lock has
+        been released.
+        """
+        self._catalog_listeners.append(listener)
 
+    @_writing
     def add_movie(self, movie: Movie) -> None:
+        # Similar movies are computed the next time they're needed, so adding movies one at a time is still linear
+        self._add_movie(movie)
+
+    def _add_movie(self, movie: Movie) -> None:
         if not isinstance(movie, Movie):
             raise TypeError(f"'movie' must be of type 'Movie' but was '{type(movie).__name__}'")
 
@@ -47,6 +152,8 @@ class MemoryRepository(AbstractRepository):
 
         insort(self._movies, movie)
         self._movie_map[movie.id] = movie
+        self._actor_graph.add_movie(movie)
+        self._similarity_index.add_movie(movie)
 
         if movie.genres:
             self.add_genres(movie.genres)
@@ -57,13 +164,18 @@ class MemoryRepository(AbstractRepository):
         if movie.director:
             self.add_director(movie.director)
 
+    @_writing
     def add_movies(self, movies: List[Movie]) -> None:
         if not isinstance(movies, list):
             raise TypeError(f"'movies' must be of type 'List[Movie]' but was '{type(movies).__name__}'")
 
         for movie in movies:
-            self.add_movie(movie)
+            self._add_movie(movie)
+
+        # Similar movies are computed in one go for all of the new movies
+        self._similarity_index.update()
 
+    @_writing
     def add_genre(self, genre: Genre):
         if not isinstance(genre, Genre):
             raise TypeError(f"'genre' must be of type 'Genre' but was '{type(genre).__name__}'")
@@ -74,6 +186,7 @@ class MemoryRepository(AbstractRepository):
         insort(self._genres, genre)
         self._genre_map[genre.genre_name.lower()] = genre
 
+    @_writing
     def add_genres(self, genres: List[Genre]) -> None:
         if not isinstance(genres, list):
             raise TypeError(f"'genres' must be of type 'List[Genre]' but was '{type(genres).__name__}'")
@@ -81,12 +194,14 @@ class MemoryRepository(AbstractRepository):
         for genre in genres:
             self.add_genre(genre)
 
+    @_reading
     def get_genre(self, genre_name: str) -> Genre:
         try:
             return self._genre_map[genre_name.lower()]
         except KeyError:
             raise ValueError(f"No genre with the name '{genre_name}'")
 
+    @_writing
     def add_director(self, director: Director) -> None:
         if not isinstance(director, Director):
             raise TypeError(f"'director' must be of type 'Director' but was '{type(director).__name__}'")
@@ -97,6 +212,7 @@ class MemoryRepository(AbstractRepository):
         insort(self._directors, director)
         self._director_map[director.director_full_name.lower()] = director
 
+    @_writing
     def add_directors(self, directors: List[Director]) -> None:
         if not isinstance(directors, list):
             raise TypeError(f"'directors' must be of type 'List[Director]' but was '{type(directors).__name__}'")
@@ -104,12 +220,14 @@ class MemoryRepository(AbstractRepository):
         for director in directors:
             self.add_director(director)
 
+    @_reading
     def get_director(self, director_name: str) -> Director:
         try:
             return self._director_map[director_name.lower()]
         except KeyError:
             raise ValueError(f"No director with the name '{director_name}'")
 
+    @_writing
     def add_actor(self, actor: Actor) -> None:
         if not isinstance(actor, Actor):
             raise TypeError(f"'actor' must be of type 'Actor' but was '{type(actor).__name__}'")
@@ -120,6 +238,7 @@ class MemoryRepository(AbstractRepository):
         insort(self._actors, actor)
         self._actor_map[actor.actor_full_name.lower()] = actor
 
+    @_writing
     def add_actors(self, actors: List[Actor]) -> None:
         if not isinstance(actors, list):
             raise TypeError(f"'actors' must be of type 'List[Actor]' but was '{type(actors).__name__}'")
@@ -127,12 +246,18 @@ class MemoryRepository(AbstractRepository):
         for actor in actors:
             self.add_actor(actor)
 
+    @_reading
     def get_actor(self, actor_name: str) -> Actor:
         try:
             return self._actor_map[actor_name.lower()]
         except KeyError:
             raise ValueError(f"No actor with the name '{actor_name}'")
 
+    @_reading
+    def get_actor_path(self, actor: Actor, other: Actor) -> Optional[ActorPath]:
+        return self._actor_graph.get_path(actor, other)
+
+    @_writing
     def add_user(self, user: User) -> None:
         if not isinstance(user, User):
             raise TypeError(f"'user' must be of type 'User' but was '{type(user).__name__}'")
@@ -148,6 +273,7 @@ class MemoryRepository(AbstractRepository):
             for review in user.reviews:
                 self._reviews_user_map[review] = user
 
+    @_writing
     def add_users(self, users: List[User]) -> None:
         if not isinstance(users, list):
             raise TypeError(f"'users' must be of type 'List[User]' but was '{type(users).__name__}'")
@@ -155,33 +281,41 @@ class MemoryRepository(AbstractRepository):
         for user in users:
             self.add_user(user)
 
+    @_reading
     def get_user(self, username: str) -> User:
         try:
             return self._user_map[self._user_id_map[username]]
         except KeyError:
             raise ValueError(f"No user with the name '{username}'")
 
+    @_writing
     def change_username(self, user: User, new_username: str) -> None:
         # Update the mapping from username to user id
         del self._user_id_map[user.username]
         self._user_id_map[new_username] = user.id
         user.username = new_username
 
+    @_writing
     def change_password(self, user: User, new_password: str) -> None:
         user.password = new_password
 
+    @_writing
     def add_movie_to_watched(self, user: User, movie: Movie) -> None:
         user.watch_movie(movie)
 
+    @_writing
     def remove_from_watched(self, user: User, movie: Movie) -> None:
         user.remove_from_watched_movies(movie)
 
+    @_writing
     def add_movie_to_watchlist(self, user: User, movie: Movie) -> None:
         user.add_to_watchlist(movie)
 
+    @_writing
     def remove_from_watchlist(self, user: User, movie: Movie) -> None:
         user.remove_from_watchlist(movie)
 
+    @_writing
     def delete_user(self, user: User) -> None:
         self._users.remove(user)
         del self._user_id_map[user.username]
@@ -192,22 +326,39 @@ class MemoryRepository(AbstractRepository):
 
         for review in user.reviews:
             self._reviews.remove(review)
+            del self._review_map[review.id]
             del self._reviews_user_map[review]
             self._reviews_movie_map[review.movie].remove(review)
 
+            if review.rating is not None:
+                self._review_summaries[review.movie].remove_rating(review.rating)
+
+    @_writing
     def add_review(self, review: Review, user: Union[User, None] = None) -> None:
         if review in self._reviews:
             return
+
+        # Reviews are given ids so that they can be looked up again, as they would be by a database
+        if review.id is None:
+            review._id = self._next_review_id
+        self._next_review_id = max(self._next_review_id, review.id + 1)
+        self._review_map[review.id] = review
+
         insort(self._reviews, review)
         insort(self._reviews_movie_map[review.movie], review)
+
+        if review.rating is not None:
+            self._review_summaries[review.movie].add_rating(review.rating)
         if user:
             user.add_review(review)
             self._reviews_user_map[review] = user
 
+    @_writing
     def add_reviews(self, reviews: List[Review]) -> None:
         for review in reviews:
             self.add_review(review)
 
+    @_reading
     def get_review_user(self, review: Review) -> Union[User, None]:
         try:
             return self._reviews_user_map[review]
@@ -228,16 +379,20 @@ class MemoryRepository(AbstractRepository):
         return fuzz.token_set_ratio(query, movie_str) >= min_ratio
 
     def _get_reviews_for_movie(self, movie):
-        return self._reviews_movie_map[movie]
+        # Doesn't add an empty list for movies without reviews, as other threads may be reading the map
+        return self._reviews_movie_map.get(movie, [])
 
+    @_reading
     def get_number_of_reviews_for_movie(self, movie: Movie) -> int:
         return len(self._get_reviews_for_movie(movie))
 
+    @_reading
     def get_number_of_review_pages_for_movie(self,
                                              movie: Movie,
                                              page_size: int = AbstractRepository.DEFAULT_PAGE_SIZE) -> int:
         return ceil(self.get_number_of_reviews_for_movie(movie) / page_size)
 
+    @_reading
     def get_reviews_for_movie(self,
                               movie: Movie,
                               page_number: int,
@@ -247,6 +402,29 @@ class MemoryRepository(AbstractRepository):
         offset = page_number * page_size
         return reviews[offset:min(offset + page_size, len(reviews))]
 
+    @_reading
+    def get_review_ids_for_movie(self, movie: Movie) -> List[int]:
+        return [review.id for review in self._get_reviews_for_movie(movie)]
+
+    @_reading
+    def get_reviews_by_id(self, review_ids: List[int]) -> List[Review]:
+        reviews = (self._review_map.get(review_id) for review_id in review_ids)
+        return [review for review in reviews if review is not None]
+
+    @_reading
+    def get_review_summary(self, movie: Movie) -> ReviewSummary:
+        # Avoid creating a summary for every movie that's looked up
+        summary = self._review_summaries.get(movie)
+        return summary if summary is not None else ReviewSummary()
+
+    def _community_rating_sort_key(self, movie: Movie):
+        summary = self._review_summaries.get(movie)
+
+        if summary is None or summary.number_of_reviews == 0:
+            return True, 0, 0
+
+        return False, -summary.average_rating, -summary.number_of_reviews
+
     @staticmethod
     def _movie_query_filter(movie: Movie, query: str = "", min_ratio: int = 80) -> bool:
 
@@ -283,6 +461,7 @@ class MemoryRepository(AbstractRepository):
 
         return list(filtered)
 
+    @_reading
     def get_number_of_movies(self,
                              query: str = "",
                              genres: List[Genre] = [],
@@ -290,6 +469,7 @@ class MemoryRepository(AbstractRepository):
                              actors: List[Actor] = []) -> int:
         return len(self._get_filtered_movies(query, genres, directors, actors))
 
+    @_reading
     def get_number_of_movie_pages(self,
                                   page_size: int = AbstractRepository.DEFAULT_PAGE_SIZE,
                                   query: str = "",
@@ -298,35 +478,64 @@ class MemoryRepository(AbstractRepository):
                                   actors: List[Actor] = []) -> int:
         return ceil(self.get_number_of_movies(query, genres, directors, actors) / page_size)
 
+    @_reading
     def get_movies(self,
                    page_number: int,
                    page_size: int = AbstractRepository.DEFAULT_PAGE_SIZE,
                    query: str = "",
                    genres: List[Genre] = [],
                    directors: List[Director] = [],
-                   actors: List[Actor] = []) -> List[Movie]:
+                   actors: List[Actor] = [],
+                   sort_by: str = AbstractRepository.SORT_BY_TITLE) -> List[Movie]:
 
-        self._check_get_movies_args(page_number, page_size, query, genres, directors, actors)
+        self._check_get_movies_args(page_number, page_size, query, genres, directors, actors, sort_by)
 
-        filtered = self._get_filtered_movies(query, genres, directors, actors)
+        filtered = self._get_sorted_movies(query, genres, directors, actors, sort_by)
 
         offset = page_number * page_size
         return filtered[offset:min(offset + page_size, len(self._movies))]
 
+    def _get_sorted_movies(self,
+                           query: str = "",
+                           genres: List[Genre] = [],
+                           directors: List[Director] = [],
+                           actors: List[Actor] = [],
+                           sort_by: str = AbstractRepository.SORT_BY_TITLE) -> List[Movie]:
+        filtered = self._get_filtered_movies(query, genres, directors, actors)
+
+        # Movies are kept sorted by title and release date, and sorting is stable, so ties are left in that order
+        if sort_by == self.SORT_BY_COMMUNITY_RATING:
+            filtered.sort(key=self._community_rating_sort_key)
+
+        return filtered
+
+    @_reading
+    def get_movie_ids(self,
+                      query: str = "",
+                      genres: List[Genre] = [],
+                      directors: List[Director] = [],
+                      actors: List[Actor] = [],
+                      sort_by: str = AbstractRepository.SORT_BY_TITLE) -> List[int]:
+        self._check_get_movies_args(0, AbstractRepository.DEFAULT_PAGE_SIZE, query, genres, directors, actors, sort_by)
+        return [movie.id for movie in self._get_sorted_movies(query, genres, directors, actors, sort_by)]
+
     @staticmethod
     def _get_movies_for_user(user) -> List[Movie]:
         movies = list(set(user.watched_movies + list(user.watchlist)))
         movies.sort()
         return movies
 
+    @_reading
     def get_number_of_movies_for_user(self, user: User) -> int:
         return len(self._get_movies_for_user(user))
 
+    @_reading
     def get_number_of_movie_pages_for_user(self,
                                            user: User,
                                            page_size: int = AbstractRepository.DEFAULT_PAGE_SIZE) -> int:
         return ceil(self.get_number_of_movies_for_user(user) / page_size)
 
+    @_reading
     def get_movies_for_user(self,
                             user: User,
                             page_number: int,
@@ -336,21 +545,78 @@ class MemoryRepository(AbstractRepository):
         offset = page_number * page_size
         return movies[offset:min(offset + page_size, len(movies))]
 
+    @_reading
     def get_movie_by_id(self, movie_id: int) -> Movie:
         try:
             return self._movie_map[movie_id]
         except KeyError:
             raise ValueError(f"no movie with the id '{movie_id}'")
 
+    @_reading
+    def get_movie(self, title: str, release_date: int) -> Movie:
+        """ Returns the movie with the given title and release date, which identify it in every catalog. """
+        movie = Movie(title, release_date)
+        i = bisect_left(self._movies, movie)
+
+        if i == len(self._movies) or self._movies[i] != movie:
+            raise ValueError(f"no movie titled '{title}' released in {release_date}")
+
+        return self._movies[i]
+
+    def get_similar_movies(self, movie: Movie) -> List[Movie]:
+        similar_movies = self._get_similar_movies(movie)
+
+        # Movies added since similar movies were last computed have to be compared first, which needs the lock for
+        # writing
+        if similar_movies is None:
+            similar_movies = self._update_similar_movies(movie)
+
+        return similar_movies
+
+    @_reading
+    def _get_similar_movies(self, movie: Movie) -> Optional[List[Movie]]:
+        if self._similarity_index.pending:
+            return None
+        return self._similarity_index.get_neighbours(movie)
+
+    @_writing
+    def _update_similar_movies(self, movie: Movie) -> List[Movie]:
+        self._similarity_index.update()
+        return self._similarity_index.get_neighbours(movie)
+
+    @_reading
+    def get_user_movie_interactions(self) -> List[Interaction]:
+        interactions = []
+
+        for user in self._users:
+            ratings = {review.movie: review.rating for review in user.reviews or []}
+            watched = set(user.watched_movies)
+            watchlist = set(user.watchlist)
+
+            for movie in watched | watchlist | ratings.keys():
+                interactions.append(Interaction(user.id, movie.id, movie in watchlist, movie in watched,
+                                                ratings.get(movie)))
+
+        return interactions
+
+    @_reading
+    def get_movies_by_id(self, movie_ids: List[int]) -> List[Movie]:
+        movies = (self._movie_map.get(movie_id) for movie_id in movie_ids)
+        return [movie for movie in movies if movie is not None]
+
+    @_reading
     def get_genres(self) -> List[Genre]:
         return self._genres
 
+    @_reading
     def get_directors(self) -> List[Director]:
         return self._directors
 
+    @_reading
     def get_actors(self) -> List[Actor]:
         return self._actors
 
+    @_reading
     def get_movies_per_genre(self) -> Dict[Genre, int]:
         movies_per_genre: Dict[Genre, int] = defaultdict(int)
 
@@ -360,3 +626,264 @@ class MemoryRepository(AbstractRepository):
                     movies_per_genre[genre] += 1
 
         return movies_per_genre
+
+    def replace_catalog(self, catalog: 'MemoryRepository', source: Optional[CatalogSource] = None) -> CatalogChanges:
+        """
+        Replaces the movies, genres, directors and actors in this repository, along with the indexes built from them,
+        with those in the given repository, which should hold nothing else and isn't to be used afterwards. The
+        catalog can be built without holding this repository's lock, so that only moving the users over blocks it.
+
+        Users' watched movies, watchlists and reviews are moved to the new movie with the same title and release date,
+        and dropped if there isn't one. Movies that were already in this repository keep their ids, so that links to
+        them still work, and the rest are numbered in order after the largest id in use. The source the catalog was
+        read from, if given, becomes this repository's catalog source. The catalog listeners are then called.
+        """
+        if not isinstance(catalog, MemoryRepository):
+            raise TypeError(f"'catalog' must be of type 'MemoryRepository' but was '{type(catalog).__name__}'")
+
+        changes = self._replace_catalog(catalog, source)
+
+        # The catalog has been replaced whether or not they succeed, so one failing doesn't stop the rest being called
+        for listener in self._catalog_listeners:
+            try:
+                listener(changes, source)
+            except Exception:
+                logger.exception('Failed to notify a listener of a catalog replacement')
+
+        return changes
+
+    @_writing
+    def _replace_catalog(self, catalog: 'MemoryRepository', source: Optional[CatalogSource]) -> CatalogChanges:
+
+        current_movies = {movie: movie for movie in self._movies}
+        next_id = max((movie.id for movie in self._movies), default=-1) + 1
+        movies: Dict[Movie, Movie] = {}
+        added = 0
+
+        # In the order they were read, so that new movies are numbered in the order they're listed
+        for movie in sorted(catalog._movies, key=lambda movie: movie.id):
+            if movie in current_movies:
+                movie._id = current_movies[movie].id
+            else:
+                movie._id = next_id
+                next_id += 1
+                added += 1
+
+            movies[movie] = movie
+
+        relinked_reviews: Dict[int, Optional[Review]] = {}
+
+        def relink_review(review: Review) -> Optional[Review]:
+            # Reviews are identified by the movie they're for, so each is replaced by one for the new movie
+            if id(review) not in relinked_reviews:
+                movie = movies.get(review.movie)
+                relinked_reviews[id(review)] = None if movie is None else Review(
+                    movie, review.review_text, review.rating, review.timestamp, review.user, review.id)
+            return relinked_reviews[id(review)]
+
+        reviews = [review for review in map(relink_review, self._reviews) if review is not None]
+
+        # Each user's lists are built before being swapped in, as requests read them without holding the lock
+        for user in self._users:
+            relinked = User(user.username, user.password, user.id)
+
+            for movie in user.watched_movies:
+                if movie in movies:
+                    relinked.watch_movie(movies[movie])
+
+            for movie in user.watchlist:
+                if movie in movies:
+                    relinked.add_to_watchlist(movies[movie])
+
+            for review in user.reviews:
+                review = relink_review(review)
+                if review is not None:
+                    relinked.add_review(review)
+
+            user._watched_movies = relinked.watched_movies
+            user._time_spent_watching_movies_minutes = relinked.time_spent_watching_movies_minutes
+            user._watchlist = relinked.watchlist
+            user._reviews = relinked.reviews
+
+        reviews_user_map = {}
+        for review, user in self._reviews_user_map.items():
+            review = relink_review(review)
+            if review is not None:
+                reviews_user_map[review] = user
+
+        kept = len(movies) - added
+        changes = CatalogChanges(added, len(current_movies) - kept, kept, len(self._reviews) - len(reviews))
+
+        self._movies = catalog._movies
+        self._movie_map = {movie.id: movie for movie in catalog._movies}
+        self._similarity_index = catalog._similarity_index
+        self._genres = catalog._genres
+        self._genre_map = catalog._genre_map
+        self._directors = catalog._directors
+        self._director_map = catalog._director_map
+        self._actors = catalog._actors
+        self._actor_map = catalog._actor_map
+        self._actor_graph = catalog._actor_graph
+
+        # Reviews stay in the same order, as their timestamps haven't changed
+        self._reviews = reviews
+        self._review_map = {review.id: review for review in reviews}
+        self._reviews_movie_map = defaultdict(list)
+        self._review_summaries = defaultdict(ReviewSummary)
+        self._reviews_user_map = reviews_user_map
+
+        for review in reviews:
+            self._reviews_movie_map[review.movie].append(review)
+
+            if review.rating is not None:
+                self._review_summaries[review.movie].add_rating(review.rating)
+
+        self._catalog_source = source
+        return changes
+
+    @_reading
+    def export_state(self) -> dict:
+        """
+        Returns everything in this repository as lists and tuples of strings and numbers, with movies, people, users
+        and reviews referring to each other by their index, e.g. for saving a snapshot of it. Nothing else is
+        referenced, so the result can be serialized without any of the domain classes.
+        """
+        genre_indices = {genre: i for i, genre in enumerate(self._genres)}
+        director_indices = {director: i for i, director in enumerate(self._directors)}
+        actor_indices = {actor: i for i, actor in enumerate(self._actors)}
+
+        # In the order they were added, so that the actor graph and similarity index are rebuilt the same way
+        movies = self._similarity_index.keys
+        movie_indices = {movie: i for i, movie in enumerate(movies)}
+        user_indices = {user: i for i, user in enumerate(self._users)}
+        pending = set(self._similarity_index.pending)
+
+        # Reviews that users have written but that were never added, or have since been removed, are kept after
+        # the repository's own reviews
+        reviews = list(self._reviews)
+        review_indices = {id(review): i for i, review in enumerate(reviews)}
+        for review in [review for user in self._users for review in user.reviews] + list(self._reviews_user_map):
+            if id(review) not in review_indices:
+                review_indices[id(review)] = len(reviews)
+                reviews.append(review)
+
+        return {
+            'genres': [(genre.genre_name, genre.id) for genre in self._genres],
+            'directors': [director.director_full_name for director in self._directors],
+            'actors': [(actor.actor_full_name, tuple(actor_indices[colleague] for colleague in actor._colleagues))
+                       for actor in self._actors],
+            'movies': [(movie.title, movie.release_date, movie.id, movie.description,
+                        director_indices[movie.director] if movie.director else None,
+                        tuple(actor_indices[actor] for actor in movie.actors or []),
+                        tuple(genre_indices[genre] for genre in movie.genres or []),
+                        movie.runtime_minutes, movie.rating, movie.votes, movie.revenue_millions, movie.metascore)
+                       for movie in movies],
+            # None for movies whose similar movies haven't been computed yet
+            'similar_movies': [tuple((movie_indices[other], score)
+                                     for other, score in self._similarity_index.get_neighbour_scores(movie))
+                               if movie not in pending else None for movie in movies],
+            'users': [(user.username, user.password, user.id, _to_microseconds(user.joined_on_utc),
+                       tuple(movie_indices[movie] for movie in user.watched_movies),
+                       tuple(movie_indices[movie] for movie in user.watchlist),
+                       tuple(review_indices[id(review)] for review in user.reviews))
+                      for user in self._users],
+            'reviews': [(movie_indices[review.movie], review.review_text, review.rating,
+                         _to_microseconds(review.timestamp), user_indices.get(review.user), review.id)
+                        for review in reviews],
+            'number_of_reviews': len(self._reviews),
+            'review_users': [(review_indices[id(review)], user_indices[user])
+                             for review, user in self._reviews_user_map.items()]
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'MemoryRepository':
+        """
+        Returns a repository with everything in the given state, as returned by export_state. The state is trusted
+        to be consistent, so the checks made and indexes searched when adding each item one at a time are skipped.
+        """
+        repo = cls()
+
+        genres = [Genre(name, id_) for name, id_ in state['genres']]
+        directors = [Director(name) for name in state['directors']]
+        actors = [Actor(name) for name, _ in state['actors']]
+
+        for actor, (_, colleagues) in zip(actors, state['actors']):
+            for i in colleagues:
+                actor.add_actor_colleague(actors[i])
+
+        movies = []
+        for (title, release_date, id_, description, director, actor_indices, genre_indices, runtime_minutes, rating,
+             votes, revenue_millions, metascore) in state['movies']:
+            movie = Movie(title, release_date, id_)
+            movie.description = description
+            movie.actors = [actors[i] for i in actor_indices]
+            movie.genres = [genres[i] for i in genre_indices]
+
+            if director is not None:
+                movie.director = directors[director]
+
+            # Set as they would be by MovieFileCSVReader, which leaves missing values unset
+            for name, value in (('runtime_minutes', runtime_minutes), ('rating', rating), ('votes', votes),
+                                ('revenue_millions', revenue_millions), ('metascore', metascore)):
+                if value is not None:
+                    setattr(movie, name, value)
+
+            movies.append(movie)
+
+        for movie in movies:
+            repo._actor_graph.add_movie(movie)
+            repo._similarity_index.add_movie(movie)
+
+        # Neighbours are restored rather than computed again
+        for movie, similar_movies in zip(movies, state['similar_movies']):
+            if similar_movies is not None:
+                repo._similarity_index.set_neighbours(movie, [(movies[i], score) for i, score in similar_movies])
+
+        users = []
+        for username, password, id_, joined_on_utc, watched, watchlist, _ in state['users']:
+            user = User(username, password, id_)
+            user._joined_on_utc = _from_microseconds(joined_on_utc)
+
+            for i in watched:
+                user.watch_movie(movies[i])
+            for i in watchlist:
+                user.add_to_watchlist(movies[i])
+
+            users.append(user)
+
+        reviews = [Review(movies[movie], text, rating, _from_microseconds(timestamp),
+                          users[user] if user is not None else None, id_)
+                   for movie, text, rating, timestamp, user, id_ in state['reviews']]
+
+        for user, (*_, review_indices) in zip(users, state['users']):
+            for i in review_indices:
+                user.add_review(reviews[i])
+
+        repo._genres = genres
+        repo._genre_map = {genre.genre_name.lower(): genre for genre in genres}
+        repo._directors = directors
+        repo._director_map = {director.director_full_name.lower(): director for director in directors}
+        repo._actors = actors
+        repo._actor_map = {actor.actor_full_name.lower(): actor for actor in actors}
+        repo._movies = sorted(movies)
+        repo._movie_map = {movie.id: movie for movie in movies}
+        repo._users = users
+        repo._user_id_map = {user.username: user.id for user in users}
+        repo._user_map = {user.id: user for user in users}
+
+        # Reviews are kept sorted, so each movie's reviews are too
+        repo._reviews = reviews[:state['number_of_reviews']]
+        for review in repo._reviews:
+            # Snapshots saved before reviews were given ids have none
+            if review.id is None:
+                review._id = repo._next_review_id
+            repo._next_review_id = max(repo._next_review_id, review.id + 1)
+            repo._review_map[review.id] = review
+
+            repo._reviews_movie_map[review.movie].append(review)
+
+            if review.rating is not None:
+                repo._review_summaries[review.movie].add_rating(review.rating)
+
+        repo._reviews_user_map = {reviews[review]: users[user] for review, user in state['review_users']}
+        return repo
@@ -0,0 +1,426 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from flask import Flask
+
+from movie.adapters.catalog_reload import build_catalog
+from movie.adapters.memory_repository import CatalogSource, MemoryRepository
+from movie.domain.movie import Movie
+from movie.domain.review import Review
+from movie.domain.user import User
+
+try:
+    import fcntl
+except ImportError:
+    # Without file locks only a single process can write to a log safely
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Operation:
+    """ How a repository method's arguments are written to the log and how the method is called again from them. """
+
+    def __init__(self, encode: Callable[..., dict], apply: Callable[[MemoryRepository, dict], None]) -> None:
+        self.encode = encode
+        self.apply = apply
+
+
+def _encode_user(user: User) -> dict:
+    return {'username': user.username, 'password': user.password, 'id': user.id,
+            'joined_on_utc': user.joined_on_utc.isoformat()}
+
+
+def _apply_add_user(repo: MemoryRepository, entry: dict) -> None:
+    user = User(entry['username'], entry['password'], entry['id'])
+    # Kept the same in every process rather than when each one happened to apply the entry
+    user._joined_on_utc = datetime.fromisoformat(entry['joined_on_utc'])
+    repo.add_user(user)
+
+
+def _encode_movie(movie: Movie) -> dict:
+    # Ids are only given to movies by each process's own repository, whereas the title and release date are the same
+    # in every catalog
+    return {'title': movie.title, 'release_date': movie.release_date}
+
+
+def _get_movie(repo: MemoryRepository, entry: dict) -> Movie:
+    if 'title' not in entry:
+        # Logged before movies were identified by their title and release date
+        return repo.get_movie_by_id(entry['movie_id'])
+    return repo.get_movie(entry['title'], entry['release_date'])
+
+
+def _encode_review(review: Review, user: Optional[User] = None) -> dict:
+    return {**_encode_movie(review.movie), 'text': review.review_text, 'rating': review.rating,
+            'timestamp': review.timestamp.isoformat(), 'username': user.username if user else None}
+
+
+def _apply_add_review(repo: MemoryRepository, entry: dict) -> None:
+    movie = _get_movie(repo, entry)
+    user = repo.get_user(entry['username']) if entry['username'] else None
+    review = Review(movie, entry['text'], entry['rating'], datetime.fromisoformat(entry['timestamp']), user)
+    repo.add_review(review, user)
+
+
+def _movie_operation(name: str) -> _Operation:
+    """ Returns how to log the method with the given name, which takes a user and a movie. """
+
+    def encode(user: User, movie: Movie) -> dict:
+        return {'username': user.username, **_encode_movie(movie)}
+
+    def apply(repo: MemoryRepository, entry: dict) -> None:
+        getattr(repo, name)(repo.get_user(entry['username']), _get_movie(repo, entry))
+
+    return _Operation(encode, apply)
+
+
+def _encode_catalog(catalog: MemoryRepository, source: CatalogSource) -> dict:
+    # The catalog is read again from the same file by each process rather than written to the log
+    return {'source': list(source)}
+
+
+def _apply_replace_catalog(repo: MemoryRepository, entry: dict) -> None:
+    source = CatalogSource(*entry['source'])
+
+    # e.g. when the repository was populated from the file after the reload was logged
+    if source == repo.catalog_source:
+        return
+
+    # If the file has changed again since, the newer one is read, and as the catalog source is still the logged one
+    # the change is reloaded again
+    repo.replace_catalog(build_catalog(source), source)
+
+
+_OPERATIONS: Dict[str, _Operation] = {
+    'add_user': _Operation(_encode_user, _apply_add_user),
+    'add_review': _Operation(_encode_review, _apply_add_review),
+    'add_movie_to_watched': _movie_operation('add_movie_to_watched'),
+    'remove_from_watched': _movie_operation('remove_from_watched'),
+    'add_movie_to_watchlist': _movie_operation('add_movie_to_watchlist'),
+    'remove_from_watchlist': _movie_operation('remove_from_watchlist'),
+    'change_username': _Operation(
+        lambda user, new_username: {'username': user.username, 'new_username': new_username},
+        lambda repo, entry: repo.change_username(repo.get_user(entry['username']), entry['new_username'])),
+    'change_password': _Operation(
+        lambda user, new_password: {'username': user.username, 'new_password': new_password},
+        lambda repo, entry: repo.change_password(repo.get_user(entry['username']), entry['new_password'])),
+    'delete_user': _Operation(
+        lambda user: {'username': user.username},
+        lambda repo, entry: repo.delete_user(repo.get_user(entry['username']))),
+    'replace_catalog': _Operation(_encode_catalog, _apply_replace_catalog)
+}
+
+
+class LogPosition(NamedTuple):
+    """ How far into a generation of an operation log a repository has applied changes, in bytes. """
+    generation: int
+    offset: int
+
+
+def _header(generation: int) -> bytes:
+    return json.dumps({'generation': generation}).encode() + b'\n'
+
+
+class OperationLog:
+    """
+    An append-only file of the changes made to users, their reviews and their watchlists in a MemoryRepository, so
+    that several processes each with their own repository, e.g. gunicorn workers, see each other's changes.
+
+    Once attached to a repository every change made through it is written to the end of the log as a line of JSON, and
+    catch_up applies the changes other processes have written since it was last called. Writers catch up before
+    appending, holding a lock on the file, so every process applies the changes in the same order. Movies are
+    referred to by their title and release date, and reloads of the catalog are logged as the data file they read,
+    which every process reads again in turn. Every process must still populate its repository from the same movies
+    to begin with, and users added before the log was attached, e.g. by the activity simulation, must be the same
+    in each.
+
+    Checking for new changes is a stat of the file, so it can be done before every request.
+
+    A log can be compacted once the state it leads to has been saved elsewhere, e.g. in a snapshot of the repository.
+    The file is then replaced by the next generation of the log, which starts empty, and processes move on to it once
+    they've applied the rest of the previous one. Each generation starts with a header line giving its number.
+    """
+
+    def __init__(self, file_name: str) -> None:
+        self._file_name = file_name
+        self._repo: Optional[MemoryRepository] = None
+        self._offset = 0
+        self._generation = 0
+        self._new_generation = 1
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    @property
+    def offset(self) -> int:
+        """ How far into the file this process has applied changes, in bytes. """
+        return self._offset
+
+    @property
+    def replaying(self) -> bool:
+        """ Whether this thread is applying a change from the log, rather than making one. """
+        return getattr(self._local, 'replaying', False)
+
+    @property
+    def position(self) -> LogPosition:
+        """ The generation of the log this process is reading and how far into it changes have been applied. """
+        return LogPosition(self._generation, self._offset)
+
+    def has_changes(self) -> bool:
+        """ Returns whether any changes have been logged since the log was last compacted. """
+        self.catch_up()
+        with self._lock:
+            start = len(_header(self._generation)) if self._generation else 0
+            return self._offset > start
+
+    def _file(self) -> int:
+        if self._pid != os.getpid():
+            # Forked processes open the file again so that they don't share its lock with their parent, and replace
+            # the thread lock in case it was held when they were forked
+            self._lock = threading.RLock()
+            self._fd = os.open(self._file_name, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    def _read_new_entries(self, fd: int):
+        size = os.fstat(fd).st_size
+        base = self._offset
+        if size <= base:
+            return
+
+        data = os.pread(fd, size - base, base)
+
+        # A line that's still being written is left until it's complete
+        end = data.rfind(b'\n') + 1
+        start = 0
+        while start < end:
+            line_end = data.index(b'\n', start)
+            yield json.loads(data[start:line_end]), base + line_end + 1
+            start = line_end + 1
+
+    def _apply(self, entry: dict) -> None:
+        self._local.replaying = True
+        try:
+            # The repository's own methods are used so that anything else wrapping them sees the change too, e.g.
+            # the page cache, but the change isn't logged again
+            _OPERATIONS[entry['operation']].apply(self._repo, entry)
+        except Exception:
+            # Skipped by every process alike rather than stopping them from applying later changes
+            logger.exception('Unable to apply %s from the operation log', entry.get('operation'))
+        finally:
+            self._local.replaying = False
+
+    def _catch_up(self, fd: int) -> int:
+        applied = 0
+        for entry, offset in self._read_new_entries(fd):
+            if 'generation' in entry:
+                self._generation = entry['generation']
+            else:
+                self._apply(entry)
+                applied += 1
+            self._offset = offset
+        return applied
+
+    def _is_replaced(self, fd: int) -> bool:
+        """ Returns whether the log has been compacted since the given file was opened. """
+        try:
+            stat = os.stat(self._file_name)
+        except FileNotFoundError:
+            return False
+
+        opened = os.fstat(fd)
+        return (stat.st_ino, stat.st_dev) != (opened.st_ino, opened.st_dev)
+
+    def _open_next_generation(self) -> int:
+        os.close(self._fd)
+        self._fd = os.open(self._file_name, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+        self._offset = 0
+        return self._fd
+
+    def _lock_file(self) -> int:
+        """ Locks the current generation of the log, writing its header if it's new, and returns its descriptor. """
+        fd = self._file()
+
+        while True:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+
+            if not self._is_replaced(fd):
+                break
+
+            # Nothing more can be written to the previous generation once it's been replaced
+            self._catch_up(fd)
+            self._unlock_file(fd)
+            fd = self._open_next_generation()
+
+        if os.fstat(fd).st_size == 0:
+            os.write(fd, _header(self._new_generation))
+
+        return fd
+
+    @staticmethod
+    def _unlock_file(fd: int) -> None:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def catch_up(self) -> int:
+        """ Applies the changes written to the log since this was last called and returns how many there were. """
+        if self._repo is None:
+            raise ValueError('the operation log must be attached to a repository first')
+
+        fd = self._file()
+        applied = 0
+
+        with self._lock:
+            while True:
+                # Checked first, as if it has been replaced everything written to it is there to be read
+                is_replaced = self._is_replaced(fd)
+
+                if os.fstat(fd).st_size != self._offset:
+                    applied += self._catch_up(fd)
+
+                if not is_replaced:
+                    return applied
+
+                fd = self._open_next_generation()
+
+    def _is_applicable(self, name: str, entry: dict) -> bool:
+        if name == 'add_user':
+            # If two processes add the same username at once, only the first to be logged is kept
+            try:
+                self._repo.get_user(entry['username'])
+                return False
+            except ValueError:
+                return True
+        if name == 'replace_catalog':
+            # If two processes notice the same change to the data file, only the first to log it reloads it
+            return CatalogSource(*entry['source']) != self._repo.catalog_source
+        return True
+
+    def _logged(self, name: str, method: Callable) -> Callable:
+        operation = _OPERATIONS[name]
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            if self.replaying:
+                return method(*args, **kwargs)
+
+            entry = {'operation': name, **operation.encode(*args, **kwargs)}
+            line = json.dumps(entry).encode() + b'\n'
+
+            with self._lock:
+                fd = self._lock_file()
+                try:
+                    self._catch_up(fd)
+                    if not self._is_applicable(name, entry):
+                        return None
+
+                    # Made here first so that changes that fail aren't logged
+                    result = method(*args, **kwargs)
+                    os.write(fd, line)
+                    self._offset = os.fstat(fd).st_size
+                finally:
+                    self._unlock_file(fd)
+
+            return result
+        return wrapper
+
+    def _read_generation(self, fd: int) -> int:
+        line = os.pread(fd, len(_header(0)) + 20, 0).split(b'\n', 1)[0]
+        try:
+            return json.loads(line)['generation']
+        except (ValueError, KeyError, TypeError):
+            # Logs written before generations were added only ever had one
+            return 0
+
+    def attach(self, repo: MemoryRepository, positions: Iterable[LogPosition] = ()) -> MemoryRepository:
+        """
+        Logs the changes made through the given repository and applies every change already in the log to it. The
+        methods are replaced on the instance, so this should be done before anything else wraps them.
+
+        If the repository already includes some of the log's changes, e.g. because it was loaded from a snapshot, the
+        positions it's up to in the generations the log might be at are given, and only the changes after that are
+        applied. A ValueError is raised if the log is at any other generation.
+        """
+        if self._repo is not None:
+            raise ValueError('an operation log can only be attached to one repository')
+
+        offsets = {position.generation: position.offset for position in positions}
+        self._new_generation = max(offsets, default=1)
+
+        with self._lock:
+            fd = self._lock_file()
+            try:
+                generation = self._read_generation(fd)
+
+                if offsets:
+                    if generation not in offsets:
+                        raise ValueError(f"'{self._file_name}' is at generation {generation} but the repository is up "
+                                         f"to generation {', '.join(map(str, sorted(offsets)))}")
+                    self._generation, self._offset = generation, offsets[generation]
+                elif generation > 1:
+                    logger.warning('%s starts at generation %d, so changes made before it was compacted are missing',
+                                   self._file_name, generation)
+
+                self._repo = repo
+                for name in _OPERATIONS:
+                    setattr(repo, name, self._logged(name, getattr(repo, name)))
+
+                applied = self._catch_up(fd)
+            finally:
+                self._unlock_file(fd)
+
+        logger.info('Applied %d changes from %s', applied, self._file_name)
+        return repo
+
+    def compact(self, checkpoint: Callable[[List[LogPosition]], None]) -> LogPosition:
+        """
+        Replaces the log with its next generation once everything in it has been saved elsewhere and returns the
+        position this process is at in the new one.
+
+        The checkpoint is called once this process has applied every change in the log, with no more able to be
+        made, and should save the repository along with the positions given, which are the start of the next
+        generation and the end of this one. If the process stops before the log is replaced, the saved repository
+        still follows on from this generation.
+        """
+        if self._repo is None:
+            raise ValueError('the operation log must be attached to a repository first')
+
+        with self._lock:
+            fd = self._lock_file()
+            try:
+                self._catch_up(fd)
+                generation = self._generation + 1
+                header = _header(generation)
+                checkpoint([LogPosition(generation, len(header)), self.position])
+
+                temporary_name = f'{self._file_name}.{os.getpid()}.tmp'
+                temporary_fd = os.open(temporary_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                try:
+                    os.write(temporary_fd, header)
+                    os.fsync(temporary_fd)
+                finally:
+                    os.close(temporary_fd)
+
+                os.replace(temporary_name, self._file_name)
+            finally:
+                self._unlock_file(fd)
+
+            self._open_next_generation()
+            self._generation, self._offset = generation, len(header)
+
+        return self.position
+
+    def init_app(self, app: Flask) -> None:
+        """ Applies changes made by other processes before each of the app's requests. """
+
+        @app.before_request
+        def catch_up_with_operation_log():
+            self.catch_up()
@@ -1,6 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import Table, MetaData, Column, Integer, String, DateTime, ForeignKey, Float, Text, func, BigInteger
+from sqlalchemy import Table, MetaData, Column, Integer, String, DateTime, ForeignKey, Float, Text, func, BigInteger, \
+    and_
 from sqlalchemy.orm import mapper, relationship
 
 from movie.domain.actor import Actor
@@ -8,6 +9,7 @@ from movie.domain.director import Director
 from movie.domain.genre import Genre
 from movie.domain.movie import Movie
 from movie.domain.review import Review
+from movie.domain.review_summary import ReviewSummary
 from movie.domain.user import User
 from movie.domain.watchlist import WatchList
 from sqlalchemy.dialects import postgresql, sqlite
@@ -94,12 +96,34 @@ movie_genres = Table(
     Column('genre_id', ForeignKey('genres.id'), primary_key=True)
 )
 
-actor_colleagues = Table(
-    'actor_colleagues', metadata,
-    Column('actor_id', ForeignKey('actors.id'), primary_key=True),
-    Column('colleague_id', ForeignKey('actors.id'), primary_key=True)
+# The most similar movies to each movie, precomputed by a MovieSimilarityIndex. rank starts from zero for the most
+# similar movie.
+movie_similarities = Table(
+    'movie_similarities', metadata,
+    Column('movie_id', ForeignKey('movies.id'), primary_key=True),
+    Column('rank', Integer, primary_key=True),
+    Column('similar_movie_id', ForeignKey('movies.id'), nullable=False),
+    Column('score', Float, nullable=False)
 )
 
+# Running totals of each movie's review ratings, kept in sync with the reviews table by SqlAlchemyRepository so that
+# averages and rating distributions don't need to be aggregated from every review. rating_n is the number of reviews
+# with a rating of n.
+movie_review_summaries = Table(
+    'movie_review_summaries', metadata,
+    Column('movie_id', ForeignKey('movies.id'), primary_key=True),
+    Column('number_of_reviews', Integer, nullable=False, default=0),
+    Column('rating_total', Integer, nullable=False, default=0),
+    *[Column(f'rating_{rating}', Integer, nullable=False, default=0)
+      for rating in range(ReviewSummary.MIN_RATING, ReviewSummary.MAX_RATING + 1)]
+)
+
+# Actors are colleagues if they've appeared in the same movie. Rather than storing every pair of colleagues (which grows
+# with the square of each movie's cast size) they're derived by joining movie_actors with itself.
+_actor_movies = movie_actors.alias('actor_movies')
+_colleague_movies = movie_actors.alias('colleague_movies')
+actor_colleagues = _actor_movies.join(_colleague_movies, _actor_movies.c.movie_id == _colleague_movies.c.movie_id)
+
 
 def map_model_to_tables():
     mapper(User, users, properties={
@@ -146,9 +170,10 @@ def map_model_to_tables():
         '_person_full_name': actors.c.actor_full_name,
         '_colleagues': relationship(Actor,
                                     secondary=actor_colleagues,
-                                    primaryjoin=(actors.c.id == actor_colleagues.c.actor_id),
-                                    secondaryjoin=(actors.c.id == actor_colleagues.c.colleague_id),
-                                    backref="actors",
+                                    primaryjoin=(actors.c.id == _actor_movies.c.actor_id),
+                                    secondaryjoin=and_(actors.c.id == _colleague_movies.c.actor_id,
+                                                       _colleague_movies.c.actor_id != _actor_movies.c.actor_id),
+                                    viewonly=True,
                                     collection_class=set)
     })
 
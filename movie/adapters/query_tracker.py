@@ -0,0 +1,123 @@
+import logging
+import random
+import threading
+from time import perf_counter
+from typing import Optional
+
+from flask import Flask, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Prefixes that ask each database how it would run a statement, without running it
+_EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN '
+}
+
+
+class RequestQueries:
+    """ The number of statements run while handling a request and how long they took. """
+
+    def __init__(self, endpoint: Optional[str]) -> None:
+        self.endpoint = endpoint
+        self.count = 0
+        self.seconds = 0.0
+
+
+class QueryTracker:
+    """
+    Counts the statements each request runs and the total time spent running them, by listening to an engine's
+    events, and logs slow statements along with how the database ran them and the endpoint they came from.
+
+    Only a sample of requests are tracked so that it can be left on in production. Untracked requests only pay for a
+    thread local lookup per statement.
+    """
+
+    def __init__(self, engine: Engine, slow_query_seconds: float = 0.1, sample_rate: float = 1.0) -> None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(f"'sample_rate' must be between 0 and 1 but was {sample_rate}")
+
+        self._engine = engine
+        self._slow_query_seconds = slow_query_seconds
+        self._sample_rate = sample_rate
+        self._local = threading.local()
+
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @property
+    def current(self) -> Optional[RequestQueries]:
+        """ The queries of the request being tracked on this thread, if any. """
+        return getattr(self._local, 'queries', None)
+
+    def start_request(self, endpoint: Optional[str]) -> Optional[RequestQueries]:
+        """ Starts tracking the statements run on this thread if this request is sampled. """
+        sampled = self._sample_rate >= 1 or random.random() < self._sample_rate
+        self._local.queries = RequestQueries(endpoint) if sampled else None
+        return self._local.queries
+
+    def finish_request(self) -> Optional[RequestQueries]:
+        """ Stops tracking the statements run on this thread and returns them, if the request was sampled. """
+        queries = self.current
+        self._local.queries = None
+        return queries
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.current is not None:
+            conn.info.setdefault('query_start_times', []).append(perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        queries = self.current
+        start_times = conn.info.get('query_start_times')
+
+        if queries is None or not start_times:
+            return
+
+        elapsed = perf_counter() - start_times.pop()
+        queries.count += 1
+        queries.seconds += elapsed
+
+        if elapsed >= self._slow_query_seconds:
+            plan = None if executemany else self._explain(conn, statement, parameters)
+            logger.warning('Slow query (%.1fms) from %s:\n%s\nParameters: %r\nPlan:\n%s', elapsed * 1000,
+                           queries.endpoint, statement, parameters, plan or 'unavailable')
+
+    def _explain(self, conn, statement: str, parameters) -> Optional[str]:
+        prefix = _EXPLAIN_PREFIXES.get(conn.dialect.name)
+
+        if prefix is None or not statement.lstrip().upper().startswith('SELECT'):
+            return None
+
+        # The DBAPI cursor is used directly so that explaining a statement doesn't trigger these events again
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+        except Exception:
+            logger.debug('Unable to explain statement', exc_info=True)
+            return None
+        finally:
+            cursor.close()
+
+    def init_app(self, app: Flask) -> None:
+        """ Tracks each of the app's requests, adding the number of statements and their duration as headers. """
+
+        @app.before_request
+        def start_tracking_queries():
+            self.start_request(request.endpoint)
+
+        @app.after_request
+        def add_query_headers(response):
+            queries = self.finish_request()
+
+            if queries is not None:
+                response.headers['X-DB-Queries'] = str(queries.count)
+                response.headers.add('Server-Timing', f'db;dur={queries.seconds * 1000:.2f};desc="{queries.count} '
+                                                      f'queries"')
+            return response
+
+        @app.teardown_request
+        def stop_tracking_queries(exception=None):
+            self.finish_request()
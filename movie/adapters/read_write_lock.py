@@ -0,0 +1,110 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+
+class ReadWriteLock:
+    """
+    A lock that any number of threads can hold for reading at once, or a single thread can hold for writing.
+
+    Threads waiting to write are let in ahead of threads that haven't started reading yet, so that a steady stream of
+    readers can't keep a writer waiting forever. A thread that holds the lock can acquire it again for reading, and a
+    writer can acquire it again for writing, but a reader can't go on to write, as two readers trying to do so at once
+    would wait for each other forever.
+    """
+
+    def __init__(self) -> None:
+        self._reset()
+
+    def _reset(self) -> None:
+        # Entered directly rather than through the condition, which is several times slower to enter
+        self._mutex = threading.Lock()
+        self._condition = threading.Condition(self._mutex)
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._write_depth = 0
+        self._writers_waiting = 0
+        self._readers_waiting = 0
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _check_pid(self) -> None:
+        if self._pid != os.getpid():
+            # Only the thread that forked the process is left in the child, e.g. a gunicorn worker, so any threads that
+            # held the lock at the time never release it
+            self._reset()
+
+    def acquire_read(self) -> None:
+        self._check_pid()
+        depth = getattr(self._local, 'depth', 0)
+
+        if depth == 0 and self._writer != threading.get_ident():
+            with self._mutex:
+                if self._writer is not None or self._writers_waiting:
+                    self._readers_waiting += 1
+                    try:
+                        while self._writer is not None or self._writers_waiting:
+                            self._condition.wait()
+                    finally:
+                        self._readers_waiting -= 1
+                self._readers += 1
+
+        self._local.depth = depth + 1
+
+    def release_read(self) -> None:
+        depth = self._local.depth - 1
+        self._local.depth = depth
+
+        if depth == 0 and self._writer != threading.get_ident():
+            with self._mutex:
+                self._readers -= 1
+                if self._readers == 0 and self._writers_waiting:
+                    self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        self._check_pid()
+        ident = threading.get_ident()
+
+        if self._writer == ident:
+            self._write_depth += 1
+            return
+
+        if getattr(self._local, 'depth', 0):
+            raise RuntimeError('a thread holding a lock for reading can\'t acquire it for writing')
+
+        with self._mutex:
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+
+            self._writer = ident
+            self._write_depth = 1
+
+    def release_write(self) -> None:
+        self._write_depth -= 1
+
+        if self._write_depth == 0:
+            with self._mutex:
+                self._writer = None
+                if self._writers_waiting or self._readers_waiting:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
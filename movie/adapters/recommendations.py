@@ -0,0 +1,372 @@
+import logging
+import os
+from threading import Thread, Event, Lock
+from time import perf_counter
+from typing import List, Dict, Hashable, NamedTuple, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from movie.adapters.repository import AbstractRepository
+
+logger = logging.getLogger(__name__)
+
+
+class Interaction(NamedTuple):
+    """ Everything a user has done with a movie. rating is None if the user hasn't reviewed the movie. """
+    user_id: Hashable
+    movie_id: Hashable
+    watchlisted: bool = False
+    watched: bool = False
+    rating: Optional[int] = None
+
+
+class Recommendations:
+    """ Precomputed top-N movie recommendations for each user. Lookups are a single dict access. """
+
+    def __init__(self,
+                 user_recommendations: Dict[Hashable, List[Hashable]],
+                 popular: List[Hashable],
+                 build_seconds: float = 0.0) -> None:
+        self._user_recommendations = user_recommendations
+        self._popular = popular
+        self._build_seconds = build_seconds
+
+    @property
+    def build_seconds(self) -> float:
+        return self._build_seconds
+
+    def __len__(self) -> int:
+        return len(self._user_recommendations)
+
+    def get(self, user_id: Hashable) -> List[Hashable]:
+        """
+        Returns the ids of the movies recommended for the user with the given id, best first. Users without any
+        history are recommended the most popular movies.
+        """
+        return self._user_recommendations.get(user_id, self._popular)
+
+
+class Recommender:
+    """
+    Item-item collaborative filtering.
+
+    Interactions are weighted and arranged into a sparse user x movie matrix X. The co-occurrence matrix X^T X is
+    normalised into the cosine similarity between every pair of movies, keeping only the number_of_neighbours most
+    similar movies to each movie. A user's score for a movie is then the sum of the similarities between it and every
+    movie they've interacted with, weighted by the strength of each interaction.
+
+    Both steps are done with NumPy a block of rows at a time, accumulating each block into a dense array so that memory
+    use stays bounded regardless of the number of users.
+    """
+
+    DEFAULT_NUMBER_OF_RECOMMENDATIONS = 10
+    DEFAULT_NUMBER_OF_NEIGHBOURS = 50
+
+    _WATCHLIST_WEIGHT = 1.0
+    _WATCHED_WEIGHT = 2.0
+    _MIN_WEIGHT = 0.1
+
+    # Maximum number of elements in any intermediate array created while building recommendations
+    _BLOCK_ELEMENTS = 1 << 22
+
+    def __init__(self,
+                 number_of_recommendations: int = DEFAULT_NUMBER_OF_RECOMMENDATIONS,
+                 number_of_neighbours: int = DEFAULT_NUMBER_OF_NEIGHBOURS) -> None:
+        if not isinstance(number_of_recommendations, int):
+            raise TypeError(f"'number_of_recommendations' must be of type 'int' but was "
+                            f"'{type(number_of_recommendations).__name__}'")
+
+        if not isinstance(number_of_neighbours, int):
+            raise TypeError(
+                f"'number_of_neighbours' must be of type 'int' but was '{type(number_of_neighbours).__name__}'")
+
+        if number_of_recommendations < 1:
+            raise ValueError("'number_of_recommendations' must be at least 1")
+
+        if number_of_neighbours < 1:
+            raise ValueError("'number_of_neighbours' must be at least 1")
+
+        self._n = number_of_recommendations
+        self._k = number_of_neighbours
+
+    @classmethod
+    def interaction_weight(cls, interaction: Interaction) -> float:
+        """
+        Returns how strongly the given interaction suggests the user likes the movie. Watching a movie counts for more
+        than adding it to a watchlist, and a review moves that up or down depending on its rating.
+        """
+        weight = 0.0
+
+        if interaction.watchlisted:
+            weight = cls._WATCHLIST_WEIGHT
+
+        if interaction.watched:
+            weight = cls._WATCHED_WEIGHT
+
+        # Reviewing a movie implies having watched it. Ratings range from 1 to 10, so a rating of 1 counts for less than
+        # adding a movie to a watchlist and a rating of 10 for twice as much as watching a movie.
+        if interaction.rating is not None:
+            weight = max(weight, cls._WATCHED_WEIGHT) + (interaction.rating - 5) / 2.5
+
+        return max(weight, cls._MIN_WEIGHT)
+
+    def build(self, interactions: List[Interaction]) -> Recommendations:
+        """ Returns Recommendations for every user in the given interactions. """
+        user_ids: Dict[Hashable, int] = {}
+        movie_ids: Dict[Hashable, int] = {}
+
+        rows = np.empty(len(interactions), dtype=np.int64)
+        columns = np.empty(len(interactions), dtype=np.int64)
+        weights = np.empty(len(interactions), dtype=np.float64)
+
+        for i, interaction in enumerate(interactions):
+            rows[i] = user_ids.setdefault(interaction.user_id, len(user_ids))
+            columns[i] = movie_ids.setdefault(interaction.movie_id, len(movie_ids))
+            weights[i] = self.interaction_weight(interaction)
+
+        return self.build_from_arrays(rows, columns, weights, list(user_ids), list(movie_ids))
+
+    @staticmethod
+    def _to_csr(rows: np.ndarray, num_rows: int, *values: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """ Sorts the given coordinate form values by row. Returns the row offsets followed by the sorted values. """
+        order = np.argsort(rows, kind='stable')
+        indptr = np.zeros(num_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_rows), out=indptr[1:])
+        return (indptr,) + tuple(value[order] for value in values)
+
+    @staticmethod
+    def _block_bounds(costs: np.ndarray, budget: int) -> List[Tuple[int, int]]:
+        """ Splits consecutive rows into blocks whose total cost is within the given budget (or a single row). """
+        cumulative = np.concatenate([[0], np.cumsum(costs)])
+        bounds = []
+        start = 0
+
+        while start < len(costs):
+            end = int(np.searchsorted(cumulative, cumulative[start] + budget, side='right')) - 1
+            end = min(max(end, start + 1), len(costs))
+            bounds.append((start, end))
+            start = end
+
+        return bounds
+
+    @staticmethod
+    def _expand(starts: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        For each i, generates the indices starts[i], ..., starts[i] + lengths[i] - 1. Returns the generated indices and
+        which i each was generated for.
+        """
+        owners = np.repeat(np.arange(len(starts)), lengths)
+        offsets = np.arange(len(owners)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return starts[owners] + offsets, owners
+
+    @staticmethod
+    def _top(scores: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds the n highest positive scores in each row of the given dense block, breaking ties by column. Returns their
+        rows, columns and scores ordered by row, descending score and then column.
+        """
+        if scores.shape[1] > n:
+            kth = -np.partition(-scores, n - 1, axis=1)[:, n - 1]
+            rows, columns = np.nonzero((scores >= kth[:, None]) & (scores > 0))
+        else:
+            rows, columns = np.nonzero(scores > 0)
+
+        values = scores[rows, columns]
+
+        # np.nonzero is ordered by row and then column, and np.lexsort is stable
+        order = np.lexsort((-values, rows))
+        rows, columns, values = rows[order], columns[order], values[order]
+
+        ranks = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        keep = ranks < n
+        return rows[keep], columns[keep], values[keep]
+
+    def _item_neighbours(self,
+                         indptr: np.ndarray,
+                         columns: np.ndarray,
+                         weights: np.ndarray,
+                         rows: np.ndarray,
+                         num_movies: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Returns the CSR representation (indptr, indices, data) of each movie's most similar movies. """
+        degrees = np.diff(indptr)
+        movie_indptr, movie_users, movie_weights = self._to_csr(columns, num_movies, rows, weights)
+        norms = np.sqrt(np.bincount(columns, weights=weights * weights, minlength=num_movies))
+
+        # Each row of a block is the co-occurrence of one movie with every other movie, found by following each of its
+        # users to every movie they've interacted with
+        costs = np.bincount(columns, weights=degrees[rows], minlength=num_movies).astype(np.int64) + num_movies
+
+        item_indptr = np.zeros(num_movies + 1, dtype=np.int64)
+        neighbours = []
+        similarities = []
+
+        for start, end in self._block_bounds(costs, self._BLOCK_ELEMENTS):
+            lo, hi = movie_indptr[start], movie_indptr[end]
+            users = movie_users[lo:hi]
+            owners = np.repeat(np.arange(end - start), np.diff(movie_indptr[start:end + 1]))
+
+            partners, entries = self._expand(indptr[users], degrees[users])
+            keys = owners[entries] * num_movies + columns[partners]
+            block = np.bincount(keys, weights=movie_weights[lo:hi][entries] * weights[partners],
+                                minlength=(end - start) * num_movies).reshape(end - start, num_movies)
+
+            # A movie isn't its own neighbour
+            block[np.arange(end - start), np.arange(start, end)] = 0
+
+            # Co-occurrences are only non-zero where both movies have a non-zero norm
+            block /= np.maximum(norms[start:end, None] * norms[None, :], np.finfo(np.float64).tiny)
+
+            top_rows, top_columns, top_scores = self._top(block, self._k)
+            item_indptr[start + 1:end + 1] = np.bincount(top_rows, minlength=end - start)
+            neighbours.append(top_columns)
+            similarities.append(top_scores)
+
+        np.cumsum(item_indptr, out=item_indptr)
+
+        if not neighbours:
+            return item_indptr, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        return item_indptr, np.concatenate(neighbours), np.concatenate(similarities)
+
+    def build_from_arrays(self,
+                          rows: np.ndarray,
+                          columns: np.ndarray,
+                          weights: np.ndarray,
+                          user_ids: List[Hashable],
+                          movie_ids: List[Hashable]) -> Recommendations:
+        """
+        Returns Recommendations built from a user x movie matrix given in coordinate form, i.e. user_ids[rows[i]] has
+        interacted with movie_ids[columns[i]] with a weight of weights[i]. Each (row, column) pair must be unique.
+        """
+        start_time = perf_counter()
+        num_users, num_movies = len(user_ids), len(movie_ids)
+
+        rows, columns, weights = np.asarray(rows), np.asarray(columns), np.asarray(weights, dtype=np.float64)
+        indptr, columns, weights, rows = self._to_csr(rows, num_users, columns, weights, rows)
+
+        popularity = np.bincount(columns, minlength=num_movies)
+        popular = np.argsort(-popularity, kind='stable')[:self._n]
+        popular = popular[popularity[popular] > 0].tolist()
+
+        item_indptr, item_neighbours, item_similarities = self._item_neighbours(indptr, columns, weights, rows,
+                                                                                num_movies)
+        item_degrees = np.diff(item_indptr)
+
+        # Each row of a block is a user's score for every movie, found by following each movie they've interacted with
+        # to its neighbours
+        costs = np.bincount(rows, weights=item_degrees[columns], minlength=num_users).astype(np.int64) + num_movies
+
+        user_recommendations: Dict[Hashable, List[Hashable]] = {}
+
+        for start, end in self._block_bounds(costs, self._BLOCK_ELEMENTS):
+            lo, hi = indptr[start], indptr[end]
+            block_rows = rows[lo:hi] - start
+            block_columns = columns[lo:hi]
+
+            candidates, entries = self._expand(item_indptr[block_columns], item_degrees[block_columns])
+            keys = block_rows[entries] * num_movies + item_neighbours[candidates]
+            block = np.bincount(keys, weights=weights[lo:hi][entries] * item_similarities[candidates],
+                                minlength=(end - start) * num_movies).reshape(end - start, num_movies)
+
+            # Don't recommend movies a user has already interacted with
+            block[block_rows, block_columns] = 0
+
+            top_rows, top_columns, _ = self._top(block, self._n)
+            top_indptr = np.searchsorted(top_rows, np.arange(end - start + 1))
+            top_columns = top_columns.tolist()
+
+            for i in range(end - start):
+                if indptr[start + i] == indptr[start + i + 1]:
+                    continue
+
+                movies = top_columns[top_indptr[i]:top_indptr[i + 1]]
+
+                # Users who have only interacted with movies no one else has are recommended popular movies instead
+                if not movies:
+                    seen = set(columns[indptr[start + i]:indptr[start + i + 1]].tolist())
+                    movies = [movie for movie in popular if movie not in seen]
+
+                user_recommendations[user_ids[start + i]] = [movie_ids[movie] for movie in movies]
+
+        return Recommendations(user_recommendations,
+                               [movie_ids[movie] for movie in popular],
+                               perf_counter() - start_time)
+
+
+class RecommendationJob:
+    """
+    Periodically rebuilds Recommendations from a repository's interactions on a background thread. Requests are served
+    from the last completed build, which is replaced in a single assignment once a new build finishes.
+    """
+
+    def __init__(self,
+                 repo: 'AbstractRepository',
+                 interval_seconds: float,
+                 recommender: Recommender = None) -> None:
+        self._repo = repo
+        self._interval_seconds = interval_seconds
+        self._recommender = recommender or Recommender()
+        self._recommendations = Recommendations({}, [])
+        self._refresh_lock = Lock()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        self._registered_fork_handler = False
+
+    @property
+    def recommendations(self) -> Recommendations:
+        return self._recommendations
+
+    def refresh(self) -> Recommendations:
+        """ Rebuilds recommendations from the repository now and returns them. """
+        with self._refresh_lock:
+            recommendations = self._recommender.build(self._repo.get_user_movie_interactions())
+            self._recommendations = recommendations
+
+        logger.info(f'Built recommendations for {len(recommendations)} users in {recommendations.build_seconds:.3f}s')
+        return recommendations
+
+    def _run(self, wait_first: bool = False) -> None:
+        if wait_first:
+            self._stopped.wait(self._interval_seconds)
+
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Failed to build recommendations')
+
+            self._stopped.wait(self._interval_seconds)
+
+    def start(self) -> None:
+        """ Starts rebuilding recommendations in the background. Does nothing if this job has already been started. """
+        if self._thread is not None:
+            return
+
+        if not self._registered_fork_handler:
+            os.register_at_fork(after_in_child=self._restart_in_child)
+            self._registered_fork_handler = True
+
+        self._start_thread()
+
+    def _start_thread(self, wait_first: bool = False) -> None:
+        self._thread = Thread(target=self._run, args=(wait_first,), name='recommendations', daemon=True)
+        self._thread.start()
+
+    def _restart_in_child(self) -> None:
+        # Threads don't survive a fork, e.g. into gunicorn workers when the app is preloaded. The lock is replaced in
+        # case a build was running at the time, and the child keeps the parent's recommendations until its first build
+        was_running = self._thread is not None and not self._stopped.is_set()
+        self._refresh_lock = Lock()
+        self._thread = None
+
+        if was_running:
+            self._start_thread(wait_first=True)
+
+    def stop(self) -> None:
+        """ Stops rebuilding recommendations in the background. """
+        self._stopped.set()
+
+    def get_recommendations(self, user_id: Hashable) -> List[Hashable]:
+        """ Returns the ids of the movies recommended for the user with the given id, best first. """
+        return self._recommendations.get(user_id)
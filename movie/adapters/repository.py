@@ -4,18 +4,26 @@ from typing import List, Union, Dict, Optional
 from werkzeug.security import generate_password_hash
 
 from movie.activitysimulations.movie_watching_simulation import MovieWatchingSimulation
+from movie.adapters.recommendations import Interaction
 from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
 from movie.domain.actor import Actor
+from movie.domain.actor_graph import ActorPath
 from movie.domain.director import Director
 from movie.domain.genre import Genre
 from movie.domain.movie import Movie
 from movie.domain.review import Review
+from movie.domain.review_summary import ReviewSummary
 from movie.domain.user import User
 
 
 class AbstractRepository(abc.ABC):
     DEFAULT_PAGE_SIZE = 25
 
+    # Orders get_movies can return movies in
+    SORT_BY_TITLE = 'title'
+    SORT_BY_COMMUNITY_RATING = 'community_rating'
+    SORT_OPTIONS = (SORT_BY_TITLE, SORT_BY_COMMUNITY_RATING)
+
     @abc.abstractmethod
     def add_movie(self, movie: Movie) -> None:
         """ Adds the given Movie to this repository. Does nothing if the given movie has already been added. """
@@ -85,6 +93,14 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_actor_path(self, actor: Actor, other: Actor) -> Optional[ActorPath]:
+        """
+        Returns the shortest chain of movies linking the two given actors, where each movie in the chain has an actor in
+        common with the next. Returns None if the actors aren't connected.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_user(self, user: User) -> None:
         """ Adds the given user to this repository. If the user is already in this repository it won't be added. """
@@ -189,6 +205,24 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_review_ids_for_movie(self, movie: Movie) -> List[int]:
+        """ Returns the ids of every Review for the given Movie in the order that get_reviews_for_movie returns them. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_reviews_by_id(self, review_ids: List[int]) -> List[Review]:
+        """ Returns the reviews with the given ids in the given order, leaving out any that have since been removed. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_review_summary(self, movie: Movie) -> ReviewSummary:
+        """
+        Returns the number of reviews for the given movie, their total rating and how many reviews gave each rating.
+        These are maintained as reviews are added and removed rather than computed from every review.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_number_of_movies(self,
                              query: str = "",
@@ -222,7 +256,8 @@ class AbstractRepository(abc.ABC):
                                query: str = "",
                                genres: List[Genre] = [],
                                directors: List[Director] = [],
-                               actors: List[Actor] = []) -> List[Movie]:
+                               actors: List[Actor] = [],
+                               sort_by: str = SORT_BY_TITLE) -> List[Movie]:
 
         if not isinstance(page_number, int):
             raise TypeError(f"'page_number' must be of type 'int' but was '{type(page_number).__name__}'")
@@ -242,6 +277,9 @@ class AbstractRepository(abc.ABC):
         if not isinstance(actors, list) or any(not isinstance(actors, Actor) for actors in actors):
             raise TypeError(f"'actors' must be of type 'List[Actor]' but was '{type(genres).__name__}'")
 
+        if sort_by not in AbstractRepository.SORT_OPTIONS:
+            raise ValueError(f"'sort_by' must be one of {AbstractRepository.SORT_OPTIONS} but was {repr(sort_by)}")
+
         if page_number < 0:
             raise ValueError(f"'page_number' must be at least zero but was {page_number}")
 
@@ -255,7 +293,8 @@ class AbstractRepository(abc.ABC):
                    query: str = "",
                    genres: List[Genre] = [],
                    directors: List[Director] = [],
-                   actors: List[Actor] = []) -> List[Movie]:
+                   actors: List[Actor] = [],
+                   sort_by: str = SORT_BY_TITLE) -> List[Movie]:
         """
         Returns a list containing the nth page of Movies in this repository ordered by title and then release date.
 
@@ -269,6 +308,21 @@ class AbstractRepository(abc.ABC):
                 specified directors for it to be included in the results.
             actors (List[Actor], optional): actors to filter movies by. A movie must have all of the specified actors
                 for it to be included in the results.
+            sort_by (str, optional): one of SORT_OPTIONS. If SORT_BY_COMMUNITY_RATING, movies are ordered by their
+                average review rating (highest first, then by number of reviews) with unreviewed movies last.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_movie_ids(self,
+                      query: str = "",
+                      genres: List[Genre] = [],
+                      directors: List[Director] = [],
+                      actors: List[Actor] = [],
+                      sort_by: str = SORT_BY_TITLE) -> List[int]:
+        """
+        Returns the ids of every Movie that meets the given filters in the order that get_movies returns them. Check
+        'get_movies' for documentation on filtering options.
         """
         raise NotImplementedError
 
@@ -308,6 +362,27 @@ class AbstractRepository(abc.ABC):
          """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_movies_by_id(self, movie_ids: List[int]) -> List[Movie]:
+        """ Returns the movies with the given ids in the given order, leaving out any that aren't in this repository. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_similar_movies(self, movie: Movie) -> List[Movie]:
+        """
+        Returns the movies most similar to the given movie based on their genres, director, actors and description,
+        most similar first. These are precomputed as movies are added.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_user_movie_interactions(self) -> List[Interaction]:
+        """
+        Returns every (user, movie) pair where the user has watched, watchlisted or reviewed the movie, identified by
+        their ids. If a user has reviewed a movie more than once then their most recent rating is used.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_genres(self) -> List[Genre]:
         """ Returns a list containing all genres in this repository ordered by each genres name. """
@@ -332,22 +407,40 @@ class AbstractRepository(abc.ABC):
         return f'<{type(self).__name__}>'
 
 
+# Movies read from the data file and added to a repository at a time when populating it
+POPULATE_BATCH_SIZE = 10_000
+
+
+def populate_catalog(repo: AbstractRepository,
+                     data_path: str,
+                     max_num_lines: int = None,
+                     batch_size: int = POPULATE_BATCH_SIZE) -> List[Movie]:
+    """
+    Adds the movies in the data at the given path to the given repository, with their genres, directors and actors.
+    Movies are added batch_size at a time as the file is read, so that no more than a batch of them is held in memory
+    besides those the repository keeps.
+    """
+    reader = MovieFileCSVReader(data_path)
+    movies: List[Movie] = []
+
+    # A movie's genres, director and actors are added along with it
+    for batch in reader.iter_batches(batch_size, max_num_lines):
+        repo.add_movies(batch)
+        movies += batch
+
+    return movies
+
+
 def populate(repo: AbstractRepository,
              data_path: str,
              seed: Optional[int] = None,
              simulate_activity: bool = True,
              max_num_lines: int = None):
     """ Populates the given repository using data at the given path. """
-    reader = MovieFileCSVReader(data_path)
-    reader.read_csv_file(max_num_lines=max_num_lines)
-
-    repo.add_genres(reader.dataset_of_genres)
-    repo.add_directors(reader.dataset_of_directors)
-    repo.add_actors(reader.dataset_of_actors)
-    repo.add_movies(reader.dataset_of_movies)
+    movies = populate_catalog(repo, data_path, max_num_lines)
 
     if simulate_activity:
-        sim = MovieWatchingSimulation(reader.dataset_of_movies, seed)
+        sim = MovieWatchingSimulation(movies, seed)
         state = sim.simulate(num_users=50, min_num_movies=10, max_num_movies=20)
 
         repo.add_users(state.users)
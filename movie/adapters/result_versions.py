@@ -0,0 +1,108 @@
+import secrets
+from collections import OrderedDict, deque
+from threading import Lock
+from time import monotonic
+from typing import Callable, Hashable, NamedTuple, Optional, Sequence, Tuple
+
+
+class _Version(NamedTuple):
+    key: Hashable
+    ids: Tuple[int, ...]
+    created: float
+
+
+class PinnedResults(NamedTuple):
+    version: str
+    ids: Tuple[int, ...]
+
+
+class ResultVersions:
+    """
+    Immutable snapshots of the ordered ids a query returned, so that the later pages of a set of results come from the
+    same list as its first page even if movies or reviews are added or removed in between, rather than shifting.
+
+    Each snapshot is identified by a version id that's handed out with its first page and passed back for the rest.
+    Snapshots are dropped once they're older than max_age_seconds, and the least recently used are dropped first
+    once together they hold more than max_ids ids. A version id that's been dropped, or that was pinned for a
+    different query, is treated as if none was given.
+    """
+
+    def __init__(self, max_age_seconds: float = 1800, max_ids: int = 1_000_000,
+                 clock: Callable[[], float] = monotonic) -> None:
+        if max_age_seconds <= 0:
+            raise ValueError(f"'max_age_seconds' must be greater than zero but was {max_age_seconds}")
+
+        if max_ids < 0:
+            raise ValueError(f"'max_ids' must be at least zero but was {max_ids}")
+
+        self._max_age_seconds = max_age_seconds
+        self._max_ids = max_ids
+        self._clock = clock
+        self._versions: 'OrderedDict[str, _Version]' = OrderedDict()
+        self._created: 'deque[Tuple[float, str]]' = deque()
+        self._number_of_ids = 0
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    @property
+    def number_of_ids(self) -> int:
+        """ The number of ids held across every snapshot. """
+        return self._number_of_ids
+
+    def pin(self, key: Hashable, ids: Sequence[int]) -> str:
+        """ Keeps the given ids as the results of the query identified by key and returns their version id. """
+        version = _Version(key, tuple(ids), self._clock())
+        version_id = secrets.token_urlsafe(8)
+
+        with self._lock:
+            self._versions[version_id] = version
+            self._created.append((version.created, version_id))
+            self._number_of_ids += len(version.ids)
+            self._evict(version.created)
+
+        return version_id
+
+    def get(self, version_id: Optional[str], key: Hashable) -> Optional[Tuple[int, ...]]:
+        """ Returns the ids pinned under the given version id for the given query, or None if there aren't any. """
+        if not version_id:
+            return None
+
+        with self._lock:
+            self._evict(self._clock())
+            version = self._versions.get(version_id)
+
+            if version is None or version.key != key:
+                return None
+
+            self._versions.move_to_end(version_id)
+            return version.ids
+
+    def get_or_pin(self, version_id: Optional[str], key: Hashable,
+                   get_ids: Callable[[], Sequence[int]]) -> PinnedResults:
+        """
+        Returns the ids pinned under the given version id for the given query, or pins the ids returned by get_ids
+        under a new version id if there aren't any.
+        """
+        ids = self.get(version_id, key)
+
+        if ids is not None:
+            return PinnedResults(version_id, ids)
+
+        ids = tuple(get_ids())
+        return PinnedResults(self.pin(key, ids), ids)
+
+    def _evict(self, now: float) -> None:
+        # Versions are kept in order of when they were last used, and separately in order of when they were created
+        while self._created and now - self._created[0][0] >= self._max_age_seconds:
+            _, version_id = self._created.popleft()
+            if version_id in self._versions:
+                self._remove(version_id)
+
+        while self._number_of_ids > self._max_ids and len(self._versions) > 1:
+            self._remove(next(iter(self._versions)))
+
+    def _remove(self, version_id: str) -> None:
+        version = self._versions.pop(version_id)
+        self._number_of_ids -= len(version.ids)
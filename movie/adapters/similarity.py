@@ -0,0 +1,315 @@
+import re
+from typing import List, Dict, Hashable, Iterable, Set, Tuple
+
+import numpy as np
+
+from movie.domain.movie import Movie
+
+
+class MovieSimilarityIndex:
+    """
+    Precomputed content based nearest neighbours between movies.
+
+    Each movie is encoded as a sparse feature vector of its genres, director, actors and the words in its description,
+    weighted by inverse document frequency. The cosine similarity between every pair of movies is computed in blocks
+    with NumPy so that memory use stays bounded regardless of the number of movies, and only the top
+    number_of_neighbours movies for each movie are kept.
+
+    Movies are identified by a key, which is the movie itself unless otherwise specified (e.g. a repository can use
+    database ids). Added movies are pending until update is called, which computes their neighbours and updates the
+    neighbours of any existing movie they're more similar to.
+    """
+
+    DEFAULT_NUMBER_OF_NEIGHBOURS = 10
+
+    # Maximum number of float32 elements in any intermediate array created while computing similarities
+    _BLOCK_ELEMENTS = 1 << 22
+
+    _FEATURE_WEIGHTS = {
+        'genre': 1.0,
+        'director': 1.0,
+        'actor': 1.0,
+        'word': 0.5
+    }
+
+    _WORD_PATTERN = re.compile(r"[a-z0-9']+")
+    _STOP_WORDS = frozenset([
+        'the', 'and', 'for', 'with', 'his', 'her', 'their', 'from', 'into', 'that', 'this', 'who', 'when', 'after',
+        'are', 'has', 'have', 'was', 'were', 'its', 'they', 'them', 'him', 'she', 'one', 'two', 'must', 'while', 'but',
+        'out', 'about', 'where', 'which', 'what', 'will', 'can', 'all', 'not', 'other', 'only', 'over', 'more'
+    ])
+
+    def __init__(self, number_of_neighbours: int = DEFAULT_NUMBER_OF_NEIGHBOURS) -> None:
+        if not isinstance(number_of_neighbours, int):
+            raise TypeError(
+                f"'number_of_neighbours' must be of type 'int' but was '{type(number_of_neighbours).__name__}'")
+
+        if number_of_neighbours < 1:
+            raise ValueError("'number_of_neighbours' must be at least 1")
+
+        self._k = number_of_neighbours
+
+        self._keys: List[Hashable] = []
+        self._positions: Dict[Hashable, int] = {}
+
+        # Feature ids of each movie and the number of movies with each feature
+        self._vocabulary: Dict[Tuple[str, str], int] = {}
+        self._feature_types: List[str] = []
+        self._features: List[np.ndarray] = []
+        self._document_frequencies: List[int] = []
+
+        # Positions and scores of each movie's neighbours, most similar first
+        self._neighbours: List[np.ndarray] = []
+        self._scores: List[np.ndarray] = []
+
+        # Positions of movies whose neighbours haven't been computed, used as an ordered set
+        self._pending: Dict[int, None] = {}
+
+    @property
+    def number_of_neighbours(self) -> int:
+        return self._k
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._positions
+
+    @property
+    def keys(self) -> List[Hashable]:
+        """ Keys of every movie in this index, in the order they were added. """
+        return list(self._keys)
+
+    @property
+    def pending(self) -> List[Hashable]:
+        """ Keys of movies that have been added but don't have their neighbours computed yet. """
+        return [self._keys[position] for position in self._pending]
+
+    @classmethod
+    def _tokenize(cls, description: str) -> Set[str]:
+        words = cls._WORD_PATTERN.findall(description.lower())
+        return {word for word in words if len(word) > 2 and word not in cls._STOP_WORDS}
+
+    @classmethod
+    def _extract_features(cls, movie: Movie) -> Set[Tuple[str, str]]:
+        features = set()
+
+        for genre in movie.genres or []:
+            features.add(('genre', genre.genre_name))
+
+        if movie.director:
+            features.add(('director', movie.director.director_full_name))
+
+        for actor in movie.actors or []:
+            features.add(('actor', actor.actor_full_name))
+
+        if movie.description:
+            features.update(('word', word) for word in cls._tokenize(movie.description))
+
+        return features
+
+    def _get_feature_id(self, feature: Tuple[str, str]) -> int:
+        try:
+            feature_id = self._vocabulary[feature]
+        except KeyError:
+            feature_id = len(self._feature_types)
+            self._vocabulary[feature] = feature_id
+            self._feature_types.append(feature[0])
+            self._document_frequencies.append(0)
+
+        self._document_frequencies[feature_id] += 1
+        return feature_id
+
+    def add_movie(self, movie: Movie, key: Hashable = None) -> None:
+        """ Adds the given movie to this index. Does nothing if a movie with the same key has already been added. """
+        if not isinstance(movie, Movie):
+            raise TypeError(f"'movie' must be of type 'Movie' but was '{type(movie).__name__}'")
+
+        key = movie if key is None else key
+
+        if key in self._positions:
+            return
+
+        position = len(self._keys)
+        self._keys.append(key)
+        self._positions[key] = position
+
+        feature_ids = sorted(self._get_feature_id(feature) for feature in self._extract_features(movie))
+        self._features.append(np.array(feature_ids, dtype=np.int64))
+        self._neighbours.append(np.empty(0, dtype=np.int64))
+        self._scores.append(np.empty(0, dtype=np.float32))
+        self._pending[position] = None
+
+    def add_movies(self, movies: Iterable[Movie]) -> None:
+        """ Adds the given movies to this index. """
+        for movie in movies:
+            self.add_movie(movie)
+
+    def set_neighbours(self, key: Hashable, neighbours: List[Tuple[Hashable, float]]) -> None:
+        """
+        Sets the neighbours of the movie with the given key to the given (key, score) pairs, e.g. when restoring
+        neighbours that were computed previously. The movie is no longer considered to be pending.
+        """
+        position = self._positions[key]
+        neighbours = neighbours[:self._k]
+
+        self._neighbours[position] = np.array([self._positions[other] for other, _ in neighbours], dtype=np.int64)
+        self._scores[position] = np.array([score for _, score in neighbours], dtype=np.float32)
+
+        self._pending.pop(position, None)
+
+    def _build_matrix(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Returns the CSR representation (indptr, indices, data) of the L2 normalised tf-idf matrix. """
+        lengths = np.array([len(features) for features in self._features], dtype=np.int64)
+        indptr = np.zeros(len(self._features) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+
+        if indptr[-1] == 0:
+            return indptr, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        indices = np.concatenate(self._features)
+
+        type_weights = np.array([self._FEATURE_WEIGHTS[feature_type] for feature_type in self._feature_types],
+                                dtype=np.float32)
+        frequencies = np.array(self._document_frequencies, dtype=np.float32)
+        weights = type_weights * (np.log((1 + len(self._keys)) / (1 + frequencies)) + 1)
+
+        data = weights[indices]
+
+        # Normalise each row, taking care as np.add.reduceat doesn't handle empty rows
+        squared = np.append(data * data, np.float32(0))
+        norms = np.sqrt(np.add.reduceat(squared, np.minimum(indptr[:-1], len(data))))
+        norms[lengths == 0] = 1
+        data /= np.repeat(norms, lengths).astype(np.float32)
+
+        return indptr, indices, data
+
+    def _similarities(self,
+                      block: np.ndarray,
+                      indptr: np.ndarray,
+                      indices: np.ndarray,
+                      data: np.ndarray,
+                      start: int,
+                      end: int) -> np.ndarray:
+        """ Returns the cosine similarity between the dense block of rows and the rows start to end of the matrix. """
+        lo, hi = indptr[start], indptr[end]
+        products = block[:, indices[lo:hi]] * data[lo:hi]
+        products = np.append(products, np.zeros((len(block), 1), dtype=np.float32), axis=1)
+
+        offsets = np.minimum(indptr[start:end] - lo, hi - lo)
+        scores = np.add.reduceat(products, offsets, axis=1)
+        scores[:, indptr[start + 1:end + 1] == indptr[start:end]] = 0
+        return scores
+
+    def update(self) -> Set[Hashable]:
+        """
+        Computes the neighbours of every pending movie and updates the neighbours of existing movies that are more
+        similar to a pending movie than to their current neighbours.
+
+        Returns:
+            The keys of all movies whose neighbours changed.
+        """
+        if not self._pending:
+            return set()
+
+        pending = np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))
+        is_pending = np.zeros(len(self._keys), dtype=bool)
+        is_pending[pending] = True
+
+        indptr, indices, data = self._build_matrix()
+        num_movies = len(self._keys)
+        num_features = len(self._feature_types)
+        k = self._k
+
+        # Score a neighbour must beat to replace an existing movie's least similar neighbour
+        thresholds = np.zeros(num_movies, dtype=np.float32)
+        for position in range(num_movies):
+            if len(self._scores[position]) >= k:
+                thresholds[position] = self._scores[position][-1]
+
+        reverse: Dict[int, List[Tuple[float, int]]] = {}
+        block_size = max(1, min(len(pending), self._BLOCK_ELEMENTS // max(1, num_features)))
+
+        for block_start in range(0, len(pending), block_size):
+            rows = pending[block_start:block_start + block_size]
+
+            block = np.zeros((len(rows), num_features), dtype=np.float32)
+            for i, row in enumerate(rows):
+                block[i, indices[indptr[row]:indptr[row + 1]]] = data[indptr[row]:indptr[row + 1]]
+
+            best_scores = np.full((len(rows), 0), -np.inf, dtype=np.float32)
+            best_positions = np.empty((len(rows), 0), dtype=np.int64)
+
+            # Split the columns so that the products for each chunk fit within the block budget
+            budget = self._BLOCK_ELEMENTS // len(rows)
+            column_start = 0
+            while column_start < num_movies:
+                column_end = int(np.searchsorted(indptr, indptr[column_start] + budget, side='right')) - 1
+                column_end = min(max(column_end, column_start + 1), num_movies)
+
+                scores = self._similarities(block, indptr, indices, data, column_start, column_end)
+                columns = np.arange(column_start, column_end, dtype=np.int64)
+
+                # A movie isn't its own neighbour
+                scores[rows[:, None] == columns[None, :]] = -np.inf
+
+                # Existing movies may gain a pending movie as a neighbour
+                candidates = (scores > thresholds[column_start:column_end]) & (scores > 0) & \
+                             ~is_pending[column_start:column_end]
+                for i, j in zip(*np.nonzero(candidates)):
+                    reverse.setdefault(column_start + j, []).append((float(scores[i, j]), int(rows[i])))
+
+                # Keep the k best columns seen so far for each row
+                merged_scores = np.concatenate([best_scores, scores], axis=1)
+                merged_positions = np.concatenate(
+                    [best_positions, np.broadcast_to(columns, (len(rows), len(columns)))], axis=1)
+
+                if merged_scores.shape[1] > k:
+                    top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+                    merged_scores = np.take_along_axis(merged_scores, top, axis=1)
+                    merged_positions = np.take_along_axis(merged_positions, top, axis=1)
+
+                best_scores, best_positions = merged_scores, merged_positions
+                column_start = column_end
+
+            order = np.argsort(-best_scores, axis=1, kind='stable')
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            best_positions = np.take_along_axis(best_positions, order, axis=1)
+
+            for i, row in enumerate(rows):
+                keep = best_scores[i] > 0
+                self._neighbours[row] = best_positions[i][keep].copy()
+                self._scores[row] = best_scores[i][keep].copy()
+
+        for position, candidates in reverse.items():
+            merged = list(zip(self._scores[position].tolist(), self._neighbours[position].tolist())) + candidates
+            merged.sort(key=lambda pair: (-pair[0], pair[1]))
+            merged = merged[:k]
+            self._scores[position] = np.array([score for score, _ in merged], dtype=np.float32)
+            self._neighbours[position] = np.array([neighbour for _, neighbour in merged], dtype=np.int64)
+
+        changed = {self._keys[position] for position in self._pending}
+        changed.update(self._keys[position] for position in reverse)
+        self._pending = {}
+
+        return changed
+
+    def get_neighbours(self, key: Hashable) -> List[Hashable]:
+        """
+        Returns the keys of the movies most similar to the movie with the given key, most similar first. Returns an
+        empty list if there is no movie with the given key.
+        """
+        try:
+            position = self._positions[key]
+        except KeyError:
+            return []
+        return [self._keys[neighbour] for neighbour in self._neighbours[position]]
+
+    def get_neighbour_scores(self, key: Hashable) -> List[Tuple[Hashable, float]]:
+        """ Returns (key, score) pairs for the movies most similar to the movie with the given key. """
+        try:
+            position = self._positions[key]
+        except KeyError:
+            return []
+        return [(self._keys[neighbour], float(score))
+                for neighbour, score in zip(self._neighbours[position], self._scores[position])]
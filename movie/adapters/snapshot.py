@@ -0,0 +1,217 @@
+import atexit
+import hashlib
+import io
+import logging
+import os
+import pickle
+import struct
+import zlib
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Iterable, List, NamedTuple, Optional
+
+from movie.adapters.memory_repository import MemoryRepository
+from movie.adapters.operation_log import LogPosition, OperationLog
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'MMLSNAP\n'
+
+# Changed whenever MemoryRepository.export_state changes, so that snapshots saved by older releases aren't misread
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('>8sH')
+
+
+class RepositorySnapshot(NamedTuple):
+    repo: MemoryRepository
+    log_positions: List[LogPosition]
+
+
+class _StateUnpickler(pickle.Unpickler):
+    """ Only loads the plain strings, numbers and containers that a repository's state is made of. """
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"snapshots can't contain '{module}.{name}'")
+
+
+def catalog_fingerprint(data_path: str, seed: Optional[int], simulate_activity: bool,
+                        max_num_lines: Optional[int]) -> str:
+    """ Identifies the contents of a repository populated with the given arguments before any users change it. """
+    digest = hashlib.sha1(f'{seed}:{simulate_activity}:{max_num_lines}:'.encode())
+
+    with open(data_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def save_snapshot(repo: MemoryRepository,
+                  file_name: str,
+                  fingerprint: str,
+                  log_positions: Iterable[LogPosition] = ()) -> int:
+    """
+    Writes everything in the given repository to a file, replacing it in a single step so that the file is never left
+    incomplete, and returns its size in bytes. The fingerprint identifies what the repository was populated from, and
+    the log positions are how far into its operation log the repository is.
+    """
+    data = pickle.dumps({
+        'fingerprint': fingerprint,
+        'log_positions': [tuple(position) for position in log_positions],
+        'state': repo.export_state()
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    temporary_name = f'{file_name}.{os.getpid()}.tmp'
+    with open(temporary_name, 'wb') as file:
+        file.write(_HEADER.pack(_MAGIC, FORMAT_VERSION))
+        file.write(zlib.compress(data, 1))
+        file.flush()
+        os.fsync(file.fileno())
+        size = file.tell()
+
+    os.replace(temporary_name, file_name)
+    return size
+
+
+def load_snapshot(file_name: str, fingerprint: str) -> Optional[RepositorySnapshot]:
+    """
+    Returns the repository saved to the given file, or None if there isn't one or it was saved from a different
+    catalog or by a release with a different format.
+
+    Raises:
+        ValueError: the file isn't a snapshot or is corrupt
+    """
+    try:
+        with open(file_name, 'rb') as file:
+            data = file.read()
+    except FileNotFoundError:
+        return None
+
+    magic, version = _HEADER.unpack_from(data) if len(data) >= _HEADER.size else (None, None)
+
+    if magic != _MAGIC:
+        raise ValueError(f"'{file_name}' isn't a repository snapshot")
+
+    if version != FORMAT_VERSION:
+        logger.warning('Ignoring %s as it was saved in format %d rather than %d', file_name, version, FORMAT_VERSION)
+        return None
+
+    try:
+        snapshot = _StateUnpickler(io.BytesIO(zlib.decompress(data[_HEADER.size:]))).load()
+    except (zlib.error, pickle.UnpicklingError, EOFError) as e:
+        raise ValueError(f"'{file_name}' is corrupt: {e}")
+
+    if snapshot['fingerprint'] != fingerprint:
+        logger.warning('Ignoring %s as it was saved from a different catalog', file_name)
+        return None
+
+    return RepositorySnapshot(MemoryRepository.from_state(snapshot['state']),
+                              [LogPosition(*position) for position in snapshot['log_positions']])
+
+
+class SnapshotJob:
+    """
+    Saves snapshots of a repository every interval_seconds on a background thread, and when the process exits, if
+    any changes have been made to it since the last snapshot. Each snapshot compacts the repository's operation log,
+    which holds the changes made since, so that starting from the snapshot only has to replay a short log.
+    """
+
+    def __init__(self,
+                 repo: MemoryRepository,
+                 log: OperationLog,
+                 file_name: str,
+                 fingerprint: str,
+                 interval_seconds: float) -> None:
+        self._repo = repo
+        self._log = log
+        self._file_name = file_name
+        self._fingerprint = fingerprint
+        self._interval_seconds = interval_seconds
+        self._save_lock = Lock()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        self._registered_handlers = False
+
+    @property
+    def fingerprint(self) -> str:
+        return self._fingerprint
+
+    @fingerprint.setter
+    def fingerprint(self, fingerprint: str) -> None:
+        """ Sets what later snapshots are identified as having been populated from, e.g. after reloading the catalog. """
+        self._fingerprint = fingerprint
+
+    def save(self, force: bool = False) -> bool:
+        """
+        Saves a snapshot and compacts the operation log, unless nothing has changed since it was last compacted and
+        force is False. Returns whether a snapshot was saved.
+        """
+        with self._save_lock:
+            if not force and not self._log.has_changes():
+                return False
+
+            start = perf_counter()
+            sizes = []
+
+            def checkpoint(positions: List[LogPosition]) -> None:
+                sizes.append(save_snapshot(self._repo, self._file_name, self._fingerprint, positions))
+
+            self._log.compact(checkpoint)
+
+        logger.info(f'Saved a {sizes[0]} byte snapshot to {self._file_name} in {perf_counter() - start:.3f}s')
+        return True
+
+    def _run(self) -> None:
+        # The repository was either just loaded from a snapshot or has one saved after populating it
+        self._stopped.wait(self._interval_seconds)
+
+        while not self._stopped.is_set():
+            try:
+                self.save()
+            except Exception:
+                logger.exception('Failed to save a snapshot')
+
+            self._stopped.wait(self._interval_seconds)
+
+    def _save_on_exit(self) -> None:
+        try:
+            self.save()
+        except Exception:
+            logger.exception('Failed to save a snapshot on exit')
+
+    def start(self) -> None:
+        """
+        Starts saving snapshots in the background, if there's an interval, and when the process exits. Does nothing if
+        this job has already been started.
+        """
+        if self._registered_handlers:
+            return
+
+        os.register_at_fork(after_in_child=self._restart_in_child)
+        atexit.register(self._save_on_exit)
+        self._registered_handlers = True
+
+        if self._interval_seconds:
+            self._start_thread()
+
+    def _start_thread(self) -> None:
+        self._thread = Thread(target=self._run, name='snapshots', daemon=True)
+        self._thread.start()
+
+    def _restart_in_child(self) -> None:
+        # Threads don't survive a fork, e.g. into gunicorn workers when the app is preloaded, so each worker runs its
+        # own. Whichever saves first compacts the log, and the others find nothing new to save.
+        was_running = self._thread is not None and not self._stopped.is_set()
+        self._save_lock = Lock()
+        self._thread = None
+
+        if was_running:
+            self._start_thread()
+
+    def stop(self) -> None:
+        """ Stops saving snapshots, including when the process exits. """
+        self._stopped.set()
+
+        if self._registered_handlers:
+            atexit.unregister(self._save_on_exit)
@@ -0,0 +1,145 @@
+import uuid
+from functools import wraps
+from typing import Iterable, Optional
+from urllib.parse import urlencode
+
+from flask import Flask, Response, g, has_app_context, request, session
+from flask_caching import Cache
+
+from movie.adapters.repository import AbstractRepository
+
+# Pages that look the same to every visitor who isn't logged in
+CACHED_ENDPOINTS = ('home_bp.home', 'search_bp.search', 'movie_bp.movie')
+
+# Repository methods that change what the cached pages show, i.e. the catalog, the options in the search form and
+# the reviews that movies are rated by
+INVALIDATING_METHODS = ('add_movie', 'add_movies', 'add_genre', 'add_genres', 'add_director', 'add_directors',
+                        'add_actor', 'add_actors', 'add_review', 'add_reviews', 'delete_user')
+
+_VERSION_KEY = 'page_cache_version'
+
+# Headers that belong to a single response rather than the page
+_EXCLUDED_HEADERS = {'set-cookie', 'content-length', 'date'}
+
+
+def normalized_query_string(args) -> str:
+    """
+    Returns the given query arguments in a canonical order, ignoring empty values, so that requests for the same page
+    share an entry, e.g. a search submitted with empty fields and one without them.
+    """
+    return urlencode(sorted((key, value) for key, value in args.items(multi=True) if value))
+
+
+class PageCache:
+    """
+    Caches whole responses to GET requests for pages that are the same for every anonymous visitor, so that repeat
+    visits to them don't render templates or touch the repository.
+
+    Entries are keyed on the page's path and normalized query string along with a version token kept in the cache
+    itself. Writes to the repository that change those pages replace the token, so every worker sharing the cache
+    stops using the old entries at once, and they expire on their own. Responses that set a cookie, e.g. because they
+    flashed a message or generated a CSRF token, aren't cached.
+    """
+
+    def __init__(self, cache: Cache, timeout: int = 60, prefix: str = '',
+                 endpoints: Iterable[str] = CACHED_ENDPOINTS) -> None:
+        self._cache = cache
+        self._timeout = timeout
+        self._prefix = prefix
+        self._endpoints = frozenset(endpoints)
+        self._app: Optional[Flask] = None
+
+    def version(self) -> str:
+        """ Returns the token that the current entries are stored under. """
+        version = self._cache.get(_VERSION_KEY)
+
+        if version is None:
+            # Only one of several workers starting at once succeeds in adding it
+            self._cache.add(_VERSION_KEY, uuid.uuid4().hex, timeout=0)
+            version = self._cache.get(_VERSION_KEY)
+
+        return version or ''
+
+    def invalidate(self) -> None:
+        """ Stops every cached page from being used. """
+        if has_app_context() or self._app is None:
+            self._cache.set(_VERSION_KEY, uuid.uuid4().hex, timeout=0)
+        else:
+            # e.g. the repository being changed from a background thread
+            with self._app.app_context():
+                self._cache.set(_VERSION_KEY, uuid.uuid4().hex, timeout=0)
+
+    def key(self, path: str, args) -> str:
+        query_string = normalized_query_string(args)
+        return f'page:{self._prefix}:{self.version()}:{path}?{query_string}'
+
+    def _is_cacheable_request(self) -> bool:
+        return request.method == 'GET' and request.endpoint in self._endpoints and 'username' not in session
+
+    def get_response(self) -> Optional[Response]:
+        """ Returns the cached response to the current request, if there is one. """
+        if not self._is_cacheable_request():
+            return None
+
+        g.page_cache_key = self.key(request.path, request.args)
+        entry = self._cache.get(g.page_cache_key)
+
+        if entry is None:
+            return None
+
+        body, status, headers = entry
+        response = Response(body, status=status, headers=headers)
+        response.headers['X-Cache'] = 'HIT'
+        g.page_cache_key = None
+
+        # Clients that already have the page are told so, if it has a validator such as an ETag
+        return response.make_conditional(request)
+
+    def store_response(self, response: Response) -> Response:
+        """ Caches the response to the current request if it's the same for every anonymous visitor. """
+        key = g.pop('page_cache_key', None)
+
+        if key is None:
+            return response
+
+        response.headers['X-Cache'] = 'MISS'
+
+        if response.status_code != 200 or response.is_streamed or 'Set-Cookie' in response.headers:
+            return response
+
+        headers = [(name, value) for name, value in response.headers.items()
+                   if name.lower() not in _EXCLUDED_HEADERS and name != 'X-Cache']
+        self._cache.set(key, (response.get_data(), response.status_code, headers), timeout=self._timeout)
+        return response
+
+    def _invalidating(self, method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.invalidate()
+        return wrapper
+
+    def watch_repository(self, repo: AbstractRepository) -> AbstractRepository:
+        """ Invalidates the cached pages whenever the given repository's catalog or reviews are changed. """
+        if getattr(repo, '_page_cache_watched', False):
+            return repo
+
+        for name in INVALIDATING_METHODS:
+            setattr(repo, name, self._invalidating(getattr(repo, name)))
+
+        repo._page_cache_watched = True
+        return repo
+
+    def init_app(self, app: Flask) -> None:
+        """ Serves the app's cacheable pages from the cache and caches the ones that aren't yet. """
+        self._app = app
+
+        @app.before_request
+        def get_cached_page():
+            return self.get_response()
+
+        @app.after_request
+        def cache_page(response):
+            return self.store_response(response)
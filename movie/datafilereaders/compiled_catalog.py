@@ -0,0 +1,396 @@
+"""
+Compiles a movie CSV file, in the format read by MovieFileCSVReader, into a binary columnar file that can be loaded
+without parsing any text.
+
+Numeric columns are stored as typed arrays. Titles, descriptions and the names of genres, directors and actors are
+stored as string tables, where each string is a range of a single UTF-8 buffer. A movie's genres and actors are a range
+of an array of indexes into their string table, given by an offsets array. Every array is aligned so that it can be
+memory mapped with NumPy and used in place. The file is written next to the CSV file and is only used while the CSV
+file has the same size and modification time as when it was compiled.
+
+Usage:
+    python -m movie.datafilereaders.compiled_catalog movie/adapters/data/Data1000Movies.csv
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+from math import isnan
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from movie.domain.actor import Actor
+from movie.domain.director import Director
+from movie.domain.genre import Genre
+from movie.domain.movie import Movie
+
+_MAGIC = b'MOVIECAT'
+_FORMAT_VERSION = 1
+
+# Magic number, format version and the length of the JSON header that follows
+_PREFIX = struct.Struct('<8sII')
+
+# Arrays start on a multiple of this many bytes
+_ALIGNMENT = 64
+
+# Index of a genre or person whose name is empty
+_NO_NAME = -1
+
+# Metascore of a movie that doesn't have one. Missing revenues are NaN.
+_NO_METASCORE = -1
+
+# Movies created from the columns at a time
+_BLOCK_SIZE = 10_000
+
+_Named = Union[Genre, Director, Actor]
+
+
+def compiled_catalog_path(source_path: str) -> str:
+    """ Returns the path the data file at the given path is compiled to. """
+    return f'{source_path}.catalog'
+
+
+def _source_version(source_path: str) -> Tuple[int, int]:
+    stat = os.stat(source_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _string_table(strings: List[Optional[str]]) -> Dict[str, np.ndarray]:
+    encoded = [string.encode('utf-8') if string is not None else b'' for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+
+    return {
+        'data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'offsets': offsets,
+        'null': np.array([string is None for string in strings], dtype=np.bool_)
+    }
+
+
+class _NameTable:
+    """ Numbers each distinct genre or person in the order they're first seen. """
+
+    def __init__(self) -> None:
+        self._indexes: Dict[_Named, int] = {}
+        self.names: List[str] = []
+
+    def index(self, named: _Named, name: Optional[str]) -> int:
+        if name is None:
+            return _NO_NAME
+
+        try:
+            return self._indexes[named]
+        except KeyError:
+            index = self._indexes[named] = len(self.names)
+            self.names.append(name)
+            return index
+
+
+def write_compiled_catalog(movies: Iterable[Movie], path: str, source_path: str) -> int:
+    """
+    Writes the given movies, read from the data file at source_path, to a compiled catalog at the given path and
+    returns how many were written. The file is replaced in a single step so that readers never see part of it.
+    """
+    ids, release_years, runtime_minutes, ratings, votes, revenue_millions, metascores = [], [], [], [], [], [], []
+    titles, descriptions, directors = [], [], []
+    genre_indices, genre_offsets, actor_indices, actor_offsets = [], [0], [], [0]
+    genre_names, director_names, actor_names = _NameTable(), _NameTable(), _NameTable()
+
+    # The version is taken before reading so that a file changed while it's compiled is seen as stale
+    source_size, source_mtime_ns = _source_version(source_path)
+
+    for movie in movies:
+        ids.append(movie.id)
+        release_years.append(movie.release_date)
+        runtime_minutes.append(movie.runtime_minutes)
+        ratings.append(movie.rating)
+        votes.append(movie.votes)
+        revenue_millions.append(movie.revenue_millions if movie.revenue_millions is not None else np.nan)
+        metascores.append(movie.metascore if movie.metascore is not None else _NO_METASCORE)
+        titles.append(movie.title)
+        descriptions.append(movie.description)
+        directors.append(director_names.index(movie.director, movie.director.director_full_name))
+
+        genre_indices += [genre_names.index(genre, genre.genre_name) for genre in movie.genres]
+        genre_offsets.append(len(genre_indices))
+        actor_indices += [actor_names.index(actor, actor.actor_full_name) for actor in movie.actors]
+        actor_offsets.append(len(actor_indices))
+
+    arrays = {
+        'ids': np.array(ids, dtype=np.int64),
+        'release_years': np.array(release_years, dtype=np.int32),
+        'runtime_minutes': np.array(runtime_minutes, dtype=np.int32),
+        'ratings': np.array(ratings, dtype=np.float64),
+        'votes': np.array(votes, dtype=np.int64),
+        'revenue_millions': np.array(revenue_millions, dtype=np.float64),
+        'metascores': np.array(metascores, dtype=np.int32),
+        'directors': np.array(directors, dtype=np.int32),
+        'genre_indices': np.array(genre_indices, dtype=np.int32),
+        'genre_offsets': np.array(genre_offsets, dtype=np.int64),
+        'actor_indices': np.array(actor_indices, dtype=np.int32),
+        'actor_offsets': np.array(actor_offsets, dtype=np.int64)
+    }
+
+    for name, strings in (('titles', titles), ('descriptions', descriptions), ('genre_names', genre_names.names),
+                          ('director_names', director_names.names), ('actor_names', actor_names.names)):
+        for part, array in _string_table(strings).items():
+            arrays[f'{name}_{part}'] = array
+
+    # Arrays are laid out relative to each other first, as where they start depends on the length of the header
+    layout = {}
+    position = 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, len(array), position]
+        position += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    def header_for(start: int) -> bytes:
+        return json.dumps({
+            'source_size': source_size,
+            'source_mtime_ns': source_mtime_ns,
+            'count': len(ids),
+            'arrays': {name: [dtype, length, start + offset] for name, (dtype, length, offset) in layout.items()}
+        }).encode('utf-8')
+
+    # Moving the arrays along can lengthen the header, so this is repeated until they start after it
+    start = 0
+    while True:
+        header = header_for(start)
+        end_of_header = -(-(_PREFIX.size + len(header)) // _ALIGNMENT) * _ALIGNMENT
+
+        if end_of_header <= start:
+            break
+
+        start = end_of_header
+
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(_PREFIX.pack(_MAGIC, _FORMAT_VERSION, len(header)))
+        file.write(header)
+
+        for name, array in arrays.items():
+            file.seek(start + layout[name][2])
+            file.write(array.tobytes())
+
+        file.truncate(start + position)
+
+    os.replace(temporary_path, path)
+
+    return len(ids)
+
+
+def compile_catalog(source_path: str, path: str = None, processes: Optional[int] = 1) -> int:
+    """
+    Compiles the data file at the given path, next to it unless another path is given, and returns the number of
+    movies in it. The file is parsed across the given number of processes, as with MovieFileCSVReader.
+    """
+    # Imported here as the reader loads compiled catalogs
+    from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+    reader = MovieFileCSVReader(source_path)
+    return write_compiled_catalog(reader.iter_csv_movies(processes=processes), path or compiled_catalog_path(source_path),
+                                  source_path)
+
+
+class CompiledCatalog:
+    """
+    A compiled catalog, memory mapped so that loading it only reads its header. Its columns are NumPy arrays that use
+    the file in place and can be used as they are, e.g. to build indexes, or turned into Movies with iter_movies. It
+    can be used as a context manager, which closes it on exit.
+
+    Raises:
+        ValueError: the file isn't a compiled catalog in this version of the format
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as file:
+            prefix = file.read(_PREFIX.size)
+
+            if len(prefix) < _PREFIX.size:
+                raise ValueError(f"'{path}' is not a compiled catalog")
+
+            magic, version, header_size = _PREFIX.unpack(prefix)
+
+            if magic != _MAGIC:
+                raise ValueError(f"'{path}' is not a compiled catalog")
+
+            if version != _FORMAT_VERSION:
+                raise ValueError(f"'{path}' is in version {version} of the format rather than {_FORMAT_VERSION}")
+
+            header = json.loads(file.read(header_size).decode('utf-8'))
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._source_version = (header['source_size'], header['source_mtime_ns'])
+        self._count: int = header['count']
+        self._arrays: Dict[str, np.ndarray] = {
+            name: np.frombuffer(self._buffer, dtype=np.dtype(dtype), count=length, offset=offset)
+            for name, (dtype, length, offset) in header['arrays'].items()
+        }
+
+    def __enter__(self) -> 'CompiledCatalog':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmaps the file. Columns taken from the catalog before it was closed can still be used, and keep the file
+        mapped until they're released.
+        """
+        self._arrays = {}
+
+        try:
+            self._buffer.close()
+        except BufferError:
+            pass
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """ Returns the column with the given name, e.g. 'ratings' or 'genre_offsets'. """
+        return self._arrays[name]
+
+    @property
+    def source_version(self) -> Tuple[int, int]:
+        """ The size and modification time of the data file the catalog was compiled from. """
+        return self._source_version
+
+    def strings(self, name: str, start: int = 0, stop: int = None) -> List[Optional[str]]:
+        """ Returns the strings from start to stop in the string table with the given name, e.g. 'titles'. """
+        stop = len(self._arrays[f'{name}_null']) if stop is None else stop
+        offsets = self._arrays[f'{name}_offsets'][start:stop + 1].tolist()
+        null = self._arrays[f'{name}_null'][start:stop].tolist()
+
+        if not offsets:
+            return []
+
+        first = offsets[0]
+        data = self._arrays[f'{name}_data'][first:offsets[-1]].tobytes()
+
+        return [None if is_null else data[begin - first:end - first].decode('utf-8')
+                for begin, end, is_null in zip(offsets, offsets[1:], null)]
+
+    def _names(self, name: str, cls: Callable[[str], _Named]) -> Callable[[int], _Named]:
+        """
+        Returns a function that returns the genre or person at an index of a string table, creating each once and only
+        when it's first needed.
+        """
+        offsets = self._arrays[f'{name}_offsets'].tolist()
+        data = self._arrays[f'{name}_data'].tobytes()
+        objects: List[Optional[_Named]] = [None] * (len(offsets) - 1)
+        nameless = cls('')
+
+        def get(index: int) -> _Named:
+            if index == _NO_NAME:
+                return nameless
+
+            named = objects[index]
+
+            if named is None:
+                named = objects[index] = cls(data[offsets[index]:offsets[index + 1]].decode('utf-8'))
+
+            return named
+
+        return get
+
+    def iter_movies(self, max_num_lines: int = None) -> Iterator[Movie]:
+        """
+        Yields the catalog's movies, which are the same as MovieFileCSVReader.iter_movies yields for the data file it
+        was compiled from. Only movies from the first max_num_lines rows of the file are yielded if it's given.
+        """
+        genre = self._names('genre_names', Genre)
+        director = self._names('director_names', Director)
+        actor = self._names('actor_names', Actor)
+        arrays = self._arrays
+
+        for start in range(0, self._count, _BLOCK_SIZE):
+            stop = min(start + _BLOCK_SIZE, self._count)
+
+            ids = arrays['ids'][start:stop].tolist()
+            release_years = arrays['release_years'][start:stop].tolist()
+            runtime_minutes = arrays['runtime_minutes'][start:stop].tolist()
+            ratings = arrays['ratings'][start:stop].tolist()
+            votes = arrays['votes'][start:stop].tolist()
+            revenue_millions = arrays['revenue_millions'][start:stop].tolist()
+            metascores = arrays['metascores'][start:stop].tolist()
+            directors = arrays['directors'][start:stop].tolist()
+            titles = self.strings('titles', start, stop)
+            descriptions = self.strings('descriptions', start, stop)
+
+            genre_offsets = arrays['genre_offsets'][start:stop + 1].tolist()
+            genre_indices = arrays['genre_indices'][genre_offsets[0]:genre_offsets[-1]].tolist()
+            actor_offsets = arrays['actor_offsets'][start:stop + 1].tolist()
+            actor_indices = arrays['actor_indices'][actor_offsets[0]:actor_offsets[-1]].tolist()
+
+            for i in range(stop - start):
+                # Ids are the number of rows that were parsed before the movie's row, including duplicates
+                if max_num_lines and ids[i] >= max_num_lines:
+                    return
+
+                movie = Movie(titles[i], release_years[i], ids[i])
+                movie.genres = [genre(index) for index in
+                                genre_indices[genre_offsets[i] - genre_offsets[0]:genre_offsets[i + 1] - genre_offsets[0]]]
+                movie.description = descriptions[i]
+                movie.director = director(directors[i])
+                movie.actors = [actor(index) for index in
+                                actor_indices[actor_offsets[i] - actor_offsets[0]:actor_offsets[i + 1] - actor_offsets[0]]]
+                movie.runtime_minutes = runtime_minutes[i]
+                movie.rating = ratings[i]
+                movie.votes = votes[i]
+
+                if not isnan(revenue_millions[i]):
+                    movie.revenue_millions = revenue_millions[i]
+
+                if metascores[i] != _NO_METASCORE:
+                    movie.metascore = metascores[i]
+
+                yield movie
+
+
+def load_compiled_catalog(source_path: str) -> Optional[CompiledCatalog]:
+    """
+    Returns the compiled catalog of the data file at the given path, or None if it hasn't been compiled or has changed
+    since it was.
+    """
+    try:
+        catalog = CompiledCatalog(compiled_catalog_path(source_path))
+    except (FileNotFoundError, ValueError):
+        return None
+
+    try:
+        if catalog.source_version == _source_version(source_path):
+            return catalog
+    except FileNotFoundError:
+        pass
+
+    catalog.close()
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source')
+    parser.add_argument('--output', default=None, help='defaults to the source path with .catalog added')
+    parser.add_argument('--processes', type=int, default=1, help='processes to parse the source with')
+    args = parser.parse_args()
+
+    start = perf_counter()
+    count = compile_catalog(args.source, args.output, args.processes)
+    elapsed = perf_counter() - start
+    path = args.output or compiled_catalog_path(args.source)
+
+    start = perf_counter()
+    CompiledCatalog(path).close()
+    loaded = perf_counter() - start
+
+    print(f'Compiled {count} movies to {path} ({os.path.getsize(path) / 2 ** 20:,.1f} MiB) in {elapsed:.1f}s, which '
+          f'loads in {loaded * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+"""
+Generates synthetic movie CSV files, in the format read by MovieFileCSVReader, of any size.
+
+The shape of the generated data is fitted from an existing file: genre combinations, cast sizes, how often actors and
+directors reappear in other movies, title and description wording and the joint distribution of the numeric columns.
+Rows are written as they're generated so that memory use doesn't grow with the number of rows.
+
+Usage:
+    python -m movie.datafilereaders.movie_file_csv_generator --rows 10000000 --output movies_10m.csv
+"""
+
+import argparse
+import csv
+import os
+from collections import Counter
+from time import perf_counter
+from typing import Iterator, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+
+# Columns that are copied together so that relationships between them (e.g. votes and revenue) are kept
+_NUMERIC_FIELDS = ['Year', 'Runtime (Minutes)', 'Rating', 'Votes', 'Revenue (Millions)', 'Metascore']
+
+
+class Distribution(NamedTuple):
+    """ An empirical distribution over a fixed set of values. """
+    values: List
+    probabilities: np.ndarray
+
+    @classmethod
+    def from_counts(cls, counts: Counter) -> 'Distribution':
+        values = sorted(counts)
+        frequencies = np.array([counts[value] for value in values], dtype=np.float64)
+        return cls(values, frequencies / frequencies.sum())
+
+    def sample_indices(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return rng.choice(len(self.values), size, p=self.probabilities)
+
+
+class CatalogModel(NamedTuple):
+    """ The distributions that generated movies are drawn from. """
+    genres: Distribution
+    cast_sizes: Distribution
+    actor_reuse: float
+    director_reuse: float
+    first_names: List[str]
+    last_names: List[str]
+    title_lengths: Distribution
+    title_words: Distribution
+    description_lengths: Distribution
+    description_words: Distribution
+    numeric_rows: List[Tuple[str, ...]]
+
+    @classmethod
+    def fit(cls, file_name: str) -> 'CatalogModel':
+        """
+        Fits a model to the movies in the given file.
+
+        Raises:
+            ValueError: '{file_name}' missing field '{field}'
+            ValueError: '{file_name}' doesn't contain any movies
+        """
+        genres = Counter()
+        cast_sizes = Counter()
+        actors = Counter()
+        directors = Counter()
+        title_lengths = Counter()
+        title_words = Counter()
+        description_lengths = Counter()
+        description_words = Counter()
+        numeric_rows = []
+
+        with open(file_name, mode='r', encoding='utf-8-sig') as file:
+            reader = csv.DictReader(file)
+
+            for field in MovieFileCSVReader._REQUIRED_FIELDS:
+                if field not in reader.fieldnames:
+                    raise ValueError(f"'{file_name}' missing field '{field}'")
+
+            for row in reader:
+                genres[row['Genre']] += 1
+
+                cast = [name.strip() for name in row['Actors'].split(',') if name.strip()]
+                cast_sizes[len(cast)] += 1
+                actors.update(cast)
+                directors[row['Director'].strip()] += 1
+
+                words = row['Title'].split()
+                title_lengths[len(words)] += 1
+                title_words.update(words)
+
+                words = row['Description'].split()
+                description_lengths[len(words)] += 1
+                description_words.update(word for word in (word.lower().rstrip('.') for word in words) if word)
+
+                numeric_rows.append(tuple(row[field] for field in _NUMERIC_FIELDS))
+
+        if not numeric_rows:
+            raise ValueError(f"'{file_name}' doesn't contain any movies")
+
+        # Names are split into first and last names which are recombined to make new people
+        first_names, last_names = set(), set()
+        for name in list(actors) + list(directors):
+            parts = name.split()
+            if any(character.isdigit() for character in parts[0]):
+                continue
+            first_names.add(parts[0])
+            last_names.add(parts[-1] if len(parts) > 1 else parts[0])
+
+        return cls(
+            genres=Distribution.from_counts(genres),
+            cast_sizes=Distribution.from_counts(cast_sizes),
+            actor_reuse=1 - len(actors) / sum(actors.values()),
+            director_reuse=1 - len(directors) / sum(directors.values()),
+            first_names=sorted(first_names),
+            last_names=sorted(last_names),
+            title_lengths=Distribution.from_counts(title_lengths),
+            title_words=Distribution.from_counts(title_words),
+            description_lengths=Distribution.from_counts(description_lengths),
+            description_words=Distribution.from_counts(description_words),
+            numeric_rows=numeric_rows
+        )
+
+
+class _PeoplePool:
+    """
+    Chooses who appears in each movie by preferential attachment: a role either goes to someone new or to someone
+    who has already appeared, with a probability proportional to the number of roles they've had. Past roles are
+    kept in a fixed size reservoir sample so that memory use is bounded.
+    """
+
+    def __init__(self, reuse: float, capacity: int) -> None:
+        self._reuse = reuse
+        self._roles = np.empty(capacity, dtype=np.int64)
+        self._number_of_roles = 0
+        self._number_of_people = 0
+
+    @property
+    def number_of_people(self) -> int:
+        return self._number_of_people
+
+    def assign(self, rng: np.random.Generator, number_of_roles: int) -> np.ndarray:
+        """ Returns the id of the person given each of the next number_of_roles roles. """
+        capacity = len(self._roles)
+        sample_size = min(self._number_of_roles, capacity)
+
+        reused = rng.random(number_of_roles) < self._reuse if sample_size else np.zeros(number_of_roles, dtype=bool)
+        number_of_new = number_of_roles - int(reused.sum())
+
+        people = np.empty(number_of_roles, dtype=np.int64)
+        people[~reused] = np.arange(self._number_of_people, self._number_of_people + number_of_new)
+        people[reused] = self._roles[rng.integers(0, max(sample_size, 1), number_of_roles - number_of_new)]
+        self._number_of_people += number_of_new
+
+        # Fill the reservoir, then replace roles in it with decreasing probability
+        positions = np.arange(self._number_of_roles, self._number_of_roles + number_of_roles)
+        filling = positions < capacity
+        self._roles[positions[filling]] = people[filling]
+
+        replacing = ~filling
+        slots = rng.integers(0, positions[replacing] + 1)
+        kept = slots < capacity
+        self._roles[slots[kept]] = people[replacing][kept]
+
+        self._number_of_roles += number_of_roles
+        return people
+
+
+class MovieFileCSVGenerator:
+    _MIN_CHUNK_SIZE = 16
+    _DEFAULT_CHUNK_SIZE = 10000
+    _DEFAULT_POOL_CAPACITY = 1 << 20
+    _NAME_MULTIPLIER = 2654435761
+
+    def __init__(self, model: CatalogModel, seed: int = None, pool_capacity: int = _DEFAULT_POOL_CAPACITY) -> None:
+        if not isinstance(model, CatalogModel):
+            raise TypeError(f"'model' must be of type 'CatalogModel' but was '{type(model).__name__}'")
+
+        if not isinstance(pool_capacity, int):
+            raise TypeError(f"'pool_capacity' must be of type 'int' but was '{type(pool_capacity).__name__}'")
+
+        if pool_capacity < 1:
+            raise ValueError(f"'pool_capacity' must be at least 1 but was {pool_capacity}")
+
+        self._model = model
+        self._seed = seed
+        self._pool_capacity = pool_capacity
+
+    def _person_name(self, id_: int, offset: int) -> str:
+        """ Returns a unique name for each id. Different offsets give different names to the same id. """
+        first_names = self._model.first_names
+        last_names = self._model.last_names
+        number_of_combinations = len(first_names) * len(last_names)
+
+        # Spread consecutive ids over the alphabet, the multiplier is prime so that no two ids get the same name
+        index = (id_ * self._NAME_MULTIPLIER + offset) % number_of_combinations
+        first = index % len(first_names)
+        last = index // len(first_names)
+        name = f'{first_names[first]} {last_names[last]}'
+
+        if id_ >= number_of_combinations:
+            name += f' {id_ // number_of_combinations + 1}'
+
+        return name
+
+    @staticmethod
+    def _split(words: Sequence[str], indices: np.ndarray, lengths: np.ndarray) -> Iterator[List[str]]:
+        start = 0
+        for length in lengths:
+            yield [words[i] for i in indices[start:start + length]]
+            start += length
+
+    def _generate_chunk(self, rng: np.random.Generator, first_rank: int, size: int, actors: _PeoplePool,
+                        directors: _PeoplePool) -> Iterator[List[str]]:
+        model = self._model
+
+        genres = model.genres.sample_indices(rng, size)
+        numeric = rng.integers(0, len(model.numeric_rows), size)
+
+        director_ids = directors.assign(rng, size)
+        cast_sizes = np.asarray(model.cast_sizes.values)[model.cast_sizes.sample_indices(rng, size)]
+        actor_ids = actors.assign(rng, int(cast_sizes.sum()))
+
+        title_lengths = np.asarray(model.title_lengths.values)[model.title_lengths.sample_indices(rng, size)]
+        title_words = model.title_words.sample_indices(rng, int(title_lengths.sum()))
+
+        description_lengths = np.maximum(
+            np.asarray(model.description_lengths.values)[model.description_lengths.sample_indices(rng, size)], 1)
+        description_words = model.description_words.sample_indices(rng, int(description_lengths.sum()))
+
+        titles = self._split(model.title_words.values, title_words, title_lengths)
+        descriptions = self._split(model.description_words.values, description_words, description_lengths)
+
+        start = 0
+        for i, title, description in zip(range(size), titles, descriptions):
+            rank = first_rank + i
+
+            # Someone can only be cast once in the same movie
+            cast = dict.fromkeys(actor_ids[start:start + cast_sizes[i]].tolist())
+            start += cast_sizes[i]
+
+            # The rank is part of the title so that every (title, year) pair is unique
+            title = ' '.join(title + [str(rank)])
+            description = ' '.join(description)
+
+            yield [
+                str(rank),
+                title,
+                model.genres.values[genres[i]],
+                description[0].upper() + description[1:].rstrip('.') + '.',
+                self._person_name(int(director_ids[i]), len(model.first_names) * len(model.last_names) // 2),
+                ', '.join(self._person_name(id_, 0) for id_ in cast),
+                *model.numeric_rows[numeric[i]]
+            ]
+
+    def iter_rows(self, num_rows: int, chunk_size: int = _DEFAULT_CHUNK_SIZE) -> Iterator[List[str]]:
+        """
+        Yields num_rows rows, in the order of MovieFileCSVReader._REQUIRED_FIELDS, generating chunk_size rows at a
+        time. The same seed always gives the same rows.
+        """
+        if not isinstance(num_rows, int):
+            raise TypeError(f"'num_rows' must be of type 'int' but was '{type(num_rows).__name__}'")
+
+        if not isinstance(chunk_size, int):
+            raise TypeError(f"'chunk_size' must be of type 'int' but was '{type(chunk_size).__name__}'")
+
+        if num_rows < 0:
+            raise ValueError(f"'num_rows' must be at least 0 but was {num_rows}")
+
+        if chunk_size < 1:
+            raise ValueError(f"'chunk_size' must be at least 1 but was {chunk_size}")
+
+        return self._iter_rows(num_rows, chunk_size)
+
+    def _iter_rows(self, num_rows: int, chunk_size: int) -> Iterator[List[str]]:
+        rng = np.random.default_rng(self._seed)
+        actors = _PeoplePool(self._model.actor_reuse, self._pool_capacity)
+        directors = _PeoplePool(self._model.director_reuse, self._pool_capacity)
+
+        # People can only be reused from earlier chunks, so chunks start small and grow with the number of rows
+        # generated so far to keep the amount of reuse close to the model's
+        generated = 0
+        while generated < num_rows:
+            size = min(chunk_size, num_rows - generated, max(generated, self._MIN_CHUNK_SIZE))
+            yield from self._generate_chunk(rng, generated + 1, size, actors, directors)
+            generated += size
+
+    def write(self, file_name: str, num_rows: int, chunk_size: int = _DEFAULT_CHUNK_SIZE) -> int:
+        """ Writes num_rows movies to the given csv file and returns the number of rows written. """
+        rows = self.iter_rows(num_rows, chunk_size)
+        count = 0
+
+        with open(file_name, mode='w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(MovieFileCSVReader._REQUIRED_FIELDS)
+
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+
+        return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=os.path.join('movie', 'adapters', 'data', 'Data1000Movies.csv'),
+                        help='csv file to fit the generated data to')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=MovieFileCSVGenerator._DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    generator = MovieFileCSVGenerator(CatalogModel.fit(args.source), args.seed)
+
+    start = perf_counter()
+    count = generator.write(args.output, args.rows, args.chunk_size)
+    elapsed = perf_counter() - start
+
+    print(f'Wrote {count} movies to {args.output} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,128 @@
-from typing import List, Set, Union, Dict, OrderedDict
+import io
+import mmap
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union, Dict, OrderedDict
 from csv import DictReader
+from itertools import islice
 
+from movie.datafilereaders.compiled_catalog import CompiledCatalog, load_compiled_catalog
 from movie.domain.movie import Movie
 from movie.domain.actor import Actor
+from movie.domain.actor_graph import ActorGraph
 from movie.domain.genre import Genre
 from movie.domain.director import Director
 
+_ROW = Union[Dict[str, str], OrderedDict[str, str]]
+
+# A row of a CSV file up to and including the newline it ends with. Between runs of text without quotes there's either
+# a quoted field, which starts with a quote at the start of a field, or the rest of a field with a quote anywhere else
+# in it, which is part of the field. These never match the same text, so a row that's cut off isn't backtracked over
+# again and again.
+_RECORD_PATTERN = rb'[^"\n]*(?:(?:(?<![^,\n])"[^"]*(?:""[^"]*)*"|(?<=[^,\n"])"[^,\n]*)[^"\n]*)*\n'
+_RECORD = re.compile(_RECORD_PATTERN)
+_RECORDS = re.compile(rb'(?:' + _RECORD_PATTERN + rb')*')
+
+
+class _ParsedRow(NamedTuple):
+    """ The fields of a row converted to their types, but without any domain objects, so it's cheap to pickle. """
+    title: str
+    genres: List[str]
+    description: str
+    director: str
+    actors: List[str]
+    release_year: int
+    runtime_minutes: int
+    rating: float
+    votes: int
+    revenue_millions: Optional[float]
+    metascore: Optional[int]
+
+
+def _parse_row(row: _ROW) -> _ParsedRow:
+    """
+    Raises:
+        ValueError: unable to parse row: {row}
+    """
+    try:
+        return _ParsedRow(
+            row['Title'],
+            row['Genre'].split(','),
+            row['Description'],
+            row['Director'],
+            row['Actors'].split(','),
+            int(row['Year']),
+            int(row['Runtime (Minutes)']),
+            float(row['Rating']),
+            int(row['Votes']),
+            float(row['Revenue (Millions)']) if row['Revenue (Millions)'] != 'N/A' else None,
+            int(row['Metascore']) if row['Metascore'] != 'N/A' else None
+        )
+    except (KeyError, ValueError):
+        raise ValueError(f'unable to parse row: {row}')
+
+
+def _parse_rows(rows: Iterable[_ROW]) -> Iterator[_ParsedRow]:
+    for row in rows:
+        try:
+            yield _parse_row(row)
+        except ValueError:
+            # Failed to parse row
+            continue
+
+
+def _parse_chunk(file_name: str, start: int, end: int, fieldnames: List[str]) -> List[tuple]:
+    """ Parses the rows between the given byte offsets, which must be at the start of a row or the end of the file. """
+    with open(file_name, mode='rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    # Newlines are translated in the same way as when the file is opened as text
+    rows = _parse_rows(DictReader(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'), fieldnames))
+
+    # Plain tuples are about twice as quick to pickle and unpickle
+    return [tuple(row) for row in rows]
+
+
+def _record_boundaries(file_name: str, chunk_size: int) -> List[int]:
+    """
+    Returns the byte offset of the first row after the header, followed by the offsets of rows roughly every
+    chunk_size bytes after it and finally the size of the file.
+
+    A row ends at a newline that isn't inside a quoted field. As with csv.reader, a quote only starts a quoted field
+    at the start of a field and is part of the field anywhere else, and a quote inside a quoted field is escaped by
+    doubling it.
+    """
+    with open(file_name, mode='rb') as file:
+        size = os.fstat(file.fileno()).st_size
+
+        if size == 0:
+            return [0, 0]
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+            def end_of_row(position: int) -> int:
+                # A row that doesn't end, e.g. the last one if there's no newline after it, ends with the file
+                match = _RECORD.match(data, position)
+                return match.end() if match else size
+
+            position = end_of_row(0)
+            boundaries = [position]
+
+            while position < size:
+                # The whole rows before the target, or the row after the position if it's longer than chunk_size
+                end = _RECORDS.match(data, position, min(position + chunk_size, size)).end()
+                position = end if end > position else end_of_row(position)
+                boundaries.append(position)
+
+    return boundaries
+
 
 class MovieFileCSVReader:
-    _ROW = Union[Dict[str, str], OrderedDict[str, str]]
+    # Bytes of the file parsed at a time by each process when reading in parallel
+    _CHUNK_SIZE = 4 * 1024 * 1024
 
     _REQUIRED_FIELDS: List[str] = [
         'Rank',
@@ -36,6 +150,11 @@ class MovieFileCSVReader:
         self._directors: Dict[Director, Director] = {}
         self._genres: Dict[Genre, Genre] = {}
 
+        # The genre, director or actor each name in the file is, so that each name is only looked up once
+        self._names: Dict[Tuple[type, str], Union[Genre, Director, Actor]] = {}
+
+        self._actor_graph = ActorGraph()
+
     @property
     def _file_name(self):
         return self.__file_name
@@ -73,14 +192,12 @@ class MovieFileCSVReader:
             dictionary[key] = key
             return key
 
-    def _get_actor(self, actor: Actor) -> Actor:
-        return self._get_dict_value(actor, self._actors)
-
-    def _get_director(self, director: Director) -> Director:
-        return self._get_dict_value(director, self._directors)
-
-    def _get_genre(self, genre: Genre) -> Genre:
-        return self._get_dict_value(genre, self._genres)
+    def _get_named(self, cls: type, name: str, dictionary: Dict):
+        try:
+            return self._names[cls, name]
+        except KeyError:
+            value = self._names[cls, name] = self._get_dict_value(cls(name), dictionary)
+            return value
 
     def _read_row(self, row: _ROW, id_: int) -> Movie:
         """
@@ -89,33 +206,24 @@ class MovieFileCSVReader:
         Raises:
             ValueError: unable to parse row: {row}
          """
-        error = False
+        return self._build_movie(_parse_row(row), id_)
 
-        try:
-            title = row['Title']
-            genres = [self._get_genre(Genre(name)) for name in row['Genre'].split(',')]
-            description = row['Description']
-            director = self._get_director(Director(row['Director']))
-            actors = [self._get_actor(Actor(name)) for name in row['Actors'].split(',')]
-            release_year = int(row['Year'])
-            runtime_minutes = int(row['Runtime (Minutes)'])
-            rating = float(row['Rating'])
-            votes = int(row['Votes'])
-            revenue_millions = float(row['Revenue (Millions)']) if row['Revenue (Millions)'] != 'N/A' else None
-            metascore = int(row['Metascore']) if row['Metascore'] != 'N/A' else None
-        except KeyError:
-            error = True
-        except ValueError:
-            error = True
+    def _build_movie(self, row: tuple, id_: int) -> Movie:
+        """
+        Constructs a Movie from a parsed row, or a plain tuple of its fields, sharing genres and people with the movies
+        constructed before it.
 
-        if error:
-            raise ValueError(f'unable to parse row: {row}')
+        Raises:
+            ValueError: the row's values aren't valid for a Movie
+        """
+        title, genres, description, director, actors, release_year, runtime_minutes, rating, votes, \
+            revenue_millions, metascore = row
 
         movie = Movie(title, release_year, id_)
-        movie.genres = genres
+        movie.genres = [self._get_named(Genre, name, self._genres) for name in genres]
         movie.description = description
-        movie.director = director
-        movie.actors = actors
+        movie.director = self._get_named(Director, director, self._directors)
+        movie.actors = [self._get_named(Actor, name, self._actors) for name in actors]
         movie.runtime_minutes = runtime_minutes
         movie.rating = rating
         movie.votes = votes
@@ -128,15 +236,61 @@ class MovieFileCSVReader:
 
         return movie
 
-    def read_csv_file(self, max_num_lines: int = None):
-        unique_movies: Set[Movie] = set()
-        unique_actors: Set[Actor] = set()
-        unique_directors: Set[Director] = set()
-        unique_genres: Set[Genre] = set()
+    @staticmethod
+    def _check_processes(processes: Optional[int]) -> None:
+        if processes is not None and not isinstance(processes, int):
+            raise TypeError(f"'processes' must be of type 'int' but was '{type(processes).__name__}'")
+
+        if processes is not None and processes <= 0:
+            raise ValueError("'processes' must be greater than zero")
+
+    def iter_movies(self, max_num_lines: int = None, processes: Optional[int] = 1) -> Iterator[Movie]:
+        """
+        Yields each movie in the file as it's read, so that they can be used without the whole file being held in
+        memory. Movies with the same genre, director or actor share the same Genre, Director or Actor object. Rows that
+        can't be parsed and movies with the same title and release date as an earlier movie are skipped.
+
+        If the file has been compiled (see compiled_catalog) since it last changed, the movies are loaded from the
+        compiled file instead, which gives the same movies without parsing the file. processes is then ignored, as
+        loading them is quicker than parsing across any number of processes. Use iter_csv_movies to always parse it.
+
+        Raises:
+            ValueError: the file is missing a required field
+        """
+        self._check_processes(processes)
+
+        catalog = load_compiled_catalog(self._file_name)
+
+        if catalog is not None:
+            return self._iter_compiled_movies(catalog, max_num_lines)
+
+        return self.iter_csv_movies(max_num_lines, processes)
+
+    @staticmethod
+    def _iter_compiled_movies(catalog: CompiledCatalog, max_num_lines: Optional[int]) -> Iterator[Movie]:
+        # Closed once the movies have all been read, or the caller stops reading them
+        with catalog:
+            yield from catalog.iter_movies(max_num_lines)
+
+    def iter_csv_movies(self, max_num_lines: int = None, processes: Optional[int] = 1) -> Iterator[Movie]:
+        """
+        Yields each movie in the file in the same way as iter_movies, but always parses the file.
+
+        If processes isn't 1 the file is split into chunks which are parsed across a pool of that many processes, or
+        one per CPU if it's None, and the movies are created from them in order in this process, so they're the same
+        as when the file is read in this process alone.
+
+        Raises:
+            ValueError: the file is missing a required field
+        """
+        self._check_processes(processes)
+
+        seen_movies: Set[Movie] = set()
 
         self._actors = {}
         self._directors = {}
         self._genres = {}
+        self._names = {}
 
         count = 0
 
@@ -148,35 +302,82 @@ class MovieFileCSVReader:
                 if field not in movie_file_reader.fieldnames:
                     raise ValueError(f"'{self._file_name}' missing field '{field}'")
 
-            for row in movie_file_reader:
+            if processes == 1:
+                rows = _parse_rows(movie_file_reader)
+            else:
+                rows = self._parse_in_parallel(movie_file_reader.fieldnames, processes or os.cpu_count() or 1)
+
+            for row in rows:
 
                 # Only read up to max_num_lines lines
                 if max_num_lines and count >= max_num_lines:
                     break
 
                 try:
-                    movie = self._read_row(row, count)
+                    movie = self._build_movie(row, count)
                 except ValueError:
                     # Failed to parse row to Movie
                     continue
 
                 count += 1
 
-                unique_movies.add(movie)
+                if movie in seen_movies:
+                    continue
+
+                seen_movies.add(movie)
+                yield movie
+
+    def _parse_in_parallel(self, fieldnames: List[str], processes: int) -> Iterator[tuple]:
+        boundaries = _record_boundaries(self._file_name, self._CHUNK_SIZE)
+
+        with ProcessPoolExecutor(processes) as pool:
+            # Limit the number of chunks that are queued up so memory use doesn't depend on the size of the file
+            pending = deque()
+
+            try:
+                for start, end in zip(boundaries, boundaries[1:]):
+                    pending.append(pool.submit(_parse_chunk, self._file_name, start, end, fieldnames))
+
+                    if len(pending) >= 2 * processes:
+                        yield from pending.popleft().result()
+
+                while pending:
+                    yield from pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def iter_batches(self,
+                     batch_size: int,
+                     max_num_lines: int = None,
+                     processes: Optional[int] = 1) -> Iterator[List[Movie]]:
+        """ Yields the movies in the file in lists of up to batch_size movies, in the same way as iter_movies. """
+        if batch_size < 1:
+            raise ValueError(f"'batch_size' must be at least 1 but was {batch_size}")
+
+        movies = self.iter_movies(max_num_lines, processes)
+
+        while batch := list(islice(movies, batch_size)):
+            yield batch
 
-                # Add colleagues to each actor
-                for actor in movie.actors:
-                    unique_actors.add(actor)
+    def read_csv_file(self, max_num_lines: int = None, processes: Optional[int] = 1):
+        # Colleagues are derived from the movies each actor appears in
+        self._actor_graph = ActorGraph()
 
-                    for colleague in movie.actors:
-                        actor.add_actor_colleague(colleague)
+        movies: List[Movie] = []
+        unique_actors: Dict[Actor, None] = {}
+        unique_directors: Dict[Director, None] = {}
+        unique_genres: Dict[Genre, None] = {}
 
-                unique_directors.add(movie.director)
+        for movie in self.iter_movies(max_num_lines, processes):
+            movies.append(movie)
+            self._actor_graph.add_movie(movie)
 
-                for genre in movie.genres:
-                    unique_genres.add(genre)
+            unique_actors.update(dict.fromkeys(movie.actors))
+            unique_directors[movie.director] = None
+            unique_genres.update(dict.fromkeys(movie.genres))
 
-        self._dataset_of_movies = list(unique_movies)
+        self._dataset_of_movies = movies
         self._dataset_of_actors = list(unique_actors)
         self._dataset_of_directors = list(unique_directors)
         self._dataset_of_genres = list(unique_genres)
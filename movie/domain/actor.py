@@ -1,15 +1,26 @@
-from typing import Set
+from typing import Set, Tuple, TYPE_CHECKING
 from .person import Person
 
+if TYPE_CHECKING:
+    from .actor_graph import ActorGraph
+
 
 class Actor(Person):
+    # Graphs this actor's colleagues are derived from, e.g. both a reader's and a repository's holding the same movies.
+    # Added to by an ActorGraph when a movie with this actor is added to it. Declared on the class as instances loaded
+    # by the ORM don't go through __init__.
+    _colleague_graphs: Tuple['ActorGraph', ...] = ()
+
     def __init__(self, actor_full_name: str) -> None:
         super().__init__(actor_full_name)
         self._colleagues: Set[Actor] = set()
 
     @property
     def colleagues(self) -> Set['Actor']:
-        return self._colleagues
+        colleagues = set(self._colleagues)
+        for graph in self._colleague_graphs:
+            colleagues |= graph.get_colleagues(self)
+        return colleagues
 
     @property
     def actor_full_name(self) -> str:
@@ -29,4 +40,8 @@ class Actor(Person):
     def check_if_this_actor_worked_with(self, colleague: 'Actor') -> bool:
         if not isinstance(colleague, Actor):
             raise TypeError(f"'colleague' must be of type '{type(self).__name__}' but was '{type(colleague).__name__}'")
-        return colleague in self._colleagues
+
+        if colleague in self._colleagues:
+            return True
+
+        return any(graph.worked_with(self, colleague) for graph in self._colleague_graphs)
@@ -0,0 +1,331 @@
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Set, FrozenSet, Iterable, Hashable, NamedTuple, Optional, Tuple
+
+from .actor import Actor
+from .movie import Movie
+
+
+class ActorPath(NamedTuple):
+    """
+    A chain of actors where each consecutive pair of actors appeared together in the movie at the same position in
+    movies, i.e. actors[i] and actors[i + 1] both appeared in movies[i].
+    """
+    actors: List[Actor]
+    movies: List[Movie]
+
+    @property
+    def degrees(self) -> int:
+        return len(self.movies)
+
+
+class ActorGraph:
+    """
+    Bipartite graph between actors and the movies they appear in.
+
+    Actors and movies are given compact integer ids in the order they're first seen. Both directions of the graph are
+    stored in compressed sparse row (CSR) form, i.e. an offsets array and a flat array of ids, so the cost of storing
+    the graph grows with the number of (movie, actor) pairs rather than the square of each movie's cast size.
+
+    Colleagues (actors who have appeared in the same movie) are derived from the graph on demand and cached per actor.
+    The caches are guarded by their own lock, so any number of threads can search the graph at once, but adding movies
+    must not happen at the same time as anything else.
+
+    Actors and movies are usually Actor and Movie objects, but any hashable value can be used through add_cast (e.g. a
+    repository can build a graph over database ids).
+    """
+
+    # Minimum number of (actor, movie) pairs added since the last compaction before the actor -> movies index is rebuilt.
+    # Past this the index is rebuilt once the pending pairs outnumber the compacted ones, so rebuilds are amortised O(1).
+    _COMPACTION_THRESHOLD = 1024
+
+    # Maximum number of shortest paths to remember
+    _PATH_CACHE_SIZE = 1024
+
+    def __init__(self) -> None:
+        self._actors: List[Actor] = []
+        self._actor_ids: Dict[Actor, int] = {}
+        self._movies: List[Movie] = []
+        self._movie_ids: Dict[Movie, int] = {}
+
+        # movie id -> actor ids. Movies are only ever appended so this is kept up to date as movies are added.
+        self._movie_offsets = array('l', [0])
+        self._movie_actor_ids = array('l')
+
+        # actor id -> movie ids. This is rebuilt from the movie -> actors index, with any movies added since the last
+        # rebuild being kept in _pending until there are enough of them to warrant another rebuild.
+        self._actor_offsets = array('l', [0])
+        self._actor_movie_ids = array('l')
+        self._pending: Dict[int, List[int]] = {}
+        self._num_pending = 0
+
+        self._colleague_cache: Dict[int, FrozenSet[int]] = {}
+        self._path_cache: OrderedDict[Tuple[int, int], Optional[Tuple[List[int], List[int]]]] = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def number_of_actors(self) -> int:
+        return len(self._actors)
+
+    @property
+    def number_of_movies(self) -> int:
+        return len(self._movies)
+
+    def _get_actor_id(self, actor: Actor) -> int:
+        try:
+            return self._actor_ids[actor]
+        except KeyError:
+            actor_id = len(self._actors)
+            self._actors.append(actor)
+            self._actor_ids[actor] = actor_id
+            return actor_id
+
+    def add_movie(self, movie: Movie) -> None:
+        """ Adds the given Movie and its actors to this graph. Does nothing if the given movie has already been added. """
+        if not isinstance(movie, Movie):
+            raise TypeError(f"'movie' must be of type 'Movie' but was '{type(movie).__name__}'")
+
+        actors = movie.actors or []
+        if not self.add_cast(movie, actors):
+            return
+
+        for actor in actors:
+            if self not in actor._colleague_graphs:
+                actor._colleague_graphs += (self,)
+
+    def add_cast(self, movie: Hashable, actors: Iterable[Hashable]) -> bool:
+        """
+        Adds the given movie and the actors who appeared in it to this graph. Does nothing if the given movie has
+        already been added.
+
+        Returns:
+            True if the movie was added, otherwise False.
+        """
+        if movie in self._movie_ids:
+            return False
+
+        movie_id = len(self._movies)
+        self._movies.append(movie)
+        self._movie_ids[movie] = movie_id
+
+        actor_ids = []
+        for actor in actors:
+            actor_id = self._get_actor_id(actor)
+
+            if actor_id in actor_ids:
+                continue
+
+            actor_ids.append(actor_id)
+            self._pending.setdefault(actor_id, []).append(movie_id)
+
+        self._movie_actor_ids.extend(actor_ids)
+        self._movie_offsets.append(len(self._movie_actor_ids))
+        self._num_pending += len(actor_ids)
+
+        with self._cache_lock:
+            for actor_id in actor_ids:
+                self._colleague_cache.pop(actor_id, None)
+
+            # A new movie can create a shorter path between any two actors
+            if len(actor_ids) > 1:
+                self._path_cache.clear()
+
+        if self._num_pending >= max(self._COMPACTION_THRESHOLD, len(self._actor_movie_ids)):
+            self._compact()
+
+        return True
+
+    def add_movies(self, movies: Iterable[Movie]) -> None:
+        """ Adds the given Movies to this graph. """
+        for movie in movies:
+            self.add_movie(movie)
+
+    def _compact(self) -> None:
+        """ Rebuilds the actor -> movies index from the movie -> actors index using a counting sort. """
+        num_actors = len(self._actors)
+        counts = array('l', bytes(array('l').itemsize * (num_actors + 1)))
+
+        for actor_id in self._movie_actor_ids:
+            counts[actor_id + 1] += 1
+
+        for i in range(num_actors):
+            counts[i + 1] += counts[i]
+
+        offsets = array('l', counts)
+        movie_ids = array('l', bytes(array('l').itemsize * len(self._movie_actor_ids)))
+        movie_offsets = self._movie_offsets
+
+        for movie_id in range(len(self._movies)):
+            for i in range(movie_offsets[movie_id], movie_offsets[movie_id + 1]):
+                actor_id = self._movie_actor_ids[i]
+                movie_ids[counts[actor_id]] = movie_id
+                counts[actor_id] += 1
+
+        self._actor_offsets = offsets
+        self._actor_movie_ids = movie_ids
+        self._pending = {}
+        self._num_pending = 0
+
+    def _movie_ids_for_actor(self, actor_id: int) -> List[int]:
+        movie_ids = []
+
+        if actor_id + 1 < len(self._actor_offsets):
+            movie_ids.extend(self._actor_movie_ids[self._actor_offsets[actor_id]:self._actor_offsets[actor_id + 1]])
+
+        movie_ids.extend(self._pending.get(actor_id, ()))
+        return movie_ids
+
+    def _actor_ids_for_movie(self, movie_id: int) -> array:
+        return self._movie_actor_ids[self._movie_offsets[movie_id]:self._movie_offsets[movie_id + 1]]
+
+    def _colleague_ids(self, actor_id: int) -> FrozenSet[int]:
+        with self._cache_lock:
+            try:
+                return self._colleague_cache[actor_id]
+            except KeyError:
+                pass
+
+        colleague_ids = set()
+        for movie_id in self._movie_ids_for_actor(actor_id):
+            colleague_ids.update(self._actor_ids_for_movie(movie_id))
+        colleague_ids.discard(actor_id)
+
+        colleague_ids = frozenset(colleague_ids)
+        with self._cache_lock:
+            self._colleague_cache[actor_id] = colleague_ids
+        return colleague_ids
+
+    def get_movies(self, actor: Actor) -> List[Movie]:
+        """ Returns the movies in this graph the given actor has appeared in. """
+        try:
+            actor_id = self._actor_ids[actor]
+        except KeyError:
+            return []
+        return [self._movies[movie_id] for movie_id in self._movie_ids_for_actor(actor_id)]
+
+    def get_colleagues(self, actor: Actor) -> Set[Actor]:
+        """ Returns the set of actors who have appeared in at least one movie with the given actor. """
+        try:
+            actor_id = self._actor_ids[actor]
+        except KeyError:
+            return set()
+        return {self._actors[colleague_id] for colleague_id in self._colleague_ids(actor_id)}
+
+    def worked_with(self, actor: Actor, colleague: Actor) -> bool:
+        """ Returns True if the given actors have appeared in at least one movie together, otherwise False. """
+        try:
+            actor_id = self._actor_ids[actor]
+            colleague_id = self._actor_ids[colleague]
+        except KeyError:
+            return False
+        return colleague_id in self._colleague_ids(actor_id)
+
+    def _expand(self,
+                frontier: List[int],
+                parents: Dict[int, Tuple[int, int]],
+                visited_movies: Set[int],
+                other_parents: Dict[int, Tuple[int, int]]) -> Tuple[List[int], List[int]]:
+        """
+        Expands one level of a breadth first search. Returns the next frontier and any actors it shares with the search
+        from the other direction.
+        """
+        next_frontier = []
+        meetings = []
+
+        for actor_id in frontier:
+            for movie_id in self._movie_ids_for_actor(actor_id):
+                if movie_id in visited_movies:
+                    continue
+                visited_movies.add(movie_id)
+
+                for colleague_id in self._actor_ids_for_movie(movie_id):
+                    if colleague_id in parents:
+                        continue
+
+                    parents[colleague_id] = (actor_id, movie_id)
+                    next_frontier.append(colleague_id)
+
+                    if colleague_id in other_parents:
+                        meetings.append(colleague_id)
+
+        return next_frontier, meetings
+
+    @staticmethod
+    def _walk(parents: Dict[int, Tuple[int, int]], actor_id: int) -> Tuple[List[int], List[int]]:
+        """ Follows the given parent links from the given actor back to the start of a search. """
+        actor_ids = [actor_id]
+        movie_ids = []
+
+        while parents[actor_id] is not None:
+            actor_id, movie_id = parents[actor_id]
+            actor_ids.append(actor_id)
+            movie_ids.append(movie_id)
+
+        return actor_ids, movie_ids
+
+    def _find_path(self, source_id: int, target_id: int) -> Optional[Tuple[List[int], List[int]]]:
+        """ Bidirectional breadth first search for the shortest path between two actors. """
+        if source_id == target_id:
+            return [source_id], []
+
+        forward: Dict[int, Tuple[int, int]] = {source_id: None}
+        backward: Dict[int, Tuple[int, int]] = {target_id: None}
+        forward_frontier, backward_frontier = [source_id], [target_id]
+        forward_movies, backward_movies = set(), set()
+
+        while forward_frontier and backward_frontier:
+            # Expand whichever side has the fewest actors to visit
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_frontier, meetings = self._expand(forward_frontier, forward, forward_movies, backward)
+            else:
+                backward_frontier, meetings = self._expand(backward_frontier, backward, backward_movies, forward)
+
+            if not meetings:
+                continue
+
+            # Every meeting in this level gives a path through the newly expanded level, pick the shortest of them
+            best = None
+            for actor_id in meetings:
+                forward_actors, forward_movie_ids = self._walk(forward, actor_id)
+                backward_actors, backward_movie_ids = self._walk(backward, actor_id)
+
+                if best is None or len(forward_movie_ids) + len(backward_movie_ids) < len(best[1]):
+                    best = (forward_actors[::-1] + backward_actors[1:], forward_movie_ids[::-1] + backward_movie_ids)
+
+            return best
+
+        return None
+
+    def get_path(self, actor: Hashable, other: Hashable) -> Optional[ActorPath]:
+        """
+        Returns the shortest chain of movies linking the given actors, or None if there isn't one. Recently requested
+        paths are cached until a movie that could change them is added to this graph.
+        """
+        try:
+            key = (self._actor_ids[actor], self._actor_ids[other])
+        except KeyError:
+            return None
+
+        with self._cache_lock:
+            path = self._path_cache.get(key, False)
+            if path is not False:
+                self._path_cache.move_to_end(key)
+
+        if path is False:
+            # Searched without the lock, so other threads can use the cache meanwhile
+            path = self._find_path(*key)
+
+            with self._cache_lock:
+                self._path_cache[key] = path
+                self._path_cache.move_to_end(key)
+
+                if len(self._path_cache) > self._PATH_CACHE_SIZE:
+                    self._path_cache.popitem(last=False)
+
+        if path is None:
+            return None
+
+        actor_ids, movie_ids = path
+        return ActorPath([self._actors[actor_id] for actor_id in actor_ids],
+                         [self._movies[movie_id] for movie_id in movie_ids])
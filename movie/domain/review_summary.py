@@ -0,0 +1,70 @@
+from typing import List, Optional
+
+
+class ReviewSummary:
+    """ Running totals of the ratings given to a movie in its reviews, updated in constant time as reviews change. """
+
+    MIN_RATING = 1
+    MAX_RATING = 10
+
+    def __init__(self, number_of_reviews: int = 0, rating_total: int = 0, histogram: List[int] = None) -> None:
+        self._number_of_reviews = number_of_reviews
+        self._rating_total = rating_total
+        self._histogram = list(histogram) if histogram else [0] * (self.MAX_RATING - self.MIN_RATING + 1)
+
+        if len(self._histogram) != self.MAX_RATING - self.MIN_RATING + 1:
+            raise ValueError(f"'histogram' must have a count for each rating from {self.MIN_RATING} to "
+                             f"{self.MAX_RATING}")
+
+    @property
+    def number_of_reviews(self) -> int:
+        return self._number_of_reviews
+
+    @property
+    def rating_total(self) -> int:
+        return self._rating_total
+
+    @property
+    def histogram(self) -> List[int]:
+        """ The number of reviews with each rating, i.e. histogram[0] is the number of reviews with a rating of 1. """
+        return self._histogram
+
+    @property
+    def average_rating(self) -> Optional[float]:
+        """ The mean rating of all reviews, or None if there aren't any reviews. """
+        if self._number_of_reviews == 0:
+            return None
+        return self._rating_total / self._number_of_reviews
+
+    def _check_rating(self, rating: int) -> None:
+        if not isinstance(rating, int):
+            raise TypeError(f"'rating' must be of type 'int' but was '{type(rating).__name__}'")
+
+        if rating < self.MIN_RATING or rating > self.MAX_RATING:
+            raise ValueError(f"'rating' must be between {self.MIN_RATING} and {self.MAX_RATING} but was {rating}")
+
+    def add_rating(self, rating: int) -> None:
+        """ Adds a review with the given rating to this summary. """
+        self._check_rating(rating)
+        self._number_of_reviews += 1
+        self._rating_total += rating
+        self._histogram[rating - self.MIN_RATING] += 1
+
+    def remove_rating(self, rating: int) -> None:
+        """ Removes a review with the given rating from this summary. """
+        self._check_rating(rating)
+
+        if self._histogram[rating - self.MIN_RATING] == 0:
+            raise ValueError(f"there are no reviews with a rating of {rating} to remove")
+
+        self._number_of_reviews -= 1
+        self._rating_total -= rating
+        self._histogram[rating - self.MIN_RATING] -= 1
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ReviewSummary):
+            return False
+        return self._histogram == other._histogram
+
+    def __repr__(self) -> str:
+        return f'<{type(self).__name__} {self._number_of_reviews}, {self.average_rating}, {self._histogram}>'
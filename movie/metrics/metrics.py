@@ -0,0 +1,40 @@
+from time import perf_counter
+
+from flask import Blueprint, Response, current_app, g, request
+
+metrics_blueprint = Blueprint(
+    'metrics_bp', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@metrics_blueprint.before_app_request
+def start_request_timer():
+    g.metrics_start = perf_counter()
+
+
+@metrics_blueprint.after_app_request
+def record_request(response):
+    start = g.pop('metrics_start', None)
+
+    if start is not None:
+        # Streamed responses don't have a known length
+        size = response.calculate_content_length() or 0
+        current_app.config['METRICS'].record_request(request.endpoint or 'unknown', request.method,
+                                                     response.status_code, perf_counter() - start, size)
+    return response
+
+
+@metrics_blueprint.teardown_app_request
+def record_failed_request(exception=None):
+    # Requests that raised an exception which wasn't turned into a response never reach record_request
+    start = g.pop('metrics_start', None)
+
+    if start is not None and exception is not None:
+        current_app.config['METRICS'].record_request(request.endpoint or 'unknown', request.method, 500,
+                                                     perf_counter() - start, 0)
+
+
+@metrics_blueprint.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(current_app.config['METRICS'].render(), content_type=PROMETHEUS_CONTENT_TYPE)
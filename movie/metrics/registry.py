@@ -0,0 +1,128 @@
+import json
+from collections import defaultdict
+from functools import wraps
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+from movie.adapters.repository import AbstractRepository
+from movie.metrics.store import AbstractMetricsStore, MemoryMetricsStore
+
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+RESPONSE_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+REPOSITORY_DURATION_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+# The type and description of each metric
+_METRICS = {
+    'http_requests_total': ('counter', 'Number of HTTP requests by endpoint, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Time taken to handle HTTP requests by endpoint.'),
+    'http_response_size_bytes': ('histogram', 'Size of HTTP response bodies by endpoint.'),
+    'repository_calls_total': ('counter', 'Number of calls to each repository method.'),
+    'repository_call_errors_total': ('counter', 'Number of calls to each repository method that raised.'),
+    'repository_call_duration_seconds': ('histogram', 'Time taken by each repository method.')
+}
+
+_HISTOGRAM_SUFFIXES = ('_bucket', '_sum', '_count')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """
+    Records how often each endpoint and repository method is used and how long they take, and renders them in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self, store: AbstractMetricsStore = None) -> None:
+        self._store = store if store is not None else MemoryMetricsStore()
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> str:
+        return json.dumps([name, sorted(labels.items())])
+
+    def _increment(self, name: str, labels: Dict[str, str], amount: float = 1) -> None:
+        self._store.add(self._key(name, labels), amount)
+
+    def _observe(self, name: str, labels: Dict[str, str], value: float, buckets: Tuple[float, ...]) -> None:
+        # Buckets are cumulative, so a value is counted in every bucket it fits in
+        for bound in buckets:
+            if value <= bound:
+                self._increment(f'{name}_bucket', {**labels, 'le': repr(float(bound))})
+        self._increment(f'{name}_bucket', {**labels, 'le': '+Inf'})
+        self._increment(f'{name}_sum', labels, value)
+        self._increment(f'{name}_count', labels)
+
+    def record_request(self, endpoint: str, method: str, status: int, duration: float, size: int) -> None:
+        self._increment('http_requests_total', {'endpoint': endpoint, 'method': method, 'status': str(status)})
+        self._observe('http_request_duration_seconds', {'endpoint': endpoint}, duration, REQUEST_DURATION_BUCKETS)
+        self._observe('http_response_size_bytes', {'endpoint': endpoint}, size, RESPONSE_SIZE_BUCKETS)
+
+    def record_repository_call(self, method: str, duration: float, error: bool = False) -> None:
+        self._increment('repository_calls_total', {'method': method})
+        if error:
+            self._increment('repository_call_errors_total', {'method': method})
+        self._observe('repository_call_duration_seconds', {'method': method}, duration, REPOSITORY_DURATION_BUCKETS)
+
+    def _timed(self, name: str, method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception:
+                self.record_repository_call(name, perf_counter() - start, error=True)
+                raise
+            self.record_repository_call(name, perf_counter() - start)
+            return result
+        return wrapper
+
+    def instrument_repository(self, repo: AbstractRepository) -> AbstractRepository:
+        """
+        Records every call to the given repository's public methods. The methods are replaced on the instance rather
+        than wrapping the repository in another object so that it's still an instance of its class.
+        """
+        if getattr(repo, '_instrumented', False):
+            return repo
+
+        for name in dir(AbstractRepository):
+            if not name.startswith('_') and callable(getattr(AbstractRepository, name)):
+                setattr(repo, name, self._timed(name, getattr(repo, name)))
+
+        repo._instrumented = True
+        return repo
+
+    def render(self) -> str:
+        """ Returns every metric in the Prometheus text exposition format. """
+        samples: Dict[str, List[Tuple[str, List[Tuple[str, str]], float]]] = defaultdict(list)
+
+        for key, value in self._store.collect().items():
+            name, labels = json.loads(key)
+            metric = name
+            for suffix in _HISTOGRAM_SUFFIXES:
+                if name.endswith(suffix) and name[:-len(suffix)] in _METRICS:
+                    metric = name[:-len(suffix)]
+            samples[metric].append((name, labels, value))
+
+        def order(sample):
+            name, labels, _ = sample
+            # Buckets are listed in order of their upper bound, followed by the series' sum and then its count
+            others = [(label, value) for label, value in labels if label != 'le']
+            bound = next((float(value) for label, value in labels if label == 'le'), float('inf'))
+            return others, not name.endswith('_bucket'), name.endswith('_count'), bound
+
+        lines = []
+        for metric, (metric_type, description) in _METRICS.items():
+            if metric not in samples:
+                continue
+
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} {metric_type}')
+
+            for name, labels, value in sorted(samples[metric], key=order):
+                # By convention a bucket's upper bound is its last label
+                labels = sorted(labels, key=lambda label: label[0] == 'le')
+                label_text = ','.join(f'{label}="{_escape(value)}"' for label, value in labels)
+                lines.append(f'{name}{{{label_text}}} {repr(float(value))}')
+
+        return '\n'.join(lines) + '\n'
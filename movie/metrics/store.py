@@ -0,0 +1,168 @@
+import abc
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from typing import Dict, Iterator, Tuple
+
+
+class AbstractMetricsStore(abc.ABC):
+    """ Holds the value of each metric sample, e.g. the number of requests made to an endpoint. """
+
+    @abc.abstractmethod
+    def add(self, key: str, amount: float) -> None:
+        """ Adds amount to the value of the sample with the given key, which starts at 0. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def collect(self) -> Dict[str, float]:
+        """ Returns the value of every sample. """
+        raise NotImplementedError
+
+
+class MemoryMetricsStore(AbstractMetricsStore):
+    """ Keeps samples in memory, so only the current process' samples are collected. """
+
+    def __init__(self) -> None:
+        self._values: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, key: str, amount: float) -> None:
+        with self._lock:
+            self._values[key] += amount
+
+    def collect(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class _MmapFile:
+    """
+    A file of (key, value) entries that's mapped into memory so that values can be updated in place.
+
+    The file starts with the number of bytes in use, followed by entries, each of which is the length of the key, the
+    key padded to a multiple of 8 bytes and the value as a double. Entries are written before the number of bytes in
+    use is updated so that other processes never read a partially written entry.
+    """
+
+    _HEADER = struct.Struct('<Q')
+    _KEY_LENGTH = struct.Struct('<I')
+    _VALUE = struct.Struct('<d')
+    _INITIAL_SIZE = 1 << 16
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'a+b')
+
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            size = self._INITIAL_SIZE
+            self._file.truncate(size)
+
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._used = self._HEADER.unpack_from(self._mmap, 0)[0] or self._HEADER.size
+        self._positions = {key: position for key, _, position in self.read_entries(self._mmap)}
+
+    @classmethod
+    def _entry_size(cls, key_bytes: bytes) -> int:
+        padded_length = (cls._KEY_LENGTH.size + len(key_bytes) + 7) // 8 * 8
+        return padded_length + cls._VALUE.size
+
+    @classmethod
+    def read_entries(cls, data) -> Iterator[Tuple[str, float, int]]:
+        """ Yields the key, value and position of the value of each entry in the given file contents. """
+        used = cls._HEADER.unpack_from(data, 0)[0] if len(data) >= cls._HEADER.size else 0
+        used = min(used, len(data))
+        position = cls._HEADER.size
+
+        while position < used:
+            key_length = cls._KEY_LENGTH.unpack_from(data, position)[0]
+            key_bytes = bytes(data[position + cls._KEY_LENGTH.size:position + cls._KEY_LENGTH.size + key_length])
+            value_position = position + cls._entry_size(key_bytes) - cls._VALUE.size
+
+            # The file was read while an entry was being added
+            if value_position + cls._VALUE.size > used:
+                break
+
+            yield key_bytes.decode('utf-8'), cls._VALUE.unpack_from(data, value_position)[0], value_position
+            position = value_position + cls._VALUE.size
+
+    def _append(self, key: str) -> int:
+        key_bytes = key.encode('utf-8')
+        entry_size = self._entry_size(key_bytes)
+
+        if self._used + entry_size > len(self._mmap):
+            size = len(self._mmap)
+            while self._used + entry_size > size:
+                size *= 2
+            self._mmap.close()
+            self._file.truncate(size)
+            self._mmap = mmap.mmap(self._file.fileno(), size)
+
+        position = self._used
+        self._KEY_LENGTH.pack_into(self._mmap, position, len(key_bytes))
+        self._mmap[position + self._KEY_LENGTH.size:position + self._KEY_LENGTH.size + len(key_bytes)] = key_bytes
+        value_position = position + entry_size - self._VALUE.size
+        self._VALUE.pack_into(self._mmap, value_position, 0.0)
+
+        self._used += entry_size
+        self._HEADER.pack_into(self._mmap, 0, self._used)
+        self._positions[key] = value_position
+        return value_position
+
+    def add(self, key: str, amount: float) -> None:
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+
+        value = self._VALUE.unpack_from(self._mmap, position)[0]
+        self._VALUE.pack_into(self._mmap, position, value + amount)
+
+    def close(self) -> None:
+        self._mmap.close()
+        self._file.close()
+
+
+class MultiprocessMetricsStore(AbstractMetricsStore):
+    """
+    Keeps each process' samples in its own memory mapped file in the given directory, so that several processes,
+    e.g. gunicorn workers, can record samples without locking each other and any of them can collect the sum of every
+    process' samples. Files from processes that have exited are still collected so that totals don't go backwards.
+
+    The directory should be emptied before the server starts.
+    """
+
+    _FILE_PREFIX = 'metrics_'
+
+    def __init__(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+
+    def _process_file(self) -> _MmapFile:
+        # Processes forked after this store was created, e.g. by gunicorn, each need their own file
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._file = _MmapFile(os.path.join(self._directory, f'{self._FILE_PREFIX}{self._pid}.db'))
+        return self._file
+
+    def add(self, key: str, amount: float) -> None:
+        with self._lock:
+            self._process_file().add(key, amount)
+
+    def collect(self) -> Dict[str, float]:
+        values: Dict[str, float] = defaultdict(float)
+
+        for file_name in sorted(os.listdir(self._directory)):
+            if not file_name.startswith(self._FILE_PREFIX):
+                continue
+
+            with open(os.path.join(self._directory, file_name), 'rb') as file:
+                data = file.read()
+
+            for key, value, _ in _MmapFile.read_entries(data):
+                values[key] += value
+
+        return dict(values)
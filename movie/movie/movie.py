@@ -1,6 +1,12 @@
+import time
+from datetime import datetime
+from typing import Optional
+
 from better_profanity import profanity
-from flask import Blueprint, render_template, abort, session, url_for, request, current_app
+from flask import Blueprint, Response, render_template, abort, session, url_for, request, current_app, make_response
 from flask_wtf import FlaskForm
+from flask_wtf.csrf import generate_csrf
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import redirect
 from wtforms import ValidationError, TextAreaField, SubmitField, SelectField
 from wtforms.validators import DataRequired, Length, NumberRange
@@ -23,6 +29,57 @@ INVALID_REVIEW_TEXT_LENGTH_MESSAGE = 'Reviews must be at least one character lon
 REVIEW_TEXT_CONTAINS_PROFANITY_MESSAGE = 'Please keep it PG (no profanity!).'
 
 
+def _form_version() -> str:
+    """ Identifies the CSRF token that forms are rendered with, as it's tied to the session and expires. """
+    if not current_app.config.get('WTF_CSRF_ENABLED', True):
+        return ''
+
+    # Made now if the session doesn't have one yet, so that the page's version doesn't change once it's rendered
+    generate_csrf()
+
+    # A page can be reused until the time limit has passed since its token was made
+    time_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    period = int(time.time() // time_limit) if time_limit else 0
+    return f"{session.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'), '')}:{period}"
+
+
+def _not_modified(version: MovieVersion, public: bool) -> Optional[Response]:
+    """ Returns an empty response if the client already has the given version of the page, otherwise None. """
+    last_modified = _last_modified(version) if public else None
+
+    if is_resource_modified(request.environ, etag=version.etag, last_modified=last_modified):
+        return None
+
+    return _add_validators(Response(status=304), version, public)
+
+
+def _last_modified(version: MovieVersion) -> datetime:
+    catalog_modified = current_app.config['CATALOG_MODIFIED']
+
+    if version.last_modified is None:
+        return catalog_modified
+
+    return max(catalog_modified, version.last_modified)
+
+
+def _add_validators(response: Response, version: MovieVersion, public: bool) -> Response:
+    """
+    Lets clients and caches keep the page but has them check it's still current before each use. Pages that depend on
+    the session are only kept by the client, and Flask adds Vary: Cookie to them as the session has been accessed.
+    """
+    response.set_etag(version.etag)
+    response.cache_control.no_cache = True
+
+    if public:
+        response.cache_control.public = True
+        # Clients that don't send the ETag back can still ask whether the page has changed since this
+        response.last_modified = _last_modified(version)
+    else:
+        response.cache_control.private = True
+
+    return response
+
+
 @movie_blueprint.route('/movie/<int:movie_id>', methods=['GET'])
 def movie(movie_id: int):
     repo = current_app.config['REPOSITORY']
@@ -46,12 +103,23 @@ def movie(movie_id: int):
         session.clear()
         pass
 
-    return render_template(
+    public = user is None
+    version = get_movie_version(repo, movie, current_app.config['CATALOG_VERSION'], user)
+    not_modified = _not_modified(version, public)
+
+    if not_modified is not None:
+        return not_modified
+
+    response = make_response(render_template(
         'movie/summary.html',
         movie=movie,
+        similar_movies=get_similar_movies(repo, movie),
+        review_summary=get_review_summary(repo, movie),
         tab=0,
         user=user
-    )
+    ))
+
+    return _add_validators(response, version, public)
 
 
 @movie_blueprint.route('/movie/<int:movie_id>/reviews', methods=['GET', 'POST'])
@@ -85,10 +153,22 @@ def reviews(movie_id: int):
     except ValueError:
         abort(404)
 
-    if page < 0:
+    if page < 0 or page_size < 1:
         abort(404)
 
-    results = get_movie_reviews(repo, movie, page, page_size)
+    version = None
+    form_version = _form_version()
+    public = user is None and not form_version
+
+    if request.method == 'GET':
+        version = get_movie_version(repo, movie, f"{current_app.config['CATALOG_VERSION']}:{form_version}", user)
+        not_modified = _not_modified(version, public)
+
+        if not_modified is not None:
+            return not_modified
+
+    results = get_movie_reviews(repo, movie, page, page_size, current_app.config['RESULT_VERSIONS'],
+                                request.args.get('version'))
 
     if page >= results.pages and page != 0:
         abort(404)
@@ -111,10 +191,12 @@ def reviews(movie_id: int):
     reviews = results.reviews
     reviews_user_map = get_reviews_user_map(repo, reviews)
 
+    # Links to the other pages carry the version of the reviews this page was taken from
     args = {key: request.args[key] for key in request.args if key != 'page'}
     args['movie_id'] = movie.id
+    args['version'] = results.version
 
-    return render_template(
+    response = make_response(render_template(
         'movie/reviews.html',
         movie=movie,
         reviews=reviews,
@@ -129,7 +211,10 @@ def reviews(movie_id: int):
         pagination_endpoint='movie_bp.reviews',
         args=args,
         user=user
-    )
+    ))
+
+    # Pages showing why a review wasn't accepted shouldn't be reused
+    return _add_validators(response, version, public) if version is not None else response
 
 
 class ProfanityFree:
@@ -1,9 +1,13 @@
+import hashlib
+from datetime import datetime
 from math import ceil
-from typing import List, Dict, Union, NamedTuple
+from typing import List, Dict, Union, NamedTuple, Optional
 
 from movie.adapters.repository import AbstractRepository
+from movie.adapters.result_versions import ResultVersions
 from movie.domain.movie import Movie
 from movie.domain.review import Review
+from movie.domain.review_summary import ReviewSummary
 from movie.domain.user import User
 
 DEFAULT_PAGE_SIZE = 25
@@ -15,6 +19,7 @@ class SearchResults(NamedTuple):
     hits: int
     page: int
     pages: int
+    version: Optional[str] = None
 
 
 def get_movie_by_id(repo: AbstractRepository, movie_id: int) -> Movie:
@@ -22,11 +27,62 @@ def get_movie_by_id(repo: AbstractRepository, movie_id: int) -> Movie:
     return repo.get_movie_by_id(movie_id)
 
 
+def get_similar_movies(repo: AbstractRepository, movie: Movie) -> List[Movie]:
+    """ Returns the movies most similar to the given movie in the given repository, most similar first. """
+    return repo.get_similar_movies(movie)
+
+
+def get_review_summary(repo: AbstractRepository, movie: Movie) -> ReviewSummary:
+    """ Returns the number of reviews for the given movie, their average rating and how many gave each rating. """
+    return repo.get_review_summary(movie)
+
+
+class MovieVersion(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+
+def get_movie_version(repo: AbstractRepository,
+                      movie: Movie,
+                      page_version: str,
+                      user: Union[User, None] = None) -> MovieVersion:
+    """
+    Returns a token that changes whenever the pages for the given movie would, along with when its latest review was
+    posted, without rendering them. The page version identifies anything else the page depends on, e.g. the catalog
+    that was loaded. If a user is given the token also covers what's shown to them about the movie.
+    """
+    summary = repo.get_review_summary(movie)
+    latest_reviews = repo.get_reviews_for_movie(movie, 0, 1) if summary.number_of_reviews else []
+    last_modified = latest_reviews[0].timestamp if latest_reviews else None
+
+    parts = [page_version, movie.id, summary.number_of_reviews, summary.rating_total,
+             last_modified.isoformat() if last_modified else '']
+
+    if user is not None:
+        parts += [user.username, movie in user.watchlist, movie in user.watched_movies]
+
+    etag = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return MovieVersion(etag, last_modified)
+
+
 def get_movie_reviews(repo: AbstractRepository,
                       movie: Movie,
                       page_number: int,
-                      page_size: int = DEFAULT_PAGE_SIZE) -> SearchResults:
-    """ Returns a page of the reviews for the specified movie. Page numbers start from zero. """
+                      page_size: int = DEFAULT_PAGE_SIZE,
+                      versions: Optional[ResultVersions] = None,
+                      version: Optional[str] = None) -> SearchResults:
+    """
+    Returns a page of the reviews for the specified movie. Page numbers start from zero. If result versions are given,
+    the reviews are pinned when they're first shown, and later pages given the returned version show the same reviews
+    even if others have been posted since.
+    """
+    if versions is not None:
+        pinned = versions.get_or_pin(version, ('reviews', movie.id), lambda: repo.get_review_ids_for_movie(movie))
+
+        offset = page_number * page_size
+        reviews = repo.get_reviews_by_id(list(pinned.ids[offset:offset + page_size]))
+        hits = len(pinned.ids)
+        return SearchResults(reviews, hits, page_number, ceil(hits / page_size), pinned.version)
 
     reviews = repo.get_reviews_for_movie(movie, page_number, page_size)
     hits = repo.get_number_of_reviews_for_movie(movie)
@@ -0,0 +1,132 @@
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import re
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+from werkzeug.urls import url_decode
+
+logger = logging.getLogger(__name__)
+
+_Function = Tuple[str, int, str]
+
+
+def _function_name(function: _Function) -> str:
+    file_name, line, name = function
+    if file_name == '~':
+        # Built in functions, e.g. <built-in method builtins.len>
+        return name
+    return f'{name} ({os.path.basename(file_name)}:{line})'
+
+
+def collapsed_stacks(stats: pstats.Stats, min_microseconds: int = 1) -> Iterator[Tuple[str, int]]:
+    """
+    Yields each call stack in the given profile as 'outer;...;inner' along with the microseconds spent in its innermost
+    function, i.e. the collapsed stack format that flame graph tools read.
+
+    cProfile only records which functions called each other, not whole stacks, so the time of a function with several
+    callers is split between them in proportion to the time each caller spent in it.
+    """
+    callees: Dict[_Function, List[Tuple[_Function, float]]] = {}
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, cumulative_time) in callers.items():
+            callees.setdefault(caller, []).append((function, cumulative_time))
+
+    roots = [function for function, (_, _, _, _, callers) in stats.stats.items() if not callers]
+
+    def walk(function: _Function, time: float, path: List[_Function]):
+        _, _, total_time, cumulative_time, _ = stats.stats[function]
+        fraction = time / cumulative_time if cumulative_time else 0
+        path = path + [function]
+
+        own_microseconds = round(total_time * fraction * 1e6)
+        if own_microseconds >= min_microseconds:
+            yield ';'.join(_function_name(f) for f in path), own_microseconds
+
+        for callee, callee_time in callees.get(function, []):
+            # Recursive calls are already counted in the outer call's time
+            if callee not in path and callee_time * fraction * 1e6 >= min_microseconds:
+                yield from walk(callee, callee_time * fraction, path)
+
+    for root in roots:
+        yield from walk(root, stats.stats[root][3], [])
+
+
+class RequestProfiler:
+    """
+    WSGI middleware that profiles a single request with cProfile when it has a profile query parameter or X-Profile
+    header matching the configured token. The profile is written to the profiles directory as collapsed stacks for
+    flame graphs, a table of the functions with the most cumulative time and the raw profile for other tools.
+
+    This is only installed when profiling is enabled, so that otherwise requests don't pay anything for it.
+    """
+
+    QUERY_PARAMETER = 'profile'
+    HEADER = 'HTTP_X_PROFILE'
+
+    def __init__(self, wsgi_app, token: str, directory: str, top_n: int = 50) -> None:
+        if not token:
+            raise ValueError("a token is required to enable profiling")
+
+        self._wsgi_app = wsgi_app
+        self._token = token
+        self._directory = directory
+        self._top_n = top_n
+
+    def _is_requested(self, environ) -> bool:
+        token = environ.get(self.HEADER) or url_decode(environ.get('QUERY_STRING', '')).get(self.QUERY_PARAMETER)
+        return bool(token) and hmac.compare_digest(token.encode(), self._token.encode())
+
+    def _file_stem(self, environ) -> str:
+        path = re.sub(r'[^A-Za-z0-9]+', '_', environ.get('PATH_INFO', '')).strip('_') or 'root'
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        return f"{timestamp}_{environ.get('REQUEST_METHOD', 'GET')}_{path}_{os.getpid()}"
+
+    def write_profile(self, profile: cProfile.Profile, stem: str) -> str:
+        """ Writes the given profile to the profiles directory and returns the path of the files, less extensions. """
+        os.makedirs(self._directory, exist_ok=True)
+        path = os.path.join(self._directory, stem)
+
+        profile.dump_stats(f'{path}.prof')
+
+        stats = pstats.Stats(profile)
+        with open(f'{path}.collapsed', 'w') as file:
+            for stack, microseconds in collapsed_stacks(stats):
+                file.write(f'{stack} {microseconds}\n')
+
+        table = io.StringIO()
+        pstats.Stats(profile, stream=table).sort_stats('cumulative').print_stats(self._top_n)
+        with open(f'{path}.txt', 'w') as file:
+            file.write(table.getvalue())
+
+        return path
+
+    def __call__(self, environ, start_response):
+        if not self._is_requested(environ):
+            return self._wsgi_app(environ, start_response)
+
+        stem = self._file_stem(environ)
+
+        def profiled_start_response(status, headers, exc_info=None):
+            return start_response(status, headers + [('X-Profile', stem)], exc_info)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            # The body is read while profiling in case it's generated lazily
+            response = self._wsgi_app(environ, profiled_start_response)
+            try:
+                body = list(response)
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+        finally:
+            profile.disable()
+
+        path = self.write_profile(profile, stem)
+        logger.info('Profiled %s %s to %s', environ.get('REQUEST_METHOD'), environ.get('PATH_INFO'), path)
+        return body
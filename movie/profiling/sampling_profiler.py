@@ -0,0 +1,135 @@
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from types import CodeType
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_Stack = Tuple[str, Tuple[CodeType, ...]]
+
+
+def _code_name(code: CodeType) -> str:
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """
+    Samples what every other thread in this process is doing at a fixed interval from a background thread, counting
+    how often each call stack is seen. The counts are written to the given directory periodically as collapsed stacks
+    for flame graphs, one file per process, so that the hot paths under real traffic can be seen.
+
+    As it only looks at each thread's current frames, rather than tracing every call, it's cheap enough to leave on.
+    Processes forked after it's started, e.g. gunicorn workers, start their own sampling thread and file.
+    """
+
+    def __init__(self, directory: str, interval_seconds: float = 0.01, flush_seconds: float = 60) -> None:
+        if interval_seconds <= 0:
+            raise ValueError(f"'interval_seconds' must be greater than 0 but was {interval_seconds}")
+
+        if flush_seconds <= 0:
+            raise ValueError(f"'flush_seconds' must be greater than 0 but was {flush_seconds}")
+
+        self._directory = directory
+        self._interval_seconds = interval_seconds
+        self._flush_seconds = flush_seconds
+
+        self._counts: Dict[_Stack, int] = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._registered_fork_handler = False
+
+    @property
+    def file_name(self) -> str:
+        return os.path.join(self._directory, f'sampled_{os.getpid()}.collapsed')
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def sample(self) -> None:
+        """ Records the current stack of every thread other than the calling one. """
+        current = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+
+        for ident, frame in sys._current_frames().items():
+            if ident == current:
+                continue
+
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+
+            codes.reverse()
+            stacks.append((names.get(ident, str(ident)), tuple(codes)))
+
+        with self._lock:
+            self._counts.update(stacks)
+
+    def flush(self) -> None:
+        """ Writes the number of times each stack has been seen so far to this process' file. """
+        with self._lock:
+            counts = list(self._counts.items())
+
+        os.makedirs(self._directory, exist_ok=True)
+        temporary_file_name = f'{self.file_name}.tmp'
+
+        with open(temporary_file_name, 'w') as file:
+            for (thread_name, codes), count in counts:
+                stack = ';'.join([thread_name] + [_code_name(code) for code in codes])
+                file.write(f'{stack} {count}\n')
+
+        # Replaced in one step so that the file is never seen half written
+        os.replace(temporary_file_name, self.file_name)
+
+    def _run(self) -> None:
+        samples_per_flush = max(1, round(self._flush_seconds / self._interval_seconds))
+        samples = 0
+
+        while not self._stop.wait(self._interval_seconds):
+            try:
+                self.sample()
+                samples += 1
+
+                if samples % samples_per_flush == 0:
+                    self.flush()
+            except Exception:
+                logger.exception('Failed to sample stacks')
+
+    def start(self) -> None:
+        """ Starts sampling on a background thread. """
+        if self.is_running:
+            return
+
+        if not self._registered_fork_handler:
+            os.register_at_fork(after_in_child=self._restart_in_child)
+            self._registered_fork_handler = True
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def _restart_in_child(self) -> None:
+        # Threads don't survive a fork, and the child's samples belong in its own file
+        was_running = self._thread is not None and not self._stop.is_set()
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        if was_running:
+            self.start()
+
+    def stop(self) -> None:
+        """ Stops sampling and writes the stacks seen so far. """
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
@@ -4,6 +4,7 @@ from werkzeug.utils import redirect
 
 import movie.adapters.repository as repo
 from .services import search_movies, create_search_form, DEFAULT_PAGE_SIZE
+from ..adapters.repository import AbstractRepository
 from ..auth import services as auth
 
 search_blueprint = Blueprint(
@@ -37,20 +38,26 @@ def search():
     genres = request.args.getlist('genre')
     directors = request.args.getlist('director')
     actors = request.args.getlist('actor')
+    sort_by = request.args.get('sort') or AbstractRepository.SORT_BY_TITLE
 
     current_app.logger.debug(f'search-form {repr(query)}, {repr(genres)}, {repr(directors)}, {repr(actors)}')
     current_app.logger.debug(f'search-args {repr(request.args)}')
 
-    if page < 0:
+    if page < 0 or page_size < 1 or sort_by not in AbstractRepository.SORT_OPTIONS:
         abort(404)
 
     results = search_movies(repo, page, page_size=page_size, query=query, genres=genres, directors=directors,
-                            actors=actors)
+                            actors=actors, sort_by=sort_by, versions=current_app.config['RESULT_VERSIONS'],
+                            version=request.args.get('version'))
 
     if page >= results.pages and page != 0:
         abort(404)
 
-    is_advanced_search = bool(genres or directors or actors)
+    is_advanced_search = bool(genres or directors or actors or sort_by != AbstractRepository.SORT_BY_TITLE)
+
+    # Links to the other pages carry the version of the results this page was taken from
+    args = {key: request.args[key] for key in request.args if key != 'page'}
+    args['version'] = results.version
 
     return render_template(
         'search/search.html',
@@ -59,7 +66,7 @@ def search():
         page=results.page,
         pages=results.pages,
         page_size=page_size,
-        args={key: request.args[key] for key in request.args if key != 'page'},
+        args=args,
         pagination_endpoint='search_bp.search',
         user=user,
         form=form,
@@ -1,15 +1,22 @@
-from typing import List, NamedTuple
+from math import ceil
+from typing import List, NamedTuple, Optional
 
 from flask_wtf import FlaskForm
-from wtforms import SelectMultipleField, SubmitField, StringField
+from wtforms import SelectMultipleField, SubmitField, StringField, SelectField
 
 from movie.adapters.repository import AbstractRepository
+from movie.adapters.result_versions import ResultVersions
 from movie.domain.director import Director
 from movie.domain.movie import Movie
 from movie.utilities.services import get_genres, get_actors, get_directors
 
 DEFAULT_PAGE_SIZE = 25
 
+SORT_CHOICES = [
+    (AbstractRepository.SORT_BY_TITLE, 'Title'),
+    (AbstractRepository.SORT_BY_COMMUNITY_RATING, 'Community rating')
+]
+
 
 # Note - page numbers starts from 0.
 class SearchResults(NamedTuple):
@@ -17,6 +24,7 @@ class SearchResults(NamedTuple):
     hits: int = 0
     page: int = 0
     pages: int = 0
+    version: Optional[str] = None
 
 
 def search_movies(repo: AbstractRepository,
@@ -25,12 +33,20 @@ def search_movies(repo: AbstractRepository,
                   query: str = '',
                   genres: List[str] = [],
                   directors: List[str] = [],
-                  actors: List[str] = []) -> SearchResults:
+                  actors: List[str] = [],
+                  sort_by: str = AbstractRepository.SORT_BY_TITLE,
+                  versions: Optional[ResultVersions] = None,
+                  version: Optional[str] = None) -> SearchResults:
     """
     Searches for movies using the given filtering options and returns a SearchResults NamedTuple.
 
-    Check the get_movies method in AbstractRepository for info on filtering options.
+    Check the get_movies method in AbstractRepository for info on filtering options. If result versions are given, the
+    results are pinned when the search is first made, and later pages given the returned version come from the same
+    results even if movies have been added or removed since.
     """
+    # Identifies the search by what was asked for, before the names are looked up
+    key = ('search', query, tuple(genres), tuple(directors), tuple(actors), sort_by)
+
     try:
         genres = [repo.get_genre(name) for name in genres]
     except ValueError:
@@ -47,7 +63,16 @@ def search_movies(repo: AbstractRepository,
     except ValueError:
         return SearchResults([], 0, page_number, 0)
 
-    movies = repo.get_movies(page_number, page_size, query, genres, directors, actors)
+    if versions is not None:
+        pinned = versions.get_or_pin(version, key,
+                                     lambda: repo.get_movie_ids(query, genres, directors, actors, sort_by))
+
+        offset = page_number * page_size
+        movies = repo.get_movies_by_id(list(pinned.ids[offset:offset + page_size]))
+        hits = len(pinned.ids)
+        return SearchResults(movies, hits, page_number, ceil(hits / page_size), pinned.version)
+
+    movies = repo.get_movies(page_number, page_size, query, genres, directors, actors, sort_by)
     hits = repo.get_number_of_movies(query, genres, directors, actors)
     pages = repo.get_number_of_movie_pages(page_size, query, genres, directors, actors)
 
@@ -75,4 +100,5 @@ class MovieSearchForm(FlaskForm):
     genre = SelectMultipleField('Genres')
     director = SelectMultipleField('Directors')
     actor = SelectMultipleField('Actors')
+    sort = SelectField('Sort by', choices=SORT_CHOICES)
     submit = SubmitField('Submit')
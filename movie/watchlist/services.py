@@ -1,9 +1,13 @@
+from typing import List
+
+from movie.adapters.recommendations import RecommendationJob
 from movie.adapters.repository import AbstractRepository
 from movie.domain.movie import Movie
 from movie.domain.user import User
 from movie.search.services import SearchResults
 
 DEFAULT_PAGE_SIZE = 25
+NUMBER_OF_RECOMMENDATIONS = 5
 
 
 def get_user_movies(repo: AbstractRepository,
@@ -37,3 +41,28 @@ def add_movie_to_watched(repo: AbstractRepository, user: User, movie: Movie) ->
 def remove_movie_from_watched(repo: AbstractRepository, user: User, movie: Movie) -> None:
     """ Removes the given movie from the given user's list of watched movies. """
     repo.remove_from_watched(user, movie)
+
+
+def get_recommended_movies(repo: AbstractRepository,
+                           recommendations: RecommendationJob,
+                           user: User,
+                           limit: int = NUMBER_OF_RECOMMENDATIONS) -> List[Movie]:
+    """ Returns the movies recommended for the given user that aren't already in their watchlist or watched movies. """
+    movies = []
+
+    for movie_id in recommendations.get_recommendations(user.id):
+        try:
+            movie = repo.get_movie_by_id(movie_id)
+        except ValueError:
+            # Recommendations are rebuilt periodically so may refer to movies that no longer exist
+            continue
+
+        if movie in user.watchlist or movie in user.watched_movies:
+            continue
+
+        movies.append(movie)
+
+        if len(movies) == limit:
+            break
+
+    return movies
@@ -7,7 +7,7 @@ from werkzeug.utils import redirect
 from movie.auth.auth import login_required
 from movie.movie import services as movie_service
 from .services import get_user_movies, DEFAULT_PAGE_SIZE, add_movie_to_watchlist, remove_movie_from_watchlist, \
-    add_movie_to_watched, remove_movie_from_watched
+    add_movie_to_watched, remove_movie_from_watched, get_recommended_movies
 from ..auth import services as auth
 from ..movie.services import get_movie_by_id
 
@@ -66,10 +66,13 @@ def watchlist(movie_id: Union[int, None]):
     elif page > results.pages:
         abort(404)
 
+    recommended_movies = get_recommended_movies(repo, current_app.config['RECOMMENDATIONS'], user)
+
     return render_template(
         'watchlist/watchlist.html',
         user=user,
         movies=results.movies,
+        recommended_movies=recommended_movies,
         page=results.page,
         page_size=page_size,
         pages=results.pages,
@@ -144,7 +144,8 @@ def client():
         'TESTING': True,
         'WTF_CSRF_ENABLED': False,
         'TEST_DATA_PATH': TEST_DATA_PATH_MEMORY,
-        'REPOSITORY': 'memory'
+        'REPOSITORY': 'memory',
+        'RECOMMENDATIONS_REFRESH_SECONDS': 0
     })
 
     # Disable caching for tests
@@ -0,0 +1,25 @@
+from flask.testing import FlaskClient
+
+from movie.actors import actors
+
+
+def test_get_actor_path(client: FlaskClient):
+    response = client.get('/actors/path')
+    assert response.status_code == 200
+
+    response = client.get('/actors/path', query_string={'from': 'Vin Diesel', 'to': 'Ryan Gosling'})
+    assert response.status_code == 200
+    assert b'2 degrees of separation' in response.data
+    assert b'La La Land' in response.data
+
+
+def test_get_actor_path_not_connected(client: FlaskClient):
+    response = client.get('/actors/path', query_string={'from': 'Vin Diesel', 'to': 'Noomi Rapace'})
+    assert response.status_code == 200
+    assert actors.NO_PATH_MESSAGE.encode() in response.data
+
+
+def test_get_actor_path_unknown_actor(client: FlaskClient):
+    response = client.get('/actors/path', query_string={'from': 'Vin Diesel', 'to': 'Nobody'})
+    assert response.status_code == 200
+    assert actors.UNKNOWN_ACTOR_MESSAGE.encode() in response.data
@@ -0,0 +1,19 @@
+from flask.testing import FlaskClient
+
+
+def test_get_metrics(client: FlaskClient):
+    client.get('/')
+    client.get('/movie/1/reviews')
+    client.get('/movie/12345')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+
+    text = response.get_data(as_text=True)
+    assert 'http_requests_total{endpoint="home_bp.home",method="GET",status="200"} 1.0' in text
+    assert 'http_requests_total{endpoint="movie_bp.reviews",method="GET",status="200"} 1.0' in text
+    assert 'http_requests_total{endpoint="movie_bp.movie",method="GET",status="404"} 1.0' in text
+    assert 'http_request_duration_seconds_count{endpoint="movie_bp.reviews"} 1.0' in text
+    assert 'http_response_size_bytes_sum{endpoint="home_bp.home"}' in text
+    assert 'repository_calls_total{method="get_reviews_for_movie"}' in text
@@ -1,6 +1,10 @@
+import re
+from datetime import datetime
+
 import pytest
 from flask.testing import FlaskClient
 
+from movie.domain.review import Review
 from movie.movie import movie
 
 
@@ -12,6 +16,13 @@ def test_get_movie(client: FlaskClient):
     assert response.status_code == 404
 
 
+def test_get_movie_similar_movies(client: FlaskClient):
+    # Suicide Squad shares genres and actors with The Great Wall
+    response = client.get('/movie/4')
+    assert b'Similar movies' in response.data
+    assert b'The Great Wall' in response.data
+
+
 def test_get_movie_reviews(client: FlaskClient):
     response = client.get('/movie/7/reviews')
     assert response.status_code == 200
@@ -69,3 +80,94 @@ def test_add_review_invalid_input(client, rating, text, message):
 
     response = client.post('/movie/1/reviews', data=data, follow_redirects=True)
     assert message.encode() in response.data
+
+
+def test_get_movie_community_rating(client: FlaskClient):
+    data = {
+        'rating': 7,
+        'review': 'abc 123'
+    }
+
+    client.post('/movie/1/reviews', data=data)
+
+    response = client.get('/movie/1')
+    assert b'Community rating' in response.data
+    assert b'/ 10 from' in response.data
+
+
+@pytest.mark.parametrize('url', ('/movie/1', '/movie/1/reviews'))
+def test_get_movie_not_modified(client: FlaskClient, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.cache_control.public
+    assert response.cache_control.no_cache
+    assert response.last_modified is not None
+
+    etag, _ = response.get_etag()
+    response = client.get(url, headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.get_etag() == (etag, False)
+
+    # A new review changes the page
+    client.post('/movie/1/reviews', data={'rating': 5, 'review': 'abc 123'})
+    response = client.get(url, headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+def test_get_movie_not_modified_since(client: FlaskClient):
+    response = client.get('/movie/1')
+    response = client.get('/movie/1', headers={'If-Modified-Since': response.headers['Last-Modified']})
+    assert response.status_code == 304
+
+
+def test_get_movie_not_modified_authenticated(client: FlaskClient, auth):
+    anonymous_etag, _ = client.get('/movie/1').get_etag()
+
+    auth.login()
+    response = client.get('/movie/1')
+    etag, _ = response.get_etag()
+
+    assert etag != anonymous_etag
+    assert response.cache_control.private
+    assert response.last_modified is None
+    assert 'Cookie' in response.headers['Vary']
+    assert client.get('/movie/1', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+    # Adding the movie to the user's watchlist changes the page
+    client.post('/watchlist/1')
+    assert client.get('/movie/1', headers={'If-None-Match': f'"{etag}"'}).status_code == 200
+
+
+def test_get_movie_reviews_not_modified_with_csrf(client: FlaskClient):
+    client.application.config['WTF_CSRF_ENABLED'] = True
+
+    response = client.get('/movie/1/reviews')
+    etag, _ = response.get_etag()
+
+    # The page has a CSRF token tied to the session so it's only kept by the client
+    assert response.cache_control.private
+    assert b'csrf_token' in response.data
+    assert client.get('/movie/1/reviews', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+
+def test_get_movie_reviews_pages_from_same_reviews(client: FlaskClient):
+    repo = client.application.config['REPOSITORY']
+    movie = repo.get_movie_by_id(7)
+    # Newer than any other review of the movie, so that they're shown first
+    for i in range(4):
+        repo.add_review(Review(movie, f'review{i}', 5, datetime(2100, 1, 1 + i)))
+
+    response = client.get('/movie/7/reviews', query_string={'size': 2})
+    version = re.search(r'version=([\w-]+)', response.get_data(as_text=True)).group(1)
+
+    repo.add_review(Review(movie, 'newest', 5, datetime(2100, 2, 1)))
+
+    # The newest review would push review2 onto the second page, and review0 off it
+    response = client.get('/movie/7/reviews', query_string={'size': 2, 'page': 2, 'version': version})
+    assert b'review1' in response.data and b'review0' in response.data
+    assert b'review2' not in response.data
+
+    response = client.get('/movie/7/reviews', query_string={'size': 2, 'page': 2})
+    assert b'review2' in response.data and b'review0' not in response.data
@@ -0,0 +1,94 @@
+import pytest
+from flask.testing import FlaskClient
+from werkzeug.datastructures import MultiDict
+
+from movie import create_app
+from movie.caching.page_cache import normalized_query_string
+from tests.conftest import TEST_DATA_PATH_MEMORY, AuthenticationManager
+
+
+@pytest.fixture
+def cached_client() -> FlaskClient:
+    app = create_app({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'TEST_DATA_PATH': TEST_DATA_PATH_MEMORY,
+        'REPOSITORY': 'memory',
+        'RECOMMENDATIONS_REFRESH_SECONDS': 0,
+        'CACHE_TYPE': 'simple',
+        'PAGE_CACHE_TIMEOUT': 60
+    })
+    return app.test_client()
+
+
+def test_normalized_query_string():
+    args = MultiDict([('query', 'abc'), ('genre', 'Drama'), ('page', ''), ('genre', 'Action')])
+    assert normalized_query_string(args) == 'genre=Action&genre=Drama&query=abc'
+
+
+@pytest.mark.parametrize('url', ('/', '/search?query=the', '/movie/1'))
+def test_anonymous_pages_are_cached(cached_client: FlaskClient, url):
+    first = cached_client.get(url)
+    second = cached_client.get(url)
+
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert second.content_type == first.content_type
+
+
+def test_equivalent_queries_share_entry(cached_client: FlaskClient):
+    cached_client.get('/search?query=the&genre=Action&genre=Drama')
+    response = cached_client.get('/search?genre=Drama&query=the&director=&genre=Action')
+    assert response.headers['X-Cache'] == 'HIT'
+
+
+def test_uncacheable_responses(cached_client: FlaskClient):
+    for _ in range(2):
+        assert 'X-Cache' not in cached_client.get('/movie/1/reviews').headers
+        assert cached_client.get('/movie/1234').headers['X-Cache'] == 'MISS'
+
+
+def test_logged_in_pages_not_cached(cached_client: FlaskClient):
+    cached_client.get('/movie/1')
+
+    AuthenticationManager(cached_client).login()
+    response = cached_client.get('/movie/1')
+
+    assert 'X-Cache' not in response.headers
+    assert b'testuser' in response.data
+
+
+def test_review_invalidates_cache(cached_client: FlaskClient):
+    cached_client.get('/movie/1')
+    before = cached_client.get('/movie/1')
+    assert before.headers['X-Cache'] == 'HIT'
+
+    cached_client.post('/movie/1/reviews', data={'rating': 3, 'review': 'abc 123'})
+
+    after = cached_client.get('/movie/1')
+    assert after.headers['X-Cache'] == 'MISS'
+    assert after.data != before.data
+
+
+def test_invalidate(cached_client: FlaskClient):
+    cached_client.get('/')
+
+    with cached_client.application.app_context():
+        cached_client.application.config['PAGE_CACHE'].invalidate()
+
+    assert cached_client.get('/').headers['X-Cache'] == 'MISS'
+
+
+def test_disabled_by_default_in_tests(client: FlaskClient):
+    client.get('/')
+    assert client.get('/').headers['X-Cache'] == 'MISS'
+
+
+def test_cached_page_not_modified(cached_client: FlaskClient):
+    etag, _ = cached_client.get('/movie/1').get_etag()
+
+    response = cached_client.get('/movie/1', headers={'If-None-Match': f'"{etag}"'})
+    assert response.headers['X-Cache'] == 'HIT'
+    assert response.status_code == 304
@@ -1,5 +1,9 @@
+import re
+
 from flask.testing import FlaskClient
 
+from movie.domain.movie import Movie
+
 
 def test_get_search(client: FlaskClient):
     response = client.get('/search')
@@ -14,3 +18,46 @@ def test_get_search(client: FlaskClient):
 
     response = client.get('/search', data=data)
     assert response.status_code == 200
+
+
+def test_get_search_sort_by_community_rating(client: FlaskClient):
+    response = client.get('/search', query_string={'sort': 'community_rating'})
+    assert response.status_code == 200
+
+    response = client.get('/search', query_string={'sort': 'abc'})
+    assert response.status_code == 404
+
+
+def _version(response) -> str:
+    return re.search(r'version=([\w-]+)', response.get_data(as_text=True)).group(1)
+
+
+def test_get_search_pages_from_same_results(client: FlaskClient):
+    repo = client.application.config['REPOSITORY']
+    second_page = [movie.title for movie in repo.get_movies(1, 2)]
+
+    response = client.get('/search', query_string={'size': 2})
+    version = _version(response)
+
+    # Sorted before every other movie, so the pages after the first would shift by one
+    movie = Movie('!Added', 2020, 5000)
+    repo.add_movie(movie)
+
+    response = client.get('/search', query_string={'size': 2, 'page': 2, 'version': version})
+    assert [title for title in second_page if title.encode() in response.data] == second_page
+    assert _version(response) == version
+
+    # Searches made afterwards include it
+    response = client.get('/search', query_string={'size': 2})
+    assert b'!Added' in response.data
+    assert _version(response) != version
+
+    # Unknown versions are given the current results
+    response = client.get('/search', query_string={'size': 2, 'page': 2, 'version': 'unknown'})
+    assert response.status_code == 200
+    assert _version(response) != 'unknown'
+
+
+def test_get_search_invalid_page_size(client: FlaskClient):
+    response = client.get('/search', query_string={'size': 0})
+    assert response.status_code == 404
@@ -39,3 +39,21 @@ def test_watchlist_watch_movie(client, auth):
     # Remove movie
     response = client.delete('/watch/1')
     assert response.status_code == 200
+
+
+def test_watchlist_recommendations(client, auth):
+    auth.login()
+
+    # Users without any history are recommended popular movies
+    response = client.get('/watchlist')
+    assert b'Recommended for you' in response.data
+
+    response = client.post('/watch/1')
+    assert response.status_code == 201
+
+    client.application.config['RECOMMENDATIONS'].refresh()
+
+    # Movies the user has already watched aren't recommended
+    response = client.get('/watchlist')
+    assert b'Recommended for you' in response.data
+    assert b"request('/watch/1', 'POST')" not in response.data
@@ -0,0 +1,113 @@
+import shutil
+
+import pytest
+
+from movie.adapters.catalog_import import import_catalog
+from movie.domain.director import Director
+from movie.domain.genre import Genre
+from movie.domain.movie import Movie
+from movie.domain.review import Review
+from tests.conftest import TEST_DATA_PATH_DATABASE
+
+NEW_MOVIE_ROW = '0,New Movie,"Drama,Comedy",Something new.,Jane Doe,"Chris Pratt, New Actor",2021,100,7.5,1000,N/A,N/A\n'
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'movies.csv'
+    shutil.copyfile(TEST_DATA_PATH_DATABASE, path)
+    return str(path)
+
+
+def write_changed_catalog(data_path: str) -> None:
+    """ Adds a movie, removes Prometheus, changes the description of Split and makes Sing a Drama. """
+    with open(TEST_DATA_PATH_DATABASE, encoding='utf-8-sig') as file:
+        header, *rows = file.readlines()
+
+    rows = [row.replace('Three girls are kidnapped', 'Three people are kidnapped').
+            replace(',Sing,"Animation,Comedy,Family"', ',Sing,"Animation,Comedy,Drama"') for row in rows
+            if ',Prometheus,' not in row]
+
+    with open(data_path, 'w', encoding='utf-8') as file:
+        file.writelines([header] + rows + [NEW_MOVIE_ROW])
+
+
+def test_import_of_unchanged_catalog_changes_nothing(populated_database_repository, data_path):
+    repository = populated_database_repository
+    movies = repository.get_movies(0, 100)
+
+    result = import_catalog(repository, data_path)
+
+    assert (result.inserted, result.updated, result.unchanged, result.names_inserted) == (0, 0, 10, 0)
+    assert result.movies_per_second > 0
+    assert repository.get_movies(0, 100) == movies
+
+
+def test_import_adds_and_updates_movies(populated_database_repository, data_path):
+    repository = populated_database_repository
+    user = repository.get_user('testuser')
+    split = repository.get_movie_by_id(2)
+    repository.add_review(Review(split, 'split', 8, user=user), user)
+    repository.add_movie_to_watchlist(user, split)
+    interactions = repository.get_user_movie_interactions()
+    number_of_reviews = repository.get_number_of_reviews_for_movie(split)
+    number_of_movies = repository.get_number_of_movies()
+
+    write_changed_catalog(data_path)
+    result = import_catalog(repository, data_path, batch_size=2)
+
+    assert (result.inserted, result.updated, result.unchanged) == (1, 2, 7)
+
+    # Jane Doe and New Actor
+    assert result.names_inserted == 2
+
+    # Movies that aren't in the file any more are kept
+    assert repository.get_number_of_movies() == number_of_movies + 1
+    assert repository.get_movie_by_id(1).title == 'Prometheus'
+
+    new_movie = repository.get_movie_by_id(number_of_movies)
+    assert new_movie.title == 'New Movie'
+    assert new_movie.director == Director('Jane Doe')
+    assert [actor.actor_full_name for actor in new_movie.actors] == ['Chris Pratt', 'New Actor']
+    assert new_movie in repository.get_movies(0, 100, query='New Movie')
+
+    split = repository.get_movie_by_id(2)
+    assert split.description.startswith('Three people are kidnapped')
+    assert sorted(repository.get_movie_by_id(3).genres) == [Genre('Animation'), Genre('Comedy'), Genre('Drama')]
+    assert repository.get_movie_by_id(3) in repository.get_movies(0, 100, genres=[Genre('Drama')])
+
+    # Users and what they've done are kept
+    user = repository.get_user('testuser')
+    assert repository.get_user_movie_interactions() == interactions
+    assert repository.get_number_of_reviews_for_movie(split) == number_of_reviews
+    assert split in repository.get_movies_for_user(user, 0, 100)
+
+    # Importing the same file again changes nothing
+    result = import_catalog(repository, data_path)
+    assert (result.inserted, result.updated, result.unchanged) == (0, 0, 10)
+
+
+def test_import_into_empty_database(database_repository, data_path):
+    result = import_catalog(database_repository, data_path, max_num_lines=5)
+
+    assert (result.inserted, result.updated, result.unchanged) == (5, 0, 0)
+    assert database_repository.get_number_of_movies() == 5
+    assert database_repository.get_similar_movies(database_repository.get_movie_by_id(1)) != []
+
+
+@pytest.mark.parametrize('batch_size', [1, 10])
+def test_import_of_repeated_movie(database_repository, batch_size):
+    first, repeat = Movie('Repeated', 2020), Movie('Repeated', 2020)
+    first.description, repeat.description = 'First.', 'Repeat.'
+
+    result = database_repository.import_movies([first, Movie('Other', 2020), repeat], batch_size)
+
+    # Only added once, with the details of the last one given whether or not they're in the same batch
+    assert result.inserted == 2
+    assert database_repository.get_number_of_movies() == 2
+    assert database_repository.get_movies(0, query='Repeated')[0].description == 'Repeat.'
+
+
+def test_import_rejects_invalid_batch_size(database_repository, data_path):
+    with pytest.raises(ValueError):
+        import_catalog(database_repository, data_path, batch_size=0)
@@ -0,0 +1,222 @@
+import shutil
+
+import pytest
+
+from movie import create_app
+from movie.adapters.catalog_reload import CatalogReloadJob, read_catalog_source
+from movie.adapters.memory_repository import MemoryRepository
+from movie.adapters.operation_log import OperationLog
+from movie.adapters.repository import populate
+from movie.domain.review import Review
+from tests.conftest import TEST_DATA_PATH_MEMORY
+
+NEW_MOVIE_ROW = '0,New Movie,"Drama,Comedy",Something new.,James Gunn,"Chris Pratt, Vin Diesel",2021,100,7.5,1000,N/A,N/A\n'
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'movies.csv'
+    shutil.copyfile(TEST_DATA_PATH_MEMORY, path)
+    return str(path)
+
+
+def write_changed_catalog(data_path: str) -> None:
+    """ Adds a movie to the start of the file, removes Prometheus and changes the description of Split. """
+    with open(TEST_DATA_PATH_MEMORY, encoding='utf-8-sig') as file:
+        header, *rows = file.readlines()
+
+    rows = [row.replace('Three girls are kidnapped', 'Three people are kidnapped') for row in rows
+            if ',Prometheus,' not in row]
+
+    with open(data_path, 'w', encoding='utf-8') as file:
+        file.writelines([header, NEW_MOVIE_ROW] + rows)
+
+
+@pytest.fixture
+def repository(data_path):
+    repository = MemoryRepository()
+    populate(repository, data_path, 123, simulate_activity=True)
+    return repository
+
+
+def test_reload_relinks_users(repository, data_path):
+    user = repository.get_user('testuser')
+    prometheus = repository.get_movie_by_id(1)
+    split = repository.get_movie_by_id(2)
+    sing = repository.get_movie_by_id(3)
+
+    repository.add_movie_to_watched(user, split)
+    repository.add_movie_to_watched(user, prometheus)
+    repository.add_movie_to_watchlist(user, sing)
+    repository.add_movie_to_watchlist(user, prometheus)
+    repository.add_review(Review(split, 'split', 8, user=user), user)
+    repository.add_review(Review(prometheus, 'prometheus', 3, user=user), user)
+    reviews_of_prometheus = repository.get_number_of_reviews_for_movie(prometheus)
+    number_of_reviews = len(repository._reviews)
+
+    write_changed_catalog(data_path)
+    changes = CatalogReloadJob(repository, data_path, 0).reload()
+
+    assert (changes.added, changes.removed, changes.kept) == (1, 1, 9)
+    assert changes.dropped_reviews == reviews_of_prometheus
+    assert len(repository._reviews) == number_of_reviews - reviews_of_prometheus
+
+    # Movies that are still in the catalog keep their ids and have their new details
+    new_split = repository.get_movie_by_id(2)
+    assert new_split is not split
+    assert new_split.description.startswith('Three people')
+    assert repository.get_movie_by_id(10).title == 'New Movie'
+
+    with pytest.raises(ValueError):
+        repository.get_movie_by_id(1)
+
+    assert user.watched_movies == [new_split]
+    assert user.watched_movies[0] is new_split
+    assert user.time_spent_watching_movies_minutes == new_split.runtime_minutes
+    assert list(user.watchlist) == [sing]
+    assert [review.review_text for review in user.reviews] == ['split']
+    assert user.reviews[0].movie is new_split
+
+    reviews = repository.get_reviews_for_movie(new_split, 0, 100)
+    assert user.reviews[0] in reviews
+    assert all(review.movie is new_split for review in reviews)
+    assert repository.get_review_user(user.reviews[0]) is user
+    assert repository.get_review_summary(new_split).number_of_reviews == len(reviews)
+    assert repository.get_reviews_by_id([review.id for review in reviews]) == reviews
+
+    # The indexes are the new catalog's
+    assert repository.get_movies(0, 1, query='something new')[0].title == 'New Movie'
+    with pytest.raises(ValueError):
+        # Only Prometheus was a mystery
+        repository.get_genre('Mystery')
+    assert all(movie.title != 'Prometheus' for movie in repository.get_similar_movies(new_split))
+
+
+def test_reload_rejects_empty_catalog(repository, data_path):
+    with open(data_path, encoding='utf-8-sig') as file:
+        header = file.readline()
+
+    with open(data_path, 'w') as file:
+        file.write(header)
+
+    with pytest.raises(ValueError):
+        CatalogReloadJob(repository, data_path, 0).reload()
+
+    assert repository.get_number_of_movies() == 10
+
+
+def test_check_waits_for_file_to_settle(repository, data_path):
+    job = CatalogReloadJob(repository, data_path, 0)
+    assert job.check() is None
+
+    write_changed_catalog(data_path)
+
+    # Not reloaded until it's seen unchanged at two checks in a row
+    assert job.check() is None
+    assert job.check().added == 1
+    assert job.check() is None
+
+
+def test_app_reloads_catalog(data_path):
+    app = create_app({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'TEST_DATA_PATH': data_path,
+        'REPOSITORY': 'memory',
+        'RECOMMENDATIONS_REFRESH_SECONDS': 0,
+        'CACHE_TYPE': 'null'
+    })
+    client = app.test_client()
+    catalog_version = app.config['CATALOG_VERSION']
+
+    assert b'Prometheus' in client.get('/search', query_string={'query': 'prometheus'}).data
+
+    write_changed_catalog(data_path)
+    app.config['CATALOG_RELOAD'].reload()
+
+    assert app.config['CATALOG_VERSION'] != catalog_version
+    assert client.get('/movie/1').status_code == 404
+    assert b'New Movie' in client.get('/movie/10').data
+
+
+def test_reload_is_shared_through_operation_log(data_path, tmp_path):
+    log_path = str(tmp_path / 'operations.log')
+    repository, other = MemoryRepository(), MemoryRepository()
+    logs = []
+    jobs = []
+
+    for repo in (repository, other):
+        populate(repo, data_path, 123, simulate_activity=True)
+        repo.catalog_source = read_catalog_source(data_path)
+        logs.append(OperationLog(log_path))
+
+    # The order the log and the job are set up in doesn't matter
+    logs[0].attach(repository)
+    jobs.append(CatalogReloadJob(repository, data_path, 0))
+    jobs.append(CatalogReloadJob(other, data_path, 0))
+    logs[1].attach(other)
+
+    # Every process's repository is told of the reload, but only the job that reloaded it
+    replaced, reloaded = [], []
+    other.add_catalog_listener(lambda changes, source: replaced.append(changes))
+    for job in jobs:
+        job.add_listener(lambda reloaded_path, changes: reloaded.append(changes))
+
+    user = repository.get_user('testuser')
+    repository.add_movie_to_watchlist(user, repository.get_movie_by_id(2))
+    write_changed_catalog(data_path)
+    changes = jobs[0].reload()
+
+    # Made after the reload, to the new movie that only has its id in the process that reloaded the catalog so far
+    new_movie = repository.get_movie_by_id(10)
+    repository.add_review(Review(new_movie, 'new', 9, user=user), user)
+
+    assert logs[1].catch_up() == 3
+    assert replaced == reloaded == [changes]
+    assert other.catalog_source == repository.catalog_source
+
+    other_user = other.get_user('testuser')
+    assert [movie.id for movie in other_user.watchlist] == [2]
+    assert other.get_movie_by_id(10) == new_movie
+    assert [review.review_text for review in other.get_reviews_for_movie(other.get_movie_by_id(10), 0)] == ['new']
+
+    # The other process noticing the same change to the file doesn't reload it again
+    assert jobs[1].check() is None
+    assert jobs[1].reload() is None
+    assert replaced == reloaded == [changes]
+    assert logs[0].catch_up() == 0
+
+
+def test_app_reloads_catalog_shared_through_operation_log(data_path, tmp_path, monkeypatch):
+    def app():
+        return create_app({
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'TEST_DATA_PATH': data_path,
+            'REPOSITORY': 'memory',
+            'RECOMMENDATIONS_REFRESH_SECONDS': 0,
+            'CACHE_TYPE': 'null',
+            'SNAPSHOT_PATH': str(tmp_path / 'repository.snapshot'),
+            'SNAPSHOT_INTERVAL_SECONDS': 0
+        })
+
+    first, second = app(), app()
+    for started in (first, second):
+        started.config['SNAPSHOTS'].stop()
+
+    write_changed_catalog(data_path)
+    first.config['CATALOG_RELOAD'].reload()
+
+    # The other process swaps in the new catalog before its next request
+    client = second.test_client()
+    assert b'New Movie' in client.get('/movie/10').data
+    assert second.config['CATALOG_VERSION'] == first.config['CATALOG_VERSION']
+
+    # The snapshot saved after the reload is of the new catalog, so starting again loads it
+    def populate_not_called(*args, **kwargs):
+        raise AssertionError('the repository should be loaded from the snapshot')
+
+    monkeypatch.setattr('movie.populate', populate_not_called)
+    third = app()
+    third.config['SNAPSHOTS'].stop()
+    assert b'New Movie' in third.test_client().get('/movie/10').data
@@ -1,11 +1,23 @@
+from datetime import datetime
+
 import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
 
 from movie.adapters.database_repository import SqlAlchemyRepository
+from movie.adapters.orm import movie_actors, movie_review_summaries, movie_similarities
+from movie.adapters.recommendations import Interaction
+from movie.adapters.repository import populate_catalog
+from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
 
 # Note: for these tests it's important that the first fixture (if it's being used) is database_repository so that
 # map_model_to_tables is called before any models are instantiated
 from movie.domain.movie import Movie
+from movie.domain.review import Review
+from movie.domain.review_summary import ReviewSummary
 from movie.domain.user import User
+from tests.conftest import TEST_DATA_PATH_DATABASE
 
 
 def test_constructor(session_factory):
@@ -562,3 +574,268 @@ def test_get_movies_per_genre(database_repository: SqlAlchemyRepository, genres)
     }
 
     assert result == expected
+
+
+def test_get_actor_path(populated_database_repository):
+    repo = populated_database_repository
+    actor = repo.get_actor('Michael Sheen')
+    other = repo.get_actor('Matt Damon')
+
+    path = repo.get_actor_path(actor, other)
+
+    assert path.degrees == 3
+    assert path.actors[0] == actor
+    assert path.actors[-1] == other
+    assert [movie.title for movie in path.movies] == ['Passengers', 'Guardians of the Galaxy', 'The Great Wall']
+
+
+def test_get_actor_path_loads_path_in_one_query_each(populated_database_repository):
+    repo = populated_database_repository
+    actor = repo.get_actor('Michael Sheen')
+    other = repo.get_actor('Matt Damon')
+    repo.get_actor_path(actor, other)
+
+    # Reloaded as they expired at the end of the last call, which isn't part of finding the path
+    names = [actor.actor_full_name, other.actor_full_name]
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(Engine, 'before_cursor_execute', listener)
+    try:
+        path = repo.get_actor_path(actor, other)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', listener)
+
+    # The actors' ids, the graph's version, then the path's actors and its movies
+    assert len(statements) == 4
+    assert [movie.title for movie in path.movies] == ['Passengers', 'Guardians of the Galaxy', 'The Great Wall']
+    assert [actor.actor_full_name for actor in path.actors][::3] == names
+
+
+def test_get_actor_path_after_casts_changed_elsewhere(populated_database_repository):
+    repo = populated_database_repository
+    actor = repo.get_actor('Michael Sheen')
+    other = repo.get_actor('Matt Damon')
+    passengers = repo.get_movies(0, query='Passengers')[0]
+    assert repo.get_actor_path(actor, other).degrees == 3
+
+    # As another process might, e.g. when importing a catalog, which changes the casts of existing movies
+    with repo._session_cm as scm:
+        scm.session.execute(movie_actors.insert().values(movie_id=passengers.id, actor_id=other.id))
+        scm.commit()
+
+    path = repo.get_actor_path(actor, other)
+    assert path.degrees == 1
+    assert path.movies == [passengers]
+
+    with repo._session_cm as scm:
+        scm.session.execute(movie_actors.delete().where(movie_actors.c.actor_id == other.id))
+        scm.commit()
+
+    assert repo.get_actor_path(actor, other) is None
+
+
+def test_get_actor_path_not_connected(populated_database_repository):
+    repo = populated_database_repository
+    actor = repo.get_actor('Michael Sheen')
+    other = repo.get_actor('Noomi Rapace')
+
+    assert repo.get_actor_path(actor, other) is None
+
+
+def test_get_similar_movies(populated_database_repository):
+    repo = populated_database_repository
+    movie = repo.get_movies(0, query='Suicide Squad')[0]
+
+    similar_movies = repo.get_similar_movies(movie)
+
+    assert 0 < len(similar_movies) <= 10
+    assert movie not in similar_movies
+    assert similar_movies[0].title == 'The Great Wall'
+
+
+def test_get_similar_movies_updated_when_movie_added(populated_database_repository: SqlAlchemyRepository):
+    repo = populated_database_repository
+    movie = repo.get_movies(0, query='Split')[0]
+    assert repo.get_similar_movies(movie) == []
+
+    sequel = Movie('Glass', 2019, 100)
+    sequel.genres = list(movie.genres)
+    sequel.director = movie.director
+    repo.add_movie(sequel)
+
+    assert repo.get_similar_movies(movie) == [sequel]
+    assert repo.get_similar_movies(sequel) == [movie]
+
+
+def test_backfill_similar_movies(populated_database_repository: SqlAlchemyRepository):
+    repository = populated_database_repository
+    movies = repository.get_movies(0, 100)
+    similar_movies = [repository.get_similar_movies(movie) for movie in movies]
+
+    # Similar movies are only backfilled if there aren't any
+    assert repository.backfill_similar_movies() == 0
+
+    with repository._session_cm as scm:
+        scm.session.execute(movie_similarities.delete())
+        scm.commit()
+
+    assert repository.get_similar_movies(movies[0]) == []
+    assert repository.backfill_similar_movies() == len(movies)
+    assert [set(repository.get_similar_movies(movie)) for movie in movies] == [set(neighbours) for neighbours in similar_movies]
+
+
+def test_get_user_movie_interactions(database_repository: SqlAlchemyRepository, user, movies):
+    database_repository.add_movies(movies)
+    database_repository.add_user(user)
+
+    database_repository.add_movie_to_watchlist(user, movies[0])
+    database_repository.add_movie_to_watched(user, movies[1])
+    database_repository.add_review(Review(movies[1], 'abc', 8, user=user), user)
+    database_repository.add_review(Review(movies[2], 'abc', 3, user=user), user)
+
+    interactions = sorted(database_repository.get_user_movie_interactions(), key=lambda interaction: interaction.movie_id)
+
+    assert interactions == [
+        Interaction(user.id, movies[0].id, watchlisted=True),
+        Interaction(user.id, movies[1].id, watched=True, rating=8),
+        Interaction(user.id, movies[2].id, rating=3)
+    ]
+
+
+def test_get_user_movie_interactions_ignores_anonymous_reviews(database_repository: SqlAlchemyRepository, movie):
+    database_repository.add_review(Review(movie, 'abc', 1))
+
+    assert database_repository.get_user_movie_interactions() == []
+
+
+def test_get_review_summary(database_repository: SqlAlchemyRepository, movie, user):
+    database_repository.add_movie(movie)
+    database_repository.add_user(user)
+    database_repository.add_review(Review(movie, 'abc', 4, user=user), user)
+    database_repository.add_review(Review(movie, 'def', 8))
+
+    summary = database_repository.get_review_summary(movie)
+    assert summary.number_of_reviews == 2
+    assert summary.average_rating == 6
+    assert summary.histogram[3] == summary.histogram[7] == 1
+
+    # Removing a user removes their reviews
+    database_repository.delete_user(user)
+    assert database_repository.get_review_summary(movie) == ReviewSummary(1, 8, [0] * 7 + [1, 0, 0])
+
+
+def test_get_review_summary_matches_reviews(populated_database_repository: SqlAlchemyRepository):
+    # Simulated reviews are added both through their users and directly, but should only be counted once
+    for movie in populated_database_repository.get_movies(0, 100):
+        reviews = populated_database_repository.get_reviews_for_movie(movie, 0, 1000)
+        summary = populated_database_repository.get_review_summary(movie)
+
+        assert summary.number_of_reviews == len(reviews)
+        assert summary.rating_total == sum(review.rating for review in reviews)
+
+
+def test_get_review_summary_ignores_reviews_without_rating(database_repository: SqlAlchemyRepository, movie, user):
+    database_repository.add_movie(movie)
+    database_repository.add_user(user)
+    database_repository.add_review(Review(movie, 'abc', 8, user=user), user)
+    movie_id = movie.id
+
+    # Reviews need a rating to be stored, but a review without one isn't counted before that's checked
+    with pytest.raises(IntegrityError):
+        database_repository.add_review(Review(movie, 'def', None, user=user), user)
+
+    database_repository.reset_session()
+    movie = database_repository.get_movie_by_id(movie_id)
+    assert database_repository.get_review_summary(movie) == ReviewSummary(1, 8, [0] * 7 + [1, 0, 0])
+
+
+def test_backfill_review_summaries(populated_database_repository: SqlAlchemyRepository):
+    repository = populated_database_repository
+    movies = repository.get_movies(0, 100)
+    summaries = [repository.get_review_summary(movie) for movie in movies]
+
+    # Summaries are only backfilled if there aren't any
+    assert repository.backfill_review_summaries() == 0
+
+    with repository._session_cm as scm:
+        scm.session.execute(movie_review_summaries.delete())
+        scm.commit()
+
+    assert repository.backfill_review_summaries() == sum(summary.number_of_reviews > 0 for summary in summaries)
+    assert [repository.get_review_summary(movie) for movie in movies] == summaries
+
+
+def test_get_review_summary_no_reviews(database_repository: SqlAlchemyRepository, movie):
+    assert database_repository.get_review_summary(movie) == ReviewSummary()
+
+
+def test_get_movies_sort_by_community_rating(database_repository: SqlAlchemyRepository, movies):
+    database_repository.add_movies(movies)
+    database_repository.add_review(Review(movies[2], 'abc', 5))
+    database_repository.add_review(Review(movies[4], 'abc', 9))
+    database_repository.add_review(Review(movies[3], 'abc', 5))
+    database_repository.add_review(Review(movies[3], 'def', 5))
+
+    results = database_repository.get_movies(0, 4, sort_by=SqlAlchemyRepository.SORT_BY_COMMUNITY_RATING)
+
+    # Ties are broken by number of reviews and then title, with unreviewed movies last
+    assert results == [movies[4], movies[3], movies[2], movies[0]]
+
+
+def test_get_movies_invalid_sort(database_repository: SqlAlchemyRepository):
+    with pytest.raises(ValueError):
+        database_repository.get_movies(0, sort_by='abc')
+
+
+def test_get_movie_ids(database_repository: SqlAlchemyRepository, movies):
+    database_repository.add_movies(movies)
+    database_repository.add_review(Review(movies[2], 'abc', 5))
+
+    assert database_repository.get_movie_ids() == [movie.id for movie in movies]
+
+    ids = database_repository.get_movie_ids(sort_by=SqlAlchemyRepository.SORT_BY_COMMUNITY_RATING)
+    assert ids == [movies[2].id] + [movie.id for movie in movies if movie != movies[2]]
+    assert database_repository.get_movies(0, 10, sort_by=SqlAlchemyRepository.SORT_BY_COMMUNITY_RATING) == \
+           database_repository.get_movies_by_id(ids)
+
+
+def test_get_movies_by_id(database_repository: SqlAlchemyRepository, movies):
+    database_repository.add_movies(movies)
+
+    # Missing ids are left out
+    assert database_repository.get_movies_by_id([movies[3].id, 1234, movies[1].id]) == [movies[3], movies[1]]
+    assert database_repository.get_movies_by_id([]) == []
+
+
+def test_get_reviews_by_id(database_repository: SqlAlchemyRepository, movie, user):
+    database_repository.add_movie(movie)
+    database_repository.add_user(user)
+    first = Review(movie, 'first', 5, datetime(2020, 1, 1), user)
+    second = Review(movie, 'second', 6, datetime(2020, 1, 2))
+    database_repository.add_review(first, user)
+    database_repository.add_review(second)
+
+    # Newest first, as they're returned by get_reviews_for_movie
+    ids = database_repository.get_review_ids_for_movie(movie)
+    assert database_repository.get_reviews_by_id(ids) == database_repository.get_reviews_for_movie(movie, 0) == [second, first]
+
+    database_repository.delete_user(user)
+    assert database_repository.get_reviews_by_id(ids) == [second]
+
+
+def test_populate_catalog_in_batches(database_repository: SqlAlchemyRepository):
+    movies = populate_catalog(database_repository, TEST_DATA_PATH_DATABASE, batch_size=3)
+
+    reader = MovieFileCSVReader(TEST_DATA_PATH_DATABASE)
+    reader.read_csv_file()
+
+    assert movies == reader.dataset_of_movies
+    assert database_repository.get_number_of_movies() == 10
+    assert all(database_repository.get_genre(genre.genre_name) == genre for genre in reader.dataset_of_genres)
+    assert all(database_repository.get_actor(actor.actor_full_name) == actor for actor in reader.dataset_of_actors)
+
+    # The same as if every movie had been added at once
+    batched = {movie: set(database_repository.get_similar_movies(movie)) for movie in movies}
+    database_repository._similarity_index = None
+    database_repository._rebuild_similar_movies()
+    assert batched == {movie: set(database_repository.get_similar_movies(movie)) for movie in movies}
@@ -0,0 +1,99 @@
+import sys
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from movie.adapters.database_repository import SqlAlchemyRepository
+from movie.adapters.orm import map_model_to_tables, metadata
+from movie.adapters.repository import populate
+from movie.domain.actor import Actor
+from movie.domain.movie import Movie
+from tests.conftest import TEST_DATA_PATH_DATABASE
+
+NUMBER_OF_MOVIES_ADDED = 20
+
+
+@pytest.fixture
+def repository(tmp_path):
+    # Backed by a file so that every thread's session sees the same database
+    engine = create_engine(f'sqlite:///{tmp_path / "movies.db"}')
+    clear_mappers()
+    metadata.create_all(engine)
+    map_model_to_tables()
+
+    repository = SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+    populate(repository, TEST_DATA_PATH_DATABASE, 123)
+    return repository
+
+
+@pytest.fixture(autouse=True)
+def frequent_thread_switches():
+    # Makes threads interleave far more often than they normally would
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_concurrent_actor_paths_and_added_movies(repository):
+    stopped = threading.Event()
+    errors = []
+    counts = {'paths': 0, 'movies': 0}
+
+    def run(name, action):
+        def target():
+            try:
+                while not stopped.is_set() and action(name):
+                    pass
+            except Exception as e:
+                errors.append((name, e))
+                stopped.set()
+            finally:
+                repository.close_session()
+        return threading.Thread(target=target, name=name, daemon=True)
+
+    # Each thread has its own session, so anything it uses is loaded by that thread
+    def find_path(_):
+        path = repository.get_actor_path(repository.get_actor('Michael Sheen'), repository.get_actor('Matt Damon'))
+        assert [movie.title for movie in path.movies] == ['Passengers', 'Guardians of the Galaxy', 'The Great Wall']
+        repository.get_similar_movies(repository.get_movie_by_id(2))
+        counts['paths'] += 1
+        return True
+
+    def add_movies(name):
+        # Movies with new actors, so the shortest path stays the same while the graph and similar movies change
+        movie = repository.get_movie_by_id(2)
+
+        for i in range(NUMBER_OF_MOVIES_ADDED):
+            sequel = Movie(f'{movie.title} {name} {i}', 2020)
+            sequel.description = movie.description
+            sequel.genres = list(movie.genres)
+            sequel.actors = [Actor(f'Actor {name} {i}')]
+            repository.add_movie(sequel)
+            counts['movies'] += 1
+        return False
+
+    threads = [run(f'path{i}', find_path) for i in range(4)] + [run(f'writer{i}', add_movies) for i in range(2)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads[4:]:
+        thread.join()
+    stopped.set()
+    for thread in threads[:4]:
+        thread.join()
+
+    assert errors == []
+    assert counts['paths'] > 0
+
+    # Every movie added was compared with the others. The sequels are equally similar to each other, so only the
+    # number of similar movies is the same as when they're computed in one go.
+    movies = repository.get_movies(0, 1000)
+    assert len(movies) == 10 + 2 * NUMBER_OF_MOVIES_ADDED
+    assert repository._similarity_index.pending == []
+
+    incremental = [len(repository.get_similar_movies(movie)) for movie in movies]
+    repository._rebuild_similar_movies()
+    assert incremental == [len(repository.get_similar_movies(movie)) for movie in movies]
@@ -1,6 +1,12 @@
+from datetime import datetime
+
 import pytest
 
 from movie.adapters.memory_repository import MemoryRepository
+from movie.adapters.recommendations import Interaction
+from movie.domain.movie import Movie
+from movie.domain.review import Review
+from movie.domain.review_summary import ReviewSummary
 
 
 def test_constructor():
@@ -123,6 +129,14 @@ def test_get_movies_invalid_query(populated_memory_repository):
         populated_memory_repository.get_movies(0, query=123)
 
 
+def test_get_movie(populated_memory_repository):
+    movie = populated_memory_repository.get_movie('Prometheus', 2012)
+    assert movie is populated_memory_repository.get_movie_by_id(1)
+
+    with pytest.raises(ValueError):
+        populated_memory_repository.get_movie('Prometheus', 2013)
+
+
 def test_add_genre(genre, memory_repository: MemoryRepository):
     memory_repository.add_genre(genre)
 
@@ -328,3 +342,145 @@ def test_remove_from_watchlist(memory_repository: MemoryRepository, user, movie)
     result = memory_repository.get_user(user.username)
     assert movie not in result.watchlist
 
+
+
+def test_get_actor_path(populated_memory_repository):
+    repo = populated_memory_repository
+    actor = repo.get_actor('Michael Sheen')
+    other = repo.get_actor('Matt Damon')
+
+    path = repo.get_actor_path(actor, other)
+
+    assert path.degrees == 3
+    assert path.actors[0] == actor
+    assert path.actors[-1] == other
+    assert [movie.title for movie in path.movies] == ['Passengers', 'Guardians of the Galaxy', 'The Great Wall']
+
+
+def test_get_actor_path_not_connected(populated_memory_repository):
+    repo = populated_memory_repository
+    actor = repo.get_actor('Michael Sheen')
+    other = repo.get_actor('Noomi Rapace')
+
+    assert repo.get_actor_path(actor, other) is None
+
+
+def test_get_similar_movies(populated_memory_repository):
+    repo = populated_memory_repository
+    movie = repo.get_movies(0, query='Suicide Squad')[0]
+
+    similar_movies = repo.get_similar_movies(movie)
+
+    assert 0 < len(similar_movies) <= 10
+    assert movie not in similar_movies
+    assert similar_movies[0].title == 'The Great Wall'
+
+
+def test_get_similar_movies_updated_when_movie_added(populated_memory_repository):
+    repo = populated_memory_repository
+    movie = repo.get_movies(0, query='Split')[0]
+    neighbours = repo.get_similar_movies(movie)
+
+    sequel = Movie('Glass', 2019, 1000)
+    sequel.genres = list(movie.genres)
+    sequel.director = movie.director
+    repo.add_movie(sequel)
+
+    # Similar movies are only computed once they're needed
+    assert repo._similarity_index.pending == [sequel]
+
+    assert repo.get_similar_movies(movie)[0] == sequel
+    assert repo.get_similar_movies(sequel)[0] == movie
+    assert repo._similarity_index.pending == []
+    assert set(repo.get_similar_movies(movie)) <= set(neighbours) | {sequel}
+
+
+def test_get_user_movie_interactions(memory_repository, user, movies):
+    memory_repository.add_movies(movies)
+    memory_repository.add_user(user)
+
+    memory_repository.add_movie_to_watchlist(user, movies[0])
+    memory_repository.add_movie_to_watched(user, movies[1])
+    memory_repository.add_review(Review(movies[1], 'abc', 8), user)
+    memory_repository.add_review(Review(movies[2], 'abc', 3), user)
+
+    interactions = sorted(memory_repository.get_user_movie_interactions(), key=lambda interaction: interaction.movie_id)
+
+    assert interactions == [
+        Interaction(user.id, movies[0].id, watchlisted=True),
+        Interaction(user.id, movies[1].id, watched=True, rating=8),
+        Interaction(user.id, movies[2].id, rating=3)
+    ]
+
+
+def test_get_review_summary(memory_repository, movie, user):
+    memory_repository.add_user(user)
+    memory_repository.add_review(Review(movie, 'abc', 4), user)
+    memory_repository.add_review(Review(movie, 'def', 8))
+
+    summary = memory_repository.get_review_summary(movie)
+    assert summary.number_of_reviews == 2
+    assert summary.average_rating == 6
+    assert summary.histogram[3] == summary.histogram[7] == 1
+
+    # Removing a user removes their reviews
+    memory_repository.delete_user(user)
+    assert memory_repository.get_review_summary(movie) == ReviewSummary(1, 8, [0] * 7 + [1, 0, 0])
+
+
+def test_get_review_summary_no_reviews(memory_repository, movie):
+    assert memory_repository.get_review_summary(movie) == ReviewSummary()
+
+
+def test_get_movies_sort_by_community_rating(memory_repository, movies):
+    memory_repository.add_movies(movies)
+    memory_repository.add_review(Review(movies[2], 'abc', 5))
+    memory_repository.add_review(Review(movies[4], 'abc', 9))
+    memory_repository.add_review(Review(movies[3], 'abc', 5))
+    memory_repository.add_review(Review(movies[3], 'def', 5))
+
+    results = memory_repository.get_movies(0, 4, sort_by=MemoryRepository.SORT_BY_COMMUNITY_RATING)
+
+    # Ties are broken by number of reviews and then title, with unreviewed movies last
+    assert results == [movies[4], movies[3], movies[2], movies[0]]
+
+
+def test_get_movies_invalid_sort(memory_repository):
+    with pytest.raises(ValueError):
+        memory_repository.get_movies(0, sort_by='abc')
+
+
+def test_get_movie_ids(memory_repository: MemoryRepository, movies):
+    memory_repository.add_movies(movies)
+    memory_repository.add_review(Review(movies[2], 'abc', 5))
+
+    assert memory_repository.get_movie_ids() == [movie.id for movie in movies]
+
+    ids = memory_repository.get_movie_ids(sort_by=MemoryRepository.SORT_BY_COMMUNITY_RATING)
+    assert ids == [movies[2].id] + [movie.id for movie in movies if movie != movies[2]]
+    assert memory_repository.get_movies(0, 10, sort_by=MemoryRepository.SORT_BY_COMMUNITY_RATING) == \
+           memory_repository.get_movies_by_id(ids)
+
+
+def test_get_movies_by_id(memory_repository: MemoryRepository, movies):
+    memory_repository.add_movies(movies)
+
+    # Missing ids are left out
+    assert memory_repository.get_movies_by_id([movies[3].id, 1234, movies[1].id]) == [movies[3], movies[1]]
+    assert memory_repository.get_movies_by_id([]) == []
+
+
+def test_get_reviews_by_id(memory_repository: MemoryRepository, movie, user):
+    memory_repository.add_movie(movie)
+    memory_repository.add_user(user)
+    first = Review(movie, 'first', 5, datetime(2020, 1, 1), user)
+    second = Review(movie, 'second', 6, datetime(2020, 1, 2))
+    memory_repository.add_review(first, user)
+    memory_repository.add_review(second)
+
+    # Newest first, as they're returned by get_reviews_for_movie
+    ids = memory_repository.get_review_ids_for_movie(movie)
+    assert memory_repository.get_reviews_by_id(ids) == memory_repository.get_reviews_for_movie(movie, 0) == [second, first]
+
+    memory_repository.delete_user(user)
+    assert memory_repository.get_reviews_by_id(ids) == [second]
@@ -0,0 +1,173 @@
+import random
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from movie.adapters.memory_repository import MemoryRepository
+from movie.adapters.repository import populate
+from movie.domain.actor_graph import ActorGraph
+from movie.domain.review import Review
+from movie.domain.user import User
+from tests.conftest import TEST_DATA_PATH_MEMORY
+
+DURATION_SECONDS = 1.5
+
+
+@pytest.fixture
+def repository():
+    repository = MemoryRepository()
+    populate(repository, TEST_DATA_PATH_MEMORY, 123, simulate_activity=True)
+    return repository
+
+
+@pytest.fixture(autouse=True)
+def frequent_thread_switches():
+    # Makes threads interleave far more often than they normally would
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def check_consistency(repository: MemoryRepository) -> None:
+    reviews = repository._reviews
+    assert reviews == sorted(reviews)
+
+    for movie in repository._movies:
+        movie_reviews = [review for review in reviews if review.movie == movie]
+        assert repository.get_reviews_for_movie(movie, 0, len(reviews) + 1) == movie_reviews
+
+        ratings = [review.rating for review in movie_reviews if review.rating is not None]
+        assert repository.get_review_summary(movie).number_of_reviews == len(ratings)
+        assert repository.get_review_summary(movie).rating_total == sum(ratings)
+
+    for user in repository._users:
+        assert repository.get_user(user.username) is user
+        for review in user.reviews:
+            assert repository.get_review_user(review) is user
+
+    assert len(repository._user_map) == len(repository._user_id_map) == len(repository._users)
+
+
+def test_concurrent_searches_and_writes(repository):
+    movies = repository.get_movies(0, 1000)
+    genres = repository.get_genres()
+    test_user = repository.get_user('testuser')
+
+    # Reviews are written for only a few movies so that writers contend for them
+    reviewed_movies = movies[:5]
+    stopped = threading.Event()
+    errors = []
+    counts = {'searches': 0, 'reviews': 0, 'watchlist': 0, 'deleted users': 0}
+
+    def run(name, action):
+        def target():
+            generator = random.Random(name)
+            try:
+                while not stopped.is_set():
+                    action(generator)
+            except Exception as e:
+                errors.append((name, e))
+                stopped.set()
+        return threading.Thread(target=target, name=name, daemon=True)
+
+    def search(generator):
+        genre = generator.choice(genres)
+        sort_by = generator.choice([repository.SORT_BY_TITLE, repository.SORT_BY_COMMUNITY_RATING])
+        results = repository.get_movies(0, 20, genres=[genre], sort_by=sort_by)
+        assert all(genre in movie.genres for movie in results)
+        assert len(set(results)) == len(results)
+
+        if sort_by == repository.SORT_BY_TITLE:
+            assert results == sorted(results)
+
+        movie = generator.choice(movies)
+        reviews = repository.get_reviews_for_movie(movie, 0, 1000)
+        assert reviews == sorted(reviews)
+        assert all(review.movie == movie for review in reviews)
+
+        user_movies = repository.get_movies_for_user(test_user, 0, 1000)
+        assert user_movies == sorted(set(user_movies))
+
+        if generator.random() < 0.1:
+            repository.get_user_movie_interactions()
+        counts['searches'] += 1
+
+    def review(generator):
+        user = User(f'reviewer{generator.random()}', 'hash')
+        repository.add_user(user)
+
+        for _ in range(generator.randint(1, 10)):
+            timestamp = datetime(2020, 1, 1) + timedelta(seconds=generator.randint(0, 10 ** 6))
+            repository.add_review(Review(generator.choice(reviewed_movies), 'text', generator.randint(1, 10), timestamp, user),
+                                  user)
+            counts['reviews'] += 1
+
+        if generator.random() < 0.5:
+            repository.delete_user(user)
+            counts['deleted users'] += 1
+
+    def change_watchlist(generator):
+        movie = generator.choice(movies)
+        action = generator.choice([repository.add_movie_to_watchlist, repository.remove_from_watchlist,
+                                   repository.add_movie_to_watched, repository.remove_from_watched])
+        action(test_user, movie)
+        counts['watchlist'] += 1
+
+    threads = [run(f'search{i}', search) for i in range(4)] + \
+              [run(f'review{i}', review) for i in range(4)] + \
+              [run('watchlist', change_watchlist)]
+    for thread in threads:
+        thread.start()
+
+    stopped.wait(DURATION_SECONDS)
+    stopped.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(count > 0 for count in counts.values()), counts
+    check_consistency(repository)
+
+
+
+def degrees(path):
+    return path.degrees if path is not None else None
+
+
+def test_concurrent_actor_paths(repository, monkeypatch):
+    # Small enough that paths are evicted from the cache while other threads are using it
+    monkeypatch.setattr(ActorGraph, '_PATH_CACHE_SIZE', 4)
+    actors = repository.get_actors()[:10]
+    expected = {(actor, other): degrees(repository.get_actor_path(actor, other)) for actor in actors for other in actors}
+    stopped = threading.Event()
+    errors = []
+    counts = {'paths': 0}
+
+    def run(name):
+        def target():
+            generator = random.Random(name)
+            try:
+                while not stopped.is_set():
+                    actor, other = generator.choice(list(expected))
+                    assert degrees(repository.get_actor_path(actor, other)) == expected[actor, other]
+                    assert other not in actor.colleagues or expected[actor, other] == 1
+                    counts['paths'] += 1
+            except Exception as e:
+                errors.append((name, e))
+                stopped.set()
+        return threading.Thread(target=target, name=name, daemon=True)
+
+    threads = [run(f'path{i}') for i in range(8)]
+    for thread in threads:
+        thread.start()
+
+    stopped.wait(DURATION_SECONDS)
+    stopped.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert counts['paths'] > 0
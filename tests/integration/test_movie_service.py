@@ -35,3 +35,24 @@ def test_add_review_with_user(user, review, memory_repository):
     result = memory_repository.get_review_user(user.reviews[0])
 
     assert result == user
+
+
+def test_get_movie_version(user, movie, memory_repository):
+    memory_repository.add_movie(movie)
+    memory_repository.add_user(user)
+
+    version = get_movie_version(memory_repository, movie, 'catalog')
+    assert version.last_modified is None
+    assert version == get_movie_version(memory_repository, movie, 'catalog')
+    assert version != get_movie_version(memory_repository, movie, 'other catalog')
+
+    add_review(memory_repository, movie, 'abc', 5)
+    reviewed = get_movie_version(memory_repository, movie, 'catalog')
+    assert reviewed.etag != version.etag
+    assert reviewed.last_modified == memory_repository.get_reviews_for_movie(movie, 0)[0].timestamp
+
+    user_version = get_movie_version(memory_repository, movie, 'catalog', user)
+    assert user_version.etag != reviewed.etag
+
+    memory_repository.add_movie_to_watchlist(user, movie)
+    assert get_movie_version(memory_repository, movie, 'catalog', user).etag != user_version.etag
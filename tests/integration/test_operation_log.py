@@ -0,0 +1,170 @@
+import multiprocessing
+
+import pytest
+
+from movie import create_app
+from movie.adapters.memory_repository import MemoryRepository
+from movie.adapters.operation_log import OperationLog
+from movie.adapters.repository import populate
+from movie.domain.review import Review
+from movie.domain.user import User
+from tests.conftest import TEST_DATA_PATH_MEMORY
+
+
+def create_repository(log_path) -> (MemoryRepository, OperationLog):
+    repository = MemoryRepository()
+    populate(repository, TEST_DATA_PATH_MEMORY, 123)
+    log = OperationLog(str(log_path))
+    log.attach(repository)
+    return repository, log
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / 'operations.log'
+
+
+def test_changes_are_shared(log_path):
+    repository, _ = create_repository(log_path)
+    other, other_log = create_repository(log_path)
+    movie = repository.get_movie_by_id(1)
+
+    user = User('loggeduser', 'hash')
+    repository.add_user(user)
+    repository.add_movie_to_watchlist(user, movie)
+    repository.add_movie_to_watched(user, repository.get_movie_by_id(2))
+    review = Review(movie, 'abc', 7, user=user)
+    repository.add_review(review, user)
+
+    assert other_log.catch_up() == 4
+    assert other_log.catch_up() == 0
+
+    other_user = other.get_user('loggeduser')
+    assert other_user.id == user.id
+    assert other_user.joined_on_utc == user.joined_on_utc
+    assert other.get_movie_by_id(1) in other_user.watchlist
+    assert other.get_movie_by_id(2) in other_user.watched_movies
+    assert review in other.get_reviews_for_movie(movie, 0)
+    assert other.get_review_user(review) == other_user
+    assert other.get_review_summary(movie).rating_total == repository.get_review_summary(movie).rating_total
+
+    repository.remove_from_watchlist(user, movie)
+    repository.change_password(user, 'new hash')
+    repository.change_username(user, 'renameduser')
+    other_log.catch_up()
+
+    assert other.get_user('renameduser') is other_user
+    assert movie not in other_user.watchlist
+    assert other_user.password == 'new hash'
+
+    repository.delete_user(user)
+    other_log.catch_up()
+
+    with pytest.raises(ValueError):
+        other.get_user('renameduser')
+    assert review not in other.get_reviews_for_movie(movie, 0)
+
+
+def test_catch_up(log_path):
+    repository = MemoryRepository()
+    log = OperationLog(str(log_path))
+    log.attach(repository)
+
+    writer = MemoryRepository()
+    OperationLog(str(log_path)).attach(writer)
+    writer.add_user(User('loggeduser', 'hash'))
+
+    assert log.catch_up() == 1
+    assert log.catch_up() == 0
+    assert log.offset == log_path.stat().st_size
+    assert repository.get_user('loggeduser').password == 'hash'
+
+
+def test_attach_replays_log(log_path):
+    repository, _ = create_repository(log_path)
+    repository.add_user(User('loggeduser', 'hash'))
+    repository.add_movie_to_watchlist(repository.get_user('loggeduser'), repository.get_movie_by_id(3))
+
+    restarted, _ = create_repository(log_path)
+    assert restarted.get_movie_by_id(3) in restarted.get_user('loggeduser').watchlist
+
+
+def test_attach_replays_log_with_movie_ids(log_path):
+    # Written before movies were logged by their title and release date
+    log_path.write_text('{"generation": 1}\n'
+                        '{"operation": "add_user", "username": "loggeduser", "password": "hash", "id": 5, '
+                        '"joined_on_utc": "2021-01-01T00:00:00"}\n'
+                        '{"operation": "add_movie_to_watchlist", "username": "loggeduser", "movie_id": 3}\n')
+
+    repository, _ = create_repository(log_path)
+    assert repository.get_movie_by_id(3) in repository.get_user('loggeduser').watchlist
+
+
+def test_first_username_wins(log_path):
+    repository, log = create_repository(log_path)
+    other, _ = create_repository(log_path)
+
+    repository.add_user(User('loggeduser', 'first'))
+    other.add_user(User('loggeduser', 'second'))
+    log.catch_up()
+
+    assert repository.get_user('loggeduser').password == 'first'
+    assert other.get_user('loggeduser').password == 'first'
+    assert log_path.read_text().count('loggeduser') == 1
+
+
+def test_attach_once(log_path):
+    log = OperationLog(str(log_path))
+
+    with pytest.raises(ValueError):
+        log.catch_up()
+
+    log.attach(MemoryRepository())
+
+    with pytest.raises(ValueError):
+        log.attach(MemoryRepository())
+
+
+def add_users_in_child(log_path, count):
+    repository, _ = create_repository(log_path)
+    for i in range(count):
+        repository.add_user(User(f'child{i}', 'hash'))
+
+
+def test_changes_from_other_processes(log_path):
+    repository, log = create_repository(log_path)
+
+    context = multiprocessing.get_context('fork')
+    process = context.Process(target=add_users_in_child, args=(log_path, 20))
+    process.start()
+    for i in range(20):
+        repository.add_user(User(f'parent{i}', 'hash'))
+    process.join()
+    log.catch_up()
+
+    # Every user is applied in the order they were logged
+    replayed, _ = create_repository(log_path)
+    lines = log_path.read_text().splitlines()
+    assert lines[0] == '{"generation": 1}'
+    assert len(lines) == 41
+    assert [user.username for user in replayed._users] == [user.username for user in repository._users]
+
+
+def test_app_shares_changes(log_path):
+    def app():
+        return create_app({
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'TEST_DATA_PATH': TEST_DATA_PATH_MEMORY,
+            'REPOSITORY': 'memory',
+            'RECOMMENDATIONS_REFRESH_SECONDS': 0,
+            'CACHE_TYPE': 'null',
+            'OPERATION_LOG_PATH': str(log_path)
+        }).test_client()
+
+    client, other_client = app(), app()
+    client.post('/register', data={'username': 'loggeduser', 'password': 'Password123'})
+
+    response = other_client.post('/login', data={'username': 'loggeduser', 'password': 'Password123'})
+    assert response.status_code == 302
+    assert other_client.application.config['REPOSITORY'].get_user('loggeduser')
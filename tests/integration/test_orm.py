@@ -52,11 +52,11 @@ def insert_actors(empty_session, values):
     return [row[0] for row in rows]
 
 
-def insert_actor_colleagues(empty_session, values):
+def insert_movie_actors(empty_session, values):
     for value in values:
-        empty_session.execute('INSERT INTO actor_colleagues (actor_id, colleague_id) VALUES (:actor_id, :colleague_id)',
-                              {'actor_id': value[0], 'colleague_id': value[1]})
-    rows = empty_session.execute('SELECT * from actor_colleagues').fetchall()
+        empty_session.execute('INSERT INTO movie_actors (movie_id, actor_id) VALUES (:movie_id, :actor_id)',
+                              {'movie_id': value[0], 'actor_id': value[1]})
+    rows = empty_session.execute('SELECT * from movie_actors').fetchall()
     return [row[0] for row in rows]
 
 
@@ -224,20 +224,23 @@ def test_loading_of_actors(empty_session):
 
 
 def test_loading_of_actors_with_colleagues(empty_session):
-    actors = ["Andrew", "Cindy"]
+    actors = ["Andrew", "Cindy", "Zoe"]
     ids = insert_actors(empty_session, actors)
+    movie_ids = insert_movies(empty_session, [("Movie1", 2020), ("Movie2", 2020)])
 
-    # Create a bidirectional relationship
-    actor_colleagues = [
-        (ids[0], ids[1]),
-        (ids[1], ids[0]),
+    # Andrew and Cindy appeared in the same movie, Zoe appeared in a movie alone
+    movie_actors = [
+        (movie_ids[0], ids[0]),
+        (movie_ids[0], ids[1]),
+        (movie_ids[1], ids[2]),
     ]
 
-    insert_actor_colleagues(empty_session, actor_colleagues)
+    insert_movie_actors(empty_session, movie_actors)
 
     expected = [
         Actor("Andrew"),
-        Actor("Cindy")
+        Actor("Cindy"),
+        Actor("Zoe")
     ]
     expected[0].add_actor_colleague(expected[1])
     expected[1].add_actor_colleague(expected[0])
@@ -248,6 +251,9 @@ def test_loading_of_actors_with_colleagues(empty_session):
     for result, actor in zip(results, expected):
         assert result.colleagues == actor.colleagues
 
+    assert results[0].check_if_this_actor_worked_with(results[1])
+    assert not results[0].check_if_this_actor_worked_with(results[2])
+
 
 def test_saving_of_actors(empty_session, actor):
     empty_session.add(actor)
@@ -257,23 +263,21 @@ def test_saving_of_actors(empty_session, actor):
     assert rows == [(actor.actor_full_name,)]
 
 
-def test_saving_of_actors_with_colleagues(empty_session, actor, actors):
-    empty_session.add_all(actors)
-
-    for colleague in actors:
-        actor.add_actor_colleague(colleague)
-
-    empty_session.add(actor)
+def test_saving_of_actors_with_colleagues(empty_session, movie, actor, actors):
+    movie.actors = [actor] + actors
+    empty_session.add(movie)
     empty_session.commit()
 
-    expected = [(actor.actor_full_name, colleague.actor_full_name) for colleague in actors]
+    expected = sorted((actor.actor_full_name, colleague.actor_full_name) for colleague in actors)
 
     rows = list(empty_session.execute(f'SELECT a.actor_full_name, c.actor_full_name '
                                       f'FROM actors a '
-                                      f'JOIN actor_colleagues b '
-                                      f'ON a.id = b.actor_id '
+                                      f'JOIN movie_actors am '
+                                      f'ON a.id = am.actor_id '
+                                      f'JOIN movie_actors cm '
+                                      f'ON am.movie_id = cm.movie_id AND am.actor_id != cm.actor_id '
                                       f'JOIN actors c '
-                                      f'ON c.id = b.colleague_id '
+                                      f'ON c.id = cm.actor_id '
                                       f'WHERE a.actor_full_name = :actor_full_name '
                                       f'ORDER BY c.actor_full_name',
                                       {
@@ -282,6 +286,9 @@ def test_saving_of_actors_with_colleagues(empty_session, actor, actors):
                                       ))
     assert rows == expected
 
+    result = empty_session.query(Actor).filter(Actor._person_full_name == actor.actor_full_name).one()
+    assert result.colleagues == set(actors)
+
 
 def test_loading_of_directors(empty_session):
     directors = ["Andrew", "Cindy"]
@@ -0,0 +1,80 @@
+import logging
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+
+from movie.adapters.query_tracker import QueryTracker
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    engine.execute('CREATE TABLE movies (id INTEGER PRIMARY KEY, title TEXT)')
+    engine.execute("INSERT INTO movies (title) VALUES ('a'), ('b')")
+    return engine
+
+
+def test_invalid_sample_rate(engine):
+    with pytest.raises(ValueError):
+        QueryTracker(engine, sample_rate=1.5)
+
+
+def test_counts_statements_during_request(engine):
+    tracker = QueryTracker(engine, slow_query_seconds=10)
+
+    engine.execute('SELECT * FROM movies')
+    assert tracker.current is None
+
+    tracker.start_request('movie_bp.movie')
+    engine.execute('SELECT * FROM movies')
+    engine.execute('SELECT COUNT(*) FROM movies')
+    queries = tracker.finish_request()
+
+    assert queries.endpoint == 'movie_bp.movie'
+    assert queries.count == 2
+    assert queries.seconds > 0
+    assert tracker.current is None
+
+
+def test_unsampled_requests_are_not_tracked(engine):
+    tracker = QueryTracker(engine, sample_rate=0)
+
+    assert tracker.start_request('movie_bp.movie') is None
+    engine.execute('SELECT * FROM movies')
+    assert tracker.finish_request() is None
+
+
+def test_logs_slow_queries_with_plan(engine, caplog):
+    tracker = QueryTracker(engine, slow_query_seconds=0)
+
+    tracker.start_request('search_bp.search')
+    with caplog.at_level(logging.WARNING, logger='movie.adapters.query_tracker'):
+        engine.execute('SELECT * FROM movies WHERE title = ?', ('a',))
+    tracker.finish_request()
+
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert 'search_bp.search' in message
+    assert 'SELECT * FROM movies WHERE title = ?' in message
+    assert 'SCAN' in message
+
+    # Explaining the statement isn't counted as one of the request's statements
+    assert 'EXPLAIN' not in message
+
+
+def test_response_headers(engine):
+    app = Flask(__name__)
+    QueryTracker(engine, slow_query_seconds=10).init_app(app)
+
+    @app.route('/')
+    def index():
+        engine.execute('SELECT * FROM movies')
+        engine.execute('SELECT * FROM movies')
+        return 'ok'
+
+    response = app.test_client().get('/')
+
+    assert response.headers['X-DB-Queries'] == '2'
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    assert response.headers['Server-Timing'].endswith('desc="2 queries"')
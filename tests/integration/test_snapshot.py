@@ -0,0 +1,222 @@
+import os
+
+import pytest
+
+from movie import create_app
+from movie.adapters.memory_repository import MemoryRepository
+from movie.adapters.operation_log import LogPosition, OperationLog
+from movie.adapters.repository import populate
+from movie.adapters.snapshot import SnapshotJob, catalog_fingerprint, load_snapshot, save_snapshot
+from movie.domain.movie import Movie
+from movie.domain.review import Review
+from movie.domain.user import User
+from tests.conftest import TEST_DATA_PATH_MEMORY
+
+FINGERPRINT = 'fingerprint'
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return str(tmp_path / 'repository.snapshot')
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / 'repository.journal')
+
+
+@pytest.fixture
+def populated_repository():
+    repository = MemoryRepository()
+    populate(repository, TEST_DATA_PATH_MEMORY, 123, simulate_activity=True)
+    return repository
+
+
+def attach_log(repository, log_path, positions=()) -> OperationLog:
+    log = OperationLog(log_path)
+    log.attach(repository, positions)
+    return log
+
+
+def test_snapshot_contains_everything(populated_repository, snapshot_path):
+    repository = populated_repository
+    user = repository.get_user('testuser')
+    movie = repository.get_movie_by_id(3)
+    repository.add_movie_to_watched(user, movie)
+    repository.add_movie_to_watchlist(user, repository.get_movie_by_id(4))
+    review = Review(movie, 'abc', 7, user=user)
+    repository.add_review(review, user)
+
+    save_snapshot(repository, snapshot_path, FINGERPRINT)
+    loaded = load_snapshot(snapshot_path, FINGERPRINT).repo
+
+    assert loaded.export_state() == repository.export_state()
+
+    loaded_user = loaded.get_user('testuser')
+    loaded_movie = loaded.get_movie_by_id(3)
+    assert loaded_user.id == user.id
+    assert loaded_user.joined_on_utc == user.joined_on_utc
+    assert loaded_user.watched_movies == user.watched_movies
+    assert loaded_user.time_spent_watching_movies_minutes == user.time_spent_watching_movies_minutes
+    assert list(loaded_user.watchlist) == list(user.watchlist)
+    assert loaded.get_reviews_for_movie(loaded_movie, 0) == repository.get_reviews_for_movie(movie, 0)
+    assert loaded.get_review_user(review) is loaded_user
+    assert loaded.get_review_summary(loaded_movie).histogram == repository.get_review_summary(movie).histogram
+    assert loaded.get_similar_movies(loaded_movie) == repository.get_similar_movies(movie)
+    assert loaded.get_movies(0, 10, sort_by=loaded.SORT_BY_COMMUNITY_RATING) == \
+           repository.get_movies(0, 10, sort_by=repository.SORT_BY_COMMUNITY_RATING)
+    assert loaded.get_user_movie_interactions() == repository.get_user_movie_interactions()
+
+    actors = loaded.get_actors()
+    assert loaded.get_actor_path(actors[0], actors[-1]) == \
+           repository.get_actor_path(repository.get_actors()[0], repository.get_actors()[-1])
+
+
+def test_snapshot_of_movies_without_similar_movies(populated_repository, snapshot_path):
+    repository = populated_repository
+    movie = repository.get_movie_by_id(2)
+    sequel = Movie('Glass', 2019, 1000)
+    sequel.genres = list(movie.genres)
+    repository.add_movie(sequel)
+
+    save_snapshot(repository, snapshot_path, FINGERPRINT)
+    loaded = load_snapshot(snapshot_path, FINGERPRINT).repo
+
+    # Similar movies that hadn't been computed yet are computed once the snapshot is loaded and they're needed
+    assert loaded._similarity_index.pending == [loaded.get_movie_by_id(1000)]
+    assert loaded.get_similar_movies(loaded.get_movie_by_id(1000)) == repository.get_similar_movies(sequel)
+    assert loaded.export_state() == repository.export_state()
+
+
+def test_load_snapshot(populated_repository, snapshot_path, tmp_path):
+    assert load_snapshot(snapshot_path, FINGERPRINT) is None
+
+    positions = [LogPosition(2, 18), LogPosition(1, 100)]
+    save_snapshot(populated_repository, snapshot_path, FINGERPRINT, positions)
+    assert load_snapshot(snapshot_path, FINGERPRINT).log_positions == positions
+
+    # A snapshot of a different catalog isn't used
+    assert load_snapshot(snapshot_path, 'other') is None
+
+    other_path = tmp_path / 'other'
+    other_path.write_bytes(b'not a snapshot')
+    with pytest.raises(ValueError):
+        load_snapshot(str(other_path), FINGERPRINT)
+
+    with open(snapshot_path, 'r+b') as file:
+        file.truncate(100)
+    with pytest.raises(ValueError):
+        load_snapshot(snapshot_path, FINGERPRINT)
+
+
+def test_catalog_fingerprint(tmp_path):
+    fingerprint = catalog_fingerprint(TEST_DATA_PATH_MEMORY, 123, True, None)
+
+    assert catalog_fingerprint(TEST_DATA_PATH_MEMORY, 123, True, None) == fingerprint
+    assert catalog_fingerprint(TEST_DATA_PATH_MEMORY, 123, False, None) != fingerprint
+    assert catalog_fingerprint(TEST_DATA_PATH_MEMORY, 123, True, 10) != fingerprint
+
+    data_path = tmp_path / 'movies.csv'
+    data_path.write_bytes(open(TEST_DATA_PATH_MEMORY, 'rb').read() + b'\n')
+    assert catalog_fingerprint(str(data_path), 123, True, None) != fingerprint
+
+
+def test_changes_after_snapshot_are_replayed(populated_repository, snapshot_path, log_path):
+    repository = populated_repository
+    job = SnapshotJob(repository, attach_log(repository, log_path), snapshot_path, FINGERPRINT, 0)
+    repository.add_user(User('beforesnapshot', 'hash'))
+
+    assert job.save()
+    assert not job.save()
+    with open(log_path) as file:
+        assert file.read() == '{"generation": 2}\n'
+
+    repository.add_user(User('aftersnapshot', 'hash'))
+
+    snapshot = load_snapshot(snapshot_path, FINGERPRINT)
+    loaded = snapshot.repo
+    log = attach_log(loaded, log_path, snapshot.log_positions)
+
+    assert loaded.get_user('beforesnapshot').password == 'hash'
+    assert loaded.get_user('aftersnapshot').password == 'hash'
+    assert log.position == LogPosition(2, os.path.getsize(log_path))
+
+
+def test_compaction_is_followed_by_other_processes(populated_repository, snapshot_path, log_path):
+    repository = populated_repository
+    log = attach_log(repository, log_path)
+
+    other = MemoryRepository()
+    populate(other, TEST_DATA_PATH_MEMORY, 123, simulate_activity=True)
+    other_log = attach_log(other, log_path)
+
+    repository.add_user(User('beforesnapshot', 'hash'))
+    SnapshotJob(repository, log, snapshot_path, FINGERPRINT, 0).save()
+    repository.add_user(User('aftersnapshot', 'hash'))
+
+    # Catches up with the previous generation before moving on to the next
+    assert other_log.catch_up() == 2
+    assert other_log.position == log.position
+    other.get_user('beforesnapshot')
+    other.get_user('aftersnapshot')
+
+    # Writers also move on to the next generation
+    other.add_user(User('otheruser', 'hash'))
+    assert log.catch_up() == 1
+    assert repository.get_user('otheruser').password == 'hash'
+
+
+def test_log_replaced_after_snapshot_is_saved(populated_repository, snapshot_path, log_path):
+    repository = populated_repository
+    log = attach_log(repository, log_path)
+    repository.add_user(User('beforesnapshot', 'hash'))
+
+    # As if the process stopped after saving the snapshot but before replacing the log
+    class Stopped(Exception):
+        pass
+
+    def checkpoint(positions):
+        save_snapshot(repository, snapshot_path, FINGERPRINT, positions)
+        raise Stopped()
+
+    with pytest.raises(Stopped):
+        log.compact(checkpoint)
+
+    # Changes made by other processes are still written to the previous generation
+    repository.add_user(User('aftersnapshot', 'hash'))
+
+    snapshot = load_snapshot(snapshot_path, FINGERPRINT)
+    assert attach_log(snapshot.repo, log_path, snapshot.log_positions).position.generation == 1
+    snapshot.repo.get_user('aftersnapshot')
+
+    with pytest.raises(ValueError):
+        attach_log(MemoryRepository(), log_path, [LogPosition(3, 18), LogPosition(2, 18)])
+
+
+def test_app_starts_from_snapshot(snapshot_path, monkeypatch):
+    def app():
+        return create_app({
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'TEST_DATA_PATH': TEST_DATA_PATH_MEMORY,
+            'REPOSITORY': 'memory',
+            'RECOMMENDATIONS_REFRESH_SECONDS': 0,
+            'CACHE_TYPE': 'null',
+            'SNAPSHOT_PATH': snapshot_path,
+            'SNAPSHOT_INTERVAL_SECONDS': 0
+        })
+
+    first = app()
+    first.config['SNAPSHOTS'].stop()
+    first.test_client().post('/register', data={'username': 'snapshotuser', 'password': 'Password123'})
+
+    def populate_not_called(*args, **kwargs):
+        raise AssertionError('the repository should be loaded from the snapshot')
+
+    monkeypatch.setattr('movie.populate', populate_not_called)
+    second = app()
+    second.config['SNAPSHOTS'].stop()
+
+    client = second.test_client()
+    response = client.post('/login', data={'username': 'snapshotuser', 'password': 'Password123'})
+    assert response.headers['Location'] == 'http://localhost/'
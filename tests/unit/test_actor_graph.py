@@ -0,0 +1,155 @@
+import pytest
+
+from movie.domain.actor import Actor
+from movie.domain.actor_graph import ActorGraph
+from movie.domain.movie import Movie
+
+
+@pytest.fixture
+def actor_graph():
+    return ActorGraph()
+
+
+@pytest.fixture
+def cast_movies(actors):
+    # Movie0 stars actors 0-2, Movie1 stars actors 2-4, Movie2 stars actor 5 alone
+    casts = [actors[0:3], actors[2:5], actors[5:6]]
+    movies = []
+
+    for i, cast in enumerate(casts):
+        movie = Movie(f'Movie{i}', 2020, i)
+        movie.actors = list(cast)
+        movies.append(movie)
+
+    return movies
+
+
+def test_constructor():
+    graph = ActorGraph()
+    assert graph.number_of_actors == 0
+    assert graph.number_of_movies == 0
+
+
+def test_add_movie(actor_graph, cast_movies, actors):
+    actor_graph.add_movie(cast_movies[0])
+
+    assert actor_graph.number_of_movies == 1
+    assert actor_graph.number_of_actors == 3
+    assert actor_graph.get_movies(actors[0]) == [cast_movies[0]]
+
+
+def test_add_movie_duplicate(actor_graph, cast_movies):
+    actor_graph.add_movie(cast_movies[0])
+    actor_graph.add_movie(cast_movies[0])
+
+    assert actor_graph.number_of_movies == 1
+
+
+def test_add_movie_invalid_type(actor_graph):
+    with pytest.raises(TypeError):
+        actor_graph.add_movie(123)
+
+
+def test_get_colleagues(actor_graph, cast_movies, actors):
+    actor_graph.add_movies(cast_movies)
+
+    assert actor_graph.get_colleagues(actors[0]) == {actors[1], actors[2]}
+    assert actor_graph.get_colleagues(actors[2]) == {actors[0], actors[1], actors[3], actors[4]}
+    assert actor_graph.get_colleagues(actors[5]) == set()
+
+
+def test_get_colleagues_unknown_actor(actor_graph, cast_movies):
+    actor_graph.add_movies(cast_movies)
+
+    assert actor_graph.get_colleagues(Actor('Unknown')) == set()
+
+
+def test_get_colleagues_updated_when_movie_added(actor_graph, cast_movies, actors):
+    actor_graph.add_movie(cast_movies[0])
+    assert actors[3] not in actor_graph.get_colleagues(actors[2])
+
+    actor_graph.add_movie(cast_movies[1])
+    assert actors[3] in actor_graph.get_colleagues(actors[2])
+
+
+def test_get_colleagues_after_compaction(actor_graph, cast_movies, actors, monkeypatch):
+    monkeypatch.setattr(ActorGraph, '_COMPACTION_THRESHOLD', 2)
+    actor_graph.add_movies(cast_movies)
+
+    assert actor_graph.get_colleagues(actors[2]) == {actors[0], actors[1], actors[3], actors[4]}
+    assert actor_graph.get_movies(actors[2]) == cast_movies[0:2]
+
+
+def test_worked_with(actor_graph, cast_movies, actors):
+    actor_graph.add_movies(cast_movies)
+
+    assert actor_graph.worked_with(actors[0], actors[1])
+    assert not actor_graph.worked_with(actors[0], actors[3])
+    assert not actor_graph.worked_with(actors[0], actors[0])
+    assert not actor_graph.worked_with(actors[0], Actor('Unknown'))
+
+
+def test_actor_colleagues_derived_from_graph(actor_graph, cast_movies, actors):
+    actor_graph.add_movies(cast_movies)
+
+    assert actors[0].colleagues == {actors[1], actors[2]}
+    assert actors[0].check_if_this_actor_worked_with(actors[2])
+    assert not actors[0].check_if_this_actor_worked_with(actors[4])
+
+
+def test_actor_colleagues_derived_from_every_graph(actor_graph, cast_movies, actors):
+    actor_graph.add_movie(cast_movies[0])
+
+    # Actor 2 is in both graphs, which each have one of their movies
+    other = ActorGraph()
+    other.add_movie(cast_movies[1])
+
+    assert actors[0].colleagues == {actors[1], actors[2]}
+    assert actors[2].colleagues == {actors[0], actors[1], actors[3], actors[4]}
+    assert actors[0].check_if_this_actor_worked_with(actors[1])
+    assert actors[2].check_if_this_actor_worked_with(actors[4])
+
+
+def test_get_path(actor_graph, cast_movies, actors):
+    actor_graph.add_movies(cast_movies)
+
+    path = actor_graph.get_path(actors[0], actors[4])
+    assert path.actors == [actors[0], actors[2], actors[4]]
+    assert path.movies == [cast_movies[0], cast_movies[1]]
+    assert path.degrees == 2
+
+
+def test_get_path_to_self(actor_graph, cast_movies, actors):
+    actor_graph.add_movies(cast_movies)
+
+    path = actor_graph.get_path(actors[0], actors[0])
+    assert path.actors == [actors[0]]
+    assert path.degrees == 0
+
+
+def test_get_path_not_connected(actor_graph, cast_movies, actors):
+    actor_graph.add_movies(cast_movies)
+
+    assert actor_graph.get_path(actors[0], actors[5]) is None
+    assert actor_graph.get_path(actors[0], Actor('Unknown')) is None
+
+
+def test_get_path_updated_when_movie_added(actor_graph, cast_movies, actors):
+    actor_graph.add_movies(cast_movies)
+    assert actor_graph.get_path(actors[0], actors[5]) is None
+
+    movie = Movie('Movie3', 2020, 3)
+    movie.actors = [actors[0], actors[5]]
+    actor_graph.add_movie(movie)
+
+    path = actor_graph.get_path(actors[0], actors[5])
+    assert path.movies == [movie]
+
+
+def test_get_path_with_keys(actor_graph):
+    actor_graph.add_cast(1, [10, 11])
+    actor_graph.add_cast(2, [11, 12])
+
+    path = actor_graph.get_path(10, 12)
+    assert path.actors == [10, 11, 12]
+    assert path.movies == [1, 2]
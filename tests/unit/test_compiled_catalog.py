@@ -0,0 +1,129 @@
+import os
+import shutil
+
+import pytest
+
+from movie.datafilereaders.compiled_catalog import CompiledCatalog, compile_catalog, compiled_catalog_path, \
+    load_compiled_catalog
+from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+EXTRA_ROWS = [
+    # The same title and release date as the first movie
+    '11,Guardians of the Galaxy,Action,Again.,James Gunn,Chris Pratt,2014,121,8.1,757074,333.13,76\n',
+    '12,Unparseable,Action,Bad year.,Nobody,Nobody,soon,100,5.0,10,N/A,N/A\n',
+    '13,Última Película,"Drama, Romance",Sin ingresos ni metascore.,María López,"Ana Pérez, Chris Pratt",2019,95,6.4,'
+    '1000,N/A,N/A\n'
+]
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'movies.csv'
+    shutil.copyfile('./tests/data/movies.csv', path)
+
+    with open(path, 'a', encoding='utf-8') as file:
+        file.writelines(EXTRA_ROWS)
+
+    return str(path)
+
+
+def details(movie):
+    return (movie, movie.id, movie.description, movie.genres, movie.director, movie.actors, movie.runtime_minutes,
+            movie.rating, movie.votes, movie.revenue_millions, movie.metascore)
+
+
+@pytest.mark.parametrize('max_num_lines', [None, 5, 11, 12])
+def test_compiled_catalog_matches_csv(data_path, max_num_lines):
+    assert compile_catalog(data_path) == 11
+
+    expected = list(MovieFileCSVReader(data_path).iter_csv_movies(max_num_lines))
+    movies = list(CompiledCatalog(compiled_catalog_path(data_path)).iter_movies(max_num_lines))
+
+    assert [details(movie) for movie in movies] == [details(movie) for movie in expected]
+
+
+def test_compiled_catalog_shares_genres_and_people(data_path):
+    compile_catalog(data_path)
+    movies = list(CompiledCatalog(compiled_catalog_path(data_path)).iter_movies())
+
+    chris_pratt = [actor for movie in movies for actor in movie.actors if actor.actor_full_name == 'Chris Pratt']
+    assert len(chris_pratt) == 3
+    assert all(actor is chris_pratt[0] for actor in chris_pratt)
+
+
+def test_compiled_catalog_columns(data_path):
+    compile_catalog(data_path)
+    catalog = CompiledCatalog(compiled_catalog_path(data_path))
+
+    assert len(catalog) == 11
+    assert catalog['ids'].tolist() == list(range(10)) + [11]
+    assert catalog.strings('titles', 10) == ['Última Película']
+    assert catalog.strings('descriptions', 9, 10) == ['A spacecraft traveling to a distant colony planet and '
+                                                      'transporting thousands of people has a malfunction in its '
+                                                      'sleep chambers. As a result, two passengers are awakened 90 '
+                                                      'years early.']
+    assert catalog['genre_offsets'][-1] == len(catalog['genre_indices'])
+    assert catalog['metascores'][10] == -1
+
+
+def test_reader_prefers_fresh_compiled_catalog(data_path):
+    reader = MovieFileCSVReader(data_path)
+    assert load_compiled_catalog(data_path) is None
+
+    compile_catalog(data_path)
+    assert load_compiled_catalog(data_path) is not None
+
+    reader.read_csv_file()
+    assert len(reader.dataset_of_movies) == 11
+    assert len(reader.dataset_of_genres) == len(set(genre for movie in reader.dataset_of_movies for genre in movie.genres))
+
+    # Changing the data file makes the compiled catalog stale, so the file is read again
+    with open(data_path, 'a', encoding='utf-8') as file:
+        file.write('14,Newer,Drama,New.,Someone,Someone Else,2020,90,7.0,10,N/A,N/A\n')
+
+    assert load_compiled_catalog(data_path) is None
+
+    reader.read_csv_file()
+    assert reader.dataset_of_movies[-1].title == 'Newer'
+
+
+def test_compiled_catalog_closed(data_path, monkeypatch):
+    compile_catalog(data_path)
+
+    with CompiledCatalog(compiled_catalog_path(data_path)) as catalog:
+        ids = catalog['ids']
+    assert catalog._buffer.closed is False
+
+    # Stays mapped until the columns taken from it are released
+    assert ids.tolist() == list(range(10)) + [11]
+    del ids
+    catalog.close()
+    assert catalog._buffer.closed
+
+    closed = []
+    close = CompiledCatalog.close
+    monkeypatch.setattr(CompiledCatalog, 'close', lambda self: closed.append(close(self)))
+
+    # Once the reader has read every movie from it, or found it to be stale
+    assert len(list(MovieFileCSVReader(data_path).iter_movies())) == 11
+    assert len(closed) == 1
+
+    with open(data_path, 'a', encoding='utf-8') as file:
+        file.write('14,Newer,Drama,New.,Someone,Someone Else,2020,90,7.0,10,N/A,N/A\n')
+
+    assert load_compiled_catalog(data_path) is None
+    assert len(closed) == 2
+
+
+def test_invalid_compiled_catalog(data_path):
+    with open(compiled_catalog_path(data_path), 'wb') as file:
+        file.write(b'not a catalog')
+
+    with pytest.raises(ValueError):
+        CompiledCatalog(compiled_catalog_path(data_path))
+
+    # Made to look fresh
+    stat = os.stat(data_path)
+    os.utime(compiled_catalog_path(data_path), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_compiled_catalog(data_path) is None
+    assert len(list(MovieFileCSVReader(data_path).iter_movies())) == 11
@@ -0,0 +1,54 @@
+import pytest
+
+from movie.adapters.memory_repository import MemoryRepository
+from movie.metrics.registry import Metrics
+
+
+def test_render_counter_and_histogram():
+    metrics = Metrics()
+    metrics.record_request('home_bp.home', 'GET', 200, 0.02, 1000)
+    metrics.record_request('home_bp.home', 'GET', 200, 0.2, 3000)
+
+    text = metrics.render()
+
+    assert '# TYPE http_requests_total counter' in text
+    assert 'http_requests_total{endpoint="home_bp.home",method="GET",status="200"} 2.0' in text
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="home_bp.home",le="0.01"}' not in text
+    assert 'http_request_duration_seconds_bucket{endpoint="home_bp.home",le="0.025"} 1.0' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="home_bp.home",le="0.25"} 2.0' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="home_bp.home",le="+Inf"} 2.0' in text
+    assert 'http_request_duration_seconds_count{endpoint="home_bp.home"} 2.0' in text
+    assert 'http_response_size_bytes_sum{endpoint="home_bp.home"} 4000.0' in text
+
+    # Buckets are in order of their upper bound
+    lines = [line for line in text.splitlines() if line.startswith('http_request_duration_seconds_bucket')]
+    assert lines[-1].endswith('le="+Inf"} 2.0')
+
+
+def test_render_escapes_labels():
+    metrics = Metrics()
+    metrics.record_repository_call('a"b\\c', 0.1)
+
+    assert 'repository_calls_total{method="a\\"b\\\\c"} 1.0' in metrics.render()
+
+
+def test_instrument_repository():
+    metrics = Metrics()
+    repo = metrics.instrument_repository(MemoryRepository())
+
+    assert isinstance(repo, MemoryRepository)
+
+    repo.get_genres()
+    with pytest.raises(ValueError):
+        repo.get_movie_by_id(123)
+
+    text = metrics.render()
+    assert 'repository_calls_total{method="get_genres"} 1.0' in text
+    assert 'repository_calls_total{method="get_movie_by_id"} 1.0' in text
+    assert 'repository_call_errors_total{method="get_movie_by_id"} 1.0' in text
+
+    # Instrumenting twice doesn't record calls twice
+    metrics.instrument_repository(repo)
+    repo.get_genres()
+    assert 'repository_calls_total{method="get_genres"} 2.0' in metrics.render()
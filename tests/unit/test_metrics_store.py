@@ -0,0 +1,52 @@
+import multiprocessing
+
+from movie.metrics.store import MemoryMetricsStore, MultiprocessMetricsStore
+
+
+def add_samples(directory, amount):
+    store = MultiprocessMetricsStore(directory)
+    store.add('requests', amount)
+    store.add('errors', 1)
+
+
+def test_memory_store():
+    store = MemoryMetricsStore()
+    store.add('a', 1)
+    store.add('a', 2.5)
+    store.add('b', 1)
+
+    assert store.collect() == {'a': 3.5, 'b': 1}
+
+
+def test_multiprocess_store(tmp_path):
+    store = MultiprocessMetricsStore(str(tmp_path))
+    store.add('a', 1)
+    store.add('a', 2)
+
+    assert store.collect() == {'a': 3}
+
+
+def test_multiprocess_store_grows(tmp_path):
+    store = MultiprocessMetricsStore(str(tmp_path))
+
+    # Enough samples to outgrow the initial file
+    for i in range(5000):
+        store.add(f'sample {i}', i)
+
+    values = store.collect()
+    assert len(values) == 5000
+    assert values['sample 4999'] == 4999
+
+
+def test_multiprocess_store_sums_processes(tmp_path):
+    store = MultiprocessMetricsStore(str(tmp_path))
+    store.add('requests', 1)
+
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=add_samples, args=(str(tmp_path), amount)) for amount in (10, 100)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert store.collect() == {'requests': 111, 'errors': 2}
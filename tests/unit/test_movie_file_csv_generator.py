@@ -0,0 +1,81 @@
+import csv
+from collections import Counter
+
+import pytest
+
+from movie.datafilereaders.movie_file_csv_generator import CatalogModel, MovieFileCSVGenerator
+from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+
+
+@pytest.fixture(scope='module')
+def model():
+    return CatalogModel.fit('./movie/adapters/data/Data1000Movies.csv')
+
+
+def test_fit(model):
+    assert model.cast_sizes.values == [3, 4]
+    assert 0 < model.actor_reuse < 1
+    assert 0 < model.director_reuse < 1
+    assert len(model.numeric_rows) == 1000
+    assert model.genres.probabilities.sum() == pytest.approx(1)
+
+
+def test_fit_invalid_file():
+    with pytest.raises(ValueError):
+        CatalogModel.fit('./tests/data/invalid.csv')
+
+
+def test_constructor_invalid_arguments(model):
+    with pytest.raises(TypeError):
+        MovieFileCSVGenerator(123)
+
+    with pytest.raises(TypeError):
+        MovieFileCSVGenerator(model, pool_capacity=1.5)
+
+    with pytest.raises(ValueError):
+        MovieFileCSVGenerator(model, pool_capacity=0)
+
+
+def test_iter_rows_invalid_arguments(model):
+    generator = MovieFileCSVGenerator(model)
+
+    with pytest.raises(TypeError):
+        generator.iter_rows(1.5)
+
+    with pytest.raises(ValueError):
+        generator.iter_rows(-1)
+
+    with pytest.raises(ValueError):
+        generator.iter_rows(10, chunk_size=0)
+
+
+def test_write_can_be_read(model, tmp_path):
+    file_name = str(tmp_path / 'movies.csv')
+    count = MovieFileCSVGenerator(model, 123).write(file_name, 500, chunk_size=64)
+
+    reader = MovieFileCSVReader(file_name)
+    reader.read_csv_file()
+
+    assert count == 500
+    assert len(reader.dataset_of_movies) == 500
+
+    with open('./movie/adapters/data/Data1000Movies.csv', encoding='utf-8-sig') as file:
+        genres = {genre for row in csv.DictReader(file) for genre in row['Genre'].split(',')}
+    assert {genre.genre_name for genre in reader.dataset_of_genres} <= genres
+
+
+def test_iter_rows_reuses_people(model):
+    rows = list(MovieFileCSVGenerator(model, 123).iter_rows(2000))
+    appearances = Counter(name for row in rows for name in row[5].split(', '))
+
+    assert all(3 <= len(row[5].split(', ')) <= 4 for row in rows)
+    assert len(appearances) < sum(appearances.values())
+    assert max(appearances.values()) > 5
+
+
+def test_iter_rows_is_deterministic(model):
+    first = list(MovieFileCSVGenerator(model, 123).iter_rows(100, chunk_size=10))
+    second = list(MovieFileCSVGenerator(model, 123).iter_rows(100, chunk_size=10))
+
+    assert first == second
+    assert [row[0] for row in first] == [str(rank) for rank in range(1, 101)]
@@ -1,6 +1,8 @@
+import csv
+
 import pytest
 
-from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader
+from movie.datafilereaders.movie_file_csv_reader import MovieFileCSVReader, _record_boundaries
 
 
 def test_constructor_invalid_file_extension():
@@ -104,3 +106,130 @@ def test_dataset_of_genres_is_valid(reader: MovieFileCSVReader):
     genres = reader.dataset_of_genres
 
     assert all(genre.genre_name is not None for genre in genres)
+
+
+def test_dataset_of_actors_colleagues(reader: MovieFileCSVReader):
+    reader.read_csv_file()
+    actors = {actor.actor_full_name: actor for actor in reader.dataset_of_actors}
+
+    # Both appear in 'Guardians of the Galaxy'
+    assert actors['Vin Diesel'] in actors['Chris Pratt'].colleagues
+    assert actors['Chris Pratt'].check_if_this_actor_worked_with(actors['Vin Diesel'])
+    assert actors['Chris Pratt'] not in actors['Chris Pratt'].colleagues
+
+
+def test_iter_movies_matches_read_csv_file(reader: MovieFileCSVReader):
+    reader.read_csv_file()
+    movies = reader.dataset_of_movies
+
+    streamed = list(MovieFileCSVReader('./movie/adapters/data/Data1000Movies.csv').iter_movies())
+
+    assert streamed == movies
+    assert [movie.id for movie in streamed] == [movie.id for movie in movies]
+    assert [movie.id for movie in streamed] == sorted(movie.id for movie in streamed)
+
+
+def test_iter_movies_shares_people_and_genres(reader: MovieFileCSVReader):
+    actors = {}
+
+    for movie in reader.iter_movies(max_num_lines=100):
+        for actor in movie.actors:
+            assert actors.setdefault(actor.actor_full_name, actor) is actor
+
+
+def test_iter_batches(reader: MovieFileCSVReader):
+    batches = list(reader.iter_batches(300, max_num_lines=700))
+
+    assert [len(batch) for batch in batches] == [300, 300, 100]
+    assert [movie.id for batch in batches for movie in batch] == list(range(700))
+
+    with pytest.raises(ValueError):
+        next(reader.iter_batches(0))
+
+
+@pytest.fixture
+def multiline_csv(tmp_path):
+    """
+    A file with quoted newlines and quotes, quotes in unquoted fields, a duplicate movie, a row that can't be parsed and
+    Windows newlines.
+    """
+    path = tmp_path / 'movies.csv'
+
+    with open(path, 'w', encoding='utf-8-sig', newline='') as file:
+        writer = csv.writer(file, lineterminator='\r\n')
+        writer.writerow(MovieFileCSVReader._REQUIRED_FIELDS)
+
+        for i in range(200):
+            description = f'Line one of {i}.\nLine "two",\r\nand three.' if i % 3 == 0 else f'Movie {i}'
+            year = 'unknown' if i == 50 else 2000 + i % 20
+            title = 'Movie 1' if i == 121 else f'Movie {i}'
+
+            if i % 10 == 7:
+                # Quotes that don't start a field are part of it, and a quoted field can follow them
+                file.write(f'{i + 1},{title} "Cut",Action,A 6" tall robot,Director {i % 7},"Actor {i % 11}, Actor 2",'
+                           f'{year},100,7.5,1000,N/A,50\r\n')
+                continue
+
+            writer.writerow([i + 1, title, 'Drama,Comedy' if i % 2 else 'Action', description, f'Director {i % 7}',
+                             f'Actor {i % 11}, Actor {i % 13},Actor {i % 5}', year, 100, 7.5, 1000, 'N/A', 50])
+
+    return str(path)
+
+
+def test_record_boundaries_are_at_start_of_rows(multiline_csv):
+    with open(multiline_csv, 'rb') as file:
+        data = file.read()
+
+    boundaries = _record_boundaries(multiline_csv, 500)
+
+    assert boundaries[-1] == len(data)
+    assert len(boundaries) > 10
+    assert boundaries == sorted(set(boundaries))
+
+    # Offsets at which csv.reader starts each row
+    position = 0
+    row_starts = {position}
+
+    def lines():
+        nonlocal position
+        for line in data.splitlines(keepends=True):
+            position += len(line)
+            yield line.decode('utf-8')
+
+    for _ in csv.reader(lines()):
+        row_starts.add(position)
+
+    assert set(boundaries) <= row_starts
+
+
+@pytest.mark.parametrize('max_num_lines', [None, 150])
+def test_read_csv_file_in_parallel(multiline_csv, monkeypatch, max_num_lines):
+    serial = MovieFileCSVReader(multiline_csv)
+    serial.read_csv_file(max_num_lines)
+
+    # Split the file into many chunks
+    monkeypatch.setattr(MovieFileCSVReader, '_CHUNK_SIZE', 500)
+    parallel = MovieFileCSVReader(multiline_csv)
+    parallel.read_csv_file(max_num_lines, processes=2)
+
+    assert len(parallel.dataset_of_movies) == (149 if max_num_lines else 198)
+
+    for movie, expected in zip(parallel.dataset_of_movies, serial.dataset_of_movies):
+        assert (movie, movie.id, movie.description, movie.genres, movie.director, movie.actors) == \
+               (expected, expected.id, expected.description, expected.genres, expected.director, expected.actors)
+
+    assert parallel.dataset_of_movies == serial.dataset_of_movies
+    assert parallel.dataset_of_genres == serial.dataset_of_genres
+    assert parallel.dataset_of_directors == serial.dataset_of_directors
+    assert parallel.dataset_of_actors == serial.dataset_of_actors
+    assert parallel.dataset_of_movies[0].description == 'Line one of 0.\nLine "two",\nand three.'
+    assert parallel.dataset_of_movies[7].title == 'Movie 7 "Cut"'
+    assert parallel.dataset_of_movies[7].description == 'A 6" tall robot'
+
+
+def test_read_csv_file_invalid_processes(reader: MovieFileCSVReader):
+    with pytest.raises(ValueError):
+        reader.read_csv_file(processes=0)
+
+    with pytest.raises(TypeError):
+        reader.read_csv_file(processes=1.5)
@@ -0,0 +1,110 @@
+import pytest
+
+from movie.adapters.similarity import MovieSimilarityIndex
+from movie.domain.movie import Movie
+
+
+@pytest.fixture
+def similarity_index():
+    return MovieSimilarityIndex(number_of_neighbours=3)
+
+
+def test_constructor():
+    index = MovieSimilarityIndex()
+    assert index.number_of_neighbours == MovieSimilarityIndex.DEFAULT_NUMBER_OF_NEIGHBOURS
+    assert len(index) == 0
+
+
+def test_constructor_invalid_number_of_neighbours():
+    with pytest.raises(TypeError):
+        MovieSimilarityIndex('3')
+
+    with pytest.raises(ValueError):
+        MovieSimilarityIndex(0)
+
+
+def test_add_movie(similarity_index, movie):
+    similarity_index.add_movie(movie)
+
+    assert movie in similarity_index
+    assert similarity_index.pending == [movie]
+
+
+def test_add_movie_duplicate(similarity_index, movie):
+    similarity_index.add_movie(movie)
+    similarity_index.add_movie(movie)
+
+    assert len(similarity_index) == 1
+
+
+def test_add_movie_invalid_type(similarity_index):
+    with pytest.raises(TypeError):
+        similarity_index.add_movie(123)
+
+
+def test_update(similarity_index, populated_movies, genres):
+    # Give the first three movies the same genre so they're more similar to each other than any other movie
+    for movie in populated_movies[:3]:
+        movie.genres = [genres[0]]
+
+    similarity_index.add_movies(populated_movies)
+    changed = similarity_index.update()
+
+    assert changed == set(populated_movies)
+    assert similarity_index.pending == []
+    assert set(similarity_index.get_neighbours(populated_movies[0])) == set(populated_movies[1:3])
+    assert populated_movies[0] not in similarity_index.get_neighbours(populated_movies[0])
+
+
+def test_update_scores_are_ordered(similarity_index, populated_movies, genres, actors):
+    populated_movies[1].genres = [genres[0]]
+    populated_movies[2].genres = [genres[0]]
+    populated_movies[2].actors = [actors[0]]
+
+    similarity_index.add_movies(populated_movies)
+    similarity_index.update()
+
+    neighbours = similarity_index.get_neighbour_scores(populated_movies[0])
+    assert [movie for movie, _ in neighbours] == [populated_movies[2], populated_movies[1]]
+    assert all(0 < score <= 1 for _, score in neighbours)
+
+
+def test_update_incremental(similarity_index, populated_movies, genres):
+    similarity_index.add_movies(populated_movies)
+    similarity_index.update()
+    assert similarity_index.get_neighbours(populated_movies[0]) == []
+
+    movie = Movie('Sequel', 2020, 10)
+    movie.genres = [genres[0]]
+    movie.director = populated_movies[0].director
+    similarity_index.add_movie(movie)
+
+    assert similarity_index.update() == {movie, populated_movies[0]}
+    assert similarity_index.get_neighbours(movie) == [populated_movies[0]]
+    assert similarity_index.get_neighbours(populated_movies[0]) == [movie]
+
+
+def test_update_with_small_blocks(similarity_index, populated_movies, genres, monkeypatch):
+    for movie in populated_movies:
+        movie.genres = [genres[0]]
+    populated_movies[1].actors = populated_movies[0].actors
+
+    monkeypatch.setattr(MovieSimilarityIndex, '_BLOCK_ELEMENTS', 4)
+    similarity_index.add_movies(populated_movies)
+    similarity_index.update()
+
+    neighbours = similarity_index.get_neighbours(populated_movies[0])
+    assert len(neighbours) == 3
+    assert neighbours[0] == populated_movies[1]
+
+
+def test_set_neighbours(similarity_index, movies):
+    similarity_index.add_movies(movies)
+    similarity_index.set_neighbours(movies[0], [(movies[1], 0.5)])
+
+    assert movies[0] not in similarity_index.pending
+    assert similarity_index.get_neighbour_scores(movies[0]) == [(movies[1], 0.5)]
+
+
+def test_get_neighbours_unknown_movie(similarity_index, movie):
+    assert similarity_index.get_neighbours(movie) == []
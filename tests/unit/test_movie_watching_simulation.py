@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 
 from movie.activitysimulations.movie_watching_simulation import MovieWatchingSimulation
@@ -86,3 +87,68 @@ def test_simulation_reviews_are_valid(movie_watching_simulation: MovieWatchingSi
         # Check this review's timestamp isn't earlier than the movie's release year
         assert review.timestamp.year >= review.movie.release_date
         assert 1 <= review.rating <= 10
+
+
+def test_simulate_batches(movie_watching_simulation: MovieWatchingSimulation, populated_movies):
+    batches = list(movie_watching_simulation.simulate_batches(25, 2, 5, batch_size=10, processes=1))
+
+    assert [batch.first_user for batch in batches] == [0, 10, 20]
+    assert sum(batch.number_of_users for batch in batches) == 25
+
+    for batch in batches:
+        num_movies = np.diff(batch.movie_offsets)
+        assert all(2 <= n <= 5 for n in num_movies)
+        assert all((batch.num_reviewed <= batch.num_watched) & (batch.num_watched <= num_movies))
+        assert batch.number_of_reviews == batch.num_reviewed.sum()
+        assert all(1 <= rating <= 10 for rating in batch.ratings)
+
+        # Each user's movies are distinct
+        for i in range(batch.number_of_users):
+            movies = batch.movie_indices[batch.movie_offsets[i]:batch.movie_offsets[i + 1]]
+            assert len(set(movies)) == len(movies)
+
+    usernames = [username for batch in batches for username in batch.usernames]
+    assert len(set(usernames)) == len(usernames)
+
+
+def test_simulate_batches_is_deterministic(populated_movies):
+    def simulate(processes):
+        simulation = MovieWatchingSimulation(populated_movies, 123)
+        return list(simulation.simulate_batches(30, batch_size=10, processes=processes))
+
+    for first, second in zip(simulate(1), simulate(2)):
+        assert first.usernames == second.usernames
+        assert first.review_texts == second.review_texts
+        assert np.array_equal(first.movie_indices, second.movie_indices)
+        assert np.array_equal(first.ratings, second.ratings)
+
+
+def test_simulate_batches_invalid_params(movie_watching_simulation):
+    with pytest.raises(ValueError):
+        movie_watching_simulation.simulate_batches(num_users=0)
+
+    with pytest.raises(TypeError):
+        movie_watching_simulation.simulate_batches(batch_size=1.5)
+
+    with pytest.raises(ValueError):
+        movie_watching_simulation.simulate_batches(batch_size=0)
+
+    with pytest.raises(ValueError):
+        movie_watching_simulation.simulate_batches(processes=0)
+
+
+def test_to_state(movie_watching_simulation: MovieWatchingSimulation, populated_movies):
+    batch = next(movie_watching_simulation.simulate_batches(20, 1, processes=1))
+    state = movie_watching_simulation.to_state(batch)
+
+    assert len(state.users) == 20
+    assert len(state.reviews) == batch.number_of_reviews
+
+    for user in state.users:
+        assert all(movie in populated_movies for movie in user.watchlist)
+        assert all(movie in populated_movies for movie in user.watched_movies)
+        assert all(review in state.reviews for review in user.reviews)
+
+    for review in state.reviews:
+        assert review.timestamp.year >= review.movie.release_date
+        assert 1 <= review.rating <= 10
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from movie.adapters.read_write_lock import ReadWriteLock
+
+TIMEOUT_SECONDS = 5
+
+
+def run_in_thread(target) -> threading.Thread:
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_readers_share_lock():
+    lock = ReadWriteLock()
+    all_reading = threading.Barrier(3, timeout=TIMEOUT_SECONDS)
+
+    def read():
+        with lock.reading():
+            all_reading.wait()
+
+    threads = [run_in_thread(read) for _ in range(2)]
+    read()
+
+    for thread in threads:
+        thread.join(TIMEOUT_SECONDS)
+        assert not thread.is_alive()
+
+
+def test_writer_waits_for_readers():
+    lock = ReadWriteLock()
+    events = []
+    lock.acquire_read()
+
+    def write():
+        with lock.writing():
+            events.append('write')
+
+    writer = run_in_thread(write)
+    writer.join(0.1)
+    assert writer.is_alive()
+
+    events.append('read')
+    lock.release_read()
+    writer.join(TIMEOUT_SECONDS)
+
+    assert events == ['read', 'write']
+
+
+def test_waiting_writer_goes_before_new_readers():
+    lock = ReadWriteLock()
+    events = []
+    lock.acquire_read()
+
+    def write():
+        with lock.writing():
+            events.append('write')
+
+    def read():
+        with lock.reading():
+            events.append('read')
+
+    writer = run_in_thread(write)
+    writer.join(0.1)
+    reader = run_in_thread(read)
+    reader.join(0.1)
+    assert events == []
+
+    lock.release_read()
+    writer.join(TIMEOUT_SECONDS)
+    reader.join(TIMEOUT_SECONDS)
+
+    assert events == ['write', 'read']
+
+
+def test_lock_is_reentrant():
+    lock = ReadWriteLock()
+
+    with lock.writing():
+        with lock.writing():
+            with lock.reading():
+                pass
+
+    with lock.reading():
+        with lock.reading():
+            pass
+
+        # A reader can't start writing
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+
+    # Released by every thread, so another thread can write
+    writer = run_in_thread(lambda: lock.writing().__enter__())
+    writer.join(TIMEOUT_SECONDS)
+    assert not writer.is_alive()
@@ -0,0 +1,170 @@
+import multiprocessing
+import threading
+
+import numpy as np
+import pytest
+
+from movie.adapters.memory_repository import MemoryRepository
+from movie.adapters.recommendations import Interaction, Recommender, Recommendations, RecommendationJob
+
+
+@pytest.fixture
+def interactions():
+    return [
+        Interaction('a', 1, watched=True),
+        Interaction('a', 2, watched=True),
+        Interaction('b', 1, watchlisted=True),
+        Interaction('b', 2, rating=8),
+        Interaction('b', 3, watched=True),
+        Interaction('c', 1, watched=True),
+        Interaction('d', 9, watched=True)
+    ]
+
+
+def dense_recommendations(rows, columns, weights, num_users, num_movies, n, k):
+    """ Computes recommendations the slow way to check the blocked implementation against. """
+    matrix = np.zeros((num_users, num_movies))
+    matrix[rows, columns] = weights
+
+    norms = np.linalg.norm(matrix, axis=0)
+    co_occurrence = matrix.T @ matrix
+    np.fill_diagonal(co_occurrence, 0)
+    similarities = co_occurrence / np.outer(norms, norms)
+
+    # Keep the k most similar movies to each movie, breaking ties by movie
+    for movie in range(num_movies):
+        order = np.lexsort((np.arange(num_movies), -similarities[movie]))
+        similarities[movie, order[k:]] = 0
+
+    scores = matrix @ similarities
+    result = {}
+    for user in range(num_users):
+        candidates = [(-scores[user, movie], movie) for movie in range(num_movies)
+                      if matrix[user, movie] == 0 and scores[user, movie] > 0]
+        if candidates:
+            result[user] = [movie for _, movie in sorted(candidates)[:n]]
+    return result
+
+
+def test_constructor_invalid_arguments():
+    with pytest.raises(TypeError):
+        Recommender('10')
+
+    with pytest.raises(TypeError):
+        Recommender(10, '50')
+
+    with pytest.raises(ValueError):
+        Recommender(0)
+
+    with pytest.raises(ValueError):
+        Recommender(10, 0)
+
+
+def test_interaction_weight():
+    watchlisted = Recommender.interaction_weight(Interaction('a', 1, watchlisted=True))
+    watched = Recommender.interaction_weight(Interaction('a', 1, watched=True))
+    liked = Recommender.interaction_weight(Interaction('a', 1, rating=10))
+    disliked = Recommender.interaction_weight(Interaction('a', 1, rating=1))
+
+    assert disliked < watchlisted < watched < liked
+    assert disliked > 0
+
+
+def test_build(interactions):
+    recommendations = Recommender().build(interactions)
+
+    assert recommendations.get('a') == [3]
+    assert recommendations.get('c') == [2, 3]
+
+
+def test_build_excludes_movies_the_user_has_interacted_with(interactions):
+    recommendations = Recommender().build(interactions)
+
+    for interaction in interactions:
+        assert interaction.movie_id not in recommendations.get(interaction.user_id)
+
+
+def test_build_user_without_similar_movies_gets_popular_movies(interactions):
+    recommendations = Recommender().build(interactions)
+
+    # Nobody else has watched movie 9 so there's nothing to base recommendations on
+    assert recommendations.get('d') == [1, 2, 3]
+
+
+def test_build_unknown_user_gets_popular_movies(interactions):
+    recommendations = Recommender(number_of_recommendations=2).build(interactions)
+
+    assert recommendations.get('unknown') == [1, 2]
+
+
+def test_build_empty():
+    recommendations = Recommender().build([])
+
+    assert len(recommendations) == 0
+    assert recommendations.get('a') == []
+
+
+@pytest.mark.parametrize('block_elements', (16, 1 << 22))
+def test_build_matches_dense_computation(monkeypatch, block_elements):
+    monkeypatch.setattr(Recommender, '_BLOCK_ELEMENTS', block_elements)
+
+    rng = np.random.default_rng(0)
+    num_users, num_movies = 60, 40
+    pairs = np.unique(rng.integers(0, num_users * num_movies, 600))
+    rows, columns = pairs // num_movies, pairs % num_movies
+
+    # Integer weights so that sums are exact and ties are broken the same way
+    weights = rng.integers(1, 4, len(pairs)).astype(np.float64)
+
+    recommender = Recommender(number_of_recommendations=5, number_of_neighbours=8)
+    recommendations = recommender.build_from_arrays(rows, columns, weights, list(range(num_users)),
+                                                    list(range(num_movies)))
+    expected = dense_recommendations(rows, columns, weights, num_users, num_movies, 5, 8)
+
+    for user, movies in expected.items():
+        assert recommendations.get(user) == movies
+
+
+def test_recommendations_get():
+    recommendations = Recommendations({'a': [1, 2]}, [3])
+
+    assert recommendations.get('a') == [1, 2]
+    assert recommendations.get('b') == [3]
+
+
+def test_recommendation_job_refresh(populated_memory_repository):
+    job = RecommendationJob(populated_memory_repository, 0)
+    assert job.get_recommendations(1) == []
+
+    job.refresh()
+
+    # Every simulated user has a history, so the most popular movies are known
+    assert len(job.recommendations) > 0
+    assert len(job.get_recommendations('unknown')) > 0
+
+
+def test_recommendation_job_start_stop():
+    job = RecommendationJob(MemoryRepository(), 60)
+
+    job.start()
+    job.stop()
+
+
+def report_recommendation_threads(queue):
+    queue.put([thread.name for thread in threading.enumerate()])
+
+
+def test_recommendation_job_restarts_after_fork():
+    job = RecommendationJob(MemoryRepository(), 60)
+    job.start()
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=report_recommendation_threads, args=(queue,))
+    process.start()
+    threads = queue.get(timeout=10)
+    process.join()
+    job.stop()
+
+    # Threads aren't copied into forked processes, so the job started its own
+    assert 'recommendations' in threads
@@ -0,0 +1,84 @@
+import cProfile
+import os
+import pstats
+
+import pytest
+from flask import Flask
+
+from movie.profiling.request_profiler import RequestProfiler, collapsed_stacks
+
+
+def inner():
+    return sum(i * i for i in range(20000))
+
+
+def outer():
+    return inner() + inner()
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+
+    @app.route('/slow')
+    def slow():
+        return str(outer())
+
+    app.wsgi_app = RequestProfiler(app.wsgi_app, 'secret', str(tmp_path), top_n=10)
+    return app
+
+
+def test_requires_token():
+    with pytest.raises(ValueError):
+        RequestProfiler(None, None, 'profiles')
+
+
+def test_collapsed_stacks():
+    profile = cProfile.Profile()
+    profile.enable()
+    outer()
+    profile.disable()
+
+    stacks = dict(collapsed_stacks(pstats.Stats(profile)))
+
+    inner_stacks = [stack for stack in stacks if stack.split(';')[-1].startswith('inner ')]
+    assert len(inner_stacks) == 1
+    assert inner_stacks[0].split(';')[-2].startswith('outer ')
+    assert all(microseconds > 0 for microseconds in stacks.values())
+
+
+def test_request_without_token_is_not_profiled(app, tmp_path):
+    response = app.test_client().get('/slow')
+
+    assert response.status_code == 200
+    assert 'X-Profile' not in response.headers
+    assert os.listdir(tmp_path) == []
+
+
+def test_request_with_wrong_token_is_not_profiled(app, tmp_path):
+    response = app.test_client().get('/slow', query_string={'profile': 'wrong'})
+
+    assert 'X-Profile' not in response.headers
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize('request_kwargs', [{'query_string': {'profile': 'secret'}},
+                                            {'headers': {'X-Profile': 'secret'}}])
+def test_request_with_token_is_profiled(app, tmp_path, request_kwargs):
+    response = app.test_client().get('/slow', **request_kwargs)
+
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == str(outer())
+
+    stem = response.headers['X-Profile']
+    assert sorted(os.listdir(tmp_path)) == [f'{stem}.collapsed', f'{stem}.prof', f'{stem}.txt']
+
+    with open(tmp_path / f'{stem}.collapsed') as file:
+        assert any(';outer ' in line and ';inner ' in line for line in file)
+
+    with open(tmp_path / f'{stem}.txt') as file:
+        assert 'Ordered by: cumulative time' in file.read()
+
+
+def test_disabled_by_default(client):
+    assert not isinstance(client.application.wsgi_app, RequestProfiler)
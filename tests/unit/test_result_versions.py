@@ -0,0 +1,90 @@
+import pytest
+
+from movie.adapters.result_versions import ResultVersions
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_pin(clock):
+    versions = ResultVersions(clock=clock)
+    version = versions.pin('key', [3, 1, 2])
+
+    assert versions.get(version, 'key') == (3, 1, 2)
+    assert versions.pin('key', [3, 1, 2]) != version
+
+    # Only given back for the query it was pinned for
+    assert versions.get(version, 'other') is None
+    assert versions.get('unknown', 'key') is None
+    assert versions.get(None, 'key') is None
+
+
+def test_get_or_pin(clock):
+    versions = ResultVersions(clock=clock)
+    ids = [1, 2]
+
+    first = versions.get_or_pin(None, 'key', lambda: ids)
+    ids.append(3)
+
+    assert versions.get_or_pin(first.version, 'key', lambda: ids) == first
+    assert first.ids == (1, 2)
+
+    second = versions.get_or_pin('unknown', 'key', lambda: ids)
+    assert second.version != first.version
+    assert second.ids == (1, 2, 3)
+
+
+def test_versions_expire(clock):
+    versions = ResultVersions(max_age_seconds=10, clock=clock)
+    first = versions.pin('key', [1])
+    clock.now = 5
+    second = versions.pin('key', [2])
+
+    # Using a version doesn't keep it for longer
+    clock.now = 9
+    assert versions.get(first, 'key') == (1,)
+    clock.now = 10
+    assert versions.get(first, 'key') is None
+    assert versions.get(second, 'key') == (2,)
+
+    clock.now = 15
+    assert versions.get(second, 'key') is None
+    assert len(versions) == 0
+    assert versions.number_of_ids == 0
+
+
+def test_least_recently_used_evicted(clock):
+    versions = ResultVersions(max_ids=5, clock=clock)
+    first = versions.pin('first', [1, 2])
+    second = versions.pin('second', [3, 4])
+    assert versions.get(first, 'first') == (1, 2)
+
+    third = versions.pin('third', [5, 6])
+
+    assert versions.get(second, 'second') is None
+    assert versions.get(first, 'first') == (1, 2)
+    assert versions.get(third, 'third') == (5, 6)
+    assert versions.number_of_ids == 4
+
+    # The newest version is kept even if it's over the budget by itself
+    fourth = versions.pin('fourth', range(10))
+    assert len(versions) == 1
+    assert versions.get(fourth, 'fourth') == tuple(range(10))
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        ResultVersions(max_age_seconds=0)
+
+    with pytest.raises(ValueError):
+        ResultVersions(max_ids=-1)
@@ -0,0 +1,67 @@
+import pytest
+
+from movie.domain.review_summary import ReviewSummary
+
+
+@pytest.fixture
+def review_summary():
+    return ReviewSummary()
+
+
+def test_constructor(review_summary):
+    assert review_summary.number_of_reviews == 0
+    assert review_summary.rating_total == 0
+    assert review_summary.histogram == [0] * 10
+    assert review_summary.average_rating is None
+
+
+def test_constructor_invalid_histogram():
+    with pytest.raises(ValueError):
+        ReviewSummary(1, 1, [1])
+
+
+def test_add_rating(review_summary):
+    review_summary.add_rating(1)
+    review_summary.add_rating(10)
+    review_summary.add_rating(10)
+
+    assert review_summary.number_of_reviews == 3
+    assert review_summary.rating_total == 21
+    assert review_summary.average_rating == 7
+    assert review_summary.histogram == [1, 0, 0, 0, 0, 0, 0, 0, 0, 2]
+
+
+@pytest.mark.parametrize('rating', (0, 11))
+def test_add_rating_out_of_range(review_summary, rating):
+    with pytest.raises(ValueError):
+        review_summary.add_rating(rating)
+
+
+def test_add_rating_invalid_type(review_summary):
+    with pytest.raises(TypeError):
+        review_summary.add_rating(2.5)
+
+
+def test_remove_rating(review_summary):
+    review_summary.add_rating(4)
+    review_summary.add_rating(8)
+    review_summary.remove_rating(4)
+
+    assert review_summary.number_of_reviews == 1
+    assert review_summary.average_rating == 8
+    assert review_summary.histogram[3] == 0
+
+
+def test_remove_rating_not_added(review_summary):
+    review_summary.add_rating(4)
+
+    with pytest.raises(ValueError):
+        review_summary.remove_rating(5)
+
+
+def test_eq():
+    summary = ReviewSummary()
+    summary.add_rating(3)
+
+    assert summary == ReviewSummary(1, 3, [0, 0, 1, 0, 0, 0, 0, 0, 0, 0])
+    assert summary != ReviewSummary()
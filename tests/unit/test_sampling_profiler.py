@@ -0,0 +1,68 @@
+import os
+import threading
+
+import pytest
+
+from movie.profiling.sampling_profiler import SamplingProfiler
+
+
+def busy(stop: threading.Event):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy, args=(stop,), name='busy-thread')
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+@pytest.mark.parametrize('interval_seconds, flush_seconds', ((0, 1), (-1, 1), (0.01, 0), (0.01, -1)))
+def test_requires_positive_intervals(tmp_path, interval_seconds, flush_seconds):
+    with pytest.raises(ValueError):
+        SamplingProfiler(str(tmp_path), interval_seconds, flush_seconds)
+
+
+def test_sample_and_flush(tmp_path, busy_thread):
+    profiler = SamplingProfiler(str(tmp_path))
+
+    for _ in range(5):
+        profiler.sample()
+    profiler.flush()
+
+    with open(profiler.file_name) as file:
+        lines = file.read().splitlines()
+
+    busy_lines = [line for line in lines if line.startswith('busy-thread;')]
+    assert busy_lines
+    assert all(' (test_sampling_profiler.py:' in line for line in busy_lines)
+    assert any(';busy (test_sampling_profiler.py:' in line for line in busy_lines)
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in busy_lines) == 5
+
+    # The thread doing the sampling isn't included
+    assert not any(line.startswith(f'{threading.current_thread().name};') for line in lines)
+
+
+def test_start_and_stop(tmp_path, busy_thread):
+    profiler = SamplingProfiler(str(tmp_path), interval_seconds=0.001, flush_seconds=60)
+
+    profiler.start()
+    assert profiler.is_running
+    threading.Event().wait(0.1)
+    profiler.stop()
+
+    assert not profiler.is_running
+    assert os.path.basename(profiler.file_name) == f'sampled_{os.getpid()}.collapsed'
+    with open(profiler.file_name) as file:
+        assert 'busy-thread;' in file.read()
+
+    # Stopping again does nothing
+    profiler.stop()
+
+
+def test_disabled_by_default(client):
+    assert 'SAMPLING_PROFILER' not in client.application.config